@@ -95,6 +95,26 @@ class Announcement(models.Model):
         self.deleted_at = timezone.now()
         self.save(update_fields=["is_deleted", "deleted_at"])
 
+    # Target audience → core.audience roles (SPECIFIC_* reach the students)
+    AUDIENCE_ROLES = {
+        TargetAudience.PARENTS: ("PARENT",),
+        TargetAudience.STUDENTS: ("STUDENT",),
+        TargetAudience.TEACHERS: ("TEACHER",),
+        TargetAudience.SPECIFIC_SECTION: ("STUDENT",),
+        TargetAudience.SPECIFIC_CLASS: ("STUDENT",),
+    }
+
+    def audience(self):
+        """core.audience.Audience of the users targeted by the announcement."""
+        from core.audience import Audience
+
+        roles = self.AUDIENCE_ROLES.get(self.target_audience, ())
+        if self.target_audience == self.TargetAudience.SPECIFIC_SECTION:
+            return Audience(self.school_id, roles, section_id=self.target_section_id)
+        if self.target_audience == self.TargetAudience.SPECIFIC_CLASS:
+            return Audience(self.school_id, roles, class_id=self.target_class_id)
+        return Audience(self.school_id, roles)
+
 
 # ---------------------------------------------------------------------------
 # AnnouncementAttachment
@@ -14,60 +14,45 @@ logger = logging.getLogger(__name__)
 def send_announcement_notifications(announcement_id: str):
     """
     Send push notifications to all targeted users when a new announcement is published.
-    """
-    from django.contrib.auth import get_user_model
 
+    The audience is resolved by core.audience (users, preferences and
+    device tokens in two queries). Pushes follow the "system" preference
+    and silent mode, except for urgent announcements.
+    """
     from apps.announcements.models import Announcement
-    from apps.notifications.tasks import send_push_notification
-
-    User = get_user_model()
+    from apps.notifications.dispatch import send_pushes
+    from core.audience import resolve
 
     try:
         announcement = Announcement.objects.get(id=announcement_id)
-
-        # Determine target audience
-        target_map = {
-            "all": None,  # All users in the school
-            "teachers": "teacher",
-            "parents": "parent",
-            "students": "student",
-            "staff": None,  # Admin + teachers
-        }
-
-        qs = User.objects.filter(school=announcement.school, is_active=True)
-
-        target_role = target_map.get(announcement.target_audience)
-        if target_role:
-            qs = qs.filter(role=target_role)
-        elif announcement.target_audience == "staff":
-            qs = qs.filter(role__in=["admin", "teacher"])
-
-        # If specific classrooms are targeted, filter further
-        if announcement.target_classrooms.exists():
-            from apps.accounts.models import StudentProfile
-
-            student_ids = StudentProfile.objects.filter(
-                classroom__in=announcement.target_classrooms.all()
-            ).values_list("user_id", flat=True)
-            qs = qs.filter(id__in=student_ids)
-
-        count = 0
-        for user in qs.iterator():
-            send_push_notification.delay(
-                user_id=str(user.id),
-                title=f"📣 {announcement.title}",
-                body=announcement.content[:200],
-                data={"type": "announcement", "announcement_id": str(announcement.id)},
-            )
-            count += 1
-
-        logger.info(f"Announcement '{announcement.title}' notified to {count} users")
-        return {"status": "sent", "count": count}
-
     except Announcement.DoesNotExist:
         logger.error(f"Announcement {announcement_id} not found")
         return {"status": "failed"}
 
+    prefix = "🔴 URGENT: " if announcement.is_urgent else ""
+    title = f"{prefix}{announcement.title}"
+    body = announcement.body[:200]
+    data = {"type": "announcement", "announcement_id": str(announcement.id)}
+
+    pushes, tokens_by_user = [], {}
+    for recipient in resolve(announcement.audience()):
+        if not recipient.tokens:
+            continue
+        pref = recipient.preference
+        if not pref.is_push_enabled("system"):
+            continue
+        if not announcement.is_urgent and pref.is_in_silent_mode():
+            continue
+        pushes.append((recipient.user_id, title, body, data))
+        tokens_by_user[str(recipient.user_id)] = recipient.tokens
+
+    sent = send_pushes(pushes, tokens_by_user=tokens_by_user)
+    logger.info(
+        f"Announcement '{announcement.title}' pushed to {len(sent['users'])} users "
+        f"({sent['tokens']} tokens)"
+    )
+    return {"status": "sent", "count": len(sent["users"]), "tokens": sent["tokens"]}
+
 
 @shared_task
 def send_event_reminders():
@@ -0,0 +1,220 @@
+"""
+╔══════════════════════════════════════════════════════════════════════════╗
+║  Attendance — Monthly counters (AttendanceMonthlyStat)                 ║
+║                                                                        ║
+║  One row per (student, class, month) with the absent / late / present  ║
+║  / justified counts of the AttendanceRecords of that month. The rows   ║
+║  are maintained by deltas in the same transaction as the record write: ║
+║                                                                        ║
+║    record_state()            — counted state of one record             ║
+║    apply_attendance_changes() — (old, new) state pairs → counter deltas ║
+║    rebuild_monthly_stats()   — full recount (management command)       ║
+║                                                                        ║
+║  Single-record writes go through signals.py (save / justify / delete); ║
+║  the bulk upsert of MarkAttendanceView calls apply_attendance_changes  ║
+║  itself since bulk_create() sends no signal.                           ║
+╚══════════════════════════════════════════════════════════════════════════╝
+"""
+
+import datetime
+import logging
+import uuid
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Fields of AttendanceRecord that decide in which row and counter it counts.
+STATE_FIELDS = (
+    "school_id",
+    "class_obj_id",
+    "student_id",
+    "date",
+    "status",
+    "is_justified",
+)
+
+COUNTERS = ("absent", "late", "present", "justified", "justified_late")
+
+
+def month_start(day):
+    """First day of the month of ``day`` (the ``month`` column value)."""
+    return day.replace(day=1)
+
+
+def record_state(record) -> tuple:
+    """Counted state of an AttendanceRecord instance (see STATE_FIELDS)."""
+    return tuple(getattr(record, field) for field in STATE_FIELDS)
+
+
+def _contribution(state) -> tuple:
+    """(row key, school_id, counter vector) of one record state."""
+    school_id, class_id, student_id, day, status, is_justified = state
+    if isinstance(day, str):
+        day = datetime.date.fromisoformat(day)
+    vector = (
+        int(status == "ABSENT"),
+        int(status == "LATE"),
+        int(status == "PRESENT"),
+        int(status == "ABSENT" and bool(is_justified)),
+        int(status == "LATE" and bool(is_justified)),
+    )
+    # ids normalised to str: instances may hold UUIDs or strings
+    return (str(student_id), str(class_id), month_start(day)), str(school_id), vector
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Incremental maintenance
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def apply_attendance_changes(changes) -> int:
+    """
+    Apply the counter deltas of (old_state, new_state) pairs, ``None``
+    standing for "no record" (creation / deletion).
+
+    Deltas are summed per row first, then written with two statements
+    whatever the number of changes: an INSERT … ON CONFLICT DO NOTHING of
+    the missing rows that gain something, and one relative
+    UPDATE … FROM (VALUES …) — concurrent markings of the same student
+    add up instead of overwriting each other. Counters never go below 0.
+    Returns the number of rows touched.
+    """
+    from apps.attendance.models import AttendanceMonthlyStat
+
+    deltas = defaultdict(lambda: [0] * len(COUNTERS))
+    schools = {}
+    for old, new in changes:
+        if old == new:
+            continue
+        for state, sign in ((old, -1), (new, 1)):
+            if state is None:
+                continue
+            key, school_id, vector = _contribution(state)
+            schools[key] = school_id
+            row = deltas[key]
+            for i, value in enumerate(vector):
+                row[i] += sign * value
+
+    rows = [(key, delta) for key, delta in deltas.items() if any(delta)]
+    if not rows:
+        return 0
+
+    qn = connection.ops.quote_name
+    meta = AttendanceMonthlyStat._meta
+    table = qn(meta.db_table)
+    student_col = qn(meta.get_field("student").column)
+    class_col = qn(meta.get_field("class_obj").column)
+    school_col = qn(meta.get_field("school").column)
+    counter_cols = [qn(meta.get_field(name).column) for name in COUNTERS]
+
+    # Decrements only ever hit existing rows: never insert for them.
+    missing = [(key, delta) for key, delta in rows if any(v > 0 for v in delta)]
+    insert_row_sql = (
+        "(%s::uuid, %s::uuid, %s::uuid, %s::uuid, %s::date"
+        + ", 0" * len(COUNTERS)
+        + ", NOW())"
+    )
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if missing:
+            cursor.execute(
+                f"INSERT INTO {table} "
+                f"(id, {school_col}, {class_col}, {student_col}, month, "
+                f"{', '.join(counter_cols)}, updated_at) "
+                f"VALUES {', '.join([insert_row_sql] * len(missing))} "
+                f"ON CONFLICT ({student_col}, {class_col}, month) DO NOTHING",
+                [
+                    value
+                    for (student_id, class_id, month), _ in missing
+                    for value in (
+                        str(uuid.uuid4()),
+                        schools[student_id, class_id, month],
+                        class_id,
+                        student_id,
+                        month,
+                    )
+                ],
+            )
+
+        row_sql = "(%s::uuid, %s::uuid, %s::date" + ", %s::integer" * len(COUNTERS) + ")"
+        set_sql = ", ".join(
+            f"{col} = GREATEST(t.{col} + v.{col}, 0)" for col in counter_cols
+        )
+        cursor.execute(
+            f"UPDATE {table} AS t SET {set_sql}, updated_at = NOW() "
+            f"FROM (VALUES {', '.join([row_sql] * len(rows))}) "
+            f"AS v({student_col}, {class_col}, month, {', '.join(counter_cols)}) "
+            f"WHERE t.{student_col} = v.{student_col} "
+            f"AND t.{class_col} = v.{class_col} AND t.month = v.month",
+            [
+                value
+                for (student_id, class_id, month), delta in rows
+                for value in (student_id, class_id, month, *delta)
+            ],
+        )
+    return len(rows)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Full rebuild
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def rebuild_monthly_stats(school_id=None, batch_size: int = 1000) -> int:
+    """
+    Recount every AttendanceMonthlyStat row from the AttendanceRecords
+    (all schools, or one school), replacing the existing rows in one
+    transaction. Returns the number of rows written.
+    """
+    from django.db.models import Count, Q
+    from django.db.models.functions import TruncMonth
+
+    from apps.attendance.models import AttendanceMonthlyStat, AttendanceRecord
+
+    records = AttendanceRecord.objects.all()
+    stats = AttendanceMonthlyStat.objects.all()
+    if school_id:
+        records = records.filter(school_id=school_id)
+        stats = stats.filter(school_id=school_id)
+
+    absent = Q(status=AttendanceRecord.Status.ABSENT)
+    late = Q(status=AttendanceRecord.Status.LATE)
+    counts = (
+        records.annotate(month=TruncMonth("date"))
+        .values("school_id", "class_obj_id", "student_id", "month")
+        .annotate(
+            absent=Count("id", filter=absent),
+            late=Count("id", filter=late),
+            present=Count("id", filter=Q(status=AttendanceRecord.Status.PRESENT)),
+            justified=Count("id", filter=absent & Q(is_justified=True)),
+            justified_late=Count("id", filter=late & Q(is_justified=True)),
+        )
+        .order_by()
+    )
+
+    with transaction.atomic():
+        stats.delete()
+        created = AttendanceMonthlyStat.objects.bulk_create(
+            (
+                AttendanceMonthlyStat(
+                    school_id=row["school_id"],
+                    class_obj_id=row["class_obj_id"],
+                    student_id=row["student_id"],
+                    month=row["month"],
+                    absent=row["absent"],
+                    late=row["late"],
+                    present=row["present"],
+                    justified=row["justified"],
+                    justified_late=row["justified_late"],
+                )
+                for row in counts.iterator()
+            ),
+            batch_size=batch_size,
+        )
+
+    logger.info(
+        "Rebuilt %d attendance monthly stats (school=%s)", len(created), school_id or "all"
+    )
+    return len(created)
@@ -0,0 +1,46 @@
+"""
+Management command: rebuild_attendance_stats
+
+Recounts the monthly attendance counters (AttendanceMonthlyStat) from the
+AttendanceRecords. The counters are maintained incrementally on every
+write; run this after the table is created, after raw SQL or queryset
+.update() edits of attendance records, or to check for drift.
+
+Usage:
+  python manage.py rebuild_attendance_stats
+  python manage.py rebuild_attendance_stats --school <uuid>
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly attendance counters from the attendance records."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--school",
+            type=str,
+            default=None,
+            help="UUID of the school to rebuild (default: all schools).",
+        )
+
+    def handle(self, *args, **options):
+        from apps.attendance.aggregates import rebuild_monthly_stats
+        from apps.schools.models import School
+
+        school_id = options["school"]
+        if school_id and not School.objects.filter(pk=school_id).exists():
+            raise CommandError(f"School with ID {school_id} does not exist.")
+
+        start = time.perf_counter()
+        count = rebuild_monthly_stats(school_id)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ {count} monthly attendance rows rebuilt in {elapsed:.2f}s"
+            )
+        )
@@ -0,0 +1,39 @@
+# Generated by Django 5.1 on 2026-10-18 01:33
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0009_add_room_teacher_availability'),
+        ('attendance', '0002_alter_attendancerecord_unique_together_and_more'),
+        ('schools', '0007_contentresource'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceMonthlyStat',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('month', models.DateField(help_text='First day of the month.')),
+                ('absent', models.PositiveIntegerField(default=0)),
+                ('late', models.PositiveIntegerField(default=0)),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('justified', models.PositiveIntegerField(default=0)),
+                ('justified_late', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('class_obj', models.ForeignKey(db_column='class_id', on_delete=django.db.models.deletion.CASCADE, related_name='attendance_monthly_stats', to='academics.class')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_monthly_stats', to='schools.school')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_monthly_stats', to='academics.studentprofile')),
+            ],
+            options={
+                'db_table': 'attendance_monthly_stats',
+                'ordering': ['-month'],
+                'indexes': [models.Index(fields=['school', 'month'], name='attendance__school__0855d1_idx'), models.Index(fields=['class_obj', 'month'], name='attendance__class_i_f85302_idx')],
+                'unique_together': {('student', 'class_obj', 'month')},
+            },
+        ),
+    ]
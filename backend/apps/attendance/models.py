@@ -1,10 +1,11 @@
 """
-Attendance models: daily attendance records and absence excuses.
+Attendance models: daily attendance records, absence excuses and the
+monthly counters derived from the records.
 """
 
 import uuid
 
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 
@@ -91,6 +92,17 @@ class AttendanceRecord(models.Model):
     def __str__(self):
         return f"{self.student.user.full_name} — {self.date} — {self.status}"
 
+    # save() / delete() are atomic so that the monthly counters updated by
+    # the signals (see signals.py) commit or roll back with the record.
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     def justify(self, user, note=""):
         """Mark this absence as justified by an admin."""
         self.is_justified = True
@@ -156,3 +168,65 @@ class AbsenceExcuse(models.Model):
             f"Excuse: {self.attendance_record.student.user.full_name} "
             f"— {self.attendance_record.date}"
         )
+
+
+# ---------------------------------------------------------------------------
+# AttendanceMonthlyStat
+# ---------------------------------------------------------------------------
+
+
+class AttendanceMonthlyStat(models.Model):
+    """
+    Per (student, class, month) attendance counters.
+
+    Maintained incrementally in the same transaction as every change of an
+    AttendanceRecord (see aggregates.py); dashboards and reports read these
+    rows instead of re-counting the raw records. ``justified`` counts the
+    justified absences, ``justified_late`` the justified lates. Rebuild
+    with ``manage.py rebuild_attendance_stats``.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    school = models.ForeignKey(
+        "schools.School",
+        on_delete=models.CASCADE,
+        related_name="attendance_monthly_stats",
+    )
+    class_obj = models.ForeignKey(
+        "academics.Class",
+        on_delete=models.CASCADE,
+        related_name="attendance_monthly_stats",
+        db_column="class_id",
+    )
+    student = models.ForeignKey(
+        "academics.StudentProfile",
+        on_delete=models.CASCADE,
+        related_name="attendance_monthly_stats",
+    )
+    month = models.DateField(help_text="First day of the month.")
+    absent = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+    present = models.PositiveIntegerField(default=0)
+    justified = models.PositiveIntegerField(default=0)
+    justified_late = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "attendance_monthly_stats"
+        unique_together = ("student", "class_obj", "month")
+        ordering = ["-month"]
+        indexes = [
+            models.Index(fields=["school", "month"]),
+            models.Index(fields=["class_obj", "month"]),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} — {self.month:%Y-%m} — {self.absent} absences"
+
+    @property
+    def total(self) -> int:
+        return self.absent + self.late + self.present
+
+    @property
+    def unjustified(self) -> int:
+        return self.absent - self.justified
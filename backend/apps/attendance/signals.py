@@ -0,0 +1,55 @@
+"""
+╔══════════════════════════════════════════════════════════════════════════╗
+║  Attendance Signals                                                    ║
+║                                                                        ║
+║  pre_save / post_save / post_delete on AttendanceRecord                ║
+║     → delta on the AttendanceMonthlyStat counters (aggregates.py),     ║
+║       in the transaction of the record write                           ║
+║                                                                        ║
+║  Covers single-record writes (justify, excuse approval, cancellation,  ║
+║  fingerprint sync…). The bulk upsert of MarkAttendanceView sends no    ║
+║  signal and applies its deltas itself.                                 ║
+╚══════════════════════════════════════════════════════════════════════════╝
+"""
+
+import logging
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .aggregates import STATE_FIELDS, apply_attendance_changes, record_state
+
+logger = logging.getLogger(__name__)
+
+# Model field names behind STATE_FIELDS, to compare with update_fields
+_STATE_MODEL_FIELDS = {field.removesuffix("_id") for field in STATE_FIELDS}
+
+
+def _counts_change(update_fields) -> bool:
+    return update_fields is None or bool(_STATE_MODEL_FIELDS & set(update_fields))
+
+
+@receiver(pre_save, sender="attendance.AttendanceRecord")
+def stash_previous_attendance_state(sender, instance, update_fields=None, **kwargs):
+    """Remember the counted state stored in DB before an update."""
+    instance._previous_stat_state = None
+    if instance._state.adding or not _counts_change(update_fields):
+        return
+    instance._previous_stat_state = (
+        sender.objects.filter(pk=instance.pk).values_list(*STATE_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender="attendance.AttendanceRecord")
+def update_stats_on_attendance_save(
+    sender, instance, created, update_fields=None, **kwargs
+):
+    if not created and not _counts_change(update_fields):
+        return
+    previous = getattr(instance, "_previous_stat_state", None)
+    apply_attendance_changes([(previous, record_state(instance))])
+
+
+@receiver(post_delete, sender="attendance.AttendanceRecord")
+def update_stats_on_attendance_delete(sender, instance, **kwargs):
+    apply_attendance_changes([(record_state(instance), None)])
@@ -1,7 +1,8 @@
 """
 Celery tasks for the Attendance app.
-Handles absence notifications, chronic-absenteeism detection,
-daily summary, teacher reminders, and threshold alerts.
+Handles absence notifications (per record and batched per marking),
+chronic-absenteeism detection, daily summary, teacher reminders, and
+threshold alerts.
 """
 
 import logging
@@ -23,6 +24,7 @@ def notify_parent_of_absence(attendance_record_id: str):
     Called automatically when a teacher marks attendance.
     """
     from apps.attendance.models import AttendanceRecord
+    from apps.notifications.dispatch import NotificationIntent, dispatch
     from apps.notifications.models import Notification
 
     try:
@@ -42,33 +44,26 @@ def notify_parent_of_absence(attendance_record_id: str):
 
         # Find parents linked to this student
         parent_profiles = student_profile.parents.select_related("user").all()
+        day = record.date.strftime("%d/%m/%Y")
 
-        notified = 0
-        for parent_profile in parent_profiles:
-            parent_user = parent_profile.user
-
-            # Create in-app notification
-            Notification.objects.create(
-                user=parent_user,
-                school=record.school,
+        notified = dispatch(
+            NotificationIntent(
+                user_id=parent_profile.user_id,
+                school_id=record.school_id,
                 title=f"Alerte d'absence : {student_user.full_name}",
                 body=(
                     f"Votre enfant {student_user.first_name} a été marqué "
-                    f"{status_label} le {record.date.strftime('%d/%m/%Y')}."
+                    f"{status_label} le {day}."
                 ),
                 notification_type=Notification.NotificationType.ATTENDANCE,
                 related_object_id=record.pk,
                 related_object_type="AttendanceRecord",
-            )
-
-            # Send FCM push via device tokens
-            _send_fcm_for_user(
-                parent_user,
-                title=f"🔴 {student_user.first_name} — {status_label}",
-                body=f"Date : {record.date.strftime('%d/%m/%Y')} — Classe : {record.class_obj.name}",
+                push_title=f"🔴 {student_user.first_name} — {status_label}",
+                push_body=f"Date : {day} — Classe : {record.class_obj.name}",
                 data={"type": "absence", "student_id": str(student_profile.pk)},
             )
-            notified += 1
+            for parent_profile in parent_profiles
+        )["notifications"]
 
         logger.info(
             "Absence notification sent for %s on %s — %d parents",
@@ -83,6 +78,85 @@ def notify_parent_of_absence(attendance_record_id: str):
         return {"status": "failed", "reason": "Record not found"}
 
 
+# ---------------------------------------------------------------------------
+# 1b. notify_parents_of_absences — one task per attendance submission
+# ---------------------------------------------------------------------------
+
+
+@shared_task
+def notify_parents_of_absences(student_ids: list[str], date_str: str, period: str):
+    """
+    Batched version of notify_parent_of_absence for a whole class marking.
+
+    Loads the absent records, their students and parents in a fixed number
+    of queries and hands every parent notification to the dispatcher in
+    one batch (bulk INSERT, one token query, FCM multicast).
+    Records marked present again since the submission are skipped.
+    """
+    from datetime import date
+
+    from django.db.models import Prefetch
+
+    from apps.academics.models import ParentProfile
+    from apps.attendance.models import AttendanceRecord
+    from apps.notifications.dispatch import NotificationIntent, dispatch
+    from apps.notifications.models import Notification
+
+    records = list(
+        AttendanceRecord.objects.filter(
+            student_id__in=student_ids,
+            date=date.fromisoformat(date_str),
+            period=period,
+            status=AttendanceRecord.Status.ABSENT,
+        )
+        .select_related("student__user", "class_obj")
+        .prefetch_related(
+            Prefetch(
+                "student__parents",
+                queryset=ParentProfile.objects.select_related("user"),
+            )
+        )
+    )
+
+    intents = []
+    for record in records:
+        student_user = record.student.user
+        day = record.date.strftime("%d/%m/%Y")
+        for parent_profile in record.student.parents.all():
+            intents.append(
+                NotificationIntent(
+                    user_id=parent_profile.user_id,
+                    school_id=record.school_id,
+                    title=f"Alerte d'absence : {student_user.full_name}",
+                    body=(
+                        f"Votre enfant {student_user.first_name} a été marqué "
+                        f"absent le {day}."
+                    ),
+                    notification_type=Notification.NotificationType.ATTENDANCE,
+                    related_object_id=record.pk,
+                    related_object_type="AttendanceRecord",
+                    push_title=f"🔴 {student_user.first_name} — absent",
+                    push_body=f"Date : {day} — Classe : {record.class_obj.name}",
+                    data={"type": "absence", "student_id": str(record.student_id)},
+                )
+            )
+
+    notified = dispatch(intents)["notifications"]
+
+    logger.info(
+        "Absence notifications sent for %s (%s) — %d absences, %d parents",
+        date_str,
+        period,
+        len(records),
+        notified,
+    )
+    return {
+        "status": "sent",
+        "absences": len(records),
+        "parents_notified": notified,
+    }
+
+
 # ---------------------------------------------------------------------------
 # 2. detect_chronic_absenteeism — daily Celery Beat task
 # ---------------------------------------------------------------------------
@@ -104,11 +178,12 @@ def detect_chronic_absenteeism():
     """
     from datetime import date
 
-    from django.db.models import Count
+    from django.db.models import F, Sum
     from django.utils import timezone
 
     from apps.academics.models import StudentProfile
-    from apps.attendance.models import AttendanceRecord
+    from apps.attendance.models import AttendanceMonthlyStat
+    from apps.notifications.dispatch import NotificationIntent, dispatch
     from apps.notifications.models import Notification
     from apps.schools.models import School
 
@@ -121,41 +196,40 @@ def detect_chronic_absenteeism():
     for school in schools:
         threshold = school.absence_alert_threshold or 5
 
-        # Students with unjustified absences >= threshold this month
+        # Students with unjustified absences >= threshold this month,
+        # read from the monthly counters (one row per student and class)
         flagged = (
-            AttendanceRecord.objects.filter(
-                school=school,
-                status=AttendanceRecord.Status.ABSENT,
-                is_justified=False,
-                date__gte=month_start,
-                date__lte=today,
-            )
+            AttendanceMonthlyStat.objects.filter(school=school, month=month_start)
             .values("student")
-            .annotate(absence_count=Count("id"))
+            .annotate(absence_count=Sum(F("absent") - F("justified")))
             .filter(absence_count__gte=threshold)
         )
 
         if not flagged:
             continue
 
-        # Resolve student profiles
+        # Resolve student profiles (with their parents)
         student_ids = [f["student"] for f in flagged]
         counts_map = {f["student"]: f["absence_count"] for f in flagged}
-        students = StudentProfile.objects.filter(pk__in=student_ids).select_related(
-            "user"
+        students = (
+            StudentProfile.objects.filter(pk__in=student_ids)
+            .select_related("user")
+            .prefetch_related("parents")
         )
 
         # Collect all admin users for this school
         from apps.accounts.models import User
 
-        admins = list(
+        admin_ids = list(
             User.objects.filter(
                 school=school,
                 role__in=[User.Role.ADMIN, User.Role.SECTION_ADMIN, User.Role.SUPER_ADMIN],
                 is_active=True,
-            )
+            ).values_list("pk", flat=True)
         )
 
+        # One dispatcher batch per school: admins + parents of every student
+        intents = []
         for student in students:
             count = counts_map[student.pk]
             student_name = student.user.full_name
@@ -165,62 +239,36 @@ def detect_chronic_absenteeism():
                 f"{student_name} cumule {count} absence(s) non justifiée(s) "
                 f"en {today.strftime('%B %Y')} (seuil : {threshold})."
             )
-
-            # ── Notify admins ──────────────────────────────────
-            for admin in admins:
-                Notification.objects.create(
-                    user=admin,
-                    school=school,
-                    title=alert_title,
-                    body=alert_body,
-                    notification_type=Notification.NotificationType.ATTENDANCE,
-                    related_object_id=student.pk,
-                    related_object_type="StudentProfile",
-                )
-                _push_ws_notification(admin, alert_title, alert_body)
-                total_alerts += 1
-
-            # ── Notify parents ─────────────────────────────────
-            parent_profiles = student.parents.select_related("user").all()
-            for pp in parent_profiles:
-                parent_user = pp.user
-                parent_body = (
-                    f"Votre enfant {student_name} cumule {count} absence(s) "
-                    f"non justifiée(s) ce mois-ci (seuil : {threshold})."
-                )
-                Notification.objects.create(
-                    user=parent_user,
-                    school=school,
-                    title=alert_title,
-                    body=parent_body,
-                    notification_type=Notification.NotificationType.ATTENDANCE,
-                    related_object_id=student.pk,
-                    related_object_type="StudentProfile",
-                )
-                _send_fcm_for_user(
-                    parent_user,
-                    title=alert_title,
-                    body=parent_body,
-                    data={
-                        "type": "chronic_absence",
-                        "student_id": str(student.pk),
-                        "count": str(count),
-                    },
-                )
-                _push_ws_notification(parent_user, alert_title, parent_body)
-                total_alerts += 1
-
-            # ── FCM push for admins (batch) ────────────────────
-            _send_fcm_for_users(
-                admins,
-                title=alert_title,
-                body=alert_body,
-                data={
-                    "type": "chronic_absence",
-                    "student_id": str(student.pk),
-                    "count": str(count),
-                },
+            parent_body = (
+                f"Votre enfant {student_name} cumule {count} absence(s) "
+                f"non justifiée(s) ce mois-ci (seuil : {threshold})."
             )
+            recipients = [(user_id, alert_body) for user_id in admin_ids] + [
+                (parent.user_id, parent_body) for parent in student.parents.all()
+            ]
+            for user_id, body in recipients:
+                intents.append(
+                    NotificationIntent(
+                        user_id=user_id,
+                        school_id=school.pk,
+                        title=alert_title,
+                        body=body,
+                        notification_type=Notification.NotificationType.ATTENDANCE,
+                        related_object_id=student.pk,
+                        related_object_type="StudentProfile",
+                        data={
+                            "type": "chronic_absence",
+                            "student_id": str(student.pk),
+                            "count": str(count),
+                        },
+                        ws_event={
+                            "type": "absence_notification",
+                            "message": f"{alert_title} — {body}",
+                        },
+                    )
+                )
+
+        total_alerts += dispatch(intents)["notifications"]
 
     logger.info("Chronic-absenteeism check complete: %d alerts generated", total_alerts)
     return {"status": "complete", "alerts": total_alerts}
@@ -233,50 +281,28 @@ def detect_chronic_absenteeism():
 
 def _send_fcm_for_user(user, title: str, body: str, data: dict | None = None):
     """Send FCM push to all device tokens registered for *user*."""
-    from apps.notifications.models import DeviceToken
-    from core.firebase import send_push_notification
-
-    tokens = list(
-        DeviceToken.objects.filter(user=user).values_list("token", flat=True)
-    )
-    for token in tokens:
-        try:
-            send_push_notification(device_token=token, title=title, body=body, data=data)
-        except Exception as exc:
-            logger.warning("FCM push failed for user %s: %s", user.pk, exc)
+    _send_fcm_for_users([user], title, body, data)
 
 
 def _send_fcm_for_users(users, title: str, body: str, data: dict | None = None):
-    """Batch FCM push for a list of users."""
-    from apps.notifications.models import DeviceToken
-    from core.firebase import send_push_to_multiple
+    """Batch FCM push for a list of users (dispatcher multicast)."""
+    from apps.notifications.dispatch import send_pushes
 
-    tokens = list(
-        DeviceToken.objects.filter(user__in=users).values_list("token", flat=True)
-    )
-    if tokens:
-        try:
-            send_push_to_multiple(device_tokens=tokens, title=title, body=body, data=data)
-        except Exception as exc:
-            logger.warning("FCM multicast push failed: %s", exc)
+    send_pushes((user.pk, title, body, data) for user in users)
 
 
 def _push_ws_notification(user, title: str, body: str):
     """Push an absence_notification event via WebSocket channel layer."""
-    try:
-        from asgiref.sync import async_to_sync
-        from channels.layers import get_channel_layer
-
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"notifications_{user.id}",
-            {
-                "type": "absence_notification",
-                "message": f"{title} — {body}",
-            },
-        )
-    except Exception:
-        pass  # Best-effort: user may not be connected
+    from apps.notifications.dispatch import send_ws_events
+
+    send_ws_events(
+        [
+            (
+                f"notifications_{user.id}",
+                {"type": "absence_notification", "message": f"{title} — {body}"},
+            )
+        ]
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -2,12 +2,10 @@
 Attendance views — teachers mark, admins review, parents/students view.
 """
 
-import csv
-import io
 from datetime import timedelta
 
-from django.db.models import Count, Q
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from drf_spectacular.utils import OpenApiResponse, extend_schema, inline_serializer
@@ -17,9 +15,22 @@ from rest_framework.views import APIView
 
 from apps.academics.models import Class, StudentProfile, TeacherAssignment
 from apps.accounts.models import User
+from core.exports import (
+    EXPORT_CHUNK_SIZE,
+    Sheet,
+    csv_response,
+    start_export_job,
+    xlsx_response,
+)
 from core.permissions import IsParent, IsSchoolAdmin, IsTeacher
 
-from .models import AbsenceExcuse, AttendanceRecord
+from .aggregates import (
+    STATE_FIELDS,
+    apply_attendance_changes,
+    month_start,
+    record_state,
+)
+from .models import AbsenceExcuse, AttendanceMonthlyStat, AttendanceRecord
 from .serializers import (
     AbsenceExcuseSerializer,
     AbsenceStatsSerializer,
@@ -51,6 +62,9 @@ class MarkAttendanceView(APIView):
     POST /api/v1/attendance/mark/
     Teacher submits attendance for a class on a given date.
     Triggers parent notification for ABSENT students via Celery.
+
+    Set-based: one roster query, one upsert for the whole class and a
+    single batched notification task, whatever the class size.
     """
 
     permission_classes = [permissions.IsAuthenticated, IsTeacher]
@@ -94,45 +108,88 @@ class MarkAttendanceView(APIView):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        created = 0
-        updated = 0
-        errors = []
-        absent_records = []
+        records = data["records"]
+        period = data["period"]
 
-        for idx, item in enumerate(data["records"]):
-            try:
-                student = StudentProfile.objects.get(
-                    pk=item["student_id"],
-                    current_class=klass,
-                )
-            except StudentProfile.DoesNotExist:
+        # Validate every student against the class roster in one query
+        roster = set(
+            StudentProfile.objects.filter(
+                pk__in=[item["student_id"] for item in records],
+                current_class=klass,
+            ).values_list("pk", flat=True)
+        )
+        # Counted state of the records being replaced (monthly stats deltas)
+        existing = {
+            state[2]: state
+            for state in AttendanceRecord.objects.filter(
+                student_id__in=roster,
+                date=data["date"],
+                period=period,
+            ).values_list(*STATE_FIELDS)
+        }
+
+        errors = []
+        to_save = {}
+        for idx, item in enumerate(records):
+            if item["student_id"] not in roster:
                 errors.append(
                     {"index": idx, "error": "Student not found in this class."}
                 )
                 continue
-
-            record, was_created = AttendanceRecord.objects.update_or_create(
-                student=student,
+            # A student listed twice keeps the last status
+            to_save[item["student_id"]] = AttendanceRecord(
+                student_id=item["student_id"],
+                class_obj=klass,
                 date=data["date"],
-                defaults={
-                    "class_obj": klass,
-                    "status": item["status"],
-                    "note": item.get("note", ""),
-                    "marked_by": user,
-                    "school": user.school,
-                },
+                period=period,
+                status=item["status"],
+                note=item.get("note", ""),
+                marked_by=user,
+                school_id=user.school_id,
             )
-            if was_created:
-                created += 1
-            else:
-                updated += 1
 
-            if item["status"] == AttendanceRecord.Status.ABSENT:
-                absent_records.append(record)
+        # The upsert keeps is_justified of a replaced record
+        for student_id, record in to_save.items():
+            previous = existing.get(student_id)
+            record.is_justified = bool(previous and previous[-1])
+
+        with transaction.atomic():
+            AttendanceRecord.objects.bulk_create(
+                to_save.values(),
+                update_conflicts=True,
+                unique_fields=["student", "date", "period"],
+                update_fields=[
+                    "class_obj",
+                    "status",
+                    "note",
+                    "marked_by",
+                    "school",
+                    "updated_at",
+                ],
+            )
+            # bulk_create() sends no signal: update the monthly counters
+            # here, in the same transaction
+            apply_attendance_changes(
+                (existing.get(student_id), record_state(record))
+                for student_id, record in to_save.items()
+            )
+
+            # One Celery task for all absentees of this submission
+            absent_ids = [
+                str(student_id)
+                for student_id, record in to_save.items()
+                if record.status == AttendanceRecord.Status.ABSENT
+            ]
+            if absent_ids:
+                transaction.on_commit(
+                    lambda: _notify_parents_absences(
+                        absent_ids, data["date"].isoformat(), period
+                    ),
+                    robust=True,
+                )
 
-        # Trigger Celery notifications for absent students
-        for record in absent_records:
-            _notify_parents_absence(record)
+        created = len(to_save.keys() - existing)
+        updated = len(to_save) - created
 
         return Response(
             {"created": created, "updated": updated, "errors": errors},
@@ -470,15 +527,19 @@ class AbsenceStatsView(APIView):
 
         today_count = base.filter(date=today).count()
         week_count = base.filter(date__gte=week_start).count()
-        month_count = base.filter(date__gte=month_start).count()
+
+        # Month figures come from the monthly counters
+        month_stats = AttendanceMonthlyStat.objects.filter(
+            school=school, month=month_start
+        )
+        month_count = month_stats.aggregate(total=Sum("absent"))["total"] or 0
 
         # At-risk students (≥ threshold unjustified absences this month)
         at_risk_qs = (
-            base.filter(date__gte=month_start, is_justified=False)
-            .values(
+            month_stats.values(
                 "student__id", "student__user__first_name", "student__user__last_name"
             )
-            .annotate(absence_count=Count("id"))
+            .annotate(absence_count=Sum(F("absent") - F("justified")))
             .filter(absence_count__gte=self.AT_RISK_THRESHOLD)
             .order_by("-absence_count")[:20]
         )
@@ -596,8 +657,9 @@ class CancelAbsenceView(APIView):
 class AbsenceReportView(APIView):
     """
     GET /api/v1/attendance/report/
-    Export attendance data as CSV.
-    Supports same filters as AttendanceListView.
+    Export attendance data as CSV (streamed, no row limit).
+    Supports same filters as AttendanceListView; ``?async=true`` runs the
+    export as a background job and sends a download link when done.
     """
 
     permission_classes = [permissions.IsAuthenticated, IsSchoolAdmin]
@@ -608,64 +670,79 @@ class AbsenceReportView(APIView):
         responses={200: OpenApiResponse(description="CSV file download.")},
     )
     def get(self, request):
-        school = request.user.school
-        params = request.query_params
+        params = request.query_params.dict()
+        filename = f"attendance_report_{timezone.localdate()}.csv"
+        if params.get("async") == "true":
+            return start_export_job(
+                "attendance_records", request, request.user.school, params, "csv", filename
+            )
 
-        qs = AttendanceRecord.objects.filter(school=school)
+        [sheet] = attendance_export_sheets(request.user.school, params)
+        return csv_response(filename, sheet, bom=False)
 
-        if params.get("class_id"):
-            qs = qs.filter(class_obj_id=params["class_id"])
-        if params.get("section_id"):
-            qs = qs.filter(class_obj__section_id=params["section_id"])
-        if params.get("date"):
-            qs = qs.filter(date=params["date"])
-        if params.get("date_from"):
-            qs = qs.filter(date__gte=params["date_from"])
-        if params.get("date_to"):
-            qs = qs.filter(date__lte=params["date_to"])
-        if params.get("status"):
-            qs = qs.filter(status=params["status"].upper())
-        if params.get("is_justified") in ("true", "false"):
-            qs = qs.filter(is_justified=params["is_justified"] == "true")
 
-        qs = qs.select_related("student__user", "class_obj", "marked_by").order_by(
-            "-date", "student__user__last_name"
-        )
+def attendance_export_sheets(school, params) -> list:
+    """
+    Export builder (core.exports) for the attendance records of a school,
+    filtered like AttendanceListView; rows are read chunk by chunk.
+    """
+    qs = AttendanceRecord.objects.filter(school=school)
+
+    if params.get("class_id"):
+        qs = qs.filter(class_obj_id=params["class_id"])
+    if params.get("section_id"):
+        qs = qs.filter(class_obj__section_id=params["section_id"])
+    if params.get("date"):
+        qs = qs.filter(date=params["date"])
+    if params.get("date_from"):
+        qs = qs.filter(date__gte=params["date_from"])
+    if params.get("date_to"):
+        qs = qs.filter(date__lte=params["date_to"])
+    if params.get("status"):
+        qs = qs.filter(status=params["status"].upper())
+    if params.get("is_justified") in ("true", "false"):
+        qs = qs.filter(is_justified=params["is_justified"] == "true")
+
+    qs = qs.select_related("student__user", "class_obj", "marked_by").order_by(
+        "-date", "student__user__last_name"
+    )
 
-        # Build CSV
-        buf = io.StringIO()
-        writer = csv.writer(buf)
-        writer.writerow(
-            [
-                "Élève",
-                "Classe",
-                "Date",
-                "Période",
-                "Statut",
-                "Justifié",
-                "Note",
-                "Marqué par",
+    def rows():
+        for r in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield [
+                r.student.user.full_name if r.student and r.student.user else "",
+                str(r.class_obj) if r.class_obj else "",
+                str(r.date),
+                r.period or "",
+                r.get_status_display(),
+                "Oui" if r.is_justified else "Non",
+                r.note or "",
+                r.marked_by.full_name if r.marked_by else "",
             ]
-        )
-        for r in qs:
-            writer.writerow(
-                [
-                    r.student.user.full_name if r.student and r.student.user else "",
-                    str(r.class_obj) if r.class_obj else "",
-                    str(r.date),
-                    r.period or "",
-                    r.get_status_display(),
-                    "Oui" if r.is_justified else "Non",
-                    r.note or "",
-                    r.marked_by.full_name if r.marked_by else "",
-                ]
-            )
 
-        response = HttpResponse(buf.getvalue(), content_type="text/csv; charset=utf-8")
-        response["Content-Disposition"] = (
-            f'attachment; filename="attendance_report_{timezone.localdate()}.csv"'
+    return [
+        Sheet(
+            title="Attendance Report",
+            columns=[
+                ("Élève", 30),
+                ("Classe", 20),
+                ("Date", 12),
+                ("Période", 12),
+                ("Statut", 12),
+                ("Justifié", 10),
+                ("Note", 40),
+                ("Marqué par", 25),
+            ],
+            rows=rows(),
+            fills={
+                4: {
+                    AttendanceRecord.Status.ABSENT.label: "FF6B6B",
+                    AttendanceRecord.Status.LATE.label: "FFD93D",
+                    AttendanceRecord.Status.PRESENT.label: "6BCB77",
+                },
+            },
         )
-        return response
+    ]
 
 
 # ===========================================================================
@@ -673,20 +750,12 @@ class AbsenceReportView(APIView):
 # ===========================================================================
 
 
-def _notify_parents_absence(record):
-    """Notify parents when their child is marked absent."""
+def _notify_parents_absences(student_ids, date_str, period):
+    """Notify the parents of every student marked absent in one submission."""
     try:
-        from apps.notifications.tasks import send_notification
+        from .tasks import notify_parents_of_absences
 
-        for parent_profile in record.student.parents.all():
-            send_notification.delay(
-                user_id=str(parent_profile.user_id),
-                title="Absence Alert",
-                body=(
-                    f"{record.student.user.full_name} was marked absent "
-                    f"on {record.date}."
-                ),
-            )
+        notify_parents_of_absences.delay(student_ids, date_str, period)
     except Exception:
         pass  # notifications are best-effort
 
@@ -747,38 +816,34 @@ class MonthlyAttendanceReportView(APIView):
             current_class=klass, is_deleted=False
         ).select_related("user").order_by("user__last_name", "user__first_name")
 
-        records = AttendanceRecord.objects.filter(
+        # Counts from the monthly counters, the day grid from the records
+        counters = AttendanceMonthlyStat.objects.filter(
             school=school,
             class_obj=klass,
-            date__gte=month_start,
-            date__lte=month_end,
-        )
-
-        # Build per-student summary
+            month=month_start,
+        ).values("student_id", "absent", "late", "present", "justified")
         student_data = defaultdict(lambda: {
             "absent": 0, "late": 0, "present": 0, "justified": 0, "days": {}
         })
+        for row in counters:
+            student_data[str(row.pop("student_id"))].update(row)
 
-        for r in records:
-            sid = str(r.student_id)
-            day = r.date.day
-            student_data[sid]["days"][day] = r.status
-            if r.status == AttendanceRecord.Status.ABSENT:
-                student_data[sid]["absent"] += 1
-                if r.is_justified:
-                    student_data[sid]["justified"] += 1
-            elif r.status == AttendanceRecord.Status.LATE:
-                student_data[sid]["late"] += 1
-            elif r.status == AttendanceRecord.Status.PRESENT:
-                student_data[sid]["present"] += 1
+        days = AttendanceRecord.objects.filter(
+            school=school,
+            class_obj=klass,
+            date__gte=month_start,
+            date__lte=month_end,
+        ).values_list("student_id", "date", "status")
+        for student_id, day, record_status in days:
+            student_data[str(student_id)]["days"][day.day] = record_status
 
         result = []
         for student in students:
             sid = str(student.pk)
-            data = student_data.get(sid, {"absent": 0, "late": 0, "present": 0, "justified": 0, "days": {}})
+            data = student_data[sid]
             result.append({
                 "student_id": sid,
-                "name": student.user.get_full_name(),
+                "name": student.user.full_name,
                 "absent": data["absent"],
                 "late": data["late"],
                 "present": data["present"],
@@ -856,7 +921,9 @@ class AnnualAttendanceReportView(APIView):
     """
     GET /api/v1/attendance/reports/annual/
     Query params: class_id (optional), year
-    Returns annual attendance recap per month.
+    Returns annual attendance recap per month. ``justified`` counts every
+    justified record (absences and lates), also given apart as
+    ``justified_absent`` / ``justified_late``.
     """
 
     permission_classes = [permissions.IsAuthenticated, IsSchoolAdmin]
@@ -867,39 +934,38 @@ class AnnualAttendanceReportView(APIView):
         year = int(request.query_params.get("year", timezone.localdate().year))
         class_id = request.query_params.get("class_id")
 
-        base = AttendanceRecord.objects.filter(school=school, date__year=year)
+        stats = AttendanceMonthlyStat.objects.filter(school=school, month__year=year)
         if class_id:
-            base = base.filter(class_obj_id=class_id)
+            stats = stats.filter(class_obj_id=class_id)
 
         monthly = (
-            base.extra(select={"month": "EXTRACT(MONTH FROM date)"})
-            .values("month")
+            stats.values("month")
             .annotate(
-                total=Count("id"),
-                absent=Count("id", filter=Q(status=AttendanceRecord.Status.ABSENT)),
-                late=Count("id", filter=Q(status=AttendanceRecord.Status.LATE)),
-                present=Count("id", filter=Q(status=AttendanceRecord.Status.PRESENT)),
-                justified=Count("id", filter=Q(is_justified=True)),
+                n_absent=Sum("absent"),
+                n_late=Sum("late"),
+                n_present=Sum("present"),
+                n_justified=Sum("justified"),
+                n_justified_late=Sum("justified_late"),
             )
             .order_by("month")
         )
 
-        return Response({
-            "year": year,
-            "class_id": class_id,
-            "months": [
-                {
-                    "month": int(m["month"]),
-                    "total": m["total"],
-                    "absent": m["absent"],
-                    "late": m["late"],
-                    "present": m["present"],
-                    "justified": m["justified"],
-                    "absence_rate": round(m["absent"] / m["total"] * 100, 1) if m["total"] else 0,
-                }
-                for m in monthly
-            ],
-        })
+        months = []
+        for m in monthly:
+            total = m["n_absent"] + m["n_late"] + m["n_present"]
+            months.append({
+                "month": m["month"].month,
+                "total": total,
+                "absent": m["n_absent"],
+                "late": m["n_late"],
+                "present": m["n_present"],
+                "justified": m["n_justified"] + m["n_justified_late"],
+                "justified_absent": m["n_justified"],
+                "justified_late": m["n_justified_late"],
+                "absence_rate": round(m["n_absent"] / total * 100, 1) if total else 0,
+            })
+
+        return Response({"year": year, "class_id": class_id, "months": months})
 
 
 class AttendanceRankingView(APIView):
@@ -918,28 +984,53 @@ class AttendanceRankingView(APIView):
         date_from = request.query_params.get("date_from")
         date_to = request.query_params.get("date_to")
 
-        base = AttendanceRecord.objects.filter(school=school)
-        if class_id:
-            base = base.filter(class_obj_id=class_id)
-        if date_from:
-            base = base.filter(date__gte=date_from)
-        if date_to:
-            base = base.filter(date__lte=date_to)
-
-        ranking = (
-            base.values(
-                "student__id",
-                "student__user__first_name",
-                "student__user__last_name",
+        student_fields = (
+            "student__id",
+            "student__user__first_name",
+            "student__user__last_name",
+        )
+        months = _month_span(date_from, date_to)
+        if months is not None:
+            # Whole months: sum the monthly counters
+            base = AttendanceMonthlyStat.objects.filter(school=school)
+            if class_id:
+                base = base.filter(class_obj_id=class_id)
+            first_month, last_month = months
+            if first_month:
+                base = base.filter(month__gte=first_month)
+            if last_month:
+                base = base.filter(month__lte=last_month)
+            ranking = (
+                base.values(*student_fields)
+                .annotate(
+                    n_absent=Sum("absent"),
+                    n_late=Sum("late"),
+                    n_present=Sum("present"),
+                )
+                .annotate(total=F("n_absent") + F("n_late") + F("n_present"))
+                .order_by("n_absent", "n_late")
             )
-            .annotate(
-                total=Count("id"),
-                absent=Count("id", filter=Q(status=AttendanceRecord.Status.ABSENT)),
-                late=Count("id", filter=Q(status=AttendanceRecord.Status.LATE)),
-                present=Count("id", filter=Q(status=AttendanceRecord.Status.PRESENT)),
+        else:
+            base = AttendanceRecord.objects.filter(school=school)
+            if class_id:
+                base = base.filter(class_obj_id=class_id)
+            if date_from:
+                base = base.filter(date__gte=date_from)
+            if date_to:
+                base = base.filter(date__lte=date_to)
+
+            ranking = (
+                base.values(*student_fields)
+                .annotate(
+                    total=Count("id"),
+                    n_absent=Count("id", filter=Q(status=AttendanceRecord.Status.ABSENT)),
+                    n_late=Count("id", filter=Q(status=AttendanceRecord.Status.LATE)),
+                    n_present=Count(
+                        "id", filter=Q(status=AttendanceRecord.Status.PRESENT)
+                    ),
+                )
+                .order_by("n_absent", "n_late")
             )
-            .order_by("absent", "late")
-        )
 
         result = []
         for idx, r in enumerate(ranking, 1):
@@ -949,88 +1040,56 @@ class AttendanceRankingView(APIView):
                 "student_id": str(r["student__id"]),
                 "name": f"{r['student__user__first_name']} {r['student__user__last_name']}",
                 "total": r["total"],
-                "present": r["present"],
-                "absent": r["absent"],
-                "late": r["late"],
-                "attendance_rate": round(r["present"] / total * 100, 1),
+                "present": r["n_present"],
+                "absent": r["n_absent"],
+                "late": r["n_late"],
+                "attendance_rate": round(r["n_present"] / total * 100, 1),
             })
 
         return Response(result)
 
 
+def _month_span(date_from, date_to):
+    """
+    (first_month, last_month) when the optional ``date_from`` / ``date_to``
+    bounds cover whole months — the monthly counters can then answer —
+    else None (arbitrary range: count the records).
+    """
+    import calendar
+
+    from django.utils.dateparse import parse_date
+
+    try:
+        start = parse_date(date_from) if date_from else None
+        end = parse_date(date_to) if date_to else None
+    except ValueError:
+        return None
+    if (date_from and start is None) or (date_to and end is None):
+        return None
+    if start and start.day != 1:
+        return None
+    if end and end.day != calendar.monthrange(end.year, end.month)[1]:
+        return None
+    return start, month_start(end) if end else None
+
+
 class AttendanceExcelExportView(APIView):
     """
     GET /api/v1/attendance/reports/excel/
-    Query params: class_id, date_from, date_to
-    Exports attendance data as Excel file.
+    Query params: class_id, date_from, date_to (+ the AbsenceReportView filters)
+    Exports attendance data as Excel file, written in constant memory with
+    no row limit; ``?async=true`` builds it in the background instead.
     """
 
     permission_classes = [permissions.IsAuthenticated, IsSchoolAdmin]
 
     @extend_schema(tags=["attendance"], summary="Export attendance to Excel")
     def get(self, request):
-        import openpyxl
-        from openpyxl.styles import Alignment, Font, PatternFill
-
-        school = request.user.school
-        class_id = request.query_params.get("class_id")
-        date_from = request.query_params.get("date_from")
-        date_to = request.query_params.get("date_to")
-
-        base = AttendanceRecord.objects.filter(school=school)
-        if class_id:
-            base = base.filter(class_obj_id=class_id)
-        if date_from:
-            base = base.filter(date__gte=date_from)
-        if date_to:
-            base = base.filter(date__lte=date_to)
-
-        base = base.select_related(
-            "student__user", "class_obj", "marked_by"
-        ).order_by("date", "student__user__last_name")
-
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Attendance Report"
-
-        # Header style
-        header_fill = PatternFill(start_color="1F4E79", end_color="1F4E79", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-
-        headers = ["Élève", "Classe", "Date", "Période", "Statut", "Justifié", "Note"]
-        for col, h in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=h)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center")
-
-        status_fills = {
-            "ABSENT": PatternFill(start_color="FF6B6B", end_color="FF6B6B", fill_type="solid"),
-            "LATE": PatternFill(start_color="FFD93D", end_color="FFD93D", fill_type="solid"),
-            "PRESENT": PatternFill(start_color="6BCB77", end_color="6BCB77", fill_type="solid"),
-        }
+        params = request.query_params.dict()
+        filename = f"attendance_report_{timezone.localdate()}.xlsx"
+        if params.get("async") == "true":
+            return start_export_job(
+                "attendance_records", request, request.user.school, params, "xlsx", filename
+            )
 
-        for row_idx, r in enumerate(base[:5000], 2):
-            ws.cell(row=row_idx, column=1, value=r.student.user.get_full_name())
-            ws.cell(row=row_idx, column=2, value=str(r.class_obj) if r.class_obj else "")
-            ws.cell(row=row_idx, column=3, value=str(r.date))
-            ws.cell(row=row_idx, column=4, value=r.period or "")
-            status_cell = ws.cell(row=row_idx, column=5, value=r.get_status_display())
-            if r.status in status_fills:
-                status_cell.fill = status_fills[r.status]
-            ws.cell(row=row_idx, column=6, value="Oui" if r.is_justified else "Non")
-            ws.cell(row=row_idx, column=7, value=r.note or "")
-
-        # Auto-width
-        for col in ws.columns:
-            max_len = max(len(str(c.value or "")) for c in col)
-            ws.column_dimensions[col[0].column_letter].width = max(max_len + 2, 10)
-
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-        response["Content-Disposition"] = (
-            f'attachment; filename="attendance_report_{timezone.localdate()}.xlsx"'
-        )
-        wb.save(response)
-        return response
+        return xlsx_response(filename, attendance_export_sheets(request.user.school, params))
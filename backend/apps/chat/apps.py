@@ -5,3 +5,6 @@ class ChatConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.chat"
     verbose_name = "Real-time Chat & Messaging"
+
+    def ready(self):
+        import apps.chat.signals  # noqa: F401
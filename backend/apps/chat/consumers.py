@@ -2,59 +2,81 @@
 WebSocket consumers for real-time chat and notifications.
 Authenticates via JWT from query param.
 Read receipts, typing indicators, message events.
+
+The conversation / room state a consumer needs for every message
+(participants, write permission, members to notify) is loaded once at
+connect and kept on the consumer; a message then only costs its INSERT
+and the inbox counter updates. Room consumers reload that state on the
+``room_state_changed`` group event sent by signals.py when the room or
+its memberships change.
+
+Every open connection is registered in the presence registry
+(core.presence); FCM pushes only go to the users who are offline and
+are queued in the push outbox, to be sent by the push worker.
 """
 
+import asyncio
 import json
 import logging
 
+from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.db import models
 from django.utils import timezone
 
+from core import presence
+
 logger = logging.getLogger(__name__)
 
+# Rooms where only ADMIN members may write
+BROADCAST_ROOM_TYPES = ("CLASS_BROADCAST", "ADMIN_BROADCAST", "ADMIN_ALL_BROADCAST")
+
 
 # ---------------------------------------------------------------------------
-# Helpers — FCM push for offline recipients
+# Helpers — FCM push for offline recipients (via the push outbox)
 # ---------------------------------------------------------------------------
 
 
 @database_sync_to_async
-def _push_fcm_to_user(user_id, title, body, data=None):
-    """Send FCM push to all devices of a user (fire-and-forget)."""
+def _queue_push(user_ids, title, body, data=None, group_key=""):
+    """
+    Queue a push for the offline users among ``user_ids``. FCM is called
+    by the push worker (drain_push_outbox), never from the event loop.
+    """
     try:
-        from apps.notifications.models import DeviceToken
-        from core.firebase import send_push_notification
+        from apps.notifications.tasks import queue_push
 
-        tokens = list(
-            DeviceToken.objects.filter(user_id=user_id).values_list("token", flat=True)
-        )
-        for token in tokens:
-            try:
-                send_push_notification(token, title, body, data or {})
-            except Exception:
-                pass
+        queue_push(user_ids, title, body, data, group_key=group_key)
     except Exception:
-        logger.exception("FCM push failed for user %s", user_id)
+        logger.exception("Queueing push failed for %d users", len(user_ids))
 
 
-@database_sync_to_async
-def _push_fcm_to_users(user_ids, title, body, data=None):
-    """Batch FCM push to multiple users."""
-    try:
-        from apps.notifications.models import DeviceToken
-        from core.firebase import send_push_to_multiple
+# ---------------------------------------------------------------------------
+# PresenceMixin — online status of the connected user
+# ---------------------------------------------------------------------------
 
-        tokens = list(
-            DeviceToken.objects.filter(user_id__in=user_ids).values_list(
-                "token", flat=True
-            )
-        )
-        if tokens:
-            send_push_to_multiple(tokens, title, body, data or {})
-    except Exception:
-        logger.exception("Batch FCM push failed")
+
+class PresenceMixin:
+    """Keeps the user online in core.presence while the socket is open."""
+
+    async def presence_connect(self):
+        """Called before accept(): the user is online once the socket opens."""
+        await sync_to_async(presence.connect, thread_sensitive=False)(self.user.pk)
+        self._presence_task = asyncio.ensure_future(self._presence_heartbeat())
+
+    async def presence_disconnect(self):
+        task = getattr(self, "_presence_task", None)
+        if task is None:
+            return  # rejected before presence_connect
+        task.cancel()
+        self._presence_task = None
+        await sync_to_async(presence.disconnect, thread_sensitive=False)(self.user.pk)
+
+    async def _presence_heartbeat(self):
+        while True:
+            await asyncio.sleep(presence.HEARTBEAT_INTERVAL)
+            await sync_to_async(presence.heartbeat, thread_sensitive=False)(self.user.pk)
 
 
 # ---------------------------------------------------------------------------
@@ -62,7 +84,7 @@ def _push_fcm_to_users(user_ids, title, body, data=None):
 # ---------------------------------------------------------------------------
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(PresenceMixin, AsyncWebsocketConsumer):
     """WebSocket consumer for a specific conversation."""
 
     async def connect(self):
@@ -75,19 +97,21 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close(code=4001)
             return
 
-        # Verify participation
-        is_participant = await self._verify_participant()
-        if not is_participant:
+        # Verify participation (and keep the conversation for the session)
+        self.conversation = await self._load_conversation()
+        if self.conversation is None:
             await self.close(code=4003)
             return
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.presence_connect()
         await self.accept()
 
         # Mark messages as delivered when user connects
         await self._mark_delivered()
 
     async def disconnect(self, close_code):
+        await self.presence_disconnect()
         if hasattr(self, "room_group_name"):
             await self.channel_layer.group_discard(
                 self.room_group_name, self.channel_name
@@ -156,12 +180,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     "preview": content[:60],
                 },
             )
-            # FCM push for offline recipient
-            await _push_fcm_to_user(
-                recipient_id,
+            # FCM push if the recipient is offline
+            await _queue_push(
+                [recipient_id],
                 f"Message de {message_data['sender_name']}",
                 content[:120],
                 {"conversation_id": str(self.conversation_id)},
+                group_key=f"conversation:{self.conversation_id}",
             )
 
     async def chat_message(self, event):
@@ -190,7 +215,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
     # -- DB helpers --
 
     @database_sync_to_async
-    def _verify_participant(self):
+    def _load_conversation(self):
+        """The conversation if the user takes part in it, else None."""
         from .models import Conversation
 
         return (
@@ -201,17 +227,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 models.Q(participant_admin=self.user)
                 | models.Q(participant_other=self.user)
             )
-            .exists()
+            .first()
         )
 
     @database_sync_to_async
     def _save_message(self, content):
-        from .models import Conversation, Message
-
-        conv = Conversation.objects.select_related(
-            "participant_admin", "participant_other"
-        ).get(pk=self.conversation_id)
+        from .models import Message
 
+        conv = self.conversation
         message = Message.objects.create(
             conversation=conv,
             sender=self.user,
@@ -219,18 +242,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
             status=Message.Status.SENT,
         )
 
-        other = (
-            conv.participant_other
-            if conv.participant_admin == self.user
-            else conv.participant_admin
-        )
+        is_admin = self.user.pk == conv.participant_admin_id
+        recipient_id = conv.participant_other_id if is_admin else conv.participant_admin_id
 
         return {
             "id": str(message.id),
             "conversation_id": str(conv.id),
             "sender_id": str(self.user.id),
             "sender_name": self.user.full_name,
-            "sender_is_admin": self.user == conv.participant_admin,
+            "sender_is_admin": is_admin,
             "content": content,
             "attachment_url": None,
             "attachment_type": None,
@@ -241,18 +261,17 @@ class ChatConsumer(AsyncWebsocketConsumer):
             "is_pinned": False,
             "is_deleted": False,
             "created_at": message.created_at.isoformat(),
-            "recipient_id": str(other.id),
+            "recipient_id": str(recipient_id),
         }
 
     @database_sync_to_async
     def _mark_delivered(self):
         """Mark all messages from the other user as DELIVERED on connect."""
-        from .models import Conversation, Message
+        from .models import Message
 
         try:
-            conv = Conversation.objects.get(pk=self.conversation_id)
             Message.objects.filter(
-                conversation=conv,
+                conversation_id=self.conversation_id,
                 is_deleted=False,
                 status=Message.Status.SENT,
             ).exclude(
@@ -267,13 +286,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def _mark_read(self):
         """Mark all messages from the other user as READ."""
-        from .models import Conversation, Message
+        from .models import Message
 
         try:
-            conv = Conversation.objects.get(pk=self.conversation_id)
+            conv = self.conversation
             now = timezone.now()
             Message.objects.filter(
-                conversation=conv,
+                conversation_id=conv.pk,
                 is_deleted=False,
             ).exclude(
                 sender=self.user
@@ -284,12 +303,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 status=Message.Status.READ,
                 read_at=now,
             )
-            # Reset unread counter
-            if self.user == conv.participant_admin:
-                Conversation.objects.filter(pk=conv.pk).update(
-                    unread_count_admin=0,
-                    is_read_by_admin=True,
-                )
+            # Reset the reader's unread counter
+            conv.mark_read_by(self.user)
         except Exception:
             pass
 
@@ -299,7 +314,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
 # ---------------------------------------------------------------------------
 
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+class NotificationConsumer(PresenceMixin, AsyncWebsocketConsumer):
     """Global WebSocket for real-time notifications (messages, payments, absences)."""
 
     async def connect(self):
@@ -310,9 +325,11 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
         self.group_name = f"notifications_{self.user.id}"
         await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.presence_connect()
         await self.accept()
 
     async def disconnect(self, close_code):
+        await self.presence_disconnect()
         if hasattr(self, "group_name"):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
@@ -349,6 +366,21 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             )
         )
 
+    async def notification(self, event):
+        """Relay an in-app notification created by the dispatcher."""
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "notification",
+                    "id": event["id"],
+                    "title": event["title"],
+                    "body": event["body"],
+                    "notification_type": event["notification_type"],
+                    "priority": event["priority"],
+                }
+            )
+        )
+
     async def room_message_notification(self, event):
         """Relay a group-room message notification."""
         await self.send(
@@ -369,7 +401,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 # ---------------------------------------------------------------------------
 
 
-class GroupChatConsumer(AsyncWebsocketConsumer):
+class GroupChatConsumer(PresenceMixin, AsyncWebsocketConsumer):
     """WebSocket consumer for a ChatRoom (group / broadcast)."""
 
     async def connect(self):
@@ -381,15 +413,16 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
             await self.close(code=4001)
             return
 
-        is_member = await self._verify_membership()
-        if not is_member:
+        if not await self._load_state():
             await self.close(code=4003)
             return
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.presence_connect()
         await self.accept()
 
     async def disconnect(self, close_code):
+        await self.presence_disconnect()
         if hasattr(self, "room_group_name"):
             await self.channel_layer.group_discard(
                 self.room_group_name, self.channel_name
@@ -424,8 +457,7 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
             return
 
         # Check write permission (only ADMIN members can write in broadcast)
-        can_write = await self._can_write()
-        if not can_write:
+        if not self.can_write:
             await self.send(
                 text_data=json.dumps(
                     {"error": "You do not have write permission in this room."}
@@ -442,7 +474,7 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
         )
 
         # Notify all other members via their personal notification channel + FCM
-        other_member_ids = await self._get_other_member_ids()
+        other_member_ids = self.other_member_ids
         for uid in other_member_ids:
             await self.channel_layer.group_send(
                 f"notifications_{uid}",
@@ -457,17 +489,23 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
 
         # Batch FCM push for offline members
         if other_member_ids:
-            await _push_fcm_to_users(
+            await _queue_push(
                 other_member_ids,
                 f"{message_data.get('room_name', 'Salon')}: {message_data['sender_name']}",
                 content[:120],
                 {"room_id": str(self.room_id)},
+                group_key=f"room:{self.room_id}",
             )
 
     async def room_chat_message(self, event):
         """Relay room message to WebSocket client."""
         await self.send(text_data=json.dumps(event["message"]))
 
+    async def room_state_changed(self, event):
+        """Room or memberships changed: reload the cached state."""
+        if not await self._load_state():
+            await self.close(code=4003)
+
     async def typing_indicator(self, event):
         """Relay typing indicator."""
         if event.get("user_id") != str(self.user.id):
@@ -481,37 +519,39 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
     # -- DB helpers --
 
     @database_sync_to_async
-    def _verify_membership(self):
+    def _load_state(self):
+        """
+        Load the room, the write permission of the user and the members to
+        notify. Returns False when the user is not a member (any more) or the
+        room was deactivated.
+        """
         from .models import ChatRoomMembership
 
-        return ChatRoomMembership.objects.filter(
-            room_id=self.room_id, user=self.user
-        ).exists()
-
-    @database_sync_to_async
-    def _can_write(self):
-        from .models import ChatRoom, ChatRoomMembership
-
-        try:
-            room = ChatRoom.objects.get(pk=self.room_id)
-        except ChatRoom.DoesNotExist:
+        membership = (
+            ChatRoomMembership.objects.select_related("room")
+            .filter(room_id=self.room_id, room__is_active=True, user=self.user)
+            .first()
+        )
+        if membership is None:
             return False
 
-        if room.room_type in (
-            ChatRoom.RoomType.CLASS_BROADCAST,
-            ChatRoom.RoomType.ADMIN_BROADCAST,
-            ChatRoom.RoomType.ADMIN_ALL_BROADCAST,
-        ):
-            return ChatRoomMembership.objects.filter(
-                room=room, user=self.user, role=ChatRoomMembership.Role.ADMIN
-            ).exists()
+        self.room = membership.room
+        self.can_write = (
+            self.room.room_type not in BROADCAST_ROOM_TYPES
+            or membership.role == ChatRoomMembership.Role.ADMIN
+        )
+        self.other_member_ids = list(
+            ChatRoomMembership.objects.filter(room_id=self.room_id, is_muted=False)
+            .exclude(user=self.user)
+            .values_list("user_id", flat=True)
+        )
         return True
 
     @database_sync_to_async
     def _save_room_message(self, content):
-        from .models import ChatRoom, ChatRoomMessage
+        from .models import ChatRoomMessage
 
-        room = ChatRoom.objects.get(pk=self.room_id)
+        room = self.room
         msg = ChatRoomMessage.objects.create(
             room=room, sender=self.user, content=content,
             status=ChatRoomMessage.Status.SENT,
@@ -530,13 +570,3 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
             "is_deleted": False,
             "created_at": msg.created_at.isoformat(),
         }
-
-    @database_sync_to_async
-    def _get_other_member_ids(self):
-        from .models import ChatRoomMembership
-
-        return list(
-            ChatRoomMembership.objects.filter(room_id=self.room_id, is_muted=False)
-            .exclude(user=self.user)
-            .values_list("user_id", flat=True)
-        )
@@ -0,0 +1,192 @@
+"""
+Management command: benchmark_chat_consumers
+
+Load test of the room WebSocket consumer (GroupChatConsumer) inside one
+process — i.e. one Daphne worker: a single event loop with its DB work on
+the thread-sensitive executor. N clients connect to a seeded group room,
+S of them send M messages each concurrently, and every client waits until
+it has received every message.
+
+The channel layer is the in-memory layer by default (local stand-in for
+Redis, no network hop); pass --redis to go through a real Redis server.
+
+Reported:
+  - messages/second persisted and fanned out by the worker
+  - deliveries/second (messages × clients)
+  - SQL queries per message
+
+The seeded school, users and room are deleted at the end.
+
+Usage:
+  python manage.py benchmark_chat_consumers
+  python manage.py benchmark_chat_consumers --clients 50 --senders 10 --messages 100
+  python manage.py benchmark_chat_consumers --redis redis://localhost:6379/3
+"""
+
+import asyncio
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+
+
+class _QueryCounter:
+    """Execute wrapper counting the queries of the worker thread."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = "Load-test the chat room WebSocket consumer in one worker process."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clients",
+            type=int,
+            default=20,
+            help="Connected room members (default: 20).",
+        )
+        parser.add_argument(
+            "--senders",
+            type=int,
+            default=5,
+            help="Members sending messages concurrently (default: 5).",
+        )
+        parser.add_argument(
+            "--messages",
+            type=int,
+            default=50,
+            help="Messages sent by each sender (default: 50).",
+        )
+        parser.add_argument(
+            "--redis",
+            type=str,
+            default=None,
+            help="Redis URL for a RedisChannelLayer (default: in-memory layer).",
+        )
+
+    def handle(self, *args, **options):
+        from asgiref.sync import async_to_sync
+
+        n_clients = max(1, options["clients"])
+        n_senders = max(1, min(options["senders"], n_clients))
+        n_messages = max(1, options["messages"])
+
+        # Channel capacity above the burst, so that no message is dropped
+        capacity = max(100, 2 * n_senders * n_messages)
+        if options["redis"]:
+            layer = {
+                "BACKEND": "channels_redis.core.RedisChannelLayer",
+                "CONFIG": {"hosts": [options["redis"]], "capacity": capacity},
+            }
+        else:
+            layer = {
+                "BACKEND": "channels.layers.InMemoryChannelLayer",
+                "CONFIG": {"capacity": capacity},
+            }
+
+        school, room, users = self._seed(n_clients)
+        counter = _QueryCounter()
+        try:
+            with override_settings(CHANNEL_LAYERS={"default": layer}):
+                with connection.execute_wrapper(counter):
+                    result = async_to_sync(self._run)(
+                        room, users, n_senders, n_messages, counter
+                    )
+        finally:
+            school.delete()
+
+        connect_time, elapsed, queries = result
+        total = n_senders * n_messages
+        self.stdout.write(
+            f"\n📊 {n_clients} clients, {n_senders} senders × {n_messages} messages "
+            f"({'redis' if options['redis'] else 'in-memory'} channel layer)\n"
+        )
+        self.stdout.write(f"  {'connect (all clients)':<28}{connect_time * 1000:>10.1f} ms")
+        self.stdout.write(f"  {'send → all delivered':<28}{elapsed * 1000:>10.1f} ms")
+        self.stdout.write(f"  {'messages / second':<28}{total / elapsed:>10.1f}")
+        self.stdout.write(f"  {'deliveries / second':<28}{total * n_clients / elapsed:>10.1f}")
+        self.stdout.write(f"  {'queries / message':<28}{queries / total:>10.2f}")
+
+    # ── helpers ─────────────────────────────────────────────────────────
+
+    async def _run(self, room, users, n_senders, n_messages, counter):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+
+        from apps.chat.routing import websocket_urlpatterns
+
+        application = URLRouter(websocket_urlpatterns)
+        path = f"/ws/room/{room.id}/"
+
+        start = time.perf_counter()
+        clients = []
+        for user in users:
+            communicator = WebsocketCommunicator(application, path)
+            communicator.scope["user"] = user
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise RuntimeError(f"{user} could not connect to the room")
+            clients.append(communicator)
+        connect_time = time.perf_counter() - start
+
+        expected = n_senders * n_messages
+
+        async def send(communicator, n):
+            for i in range(n_messages):
+                await communicator.send_json_to({"content": f"Message {n}-{i}"})
+
+        async def drain(communicator):
+            for _ in range(expected):
+                await communicator.receive_json_from(timeout=30)
+
+        queries_before = counter.count
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(send(c, n) for n, c in enumerate(clients[:n_senders])),
+            *(drain(c) for c in clients),
+        )
+        elapsed = time.perf_counter() - start
+        queries = counter.count - queries_before
+
+        for communicator in clients:
+            await communicator.disconnect()
+        return connect_time, elapsed, queries
+
+    def _seed(self, n_clients):
+        from apps.accounts.models import User
+        from apps.chat.models import ChatRoom, ChatRoomMembership
+        from apps.schools.models import School
+
+        tag = random.randint(10**5, 10**6 - 1)
+        school = School.objects.create(name="Benchmark Chat", subdomain=f"bench-chat-{tag}")
+        users = User.objects.bulk_create(
+            [
+                User(
+                    phone_number=f"c{tag}{i:07d}",
+                    password="!",
+                    first_name=f"Membre{i}",
+                    last_name="Bench",
+                    role=User.Role.TEACHER,
+                    school=school,
+                )
+                for i in range(n_clients)
+            ]
+        )
+        room = ChatRoom.objects.create(
+            school=school,
+            room_type=ChatRoom.RoomType.ADMIN_TEACHER_GROUP,
+            name="Salle des profs",
+            created_by=users[0],
+        )
+        ChatRoomMembership.objects.bulk_create(
+            [ChatRoomMembership(room=room, user=user) for user in users]
+        )
+        return school, room, users
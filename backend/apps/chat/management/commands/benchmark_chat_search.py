@@ -0,0 +1,292 @@
+"""
+Management command: benchmark_chat_search
+
+Latency of the chat message search on a synthetic corpus: the former
+``content__icontains`` scan of both message tables against the
+full-text search of apps.chat.search (GIN index on search_vector).
+
+A benchmark school is seeded with one searching user, conversations and
+rooms (half of them the user's own), then --messages messages split
+70 / 30 between conversations and rooms are generated by PostgreSQL
+itself (INSERT … SELECT generate_series) from a French / Arabic
+vocabulary; the rare word "olympiade" appears in one message out of
+10 000. Each query is run --repeat times after a warm-up, the median is
+reported.
+
+The seeded school and its messages are deleted at the end.
+
+Usage:
+  python manage.py benchmark_chat_search
+  python manage.py benchmark_chat_search --messages 100000 --repeat 3
+"""
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+VOCABULARY = [
+    "bonjour", "merci", "réunion", "parents", "absence", "justifiée", "retard",
+    "devoir", "maison", "examen", "composition", "bulletin", "trimestre",
+    "note", "moyenne", "classe", "élève", "enseignant", "directeur", "cantine",
+    "transport", "bus", "sortie", "scolaire", "musée", "demain", "lundi",
+    "jeudi", "semaine", "rendez-vous", "inscription", "paiement", "frais",
+    "certificat", "médical", "malade", "vacances", "horaire", "emploi",
+    "cahier", "livre", "mathématiques", "français", "arabe", "sciences",
+    "سلام", "شكرا", "اجتماع", "أولياء", "التلاميذ", "غياب", "واجب", "امتحان",
+    "نتائج", "الأستاذ", "المدير", "غدا", "الخميس", "الأسبوع", "الدفع",
+]
+RARE_WORD = "olympiade"
+
+QUERIES = [
+    ("mot rare", RARE_WORD),
+    ("mot fréquent", "réunion"),
+    ("deux mots", "absence justifiée"),
+    ("arabe", "اجتماع"),
+    ("aucun résultat", "xylophone"),
+]
+
+
+class Command(BaseCommand):
+    help = "Compare icontains and full-text chat search on a synthetic corpus."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--messages",
+            type=int,
+            default=1_000_000,
+            help="Messages generated (default: 1 000 000).",
+        )
+        parser.add_argument(
+            "--conversations",
+            type=int,
+            default=200,
+            help="Conversations seeded (default: 200).",
+        )
+        parser.add_argument(
+            "--rooms",
+            type=int,
+            default=20,
+            help="Rooms seeded (default: 20).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Runs per query (default: 5).",
+        )
+
+    def handle(self, *args, **options):
+        n_messages = max(1, options["messages"])
+        repeat = max(1, options["repeat"])
+
+        school, searcher, conversations, rooms = self._seed(
+            max(2, options["conversations"]), max(2, options["rooms"])
+        )
+        try:
+            start = time.perf_counter()
+            self._generate(conversations, rooms, searcher, n_messages)
+            self.stdout.write(
+                f"  {n_messages} messages generated in {time.perf_counter() - start:.1f} s"
+            )
+
+            self.stdout.write(
+                f"\n📊 Chat search — {n_messages} messages, median of {repeat} runs\n"
+            )
+            self.stdout.write(
+                f"  {'requête':<16}{'icontains':>12}{'full-text':>12}{'hits':>8}"
+            )
+            for label, text in QUERIES:
+                legacy = self._time(lambda: self._legacy_search(searcher, text), repeat)
+                indexed = self._time(lambda: self._search(searcher, text), repeat)
+                hits = len(self._search(searcher, text))
+                self.stdout.write(
+                    f"  {label:<16}{legacy * 1000:>9.1f} ms{indexed * 1000:>9.1f} ms{hits:>8}"
+                )
+        finally:
+            self._cleanup(school, conversations, rooms)
+
+    # ── searches ────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _time(run, repeat):
+        run()  # warm-up
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
+
+    @staticmethod
+    def _legacy_search(user, text):
+        """The former MessageSearchView queries (ILIKE on both tables)."""
+        from django.db.models import Q
+
+        from apps.chat.models import ChatRoomMessage, Message
+
+        conv_messages = list(
+            Message.objects.filter(
+                conversation__school=user.school, is_deleted=False, content__icontains=text
+            )
+            .filter(
+                Q(conversation__participant_admin=user)
+                | Q(conversation__participant_other=user)
+            )
+            .select_related("sender", "conversation__participant_admin")
+            .order_by("-created_at")[:50]
+        )
+        room_messages = list(
+            ChatRoomMessage.objects.filter(
+                room__school=user.school,
+                room__memberships__user=user,
+                is_deleted=False,
+                content__icontains=text,
+            )
+            .select_related("sender", "room")
+            .order_by("-created_at")[:50]
+        )
+        return conv_messages + room_messages
+
+    @staticmethod
+    def _search(user, text):
+        from apps.chat.search import search_messages
+
+        messages, _ = search_messages(user, text, limit=20)
+        return messages
+
+    # ── corpus ──────────────────────────────────────────────────────────
+
+    def _seed(self, n_conversations, n_rooms):
+        from apps.accounts.models import User
+        from apps.chat.models import ChatRoom, ChatRoomMembership, Conversation
+        from apps.schools.models import School
+
+        tag = random.randint(10**5, 10**6 - 1)
+        school = School.objects.create(name="Benchmark Search", subdomain=f"bench-search-{tag}")
+        searcher, other_admin = User.objects.bulk_create(
+            [
+                User(
+                    phone_number=f"s{tag}{i:07d}",
+                    password="!",
+                    first_name=f"Admin{i}",
+                    last_name="Bench",
+                    role=User.Role.ADMIN,
+                    school=school,
+                )
+                for i in range(2)
+            ]
+        )
+        parents = User.objects.bulk_create(
+            [
+                User(
+                    phone_number=f"p{tag}{i:07d}",
+                    password="!",
+                    first_name=f"Parent{i}",
+                    last_name="Bench",
+                    role=User.Role.PARENT,
+                    school=school,
+                )
+                for i in range(n_conversations)
+            ]
+        )
+        conversations = Conversation.objects.bulk_create(
+            [
+                Conversation(
+                    school=school,
+                    room_type="ADMIN_PARENT",
+                    created_by=searcher,
+                    participant_admin=searcher if i % 2 == 0 else other_admin,
+                    participant_other=parent,
+                    participant_other_role="parent",
+                )
+                for i, parent in enumerate(parents)
+            ]
+        )
+        rooms = ChatRoom.objects.bulk_create(
+            [
+                ChatRoom(
+                    school=school,
+                    room_type=ChatRoom.RoomType.ADMIN_TEACHER_GROUP,
+                    name=f"Salon {i}",
+                    created_by=searcher,
+                )
+                for i in range(n_rooms)
+            ]
+        )
+        ChatRoomMembership.objects.bulk_create(
+            [
+                ChatRoomMembership(room=room, user=searcher if i % 2 == 0 else other_admin)
+                for i, room in enumerate(rooms)
+            ]
+        )
+        return school, searcher, conversations, rooms
+
+    def _generate(self, conversations, rooms, sender, n_messages, batch_size=100_000):
+        """Insert the corpus with INSERT … SELECT, batch by batch."""
+        from apps.chat.models import (
+            ChatRoom,
+            ChatRoomMembership,
+            ChatRoomMessage,
+            Conversation,
+            Message,
+        )
+
+        content_sql = (
+            "array_to_string(ARRAY("
+            "SELECT (%s::text[])[1 + floor(random() * %s)::int] "
+            "FROM generate_series(1, 6 + g %% 10)), ' ')"
+            f" || CASE WHEN g %% 10000 = 0 THEN ' {RARE_WORD}' ELSE '' END"
+        )
+        targets = [
+            (Message._meta.db_table, "conversation_id", [str(c.pk) for c in conversations],
+             ", is_read, delivered_at, read_at", ", false, NULL, NULL", 0.7),
+            (ChatRoomMessage._meta.db_table, "room_id", [str(r.pk) for r in rooms],
+             "", "", 0.3),
+        ]
+        with connection.cursor() as cursor:
+            for table, parent_col, parent_ids, extra_cols, extra_values, share in targets:
+                total = int(n_messages * share)
+                for first in range(0, total, batch_size):
+                    last = min(first + batch_size, total)
+                    cursor.execute(
+                        f"INSERT INTO {table} "
+                        f"(id, {parent_col}, sender_id, content, attachment, attachment_type, "
+                        f"attachment_name, attachment_size, status, is_pinned, is_deleted, "
+                        f"deleted_at, created_at{extra_cols}) "
+                        f"SELECT gen_random_uuid(), (%s::uuid[])[1 + g %% %s], %s::uuid, "
+                        f"{content_sql}, NULL, NULL, NULL, NULL, 'SENT', false, false, NULL, "
+                        f"NOW() - g * INTERVAL '1 second'{extra_values} "
+                        f"FROM generate_series(%s, %s) AS g",
+                        [
+                            parent_ids,
+                            len(parent_ids),
+                            str(sender.pk),
+                            VOCABULARY,
+                            len(VOCABULARY),
+                            first + 1,
+                            last,
+                        ],
+                    )
+                    self.stdout.write(f"    {table}: {last}/{total}")
+
+            # Fresh planner statistics, as autovacuum would have them
+            for model in (Conversation, ChatRoom, ChatRoomMembership, Message, ChatRoomMessage):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+    def _cleanup(self, school, conversations, rooms):
+        from apps.chat.models import ChatRoomMessage, Message
+
+        # Raw deletes: the ORM cascade would load every message
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {Message._meta.db_table} WHERE conversation_id = ANY(%s::uuid[])",
+                [[str(c.pk) for c in conversations]],
+            )
+            cursor.execute(
+                f"DELETE FROM {ChatRoomMessage._meta.db_table} WHERE room_id = ANY(%s::uuid[])",
+                [[str(r.pk) for r in rooms]],
+            )
+        school.delete()
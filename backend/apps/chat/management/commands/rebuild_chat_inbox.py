@@ -0,0 +1,90 @@
+"""
+Management command: rebuild_chat_inbox
+
+Recomputes the last-message snapshot of every Conversation and ChatRoom
+from their messages, and the unread counter of the non-admin participant
+(messages of the admin participant not read yet, nor sent before the
+participant last opened the conversation). The snapshots are
+maintained on every message write; run this once after the fields are
+added, or after raw SQL / queryset .update() edits of messages.
+
+Room unread counters cannot be recomputed (nothing records what a member
+had read before) and are left untouched.
+
+Usage:
+  python manage.py rebuild_chat_inbox
+  python manage.py rebuild_chat_inbox --school <uuid>
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Rebuild the chat inbox snapshots (last message, unread counters)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--school",
+            type=str,
+            default=None,
+            help="UUID of the school to rebuild (default: all schools).",
+        )
+
+    def handle(self, *args, **options):
+        from django.db.models import Count, F, OuterRef, Q, Subquery
+        from django.db.models.functions import Coalesce
+
+        from apps.chat.models import ChatRoom, Conversation, Message
+        from apps.schools.models import School
+
+        school_id = options["school"]
+        if school_id and not School.objects.filter(pk=school_id).exists():
+            raise CommandError(f"School with ID {school_id} does not exist.")
+
+        conversations = Conversation.objects.all()
+        rooms = ChatRoom.objects.all()
+        if school_id:
+            conversations = conversations.filter(school_id=school_id)
+            rooms = rooms.filter(school_id=school_id)
+
+        start = time.perf_counter()
+
+        unread_other = (
+            Message.objects.filter(
+                conversation=OuterRef("pk"),
+                sender_id=OuterRef("participant_admin_id"),
+                is_deleted=False,
+            )
+            .filter(
+                Q(conversation__last_read_at_other__isnull=True)
+                | Q(created_at__gt=F("conversation__last_read_at_other"))
+            )
+            .exclude(status=Message.Status.READ)
+            .order_by()
+            .values("conversation")
+            .annotate(n=Count("id"))
+            .values("n")
+        )
+        conversations.update(unread_count_other=Coalesce(Subquery(unread_other), 0))
+
+        n_conv = 0
+        for conv in conversations.iterator():
+            conv.refresh_last_message()
+            n_conv += 1
+
+        n_rooms = 0
+        for room in rooms.iterator():
+            room.refresh_last_message()
+            ChatRoom.objects.filter(pk=room.pk).update(
+                last_message_at=room.last_message.created_at if room.last_message else None
+            )
+            n_rooms += 1
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ {n_conv} conversations and {n_rooms} rooms rebuilt in {elapsed:.2f}s"
+            )
+        )
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0003_add_room_type_and_chatroom_models"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["conversation", "created_at", "id"],
+                name="conversatio_convers_b60625_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chatroommessage",
+            index=models.Index(
+                fields=["room", "created_at", "id"],
+                name="chat_room_m_room_id_968248_idx",
+            ),
+        ),
+    ]
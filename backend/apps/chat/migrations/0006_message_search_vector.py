@@ -0,0 +1,48 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+def _search_vector():
+    return models.GeneratedField(
+        db_persist=True,
+        expression=django.contrib.postgres.search.CombinedSearchVector(
+            django.contrib.postgres.search.SearchVector("content", config="french"),
+            "||",
+            django.contrib.postgres.search.SearchVector("content", config="arabic"),
+            django.contrib.postgres.search.SearchConfig("french"),
+        ),
+        output_field=django.contrib.postgres.search.SearchVectorField(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0005_chat_inbox_snapshots"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="search_vector",
+            field=_search_vector(),
+        ),
+        migrations.AddField(
+            model_name="chatroommessage",
+            name="search_vector",
+            field=_search_vector(),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="conv_msg_search_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chatroommessage",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="room_msg_search_idx"
+            ),
+        ),
+    ]
@@ -9,10 +9,51 @@ import uuid
 import os
 
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import models, transaction
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
 
+def message_preview(message) -> str:
+    """Inbox preview of a message (conversation or room)."""
+    if message.content:
+        return message.content[:60]
+    if message.attachment:
+        return "Pièce jointe"
+    return ""
+
+
+def message_search_vector():
+    """
+    Full-text vector of a message ``content``, stored as a generated column
+    (MessageSearchView). Messages mix French and Arabic, so the content is
+    indexed with both stemmers; words of the other language only go
+    through lowercasing.
+    """
+    return SearchVector("content", config="french") + SearchVector(
+        "content", config="arabic"
+    )
+
+
+def _last_message_fields(message) -> dict:
+    """Last-message snapshot columns (Conversation / ChatRoom) for ``message``."""
+    if message is None:
+        return {
+            "last_message": None,
+            "last_message_preview": "",
+            "last_message_sender": None,
+            "last_message_has_attachment": False,
+        }
+    return {
+        "last_message": message,
+        "last_message_preview": message_preview(message),
+        "last_message_sender_id": message.sender_id,
+        "last_message_has_attachment": bool(message.attachment),
+    }
+
+
 # ---------------------------------------------------------------------------
 # Conversation  (1-to-1 private chats)
 # ---------------------------------------------------------------------------
@@ -79,6 +120,30 @@ class Conversation(models.Model):
     last_message_at = models.DateTimeField(null=True, blank=True)
     is_read_by_admin = models.BooleanField(default=True)
     unread_count_admin = models.PositiveIntegerField(default=0)
+    unread_count_other = models.PositiveIntegerField(default=0)
+    # When each participant last opened the conversation: messages created
+    # before it are out of their unread counter
+    last_read_at_admin = models.DateTimeField(null=True, blank=True)
+    last_read_at_other = models.DateTimeField(null=True, blank=True)
+
+    # Snapshot of the latest non-deleted message (kept by Message.save /
+    # soft_delete) so the inbox never reads the message table.
+    last_message = models.ForeignKey(
+        "Message",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    last_message_preview = models.CharField(max_length=80, blank=True, default="")
+    last_message_sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    last_message_has_attachment = models.BooleanField(default=False)
 
     class Meta:
         db_table = "conversations"
@@ -91,6 +156,41 @@ class Conversation(models.Model):
             f"{self.participant_admin.full_name} ↔ {self.participant_other.full_name}"
         )
 
+    def unread_count_for(self, user):
+        """Unread counter of one participant."""
+        if user.pk == self.participant_admin_id:
+            return self.unread_count_admin
+        return self.unread_count_other
+
+    def mark_read_by(self, user):
+        """Reset the unread counter of the participant ``user``."""
+        now = timezone.now()
+        if user.pk == self.participant_admin_id:
+            fields = {
+                "unread_count_admin": 0,
+                "is_read_by_admin": True,
+                "last_read_at_admin": now,
+            }
+        elif user.pk == self.participant_other_id:
+            fields = {"unread_count_other": 0, "last_read_at_other": now}
+        else:
+            return
+        Conversation.objects.filter(pk=self.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def refresh_last_message(self):
+        """Recompute the last-message snapshot from the latest visible message."""
+        last = (
+            self.messages.filter(is_deleted=False)
+            .order_by("-created_at", "-id")
+            .first()
+        )
+        fields = _last_message_fields(last)
+        Conversation.objects.filter(pk=self.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(self, name, value)
+
 
 # ---------------------------------------------------------------------------
 # Message
@@ -159,35 +259,66 @@ class Message(models.Model):
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    # Full-text index of ``content`` (kept up to date by PostgreSQL)
+    search_vector = models.GeneratedField(
+        expression=message_search_vector(),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = "conversation_messages"
         ordering = ["created_at"]
+        indexes = [
+            # Keyset pagination of the history (core.pagination.KeysetPagination)
+            models.Index(fields=["conversation", "created_at", "id"]),
+            GinIndex(fields=["search_vector"], name="conv_msg_search_idx"),
+        ]
 
     def __str__(self):
         return f"{self.sender.full_name}: {self.content[:50] if self.content else '[attachment]'}"
 
     def save(self, *args, **kwargs):
         is_new = self._state.adding
-        super().save(*args, **kwargs)
-
-        if is_new:
-            conv = self.conversation
-            conv.last_message_at = timezone.now()
-
-            # If sender is NOT the admin, increment unread for admin
-            if self.sender_id != conv.participant_admin_id:
-                conv.unread_count_admin = models.F("unread_count_admin") + 1
-                conv.is_read_by_admin = False
-
-            conv.save(
-                update_fields=[
-                    "last_message_at",
-                    "unread_count_admin",
-                    "is_read_by_admin",
-                ]
-            )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                self._on_created()
+
+    def _on_created(self):
+        """Move the conversation snapshot to this message and count it unread."""
+        conv = self.conversation
+        fields = {
+            "last_message_at": self.created_at,
+            **_last_message_fields(self),
+        }
+        # The recipient's counter, incremented in SQL (concurrent senders)
+        if self.sender_id != conv.participant_admin_id:
+            fields["unread_count_admin"] = models.F("unread_count_admin") + 1
+            fields["is_read_by_admin"] = False
+        else:
+            fields["unread_count_other"] = models.F("unread_count_other") + 1
+        Conversation.objects.filter(pk=conv.pk).update(**fields)
+
+        conv.last_message_at = self.created_at
+        if self.sender_id != conv.participant_admin_id:
+            conv.is_read_by_admin = False
+
+    def _on_removed(self):
+        """Take a deleted message out of the snapshot and the unread counter."""
+        conv = self.conversation
+        if self.status != self.Status.READ:
+            side = "admin" if self.sender_id != conv.participant_admin_id else "other"
+            counter = f"unread_count_{side}"
+            # Only counted if the recipient has not opened the thread since
+            Conversation.objects.filter(
+                models.Q(**{f"last_read_at_{side}__isnull": True})
+                | models.Q(**{f"last_read_at_{side}__lt": self.created_at}),
+                pk=conv.pk,
+            ).update(**{counter: Greatest(models.F(counter) - 1, 0)})
+        conv.refresh_last_message()
 
     def delete(self, *args, **kwargs):
         # Remove physical file on delete
@@ -197,7 +328,11 @@ class Message(models.Model):
                     os.remove(self.attachment.path)
             except Exception:
                 pass
-        super().delete(*args, **kwargs)
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if not self.is_deleted:
+                self._on_removed()
+        return result
 
     def can_delete(self):
         """Check if message can be deleted (within 60 seconds of creation)."""
@@ -220,10 +355,12 @@ class Message(models.Model):
             self.attachment_type = None
             self.attachment_name = None
             self.attachment_size = None
-        self.save(update_fields=[
-            "is_deleted", "deleted_at", "content",
-            "attachment", "attachment_type", "attachment_name", "attachment_size",
-        ])
+        with transaction.atomic():
+            self.save(update_fields=[
+                "is_deleted", "deleted_at", "content",
+                "attachment", "attachment_type", "attachment_name", "attachment_size",
+            ])
+            self._on_removed()
 
 
 # ---------------------------------------------------------------------------
@@ -288,6 +425,25 @@ class ChatRoom(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Snapshot of the latest non-deleted message (see Conversation)
+    last_message = models.ForeignKey(
+        "ChatRoomMessage",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=80, blank=True, default="")
+    last_message_sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    last_message_has_attachment = models.BooleanField(default=False)
+
     class Meta:
         db_table = "chat_rooms"
         ordering = ["-updated_at"]
@@ -295,6 +451,18 @@ class ChatRoom(models.Model):
     def __str__(self):
         return f"[{self.get_room_type_display()}] {self.name}"
 
+    def refresh_last_message(self):
+        """Recompute the last-message snapshot from the latest visible message."""
+        last = (
+            self.messages.filter(is_deleted=False)
+            .order_by("-created_at", "-id")
+            .first()
+        )
+        fields = _last_message_fields(last)
+        ChatRoom.objects.filter(pk=self.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(self, name, value)
+
 
 class ChatRoomMembership(models.Model):
     """Membership of a user in a ChatRoom."""
@@ -322,6 +490,10 @@ class ChatRoomMembership(models.Model):
     is_muted = models.BooleanField(default=False)
     joined_at = models.DateTimeField(auto_now_add=True)
 
+    # Messages of the others since the member last opened the room
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         db_table = "chat_room_memberships"
         unique_together = ("room", "user")
@@ -329,6 +501,14 @@ class ChatRoomMembership(models.Model):
     def __str__(self):
         return f"{self.user.full_name} in {self.room.name}"
 
+    def mark_read(self):
+        """Reset the unread counter of this member."""
+        self.unread_count = 0
+        self.last_read_at = timezone.now()
+        ChatRoomMembership.objects.filter(pk=self.pk).update(
+            unread_count=0, last_read_at=self.last_read_at
+        )
+
 
 class ChatRoomMessage(models.Model):
     """A single message inside a ChatRoom."""
@@ -383,21 +563,55 @@ class ChatRoomMessage(models.Model):
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    # Full-text index of ``content`` (kept up to date by PostgreSQL)
+    search_vector = models.GeneratedField(
+        expression=message_search_vector(),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = "chat_room_messages"
         ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["room", "created_at", "id"]),
+            GinIndex(fields=["search_vector"], name="room_msg_search_idx"),
+        ]
 
     def __str__(self):
         return f"{self.sender.full_name}: {self.content[:50] if self.content else '[attachment]'}"
 
     def save(self, *args, **kwargs):
         is_new = self._state.adding
-        super().save(*args, **kwargs)
-        if is_new:
-            self.room.updated_at = timezone.now()
-            self.room.save(update_fields=["updated_at"])
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                self._on_created()
+
+    def _on_created(self):
+        """Move the room snapshot to this message; one unread more for the others."""
+        now = timezone.now()
+        ChatRoom.objects.filter(pk=self.room_id).update(
+            updated_at=now,
+            last_message_at=self.created_at,
+            **_last_message_fields(self),
+        )
+        ChatRoomMembership.objects.filter(room_id=self.room_id).exclude(
+            user_id=self.sender_id
+        ).update(unread_count=models.F("unread_count") + 1)
+        self.room.updated_at = now
+        self.room.last_message_at = self.created_at
+
+    def _on_removed(self):
+        """Take a deleted message out of the snapshot and the unread counters."""
+        ChatRoomMembership.objects.filter(room_id=self.room_id).exclude(
+            user_id=self.sender_id
+        ).filter(
+            models.Q(last_read_at__isnull=True) | models.Q(last_read_at__lt=self.created_at)
+        ).update(unread_count=Greatest(models.F("unread_count") - 1, 0))
+        self.room.refresh_last_message()
 
     def delete(self, *args, **kwargs):
         if self.attachment:
@@ -406,7 +620,11 @@ class ChatRoomMessage(models.Model):
                     os.remove(self.attachment.path)
             except Exception:
                 pass
-        super().delete(*args, **kwargs)
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if not self.is_deleted:
+                self._on_removed()
+        return result
 
     def can_delete(self):
         if self.is_deleted:
@@ -427,10 +645,12 @@ class ChatRoomMessage(models.Model):
             self.attachment_type = None
             self.attachment_name = None
             self.attachment_size = None
-        self.save(update_fields=[
-            "is_deleted", "deleted_at", "content",
-            "attachment", "attachment_type", "attachment_name", "attachment_size",
-        ])
+        with transaction.atomic():
+            self.save(update_fields=[
+                "is_deleted", "deleted_at", "content",
+                "attachment", "attachment_type", "attachment_name", "attachment_size",
+            ])
+            self._on_removed()
 
 
 # ---------------------------------------------------------------------------
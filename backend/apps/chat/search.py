@@ -0,0 +1,70 @@
+"""
+Full-text search over the chat messages a user can read.
+
+Both message tables carry a ``search_vector`` generated column
+(models.message_search_vector: French + Arabic stemming) with a GIN
+index, so a search only reads the messages matching the query instead of
+scanning every message of the school with ILIKE. Matches are ranked with
+ts_rank, newest first among equal ranks.
+
+The query is parsed with websearch_to_tsquery: words are ANDed,
+"quoted phrases", ``or`` and ``-excluded`` words are supported.
+"""
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Q
+
+
+def message_search_query(text: str):
+    """tsquery matching ``text`` in French or in Arabic."""
+    return SearchQuery(text, config="french", search_type="websearch") | SearchQuery(
+        text, config="arabic", search_type="websearch"
+    )
+
+
+def _ranked(queryset, query, window):
+    return list(
+        queryset.filter(is_deleted=False, search_vector=query)
+        .annotate(rank=SearchRank(F("search_vector"), query))
+        .order_by("-rank", "-created_at")[:window]
+    )
+
+
+def search_messages(user, text: str, *, limit: int = 20, offset: int = 0):
+    """
+    Messages of ``user``'s conversations and rooms matching ``text``.
+
+    Each table returns its best ``offset + limit + 1`` rows through the
+    index; the two lists are merged by rank and the requested page is cut
+    from the merge. Returns (messages, has_more); every message has a
+    ``rank`` attribute.
+    """
+    from apps.chat.models import ChatRoomMessage, Message
+
+    query = message_search_query(text)
+    window = offset + limit + 1
+
+    conv_messages = _ranked(
+        Message.objects.filter(conversation__school=user.school)
+        .filter(
+            Q(conversation__participant_admin=user)
+            | Q(conversation__participant_other=user)
+        )
+        .select_related("sender"),
+        query,
+        window,
+    )
+    room_messages = _ranked(
+        ChatRoomMessage.objects.filter(
+            room__school=user.school, room__memberships__user=user
+        ).select_related("sender", "room"),
+        query,
+        window,
+    )
+
+    merged = sorted(
+        conv_messages + room_messages,
+        key=lambda msg: (msg.rank, msg.created_at),
+        reverse=True,
+    )
+    return merged[offset : offset + limit], len(merged) > offset + limit
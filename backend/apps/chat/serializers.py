@@ -69,7 +69,7 @@ class MessageSerializer(serializers.ModelSerializer):
 class ConversationListSerializer(serializers.ModelSerializer):
     participant_other_name = serializers.SerializerMethodField()
     participant_other_initials = serializers.SerializerMethodField()
-    last_message_preview = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Conversation
@@ -80,9 +80,13 @@ class ConversationListSerializer(serializers.ModelSerializer):
             "participant_other_name",
             "participant_other_role",
             "participant_other_initials",
+            "last_message_id",
             "last_message_preview",
+            "last_message_sender",
+            "last_message_has_attachment",
             "last_message_at",
             "unread_count_admin",
+            "unread_count",
             "related_student",
         ]
         read_only_fields = fields
@@ -98,15 +102,11 @@ class ConversationListSerializer(serializers.ModelSerializer):
         last = u.last_name[:1].upper() if u.last_name else ""
         return f"{first}{last}"
 
-    def get_last_message_preview(self, obj):
-        last_msg = obj.messages.filter(is_deleted=False).order_by("-created_at").first()
-        if not last_msg:
-            return ""
-        if last_msg.content:
-            return last_msg.content[:60]
-        if last_msg.attachment:
-            return "Pièce jointe"
-        return ""
+    def get_unread_count(self, obj):
+        request = self.context.get("request")
+        if request is None:
+            return obj.unread_count_admin
+        return obj.unread_count_for(request.user)
 
 
 # ---------------------------------------------------------------------------
@@ -178,7 +178,7 @@ class ChatRoomMessageSerializer(serializers.ModelSerializer):
 
 class ChatRoomListSerializer(serializers.ModelSerializer):
     member_count = serializers.SerializerMethodField()
-    last_message_preview = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
 
     class Meta:
         model = ChatRoom
@@ -190,23 +190,38 @@ class ChatRoomListSerializer(serializers.ModelSerializer):
             "related_class",
             "related_section",
             "member_count",
+            "last_message_id",
             "last_message_preview",
+            "last_message_sender",
+            "last_message_has_attachment",
+            "last_message_at",
+            "unread_count",
             "is_active",
             "created_at",
             "updated_at",
         ]
         read_only_fields = fields
 
+    # member_count / unread_count are annotated by ChatRoomListCreateView;
+    # a freshly created room falls back to one query each.
+
     def get_member_count(self, obj):
+        if hasattr(obj, "member_count"):
+            return obj.member_count
         return obj.memberships.count()
 
-    def get_last_message_preview(self, obj):
-        last = obj.messages.filter(is_deleted=False).order_by("-created_at").first()
-        if not last:
-            return ""
-        if last.content:
-            return last.content[:60]
-        return "Pièce jointe"
+    def get_unread_count(self, obj):
+        if hasattr(obj, "unread_count"):
+            return obj.unread_count
+        request = self.context.get("request")
+        if request is None:
+            return 0
+        return (
+            obj.memberships.filter(user=request.user)
+            .values_list("unread_count", flat=True)
+            .first()
+            or 0
+        )
 
 
 class ChatRoomCreateSerializer(serializers.Serializer):
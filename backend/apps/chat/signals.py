@@ -0,0 +1,55 @@
+"""
+╔══════════════════════════════════════════════════════════════════════════╗
+║  Chat Signals                                                          ║
+║                                                                        ║
+║  post_save / post_delete on ChatRoomMembership, post_save on ChatRoom  ║
+║     → ``room_state_changed`` sent to the room group once the write is  ║
+║       committed, so the connected GroupChatConsumers reload the state  ║
+║       they cached at connect (write permission, members to notify).    ║
+╚══════════════════════════════════════════════════════════════════════════╝
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# ChatRoom fields the consumers keep in their state
+_ROOM_STATE_FIELDS = {"name", "room_type", "is_active"}
+
+
+def broadcast_room_state_changed(room_id):
+    """Tell the consumers connected to a room to reload their state."""
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        async_to_sync(channel_layer.group_send)(
+            f"room_{room_id}",
+            {"type": "room_state_changed", "room_id": str(room_id)},
+        )
+    except Exception:
+        logger.warning("Could not broadcast state change of room %s", room_id)
+
+
+@receiver(post_save, sender="chat.ChatRoomMembership")
+@receiver(post_delete, sender="chat.ChatRoomMembership")
+def membership_changed(sender, instance, **kwargs):
+    room_id = instance.room_id
+    transaction.on_commit(lambda: broadcast_room_state_changed(room_id))
+
+
+@receiver(post_save, sender="chat.ChatRoom")
+def room_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        return  # nobody can be connected yet
+    if update_fields is not None and not _ROOM_STATE_FIELDS & set(update_fields):
+        return
+    room_id = instance.pk
+    transaction.on_commit(lambda: broadcast_room_state_changed(room_id))
@@ -13,8 +13,14 @@ logger = logging.getLogger(__name__)
 def send_offline_fcm_push(self, user_id, title, body, data=None):
     """
     Send FCM push notification to a user who is offline.
-    Called when a message is sent and the recipient is not connected via WebSocket.
+    Called when a message is sent and the recipient is not connected via
+    WebSocket; skipped if the user came online in the meantime.
     """
+    from core.presence import is_online
+
+    if is_online(user_id):
+        logger.info("User %s online, FCM push skipped", user_id)
+        return
     try:
         from apps.notifications.models import DeviceToken
         from core.firebase import send_push_notification
@@ -42,8 +48,13 @@ def send_offline_fcm_push(self, user_id, title, body, data=None):
 def send_offline_fcm_push_batch(self, user_ids, title, body, data=None):
     """
     Batch FCM push notification to multiple offline users.
-    Used for group/broadcast room messages.
+    Used for group/broadcast room messages; online users are skipped.
     """
+    from core.presence import offline_user_ids
+
+    user_ids = offline_user_ids(user_ids)
+    if not user_ids:
+        return
     try:
         from apps.notifications.models import DeviceToken
         from core.firebase import send_push_to_multiple
@@ -67,65 +78,18 @@ def send_offline_fcm_push_batch(self, user_ids, title, body, data=None):
 @shared_task
 def send_announcement_notification(announcement_id):
     """
-    Send FCM push for a new announcement to its target audience.
+    Send FCM push for a new announcement to its target audience
+    (see apps.announcements.tasks.send_announcement_notifications).
     """
-    try:
-        from apps.accounts.models import User
-        from apps.announcements.models import Announcement
-        from apps.notifications.models import DeviceToken
-        from core.firebase import send_push_to_multiple
+    from apps.announcements.tasks import send_announcement_notifications
 
-        announcement = Announcement.objects.select_related("school").get(
-            pk=announcement_id
-        )
-        school = announcement.school
-
-        # Build user queryset based on target audience
-        users = User.objects.filter(school=school, is_active=True)
-
-        if announcement.target_audience == "ALL":
-            pass
-        elif announcement.target_audience == "PARENTS":
-            users = users.filter(role=User.Role.PARENT)
-        elif announcement.target_audience == "STUDENTS":
-            users = users.filter(role=User.Role.STUDENT)
-        elif announcement.target_audience == "TEACHERS":
-            users = users.filter(role=User.Role.TEACHER)
-        elif announcement.target_audience == "SPECIFIC_SECTION":
-            if announcement.target_section_id:
-                from apps.academics.models import StudentProfile
-                student_ids = StudentProfile.objects.filter(
-                    current_class__section_id=announcement.target_section_id
-                ).values_list("user_id", flat=True)
-                users = users.filter(id__in=student_ids)
-        elif announcement.target_audience == "SPECIFIC_CLASS":
-            if announcement.target_class_id:
-                from apps.academics.models import StudentProfile
-                student_ids = StudentProfile.objects.filter(
-                    current_class_id=announcement.target_class_id
-                ).values_list("user_id", flat=True)
-                users = users.filter(id__in=student_ids)
-
-        user_ids = list(users.values_list("id", flat=True))
-        tokens = list(
-            DeviceToken.objects.filter(user_id__in=user_ids).values_list(
-                "token", flat=True
-            )
+    try:
+        result = send_announcement_notifications(announcement_id)
+        logger.info(
+            "Announcement FCM sent to %d tokens for announcement %s",
+            result.get("tokens", 0),
+            announcement_id,
         )
-
-        if tokens:
-            prefix = "🔴 URGENT: " if announcement.is_urgent else ""
-            send_push_to_multiple(
-                tokens,
-                f"{prefix}{announcement.title}",
-                announcement.body[:200],
-                {"announcement_id": str(announcement.id)},
-            )
-            logger.info(
-                "Announcement FCM sent to %d tokens for announcement %s",
-                len(tokens),
-                announcement_id,
-            )
     except Exception:
         logger.exception(
             "send_announcement_notification failed for announcement %s",
@@ -6,7 +6,6 @@ message search, pinning, deletion, templates.
 import os
 
 from django.db import models
-from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import permissions, status
@@ -15,11 +14,13 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from apps.accounts.models import User
+from core.pagination import KeysetPagination
 
 from .models import (
     ChatRoom, ChatRoomMembership, ChatRoomMessage,
     Conversation, Message, MessageTemplate,
 )
+from .search import search_messages
 from .serializers import (
     ChatRoomCreateSerializer,
     ChatRoomListSerializer,
@@ -62,6 +63,36 @@ def _role_from_user(user):
     return role_map.get(user.role, "admin")
 
 
+def _message_history(request, messages, serializer_class):
+    """
+    Message history of a conversation / room.
+
+    With ?limit, ?before, ?after or ?since the history is keyset-paginated
+    on (created_at, id) — see core.pagination.KeysetPagination. In
+    ``since`` mode the ids of the messages deleted since then are returned
+    too, so a client can sync incrementally. Without any of them the full
+    history is returned as a plain list (legacy clients).
+    """
+    paginator = KeysetPagination()
+    if not paginator.is_requested(request):
+        serializer = serializer_class(
+            messages.order_by("created_at"), many=True, context={"request": request}
+        )
+        return Response(serializer.data)
+
+    page = paginator.paginate_queryset(messages, request)
+    serializer = serializer_class(page, many=True, context={"request": request})
+    extra = {}
+    if paginator.since is not None:
+        extra["deleted"] = [
+            str(pk)
+            for pk in messages.filter(
+                deleted_at__gt=paginator.since, created_at__lte=paginator.since
+            ).values_list("id", flat=True)
+        ]
+    return paginator.get_paginated_response(serializer.data, **extra)
+
+
 # ---------------------------------------------------------------------------
 # 1. ConversationListCreateView
 # ---------------------------------------------------------------------------
@@ -84,7 +115,6 @@ class ConversationListCreateView(APIView):
                 school=request.user.school,
             )
             .select_related("participant_admin", "participant_other")
-            .prefetch_related("messages")
             .order_by(
                 models.F("last_message_at").desc(nulls_last=True),
                 "-created_at",
@@ -181,7 +211,12 @@ class ConversationDeleteView(APIView):
 
 
 class MessageListView(APIView):
-    """GET /api/v1/chat/conversations/<id>/messages/"""
+    """
+    GET /api/v1/chat/conversations/<id>/messages/
+
+    Paginated by cursor with ?limit / ?before / ?after / ?since
+    (see _message_history).
+    """
 
     permission_classes = [permissions.IsAuthenticated]
 
@@ -195,20 +230,13 @@ class MessageListView(APIView):
         if request.user not in (conv.participant_admin, conv.participant_other):
             return Response(status=status.HTTP_403_FORBIDDEN)
 
-        # Mark as read for admin
-        if request.user == conv.participant_admin:
-            Conversation.objects.filter(pk=conv.pk).update(
-                unread_count_admin=0,
-                is_read_by_admin=True,
-            )
+        # Mark as read for the reader
+        conv.mark_read_by(request.user)
 
         messages = conv.messages.select_related(
             "sender", "conversation__participant_admin"
-        ).order_by("created_at")
-        serializer = MessageSerializer(
-            messages, many=True, context={"request": request}
         )
-        return Response(serializer.data)
+        return _message_history(request, messages, MessageSerializer)
 
 
 # ---------------------------------------------------------------------------
@@ -474,8 +502,16 @@ class ChatRoomListCreateView(APIView):
                 memberships__user=request.user,
                 is_active=True,
             )
-            .distinct()
-            .prefetch_related("memberships", "messages")
+            .annotate(
+                unread_count=models.F("memberships__unread_count"),
+                member_count=models.Subquery(
+                    ChatRoomMembership.objects.filter(room=models.OuterRef("pk"))
+                    .order_by()
+                    .values("room")
+                    .annotate(n=models.Count("id"))
+                    .values("n"),
+                ),
+            )
         )
         serializer = ChatRoomListSerializer(
             rooms, many=True, context={"request": request}
@@ -586,7 +622,7 @@ class ChatRoomDetailView(APIView):
 
 class ChatRoomMessageListView(APIView):
     """
-    GET  /api/v1/chat/rooms/<id>/messages/   — room message history
+    GET  /api/v1/chat/rooms/<id>/messages/   — room message history (cursor-paginated)
     POST /api/v1/chat/rooms/<id>/messages/   — send text message to room
     """
 
@@ -600,14 +636,13 @@ class ChatRoomMessageListView(APIView):
             school=request.user.school,
             is_active=True,
         )
-        if not room.memberships.filter(user=request.user).exists():
+        membership = room.memberships.filter(user=request.user).first()
+        if not membership:
             return Response(status=status.HTTP_403_FORBIDDEN)
+        membership.mark_read()
 
-        messages = room.messages.select_related("sender").order_by("created_at")
-        serializer = ChatRoomMessageSerializer(
-            messages, many=True, context={"request": request}
-        )
-        return Response(serializer.data)
+        messages = room.messages.select_related("sender")
+        return _message_history(request, messages, ChatRoomMessageSerializer)
 
     def post(self, request, room_id):
         room = get_object_or_404(
@@ -705,11 +740,12 @@ class ChatRoomMessageListView(APIView):
             # FCM push for offline members
             from apps.notifications.models import DeviceToken
             from core.firebase import send_push_to_multiple
+            from core.presence import offline_user_ids
 
             tokens = list(
-                DeviceToken.objects.filter(user_id__in=other_ids).values_list(
-                    "token", flat=True
-                )
+                DeviceToken.objects.filter(
+                    user_id__in=offline_user_ids(other_ids)
+                ).values_list("token", flat=True)
             )
             if tokens:
                 send_push_to_multiple(
@@ -736,9 +772,17 @@ class ChatRoomMessageListView(APIView):
 
 
 class MessageSearchView(APIView):
-    """GET /api/v1/chat/messages/search/?q=term"""
+    """
+    GET /api/v1/chat/messages/search/?q=term&limit=20&offset=0
+
+    Full-text search (apps.chat.search) over the user's conversations and
+    rooms, best matches first. Response: ``results``, ``has_more`` and
+    ``next_offset`` (pass as ``offset`` for the next page).
+    """
 
     permission_classes = [permissions.IsAuthenticated]
+    page_size = 20
+    max_page_size = 50
 
     def get(self, request):
         q = request.query_params.get("q", "").strip()
@@ -748,52 +792,43 @@ class MessageSearchView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        school = request.user.school
-        user = request.user
-
-        # Search in 1-to-1 conversations
-        conv_messages = Message.objects.filter(
-            conversation__school=school,
-            is_deleted=False,
-            content__icontains=q,
-        ).filter(
-            Q(conversation__participant_admin=user) |
-            Q(conversation__participant_other=user)
-        ).select_related(
-            "sender", "conversation__participant_admin"
-        ).order_by("-created_at")[:50]
+        try:
+            limit = int(request.query_params.get("limit", self.page_size))
+            offset = int(request.query_params.get("offset", 0))
+        except ValueError:
+            return Response(
+                {"detail": "Paramètres limit / offset invalides."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = max(1, min(limit, self.max_page_size))
+        offset = max(0, offset)
 
-        # Search in rooms
-        room_messages = ChatRoomMessage.objects.filter(
-            room__school=school,
-            room__memberships__user=user,
-            is_deleted=False,
-            content__icontains=q,
-        ).select_related("sender", "room").order_by("-created_at")[:50]
+        messages, has_more = search_messages(
+            request.user, q, limit=limit, offset=offset
+        )
 
         results = []
-        for msg in conv_messages:
-            results.append({
-                "id": str(msg.id),
-                "type": "conversation",
-                "conversation_id": str(msg.conversation_id),
-                "sender_name": msg.sender.full_name,
-                "content": msg.content[:120],
-                "created_at": msg.created_at.isoformat(),
-            })
-        for msg in room_messages:
-            results.append({
+        for msg in messages:
+            row = {
                 "id": str(msg.id),
-                "type": "room",
-                "room_id": str(msg.room_id),
-                "room_name": msg.room.name,
                 "sender_name": msg.sender.full_name,
                 "content": msg.content[:120],
                 "created_at": msg.created_at.isoformat(),
-            })
+                "rank": round(msg.rank, 4),
+            }
+            if isinstance(msg, ChatRoomMessage):
+                row.update(type="room", room_id=str(msg.room_id), room_name=msg.room.name)
+            else:
+                row.update(type="conversation", conversation_id=str(msg.conversation_id))
+            results.append(row)
 
-        results.sort(key=lambda x: x["created_at"], reverse=True)
-        return Response(results[:50])
+        return Response(
+            {
+                "results": results,
+                "has_more": has_more,
+                "next_offset": offset + limit if has_more else None,
+            }
+        )
 
 
 # ---------------------------------------------------------------------------
@@ -911,12 +946,8 @@ class MessageReadReceiptView(APIView):
             read_at=now,
         )
 
-        # Reset unread counter if admin
-        if request.user == conv.participant_admin:
-            Conversation.objects.filter(pk=conv.pk).update(
-                unread_count_admin=0,
-                is_read_by_admin=True,
-            )
+        # Reset the reader's unread counter
+        conv.mark_read_by(request.user)
 
         # Broadcast read receipt via WebSocket
         try:
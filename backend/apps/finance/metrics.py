@@ -0,0 +1,196 @@
+"""
+Finance metrics — dashboard aggregates, cached per school.
+
+Each dashboard is computed with one conditional-aggregation query
+(Sum / Count with ``filter=``) instead of one query per figure:
+
+  * payment_stats(school)             totals of the payments dashboard
+  * enrollment_stats(school)          paid / partial / unpaid / late
+  * payroll_stats(school, month, y)   payslip totals and status counts
+  * monthly_revenue(school, year)     revenue per month (charts), one
+                                      grouped query for the 12 months
+
+Results are cached under a per-school version: ``invalidate(school_id)``
+drops the version, so every cached dashboard of the school goes stale
+with one cache write. It is called by the StudentPayment /
+StudentFeeEnrollment / PaySlip writes and by the batched payroll run.
+Figures that depend on today's date are keyed by the date as well.
+"""
+
+import datetime
+import logging
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+logger = logging.getLogger(__name__)
+
+# Lifetime of a dashboard entry. Writes make entries unreachable by
+# dropping the school's version key; date-keyed entries stop being read
+# the next day; both are evicted once this expires.
+METRICS_CACHE_TTL = 60 * 60  # 1 h
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+
+def _version_key(school_id) -> str:
+    return f"finance_metrics_version_{school_id}"
+
+
+def _version(school_id) -> str:
+    key = _version_key(school_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex[:12]
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key) or version
+    return version
+
+
+def _cached(school_id, name, compute):
+    key = f"finance_metrics_{school_id}_{_version(school_id)}_{name}"
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, timeout=METRICS_CACHE_TTL)
+    return result
+
+
+def invalidate(school_id) -> None:
+    """
+    Drop the cached metrics of a school now (later reads in the same
+    transaction) and again on commit (a concurrent reader may have
+    re-cached the old figures meanwhile).
+    """
+
+    def drop():
+        cache.delete(_version_key(school_id))
+
+    try:
+        drop()
+        transaction.on_commit(drop, robust=True)
+    except Exception:
+        logger.exception("Error invalidating finance metrics for school %s", school_id)
+
+
+# ---------------------------------------------------------------------------
+# Dashboards
+# ---------------------------------------------------------------------------
+
+
+def payment_stats(school, today=None) -> dict:
+    """
+    Payments of the school: collected this month / this year, active and
+    expired counts (from period_end) and number of distinct payers.
+    """
+    from .models import StudentPayment
+
+    today = today or datetime.date.today()
+
+    def compute():
+        stats = StudentPayment.objects.filter(school=school, is_deleted=False).aggregate(
+            total_this_month=Sum(
+                "amount_paid", filter=Q(payment_date__gte=today.replace(day=1))
+            ),
+            total_this_year=Sum(
+                "amount_paid", filter=Q(payment_date__gte=today.replace(month=1, day=1))
+            ),
+            active_count=Count("id", filter=Q(period_end__gte=today)),
+            expired_count=Count("id", filter=Q(period_end__lt=today)),
+            payers=Count("student", distinct=True),
+        )
+        stats["total_this_month"] = stats["total_this_month"] or 0
+        stats["total_this_year"] = stats["total_this_year"] or 0
+        return stats
+
+    return _cached(school.pk, f"payments_{today.isoformat()}", compute)
+
+
+def enrollment_stats(school, today=None) -> dict:
+    """
+    Fee enrollments of the school by status. Overdue unpaid ones count as
+    late even before the daily task has marked them.
+    """
+    from .models import StudentFeeEnrollment
+
+    today = today or datetime.date.today()
+
+    def compute():
+        overdue = Q(due_date__lt=today) & ~Q(status="PAID")
+        stats = StudentFeeEnrollment.objects.filter(
+            school=school, is_deleted=False
+        ).aggregate(
+            total=Count("id"),
+            paid=Count("id", filter=Q(status="PAID")),
+            partial=Count("id", filter=Q(status="PARTIAL") & ~overdue),
+            unpaid=Count("id", filter=Q(status="UNPAID") & ~overdue),
+            late=Count("id", filter=Q(status="LATE") | overdue),
+            total_due=Sum("total_due"),
+            total_collected=Sum("total_paid"),
+        )
+        stats["total_due"] = stats["total_due"] or 0
+        stats["total_collected"] = stats["total_collected"] or 0
+        return stats
+
+    return _cached(school.pk, f"enrollments_{today.isoformat()}", compute)
+
+
+def payroll_stats(school, month: int, year: int) -> dict:
+    """Payslips of the school for month/year: totals and status counts."""
+    from .models import PaySlip
+
+    def compute():
+        stats = PaySlip.objects.filter(
+            school=school, year=year, month=month, is_deleted=False
+        ).aggregate(
+            total_payslips=Count("id"),
+            total_gross=Sum("gross_salary"),
+            total_net=Sum("net_salary"),
+            total_deductions=Sum("total_deductions"),
+            draft=Count("id", filter=Q(status="DRAFT")),
+            validated=Count("id", filter=Q(status="VALIDATED")),
+            paid=Count("id", filter=Q(status="PAID")),
+        )
+        for name in ("total_gross", "total_net", "total_deductions"):
+            stats[name] = stats[name] or 0
+        return stats
+
+    return _cached(school.pk, f"payroll_{year}_{month:02d}", compute)
+
+
+def monthly_revenue(school, year: int) -> list[dict]:
+    """
+    Student payments of ``year`` per month:
+    [{"month": 1..12, "revenue": total, "count": payments}], every month
+    present (zeros included).
+    """
+    from django.db.models.functions import ExtractMonth
+
+    from .models import StudentPayment
+
+    def compute():
+        rows = {
+            row["month"]: row
+            for row in StudentPayment.objects.filter(
+                school=school, is_deleted=False, payment_date__year=year
+            )
+            .annotate(month=ExtractMonth("payment_date"))
+            .values("month")
+            .annotate(revenue=Sum("amount_paid"), count=Count("id"))
+            .order_by()
+        }
+        return [
+            {
+                "month": m,
+                "revenue": rows[m]["revenue"] if m in rows else 0,
+                "count": rows[m]["count"] if m in rows else 0,
+            }
+            for m in range(1, 13)
+        ]
+
+    return _cached(school.pk, f"revenue_{year}", compute)
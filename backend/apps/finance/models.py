@@ -4,11 +4,15 @@ Finance models: fee structures, student payments, fee enrollment tracking.
 
 import datetime
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
 from django.utils import timezone
 
 from core.models import TenantModel
 
+from . import metrics
+
 
 class FeeStructure(TenantModel):
     """Fee configuration for a school / academic year, optionally per section."""
@@ -142,10 +146,64 @@ class StudentPayment(TenantModel):
             f"{self.student.full_name} — {self.amount_paid} DA — {self.receipt_number}"
         )
 
+    # Fields deciding which enrollment a payment counts towards, and how much
+    _ENROLLMENT_FIELDS = ("student_id", "fee_structure_id", "amount_paid", "is_deleted")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(name in field_names for name in cls._ENROLLMENT_FIELDS):
+            instance._counted = instance._enrollment_share()
+        return instance
+
+    def _enrollment_share(self):
+        """(student_id, fee_structure_id, amount) counted in total_paid, or None."""
+        if self.is_deleted:
+            return None
+        return (self.student_id, self.fee_structure_id, self.amount_paid)
+
+    def _sync_enrollment(self, current, tracked=True):
+        """
+        Move this payment's share of StudentFeeEnrollment.total_paid from
+        what was last counted to ``current`` (F() increments, same
+        transaction as the payment write).
+        """
+        if not tracked:
+            # Loaded without the tracked fields: recompute from scratch
+            for enrollment in StudentFeeEnrollment.objects.filter(
+                student_id=self.student_id,
+                fee_structure_id=self.fee_structure_id,
+                is_deleted=False,
+            ):
+                enrollment.refresh_totals(commit=True)
+        else:
+            previous = getattr(self, "_counted", None)
+            if previous != current:
+                if previous:
+                    StudentFeeEnrollment.add_payment(previous[0], previous[1], -previous[2])
+                if current:
+                    StudentFeeEnrollment.add_payment(*current)
+        self._counted = current
+
+    def save(self, *args, **kwargs):
+        tracked = self._state.adding or hasattr(self, "_counted")
+        with transaction.atomic():
+            self._save(*args, **kwargs)
+            self._sync_enrollment(self._enrollment_share(), tracked)
+            metrics.invalidate(self.school_id)
+
+    def delete(self, *args, **kwargs):
+        tracked = hasattr(self, "_counted")
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self._sync_enrollment(None, tracked)
+            metrics.invalidate(self.school_id)
+        return result
+
     # ------------------------------------------------------------------
     # Auto-generate receipt number
     # ------------------------------------------------------------------
-    def save(self, *args, **kwargs):
+    def _save(self, *args, **kwargs):
         if not self.receipt_number:
             year = self.payment_date.year if self.payment_date else timezone.now().year
             last = (
@@ -181,8 +239,11 @@ class StudentFeeEnrollment(TenantModel):
     Tracks a student's enrolment in a specific FeeStructure.
 
     total_due  = amount the student must pay for this fee.
-    total_paid = cached sum of linked StudentPayment.amount_paid.
-    status     = auto-computed from total_due vs total_paid + due_date.
+    total_paid = cached sum of linked StudentPayment.amount_paid, moved
+                 with F() increments whenever a payment is created,
+                 edited or (soft-)deleted.
+    status     = auto-computed from total_due vs total_paid + due_date;
+                 the daily task turns overdue ones LATE (mark_late).
     """
 
     class FeeStatus(models.TextChoices):
@@ -234,6 +295,29 @@ class StudentFeeEnrollment(TenantModel):
             f"({self.get_status_display()})"
         )
 
+    def save(self, *args, **kwargs):
+        # Payments recorded before the enrollment existed; afterwards
+        # total_paid is kept up to date by StudentPayment writes.
+        if self._state.adding and not self.total_paid:
+            paid = self._payments_total()
+            if paid:
+                self.total_paid = paid
+                self._compute_status()
+        super().save(*args, **kwargs)
+        metrics.invalidate(self.school_id)
+
+    def _payments_total(self):
+        from django.db.models import Sum
+
+        return (
+            StudentPayment.objects.filter(
+                student_id=self.student_id,
+                fee_structure_id=self.fee_structure_id,
+                is_deleted=False,
+            ).aggregate(total=Sum("amount_paid"))["total"]
+            or 0
+        )
+
     # ------------------------------------------------------------------
     # Refresh cached total and status
     # ------------------------------------------------------------------
@@ -242,18 +326,50 @@ class StudentFeeEnrollment(TenantModel):
         Re-compute total_paid from linked StudentPayment rows and
         derive status from total_paid vs total_due + due_date.
         """
-        from django.db.models import Sum
-
-        agg = StudentPayment.objects.filter(
-            student=self.student,
-            fee_structure=self.fee_structure,
-            is_deleted=False,
-        ).aggregate(total=Sum("amount_paid"))
-        self.total_paid = agg["total"] or 0
+        self.total_paid = self._payments_total()
         self._compute_status()
         if commit:
             self.save(update_fields=["total_paid", "status", "updated_at"])
 
+    @classmethod
+    def status_expression(cls, total_paid, today=None):
+        """
+        SQL expression of ``_compute_status`` for a given total_paid
+        expression, so status can be written in the same UPDATE.
+        """
+        today = today or datetime.date.today()
+        late = Q(due_date__lt=today)
+        return Case(
+            When(GreaterThanOrEqual(total_paid, F("total_due")), then=Value(cls.FeeStatus.PAID)),
+            When(late, then=Value(cls.FeeStatus.LATE)),
+            When(GreaterThan(total_paid, 0), then=Value(cls.FeeStatus.PARTIAL)),
+            default=Value(cls.FeeStatus.UNPAID),
+        )
+
+    @classmethod
+    def add_payment(cls, student_id, fee_structure_id, amount):
+        """Add ``amount`` (may be negative) to the matching enrollment, one UPDATE."""
+        if not amount:
+            return 0
+        total_paid = F("total_paid") + amount
+        return cls.objects.filter(
+            student_id=student_id, fee_structure_id=fee_structure_id, is_deleted=False
+        ).update(
+            total_paid=total_paid,
+            status=cls.status_expression(total_paid),
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def mark_late(cls, today=None) -> int:
+        """UNPAID / PARTIAL enrollments past their due date become LATE (one UPDATE)."""
+        today = today or datetime.date.today()
+        return cls.objects.filter(
+            is_deleted=False,
+            due_date__lt=today,
+            status__in=[cls.FeeStatus.UNPAID, cls.FeeStatus.PARTIAL],
+        ).update(status=cls.FeeStatus.LATE, updated_at=timezone.now())
+
     def _compute_status(self):
         """Derive status from amounts + date."""
         today = datetime.date.today()
@@ -552,6 +668,7 @@ class PaySlip(TenantModel):
             seq = int(last.split("-")[-1]) + 1 if last else 1
             self.reference = f"{prefix}-{seq:05d}"
         super().save(*args, **kwargs)
+        metrics.invalidate(self.school_id)
 
 
 # =========================================================================
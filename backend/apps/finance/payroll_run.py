@@ -0,0 +1,363 @@
+"""
+Payroll run — every payslip of a school for one month, in batch.
+
+``compute_payslip`` (payroll_service) used to issue four queries and a
+save per advance for each teacher. A run loads the inputs of all the
+teachers at once:
+
+  * approved overtime hours  — one grouped SUM
+  * approved unpaid leaves   — one query (intervals)
+  * active deductions        — one query, shared by all payslips
+  * approved advances        — one query, locked until the run commits
+
+computes the payslips in memory and writes them with one bulk_create
+(plus one bulk_update for the advances) in a single transaction.
+
+A run is idempotent per (school, month, year): teachers who already
+have a payslip for the period are skipped. Large schools run it as a
+Celery job (``start_payroll_job``) whose progress is readable via
+GET /api/v1/finance/payslips/bulk-generate/<task_id>/.
+"""
+
+import datetime
+import logging
+import uuid
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Working days per month (Algeria standard)
+WORKING_DAYS_PER_MONTH = 22
+
+# Schools with more salary configs than this generate in the background
+PAYROLL_SYNC_MAX = 50
+
+# How long the status of a payroll job stays readable
+PAYROLL_JOB_TTL = 60 * 60 * 24  # 24 h
+
+# Progress is reported every N computed payslips
+PROGRESS_EVERY = 25
+
+ADVANCE_LABEL = "Avance sur salaire"
+
+
+def month_bounds(month: int, year: int):
+    """First and last day of the month."""
+    start = datetime.date(year, month, 1)
+    if month == 12:
+        end = datetime.date(year + 1, 1, 1) - datetime.timedelta(days=1)
+    else:
+        end = datetime.date(year, month + 1, 1) - datetime.timedelta(days=1)
+    return start, end
+
+
+# ---------------------------------------------------------------------------
+# Computation (no database access)
+# ---------------------------------------------------------------------------
+
+
+def unpaid_leave_days(leaves, month: int, year: int) -> int:
+    """Days of the (start, end) intervals that fall within the month."""
+    month_start, month_end = month_bounds(month, year)
+    total = 0
+    for start, end in leaves:
+        days = (min(end, month_end) - max(start, month_start)).days + 1
+        if days > 0:
+            total += days
+    return total
+
+
+def build_payslip(config, month, year, *, overtime_hours, leave_days, deductions, advances):
+    """
+    Unsaved PaySlip for ``config``:
+
+    1. gross = base + overtime - unpaid leave
+    2. the active deductions apply on gross
+    3. each approved advance takes its monthly deduction (``advances``
+       are updated in place: remaining / status)
+    4. net = gross - total deductions
+    """
+    from .models import PaySlip, SalaryAdvance
+
+    base_salary = config.base_salary
+    overtime_hours = overtime_hours or Decimal("0")
+    overtime_amount = overtime_hours * config.hourly_rate
+
+    daily_rate = base_salary / Decimal(str(WORKING_DAYS_PER_MONTH))
+    leave_deduction = round(daily_rate * Decimal(str(leave_days)), 2)
+
+    gross_salary = round(base_salary + overtime_amount - leave_deduction, 2)
+
+    deductions_detail = []
+    total_deductions = Decimal("0")
+    for d in deductions:
+        amount = d.compute(gross_salary)
+        deductions_detail.append({"name": d.name, "amount": str(amount)})
+        total_deductions += amount
+
+    advance_total = Decimal("0")
+    for adv in advances:
+        deduct = min(adv.monthly_deduction, adv.remaining)
+        if deduct > 0:
+            advance_total += deduct
+            adv.remaining -= deduct
+            if adv.remaining <= 0:
+                adv.remaining = 0
+                adv.status = SalaryAdvance.AdvanceStatus.REPAID
+    if advance_total > 0:
+        deductions_detail.append({"name": ADVANCE_LABEL, "amount": str(advance_total)})
+        total_deductions += advance_total
+
+    return PaySlip(
+        school_id=config.school_id,
+        teacher_id=config.teacher_id,
+        month=month,
+        year=year,
+        base_salary=base_salary,
+        overtime_hours=overtime_hours,
+        overtime_amount=overtime_amount,
+        leave_days_unpaid=leave_days,
+        leave_deduction=leave_deduction,
+        gross_salary=gross_salary,
+        deductions_detail=deductions_detail,
+        total_deductions=total_deductions,
+        net_salary=round(gross_salary - total_deductions, 2),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Run
+# ---------------------------------------------------------------------------
+
+
+def run_payroll(school, month, year, *, configs=None, skip_existing=True, progress=None):
+    """
+    Generate the payslips of ``school`` for month/year.
+
+    ``configs`` restricts the run (default: every SalaryConfig of the
+    school). With ``skip_existing=False`` an existing payslip makes the
+    run fail on the (teacher, month, year) unique constraint instead of
+    being skipped. ``progress(done, total)`` is called while computing.
+
+    Returns {"payslips": [created PaySlips], "skipped": [teacher names]}.
+    """
+    from .models import (
+        Deduction,
+        LeaveRecord,
+        OvertimeRecord,
+        PaySlip,
+        SalaryAdvance,
+        SalaryConfig,
+    )
+
+    if configs is None:
+        configs = SalaryConfig.objects.filter(school=school, is_deleted=False).select_related(
+            "teacher"
+        )
+    configs = list(configs)
+
+    skipped = []
+    if skip_existing and configs:
+        existing = set(
+            PaySlip.objects.filter(
+                teacher_id__in=[c.teacher_id for c in configs], month=month, year=year
+            ).values_list("teacher_id", flat=True)
+        )
+        skipped = [c.teacher.full_name for c in configs if c.teacher_id in existing]
+        configs = [c for c in configs if c.teacher_id not in existing]
+    if not configs:
+        return {"payslips": [], "skipped": skipped}
+
+    teacher_ids = [c.teacher_id for c in configs]
+    month_start, month_end = month_bounds(month, year)
+
+    with transaction.atomic():
+        overtime = dict(
+            OvertimeRecord.objects.filter(
+                school=school,
+                teacher_id__in=teacher_ids,
+                date__range=(month_start, month_end),
+                approved=True,
+                is_deleted=False,
+            )
+            .values("teacher_id")
+            .annotate(total=Sum("hours"))
+            .values_list("teacher_id", "total")
+        )
+
+        leaves = {}
+        for teacher_id, start, end in LeaveRecord.objects.filter(
+            school=school,
+            teacher_id__in=teacher_ids,
+            leave_type=LeaveRecord.LeaveType.UNPAID,
+            status=LeaveRecord.LeaveStatus.APPROVED,
+            start_date__range=(month_start, month_end),
+            is_deleted=False,
+        ).values_list("teacher_id", "start_date", "end_date"):
+            leaves.setdefault(teacher_id, []).append((start, end))
+
+        deductions = list(
+            Deduction.objects.filter(school=school, is_active=True, is_deleted=False)
+        )
+
+        advances = {}
+        for adv in (
+            SalaryAdvance.objects.select_for_update()
+            .filter(
+                school=school,
+                teacher_id__in=teacher_ids,
+                status=SalaryAdvance.AdvanceStatus.APPROVED,
+                remaining__gt=0,
+                is_deleted=False,
+            )
+            .order_by("request_date", "created_at")
+        ):
+            advances.setdefault(adv.teacher_id, []).append(adv)
+
+        payslips = []
+        for done, config in enumerate(configs, start=1):
+            payslips.append(
+                build_payslip(
+                    config,
+                    month,
+                    year,
+                    overtime_hours=overtime.get(config.teacher_id),
+                    leave_days=unpaid_leave_days(leaves.get(config.teacher_id, ()), month, year),
+                    deductions=deductions,
+                    advances=advances.get(config.teacher_id, ()),
+                )
+            )
+            if progress and (done % PROGRESS_EVERY == 0 or done == len(configs)):
+                progress(done, len(configs))
+
+        _assign_references(payslips, month, year)
+        PaySlip.objects.bulk_create(payslips, batch_size=500)
+
+        changed = [adv for group in advances.values() for adv in group]
+        if changed:
+            now = timezone.now()
+            for adv in changed:
+                adv.updated_at = now
+            SalaryAdvance.objects.bulk_update(
+                changed, ["remaining", "status", "updated_at"], batch_size=500
+            )
+
+    metrics.invalidate(school.pk)
+
+    teachers = {c.teacher_id: c.teacher for c in configs}
+    for payslip in payslips:
+        payslip.teacher = teachers[payslip.teacher_id]
+    return {"payslips": payslips, "skipped": skipped}
+
+
+def _assign_references(payslips, month, year):
+    """
+    FDP-YYYY-MM-NNNNN references continuing the period's sequence (the
+    same numbering as PaySlip.save). The sequence is shared by every
+    school: on PostgreSQL concurrent runs of the same period are
+    serialized until commit by a transaction-level advisory lock.
+    """
+    from .models import PaySlip
+
+    prefix = f"FDP-{year}-{month:02d}"
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [prefix])
+    last = (
+        PaySlip.objects.filter(reference__startswith=prefix)
+        .order_by("-reference")
+        .values_list("reference", flat=True)
+        .first()
+    )
+    seq = int(last.split("-")[-1]) if last else 0
+    for payslip in payslips:
+        seq += 1
+        payslip.reference = f"{prefix}-{seq:05d}"
+
+
+# ---------------------------------------------------------------------------
+# Background jobs
+# ---------------------------------------------------------------------------
+
+
+def _job_key(task_id) -> str:
+    return f"payroll_job_{task_id}"
+
+
+def _run_key(school_id, month, year) -> str:
+    return f"payroll_run_{school_id}_{year}_{month:02d}"
+
+
+def job_status(task_id):
+    return cache.get(_job_key(task_id))
+
+
+def set_job_status(task_id, **values):
+    job = cache.get(_job_key(task_id)) or {}
+    job.update(values)
+    cache.set(_job_key(task_id), job, timeout=PAYROLL_JOB_TTL)
+    return job
+
+
+def start_payroll_job(school, month, year, user):
+    """
+    Dispatch ``run_payroll_job`` unless a run of the same period is
+    already in progress for the school. Returns (task_id, started).
+
+    The period is claimed with cache.add() under a pre-generated task id
+    and the "pending" status is written before dispatch, so a job that
+    finishes before apply_async() returns (eager mode, idle worker) is
+    not reset to pending, and two concurrent requests cannot both start.
+    """
+    from .tasks import run_payroll_job
+
+    run_key = _run_key(school.pk, month, year)
+    task_id = str(uuid.uuid4())
+    if not cache.add(run_key, task_id, timeout=PAYROLL_JOB_TTL):
+        running = cache.get(run_key)
+        if running and (job_status(running) or {}).get("status") in ("pending", "running"):
+            return running, False
+        # Left over by a job that is gone (expired status, killed worker)
+        cache.delete(run_key)
+        if not cache.add(run_key, task_id, timeout=PAYROLL_JOB_TTL):
+            return cache.get(run_key), False
+
+    set_job_status(
+        task_id,
+        status="pending",
+        user_id=str(user.pk),
+        school_id=str(school.pk),
+        month=month,
+        year=year,
+        done=0,
+        total=0,
+    )
+    try:
+        run_payroll_job.apply_async(
+            kwargs={
+                "school_id": str(school.pk),
+                "month": month,
+                "year": year,
+                "user_id": str(user.pk),
+            },
+            task_id=task_id,
+        )
+    except Exception:
+        release_run(school.pk, month, year, task_id)
+        set_job_status(task_id, status="failed")
+        raise
+    return task_id, True
+
+
+def release_run(school_id, month, year, task_id) -> None:
+    """Free the period, unless another job has claimed it since."""
+    run_key = _run_key(school_id, month, year)
+    if cache.get(run_key) == task_id:
+        cache.delete(run_key)
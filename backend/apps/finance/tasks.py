@@ -184,23 +184,13 @@ def send_payment_reminders():
 @shared_task
 def refresh_enrollment_statuses():
     """
-    Daily task: refresh all enrollment totals and statuses.
-    This catches cases where due_date has passed and status
-    should switch to LATE.
+    Daily task: unpaid / partial enrollments whose due_date has passed
+    switch to LATE. Totals are maintained by the payment writes, so this
+    is a single date-based UPDATE.
     """
     from apps.finance.models import StudentFeeEnrollment
-    from apps.schools.models import School
 
-    total_updated = 0
-    for school in School.objects.filter(is_active=True):
-        enrollments = StudentFeeEnrollment.objects.filter(
-            school=school, is_deleted=False
-        ).exclude(status="PAID")
-        for enrollment in enrollments:
-            old_status = enrollment.status
-            enrollment.refresh_totals(commit=True)
-            if enrollment.status != old_status:
-                total_updated += 1
+    total_updated = StudentFeeEnrollment.mark_late()
 
     logger.info(f"refresh_enrollment_statuses: {total_updated} statuses updated")
     return {"status": "complete", "updated": total_updated}
@@ -216,10 +206,12 @@ def generate_monthly_payslips():
     """
     Runs on the 1st of each month.
     Generates DRAFT payslips for last month for every teacher with a
-    SalaryConfig who doesn't already have a payslip for that period.
+    SalaryConfig who doesn't already have a payslip for that period
+    (one batched payroll run per school).
     """
-    from apps.finance.models import PaySlip, SalaryConfig
-    from apps.finance.payroll_service import compute_payslip
+    from apps.finance.models import SalaryConfig
+    from apps.finance.payroll_run import run_payroll
+    from apps.schools.models import School
 
     today = datetime.date.today()
     # Target = previous month
@@ -232,26 +224,25 @@ def generate_monthly_payslips():
     skipped = 0
     errors = 0
 
-    for config in SalaryConfig.objects.select_related("teacher", "school").filter(
-        school__is_active=True
-    ):
-        if PaySlip.objects.filter(
-            teacher=config.teacher, month=month, year=year
-        ).exists():
-            skipped += 1
-            continue
+    schools = School.objects.filter(
+        is_active=True,
+        pk__in=SalaryConfig.objects.filter(is_deleted=False).values("school_id"),
+    )
+    for school in schools:
         try:
-            compute_payslip(config, month, year, config.school)
-            created += 1
+            result = run_payroll(school, month, year)
         except Exception as exc:
-            errors += 1
+            errors += SalaryConfig.objects.filter(school=school, is_deleted=False).count()
             logger.error(
-                "Payslip generation failed for teacher %s (%s/%s): %s",
-                config.teacher_id,
+                "Payroll run failed for school %s (%s/%s): %s",
+                school.pk,
                 month,
                 year,
                 exc,
             )
+            continue
+        created += len(result["payslips"])
+        skipped += len(result["skipped"])
 
     logger.info(
         "generate_monthly_payslips: created=%d, skipped=%d, errors=%d",
@@ -261,3 +252,52 @@ def generate_monthly_payslips():
     )
     return {"created": created, "skipped": skipped, "errors": errors}
 
+
+@shared_task(bind=True)
+def run_payroll_job(self, school_id: str, month: int, year: int, user_id: str | None = None):
+    """
+    Background payroll run started by PaySlipBulkGenerateView; progress
+    and result are kept in the job status (payroll_run.job_status).
+    """
+    from apps.finance.payroll_run import release_run, run_payroll, set_job_status
+    from apps.schools.models import School
+
+    task_id = self.request.id
+    set_job_status(task_id, status="running")
+
+    def progress(done, total):
+        set_job_status(task_id, done=done, total=total)
+
+    try:
+        school = School.objects.get(pk=school_id)
+        result = run_payroll(school, month, year, progress=progress)
+    except Exception:
+        logger.exception("Payroll job failed for school %s (%s/%s)", school_id, month, year)
+        set_job_status(task_id, status="failed")
+        raise
+    finally:
+        release_run(school_id, month, year, task_id)
+
+    summary = {
+        "created_count": len(result["payslips"]),
+        "created_references": [ps.reference for ps in result["payslips"]],
+        "skipped_count": len(result["skipped"]),
+        "skipped_teachers": result["skipped"],
+    }
+    set_job_status(task_id, status="done", **summary)
+
+    if user_id:
+        from apps.notifications.models import Notification
+
+        Notification.objects.create(
+            user_id=user_id,
+            school_id=school_id,
+            title="Fiches de paie générées",
+            body=(
+                f"{summary['created_count']} fiche(s) de paie générée(s) pour "
+                f"{month:02d}/{year}."
+            ),
+            notification_type=Notification.NotificationType.SYSTEM,
+        )
+    return {"created": summary["created_count"], "skipped": summary["skipped_count"]}
+
@@ -194,6 +194,11 @@ urlpatterns = [
         views.PaySlipBulkGenerateView.as_view(),
         name="payslip-bulk-generate",
     ),
+    path(
+        "payslips/bulk-generate/<str:task_id>/",
+        views.PayrollRunStatusView.as_view(),
+        name="payslip-bulk-generate-status",
+    ),
     path("payslips/stats/", views.PayrollStatsView.as_view(), name="payroll-stats"),
     path("payslips/my/", views.TeacherOwnPaySlipsView.as_view(), name="payslip-my"),
     path("payslips/", views.PaySlipListView.as_view(), name="payslip-list"),
@@ -208,10 +213,14 @@ urlpatterns = [
         name="payslip-pdf",
     ),
     # ─── Financial Reports ───────────────────────────────────
+    path(
+        "reports/revenue-monthly/",
+        views.RevenueSeriesView.as_view(),
+        name="financial-revenue-monthly",
+    ),
     path(
         "reports/",
         views.FinancialReportView.as_view(),
         name="financial-reports",
     ),
 ]
-]
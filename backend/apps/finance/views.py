@@ -2,20 +2,27 @@
 Finance (Payments) views — school-scoped.
 """
 
-import csv
 import datetime
-import io
 import logging
 
 from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractMonth
 from django.http import HttpResponse
 from django.utils import timezone
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core.exports import (
+    EXPORT_CHUNK_SIZE,
+    Sheet,
+    csv_response,
+    start_export_job,
+    xlsx_response,
+)
 from core.permissions import IsSchoolAdmin, IsAdminOrTeacher, IsTeacher, require_module
 
+from . import metrics
 from .models import (
     AnnualBudget,
     Deduction,
@@ -241,19 +248,11 @@ class PaymentListCreateView(APIView):
     def post(self, request):
         serializer = StudentPaymentCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        # The enrollment total is moved by StudentPayment.save
         obj = serializer.save(
             school=request.user.school,
             recorded_by=request.user,
         )
-        # Refresh the related enrollment totals if one exists
-        enrollment = StudentFeeEnrollment.objects.filter(
-            student=obj.student,
-            fee_structure=obj.fee_structure,
-            is_deleted=False,
-        ).first()
-        if enrollment:
-            enrollment.refresh_totals(commit=True)
-
         return Response(
             StudentPaymentSerializer(obj).data, status=status.HTTP_201_CREATED
         )
@@ -313,28 +312,13 @@ class PaymentStatsView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSchoolAdmin]
 
     def get(self, request):
+        # Read-only: active / expired are derived from period_end here,
+        # the stored status is refreshed by check_expired_payments.
         school = request.user.school
-        _refresh_statuses(school)
         qs = StudentPayment.objects.filter(school=school, is_deleted=False)
 
         today = datetime.date.today()
-        first_of_month = today.replace(day=1)
-        first_of_year = today.replace(month=1, day=1)
-
-        total_this_month = (
-            qs.filter(payment_date__gte=first_of_month).aggregate(
-                total=Sum("amount_paid")
-            )["total"]
-            or 0
-        )
-        total_this_year = (
-            qs.filter(payment_date__gte=first_of_year).aggregate(
-                total=Sum("amount_paid")
-            )["total"]
-            or 0
-        )
-        active_count = qs.filter(status="actif").count()
-        expired_count = qs.filter(status="expire").count()
+        stats = metrics.payment_stats(school, today)
 
         # Students who have never paid: students in the school with no payment records
         from apps.accounts.models import User
@@ -342,12 +326,11 @@ class PaymentStatsView(APIView):
         all_students_count = User.objects.filter(
             school=school, role="STUDENT", is_active=True
         ).count()
-        students_with_payments = qs.values("student").distinct().count()
-        never_paid_count = max(0, all_students_count - students_with_payments)
+        never_paid_count = max(0, all_students_count - stats["payers"])
 
         # Expired students detail
         expired_payments = (
-            qs.filter(status="expire")
+            qs.filter(period_end__lt=today)
             .select_related(
                 "student",
                 "student__student_profile",
@@ -372,10 +355,10 @@ class PaymentStatsView(APIView):
 
         return Response(
             {
-                "total_this_month": total_this_month,
-                "total_this_year": total_this_year,
-                "active_count": active_count,
-                "expired_count": expired_count,
+                "total_this_month": stats["total_this_month"],
+                "total_this_year": stats["total_this_year"],
+                "active_count": stats["active_count"],
+                "expired_count": stats["expired_count"],
                 "never_paid_count": never_paid_count,
                 "expired_students": expired_students,
             }
@@ -395,7 +378,6 @@ class PaymentExpiringSoonView(APIView):
 
     def get(self, request):
         school = request.user.school
-        _refresh_statuses(school)
 
         today = datetime.date.today()
         cutoff = today + datetime.timedelta(days=7)
@@ -403,7 +385,6 @@ class PaymentExpiringSoonView(APIView):
         qs = (
             _base_payments_qs(school)
             .filter(
-                status="actif",
                 period_end__gte=today,
                 period_end__lte=cutoff,
             )
@@ -563,7 +544,11 @@ class PaymentBulkReminderView(APIView):
 
 @require_module("finance")
 class PaymentReportView(APIView):
-    """Export payments as CSV or PDF."""
+    """
+    Export payments as CSV, XLSX (both streamed, no row limit) or PDF.
+    ``?async=true`` builds the CSV / XLSX file in the background and sends
+    a download link when done.
+    """
 
     permission_classes = [permissions.IsAuthenticated, IsSchoolAdmin]
 
@@ -571,63 +556,30 @@ class PaymentReportView(APIView):
         school = request.user.school
         _refresh_statuses(school)
 
-        qs = _base_payments_qs(school)
-        qs = _apply_filters(qs, request.query_params)
-
         fmt = request.query_params.get("export_format", "csv")
+        params = request.query_params.dict()
 
-        if fmt == "csv":
-            return self._csv_response(qs)
+        if fmt in ("csv", "xlsx"):
+            filename = f"paiements.{fmt}"
+            if params.get("async") == "true":
+                return start_export_job(
+                    "finance_payments", request, school, params, fmt, filename
+                )
+            sheets = payment_export_sheets(school, params)
+            if fmt == "csv":
+                return csv_response(filename, sheets[0])
+            return xlsx_response(filename, sheets)
         elif fmt == "pdf":
+            qs = _apply_filters(_base_payments_qs(school), request.query_params)
             return self._pdf_response(qs)
         return Response(
             {
-                "error": "Format not supported. Use ?export_format=csv or ?export_format=pdf"
+                "error": "Format not supported. Use ?export_format=csv, "
+                "?export_format=xlsx or ?export_format=pdf"
             },
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    def _csv_response(self, qs):
-        response = HttpResponse(content_type="text/csv; charset=utf-8")
-        response["Content-Disposition"] = 'attachment; filename="paiements.csv"'
-        response.write("\ufeff")  # BOM for Excel
-
-        writer = csv.writer(response)
-        writer.writerow(
-            [
-                "Élève",
-                "Classe",
-                "Type",
-                "Montant (DA)",
-                "Méthode",
-                "Date de paiement",
-                "Période début",
-                "Période fin",
-                "Statut",
-                "N° Reçu",
-            ]
-        )
-        for p in qs:
-            profile = getattr(p.student, "student_profile", None)
-            cls = (
-                profile.current_class.name if profile and profile.current_class else ""
-            )
-            writer.writerow(
-                [
-                    p.student.full_name,
-                    cls,
-                    p.get_payment_type_display(),
-                    str(p.amount_paid),
-                    p.get_payment_method_display(),
-                    p.payment_date.strftime("%d/%m/%Y") if p.payment_date else "",
-                    p.period_start.strftime("%d/%m/%Y") if p.period_start else "",
-                    p.period_end.strftime("%d/%m/%Y") if p.period_end else "",
-                    p.get_status_display(),
-                    p.receipt_number,
-                ]
-            )
-        return response
-
     def _pdf_response(self, qs):
         # Simple HTML table rendered as PDF via browser print
         html = (
@@ -669,6 +621,52 @@ tr:nth-child(even){background:#f9fafb}
         return response
 
 
+def payment_export_sheets(school, params) -> list:
+    """
+    Export builder (core.exports) for the payments of a school, filtered
+    like the payments list; rows are read chunk by chunk.
+    """
+    qs = _apply_filters(_base_payments_qs(school), params)
+
+    def rows():
+        for p in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            profile = getattr(p.student, "student_profile", None)
+            cls = (
+                profile.current_class.name if profile and profile.current_class else ""
+            )
+            yield [
+                p.student.full_name,
+                cls,
+                p.get_payment_type_display(),
+                str(p.amount_paid),
+                p.get_payment_method_display(),
+                p.payment_date.strftime("%d/%m/%Y") if p.payment_date else "",
+                p.period_start.strftime("%d/%m/%Y") if p.period_start else "",
+                p.period_end.strftime("%d/%m/%Y") if p.period_end else "",
+                p.get_status_display(),
+                p.receipt_number,
+            ]
+
+    return [
+        Sheet(
+            title="Paiements",
+            columns=[
+                ("Élève", 30),
+                ("Classe", 15),
+                ("Type", 15),
+                ("Montant (DA)", 14),
+                ("Méthode", 15),
+                ("Date de paiement", 16),
+                ("Période début", 14),
+                ("Période fin", 14),
+                ("Statut", 12),
+                ("N° Reçu", 18),
+            ],
+            rows=rows(),
+        )
+    ]
+
+
 # =========================================================================
 # PDF Receipt Download
 # =========================================================================
@@ -833,21 +831,12 @@ class FeeEnrollmentStatsView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSchoolAdmin]
 
     def get(self, request):
-        school = request.user.school
-        qs = StudentFeeEnrollment.objects.filter(school=school, is_deleted=False)
-
-        # Refresh statuses
-        for e in qs:
-            e.refresh_totals(commit=True)
-
-        total = qs.count()
-        paid = qs.filter(status="PAID").count()
-        partial = qs.filter(status="PARTIAL").count()
-        unpaid = qs.filter(status="UNPAID").count()
-        late = qs.filter(status="LATE").count()
-
-        total_due = qs.aggregate(s=Sum("total_due"))["s"] or 0
-        total_collected = qs.aggregate(s=Sum("total_paid"))["s"] or 0
+        stats = metrics.enrollment_stats(request.user.school)
+        total = stats["total"]
+        paid, partial = stats["paid"], stats["partial"]
+        unpaid, late = stats["unpaid"], stats["late"]
+        total_due = stats["total_due"]
+        total_collected = stats["total_collected"]
 
         return Response(
             {
@@ -1353,7 +1342,14 @@ class PaySlipPDFView(APIView):
 
 @require_module("finance")
 class PaySlipBulkGenerateView(APIView):
-    """Generate payslips for all teachers in the school for a given month."""
+    """
+    Generate payslips for all teachers in the school for a given month.
+
+    Runs inline for small schools (201 with the created references);
+    with ``async=true`` or more than PAYROLL_SYNC_MAX salary configs the
+    run becomes a background job (202 with its status URL). A period
+    already being generated for the school is not started twice.
+    """
 
     permission_classes = [permissions.IsAuthenticated, IsSchoolAdmin]
 
@@ -1368,34 +1364,55 @@ class PaySlipBulkGenerateView(APIView):
         month, year = int(month), int(year)
         school = request.user.school
 
-        from .payroll_service import compute_payslip
+        from .payroll_run import PAYROLL_SYNC_MAX, run_payroll, start_payroll_job
 
-        configs = SalaryConfig.objects.filter(
-            school=school, is_deleted=False
-        ).select_related("teacher")
-
-        created = []
-        skipped = []
-        for config in configs:
-            if PaySlip.objects.filter(
-                teacher=config.teacher, month=month, year=year, is_deleted=False
-            ).exists():
-                skipped.append(config.teacher.full_name)
-                continue
-            ps = compute_payslip(config, month, year, school)
-            created.append(ps.reference)
+        configs = SalaryConfig.objects.filter(school=school, is_deleted=False)
+        run_async = str(request.data.get("async", "")).lower() == "true"
+        if run_async or configs.count() > PAYROLL_SYNC_MAX:
+            task_id, started = start_payroll_job(school, month, year, request.user)
+            return Response(
+                {
+                    "task_id": task_id,
+                    "status": "started" if started else "running",
+                    "status_url": f"/api/v1/finance/payslips/bulk-generate/{task_id}/",
+                    "message": "Génération des fiches de paie lancée."
+                    if started
+                    else "Génération déjà en cours pour cette période.",
+                },
+                status=status.HTTP_202_ACCEPTED,
+            )
 
+        result = run_payroll(school, month, year, configs=configs.select_related("teacher"))
+        created = [ps.reference for ps in result["payslips"]]
         return Response(
             {
                 "created_count": len(created),
                 "created_references": created,
-                "skipped_count": len(skipped),
-                "skipped_teachers": skipped,
+                "skipped_count": len(result["skipped"]),
+                "skipped_teachers": result["skipped"],
             },
             status=status.HTTP_201_CREATED,
         )
 
 
+@require_module("finance")
+class PayrollRunStatusView(APIView):
+    """GET /payslips/bulk-generate/{task_id}/ — progress of a payroll job."""
+
+    permission_classes = [permissions.IsAuthenticated, IsSchoolAdmin]
+
+    def get(self, request, task_id):
+        from .payroll_run import job_status
+
+        job = job_status(task_id)
+        if job is None or job.get("school_id") != str(request.user.school_id):
+            return Response(
+                {"status": "unknown", "message": "Tâche non trouvée ou expirée."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response({k: v for k, v in job.items() if k not in ("user_id", "school_id")})
+
+
 @require_module("finance")
 class PayrollStatsView(APIView):
     """Payroll dashboard stats for a given month/year."""
@@ -1407,28 +1424,19 @@ class PayrollStatsView(APIView):
         year = int(request.query_params.get("year", datetime.date.today().year))
         month = int(request.query_params.get("month", datetime.date.today().month))
 
-        qs = PaySlip.objects.filter(
-            school=school, year=year, month=month, is_deleted=False
-        )
-        total_slips = qs.count()
-        total_gross = qs.aggregate(s=Sum("gross_salary"))["s"] or 0
-        total_net = qs.aggregate(s=Sum("net_salary"))["s"] or 0
-        total_deductions = qs.aggregate(s=Sum("total_deductions"))["s"] or 0
-        draft = qs.filter(status="DRAFT").count()
-        validated = qs.filter(status="VALIDATED").count()
-        paid = qs.filter(status="PAID").count()
+        stats = metrics.payroll_stats(school, month, year)
 
         return Response(
             {
                 "year": year,
                 "month": month,
-                "total_payslips": total_slips,
-                "total_gross": total_gross,
-                "total_net": total_net,
-                "total_deductions": total_deductions,
-                "draft": draft,
-                "validated": validated,
-                "paid": paid,
+                "total_payslips": stats["total_payslips"],
+                "total_gross": stats["total_gross"],
+                "total_net": stats["total_net"],
+                "total_deductions": stats["total_deductions"],
+                "draft": stats["draft"],
+                "validated": stats["validated"],
+                "paid": stats["paid"],
             }
         )
 
@@ -1951,59 +1959,42 @@ class FinancialReportView(APIView):
         total_payroll = payroll_qs.aggregate(s=Sum("net_salary"))["s"] or 0
 
         # Unpaid
-        unpaid_count = StudentFeeEnrollment.objects.filter(
+        unpaid = StudentFeeEnrollment.objects.filter(
             school=school,
             is_deleted=False,
             status__in=["UNPAID", "LATE"],
-        ).count()
-        unpaid_amount = (
-            StudentFeeEnrollment.objects.filter(
+        ).aggregate(count=Count("id"), due=Sum("total_due"), paid=Sum("total_paid"))
+        unpaid_count = unpaid["count"]
+        unpaid_amount = unpaid["due"] or 0
+        paid_amount = unpaid["paid"] or 0
+
+        # Monthly breakdown for the year — revenue from the cached series,
+        # expenses and payroll grouped by month
+        expenses_by_month = dict(
+            Expense.objects.filter(
                 school=school,
                 is_deleted=False,
-                status__in=["UNPAID", "LATE"],
-            ).aggregate(s=Sum("total_due"))["s"]
-            or 0
+                status="APPROVED",
+                expense_date__year=year,
+            )
+            .annotate(m=ExtractMonth("expense_date"))
+            .values("m")
+            .annotate(s=Sum("amount"))
+            .order_by()
+            .values_list("m", "s")
         )
-        paid_amount = (
-            StudentFeeEnrollment.objects.filter(
-                school=school,
-                is_deleted=False,
-                status__in=["UNPAID", "LATE"],
-            ).aggregate(s=Sum("total_paid"))["s"]
-            or 0
+        payroll_by_month = dict(
+            PaySlip.objects.filter(school=school, is_deleted=False, year=year)
+            .values("month")
+            .annotate(s=Sum("net_salary"))
+            .order_by()
+            .values_list("month", "s")
         )
-
-        # Monthly breakdown for the year
         monthly = []
-        for m in range(1, 13):
-            rev = (
-                StudentPayment.objects.filter(
-                    school=school,
-                    is_deleted=False,
-                    payment_date__year=year,
-                    payment_date__month=m,
-                ).aggregate(s=Sum("amount_paid"))["s"]
-                or 0
-            )
-            exp = (
-                Expense.objects.filter(
-                    school=school,
-                    is_deleted=False,
-                    status="APPROVED",
-                    expense_date__year=year,
-                    expense_date__month=m,
-                ).aggregate(s=Sum("amount"))["s"]
-                or 0
-            )
-            pay = (
-                PaySlip.objects.filter(
-                    school=school,
-                    is_deleted=False,
-                    year=year,
-                    month=m,
-                ).aggregate(s=Sum("net_salary"))["s"]
-                or 0
-            )
+        for row in metrics.monthly_revenue(school, year):
+            m, rev = row["month"], row["revenue"]
+            exp = expenses_by_month.get(m) or 0
+            pay = payroll_by_month.get(m) or 0
             monthly.append(
                 {
                     "month": m,
@@ -2033,3 +2024,22 @@ class FinancialReportView(APIView):
                 "monthly_breakdown": monthly,
             }
         )
+
+
+@require_module("finance")
+class RevenueSeriesView(APIView):
+    """Monthly revenue of a year for the dashboard charts (cached)."""
+
+    permission_classes = [permissions.IsAuthenticated, IsSchoolAdmin]
+
+    def get(self, request):
+        try:
+            year = int(request.query_params.get("year", timezone.now().year))
+        except ValueError:
+            return Response(
+                {"error": "year must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            {"year": year, "results": metrics.monthly_revenue(request.user.school, year)}
+        )
@@ -4,12 +4,14 @@
 ║                                                                        ║
 ║  log_grade_action() — single entry-point for all audit events.         ║
 ║  Extracts IP from request, resolves ContentType, fills context.        ║
+║  log_grade_actions() — same, for a batch of events in one INSERT.      ║
 ╚══════════════════════════════════════════════════════════════════════════╝
 """
 
 import logging
 
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 
 from .models import GradeAuditLog
 
@@ -84,3 +86,51 @@ def log_grade_action(
         logger.exception(
             "Failed to write audit log: action=%s instance=%s", action, instance.pk
         )
+
+
+def log_grade_actions(
+    entries: list[dict],
+    *,
+    performed_by=None,
+    request=None,
+):
+    """
+    Create many GradeAuditLog entries with a single bulk INSERT.
+
+    Each entry is a dict with the keyword arguments of log_grade_action()
+    (action, instance, student, old_value, new_value, reason, subject_name,
+    exam_name, trimester); performed_by and request apply to the batch.
+    """
+    if not entries:
+        return
+    try:
+        ip_address = _get_client_ip(request)
+        content_types = {}
+        logs = []
+        for entry in entries:
+            instance = entry["instance"]
+            model = type(instance)
+            if model not in content_types:
+                content_types[model] = ContentType.objects.get_for_model(instance)
+            logs.append(
+                GradeAuditLog(
+                    action=entry["action"],
+                    performed_by=performed_by,
+                    content_type=content_types[model],
+                    object_id=instance.pk,
+                    student=entry.get("student"),
+                    old_value=entry.get("old_value"),
+                    new_value=entry.get("new_value"),
+                    reason=entry.get("reason", ""),
+                    subject_name=entry.get("subject_name", ""),
+                    exam_name=entry.get("exam_name", ""),
+                    trimester=entry.get("trimester"),
+                    ip_address=ip_address,
+                )
+            )
+        # Savepoint: a failed audit insert must not break the caller's
+        # transaction (the grades it describes are still saved).
+        with transaction.atomic():
+            GradeAuditLog.objects.bulk_create(logs, batch_size=500)
+    except Exception:
+        logger.exception("Failed to write audit log batch (%d entries)", len(entries))
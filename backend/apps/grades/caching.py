@@ -0,0 +1,134 @@
+"""
+╔══════════════════════════════════════════════════════════════════════════╗
+║  Grades — Lookup caches                                                ║
+║                                                                        ║
+║  Read-mostly reference data shared by the grade services and the      ║
+║  report-card tasks, stored in Redis (Django cache):                    ║
+║                                                                        ║
+║    coefficient_map()  {subject_id: coefficient}                        ║
+║                       per (school, level, stream)                      ║
+║    exam_type_map()    [ExamType rows with percentage / max_score]      ║
+║                       per (classroom, academic_year, trimester)        ║
+║                                                                        ║
+║  Invalidated by the LevelSubject / ExamType signals (signals.py).      ║
+╚══════════════════════════════════════════════════════════════════════════╝
+"""
+
+import logging
+from decimal import Decimal
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Entries are invalidated on write; the TTL is only a safety net.
+LOOKUP_CACHE_TTL = 60 * 60 * 24  # 24 hours
+
+DEFAULT_COEFFICIENT = Decimal("1")
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Coefficients — LevelSubject per (school, level, stream)
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def _coefficient_key(school_id, level_id, stream_id) -> str:
+    return f"grades_coefficients_{school_id}_{level_id}_{stream_id or 'none'}"
+
+
+def coefficient_map(classroom) -> dict:
+    """
+    Return {subject_id: coefficient} for the classroom's level/stream.
+
+    Stream-specific LevelSubject rows win over stream-less ones (CEM /
+    primaire, tronc commun). Subjects without a LevelSubject are absent:
+    callers default them to DEFAULT_COEFFICIENT.
+    """
+    key = _coefficient_key(classroom.school_id, classroom.level_id, classroom.stream_id)
+    coefficients = cache.get(key)
+    if coefficients is not None:
+        return coefficients
+
+    from apps.academics.models import LevelSubject
+
+    rows = LevelSubject.objects.filter(level_id=classroom.level_id).values_list(
+        "subject_id", "stream_id", "coefficient"
+    )
+
+    coefficients = {}
+    fallback = {}
+    for subject_id, stream_id, coefficient in rows:
+        if stream_id is None:
+            fallback[subject_id] = coefficient
+        if stream_id == classroom.stream_id:
+            coefficients[subject_id] = coefficient
+    for subject_id, coefficient in fallback.items():
+        coefficients.setdefault(subject_id, coefficient)
+
+    cache.set(key, coefficients, timeout=LOOKUP_CACHE_TTL)
+    return coefficients
+
+
+def invalidate_coefficient_map(level_subject) -> None:
+    """
+    Drop the cached coefficients affected by a LevelSubject change.
+
+    A stream-less row is the fallback of every stream of the level, so
+    all of the level's entries are dropped in that case.
+    """
+    from apps.academics.models import Stream
+
+    if level_subject.stream_id:
+        stream_ids = [level_subject.stream_id]
+    else:
+        stream_ids = [None, *Stream.objects.filter(
+            level_id=level_subject.level_id
+        ).values_list("id", flat=True)]
+
+    cache.delete_many(
+        [
+            _coefficient_key(level_subject.school_id, level_subject.level_id, s)
+            for s in stream_ids
+        ]
+    )
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Exam types — ExamType per (classroom, academic_year, trimester)
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def _exam_type_key(classroom_id, academic_year_id, trimester) -> str:
+    return f"grades_exam_types_{classroom_id}_{academic_year_id}_T{trimester}"
+
+
+def exam_type_map(classroom_id, academic_year_id, trimester: int) -> list[dict]:
+    """
+    Return the ExamTypes of a classroom/trimester as dicts with id,
+    subject_id, name, percentage and max_score (ExamType ordering).
+    """
+    key = _exam_type_key(classroom_id, academic_year_id, trimester)
+    exam_types = cache.get(key)
+    if exam_types is not None:
+        return exam_types
+
+    from apps.grades.models import ExamType
+
+    exam_types = list(
+        ExamType.objects.filter(
+            classroom_id=classroom_id,
+            academic_year_id=academic_year_id,
+            trimester=trimester,
+        ).values("id", "subject_id", "name", "percentage", "max_score")
+    )
+    cache.set(key, exam_types, timeout=LOOKUP_CACHE_TTL)
+    return exam_types
+
+
+def invalidate_exam_type_map(exam_type) -> None:
+    """Drop the cached ExamType list of the exam type's classroom/trimester."""
+    cache.delete(
+        _exam_type_key(
+            exam_type.classroom_id, exam_type.academic_year_id, exam_type.trimester
+        )
+    )
@@ -0,0 +1,217 @@
+"""
+Management command: benchmark_rankings
+
+Compares the two ranking paths of grades.services.calculate_rankings on a
+synthetic lycée section (3 levels × 2 filières, ~50 élèves par classe):
+
+  - python : legacy Python sort + bulk_update of every row (4 passes)
+  - window : DENSE_RANK() OVER (PARTITION BY …) in one query,
+             only rows whose rank changed are written
+
+Two scenarios per path:
+  - cold   : no rank set yet (first ranking of the trimester)
+  - edit   : one student's average changed (typical grade cascade)
+
+Everything is created inside a transaction that is rolled back at the end,
+so the command is safe to run against a development database.
+
+Usage:
+  python manage.py benchmark_rankings
+  python manage.py benchmark_rankings --students 5000 --class-size 40
+"""
+
+import random
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+RANK_FIELDS = ["rank_in_class", "rank_in_stream", "rank_in_level", "rank_in_section"]
+
+
+class Command(BaseCommand):
+    help = "Benchmark window-function ranking against the legacy Python ranking."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--students",
+            type=int,
+            default=2000,
+            help="Number of students in the seeded section (default: 2000).",
+        )
+        parser.add_argument(
+            "--class-size",
+            type=int,
+            default=50,
+            help="Students per class (default: 50).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=42,
+            help="Random seed for the generated averages.",
+        )
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+
+        with transaction.atomic():
+            classroom, year, rows = self._seed(
+                options["students"], options["class_size"]
+            )
+            self.stdout.write(
+                f"\n📊 Seeded section: {len(rows)} élèves, "
+                f"{options['students'] // options['class_size'] or 1} classes\n"
+            )
+
+            results = {}
+            snapshots = {}
+            for method in ("python", "window"):
+                self._reset_ranks(year)
+                results[(method, "cold")] = self._run(method, classroom, year)
+                if method == "window":
+                    # Same data as the python "edit" run just before
+                    snapshots[method] = self._snapshot(classroom, year)
+
+                self._bump_one(rows)
+                results[(method, "edit")] = self._run(method, classroom, year)
+                if method == "python":
+                    snapshots[method] = self._snapshot(classroom, year)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"  {'path':<8}{'scenario':<10}{'time (ms)':>12}{'queries':>10}")
+        for (method, scenario), (elapsed, queries) in results.items():
+            self.stdout.write(
+                f"  {method:<8}{scenario:<10}{elapsed * 1000:>12.1f}{queries:>10}"
+            )
+
+        if snapshots["python"] == snapshots["window"]:
+            self.stdout.write(self.style.SUCCESS("\n  ✅ Both paths produce identical ranks for the class"))
+        else:
+            self.stdout.write(self.style.ERROR("\n  ❌ Rank mismatch between paths"))
+
+    # ── helpers ─────────────────────────────────────────────────────────
+
+    def _run(self, method, classroom, year):
+        from apps.grades.services import calculate_rankings
+
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            calculate_rankings(classroom.pk, year.pk, 1, method=method)
+            elapsed = time.perf_counter() - start
+        return elapsed, len(ctx.captured_queries)
+
+    def _reset_ranks(self, year):
+        from apps.grades.models import TrimesterAverage
+
+        TrimesterAverage.objects.filter(academic_year=year).update(
+            **{field: None for field in RANK_FIELDS}
+        )
+
+    def _snapshot(self, classroom, year):
+        # The python path only ranks the benchmarked class (and its
+        # stream/level), while one window pass re-ranks the whole section:
+        # compare on the rows both paths write.
+        from apps.grades.models import TrimesterAverage
+
+        return {
+            row[0]: row[1:]
+            for row in TrimesterAverage.objects.filter(
+                classroom=classroom, academic_year=year
+            ).values_list("pk", *RANK_FIELDS)
+        }
+
+    def _bump_one(self, rows):
+        from apps.grades.models import TrimesterAverage
+
+        target = random.choice(rows)
+        TrimesterAverage.objects.filter(pk=target.pk).update(
+            calculated_average=Decimal(random.randint(0, 2000)) / 100
+        )
+
+    def _seed(self, n_students, class_size):
+        from apps.academics.models import Class, Level, StudentProfile, Stream
+        from apps.accounts.models import User
+        from apps.grades.models import TrimesterAverage
+        from apps.schools.models import AcademicYear, School, Section
+
+        tag = random.randint(10**5, 10**6 - 1)
+        school = School.objects.create(
+            name="Benchmark Rankings", subdomain=f"bench-{tag}"
+        )
+        section = Section.objects.create(
+            school=school, section_type=Section.SectionType.HIGH, name="Lycée"
+        )
+        year = AcademicYear.objects.create(
+            school=school,
+            section=section,
+            name="2025-2026",
+            start_date=date(2025, 9, 1),
+            end_date=date(2026, 6, 30),
+        )
+
+        groups = []
+        for order, code in enumerate(("1AS", "2AS", "3AS"), start=1):
+            level = Level.objects.create(
+                school=school, section=section, name=code, code=code, order=order,
+                has_streams=True,
+            )
+            for stream_code in ("SCI", "LPH"):
+                stream = Stream.objects.create(
+                    school=school, level=level, name=stream_code, code=stream_code
+                )
+                groups.append((level, stream))
+
+        n_classes = max(1, n_students // class_size)
+        classes = Class.objects.bulk_create(
+            [
+                Class(
+                    school=school,
+                    section=section,
+                    academic_year=year,
+                    level=groups[i % len(groups)][0],
+                    stream=groups[i % len(groups)][1],
+                    name=f"{groups[i % len(groups)][0].code}-{i + 1}",
+                )
+                for i in range(n_classes)
+            ]
+        )
+
+        users = User.objects.bulk_create(
+            [
+                User(
+                    phone_number=f"b{tag}{i:07d}",
+                    password="!",
+                    first_name=f"Eleve{i}",
+                    last_name="Bench",
+                    role=User.Role.STUDENT,
+                    school=school,
+                )
+                for i in range(n_students)
+            ]
+        )
+        students = StudentProfile.objects.bulk_create(
+            [
+                StudentProfile(user=user, current_class=classes[i % n_classes])
+                for i, user in enumerate(users)
+            ]
+        )
+        rows = TrimesterAverage.objects.bulk_create(
+            [
+                TrimesterAverage(
+                    student=student,
+                    classroom=student.current_class,
+                    academic_year=year,
+                    trimester=1,
+                    # 2 decimals on a /20 scale → realistic amount of ties
+                    calculated_average=Decimal(random.randint(0, 2000)) / 100,
+                )
+                for student in students
+            ],
+            batch_size=1000,
+        )
+        return classes[0], year, rows
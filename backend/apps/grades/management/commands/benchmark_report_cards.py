@@ -0,0 +1,132 @@
+"""
+Management command: benchmark_report_cards
+
+Measures the per-bulletin render time of one class, before and after the
+class batch renderer (apps.grades.report_cards):
+
+  - per-student : data loaded and template/stylesheet/fonts compiled again
+                  for every bulletin (former generate_report_card_pdf path)
+  - batch       : one ReportCardBatch for the class + one compiled
+                  ReportCardRenderer reused for every bulletin
+
+PDFs are rendered in memory only: nothing is uploaded and no ReportCard
+is written, so the command is safe to run against real data.
+
+Usage:
+  python manage.py benchmark_report_cards --class-id <uuid>
+  python manage.py benchmark_report_cards --class-id <uuid> --trimester 2 --limit 10
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-student vs batched report card PDF rendering."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--class-id",
+            type=str,
+            required=True,
+            help="UUID of the class to render.",
+        )
+        parser.add_argument(
+            "--academic-year-id",
+            type=str,
+            default=None,
+            help="UUID of the academic year (default: the class's year).",
+        )
+        parser.add_argument(
+            "--trimester",
+            type=int,
+            default=1,
+            choices=[1, 2, 3],
+            help="Trimester to render (default: 1).",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Only render the first N students of the class.",
+        )
+
+    def handle(self, *args, **options):
+        from apps.academics.models import Class
+        from apps.grades.report_cards import ReportCardBatch
+        from apps.schools.models import AcademicYear
+
+        try:
+            class_obj = Class.objects.select_related(
+                "section__school", "academic_year", "level", "stream"
+            ).get(pk=options["class_id"])
+        except Class.DoesNotExist:
+            raise CommandError(f"Class with ID {options['class_id']} does not exist.")
+
+        academic_year = class_obj.academic_year
+        if options["academic_year_id"]:
+            academic_year = AcademicYear.objects.get(pk=options["academic_year_id"])
+        trimester = options["trimester"]
+
+        students = ReportCardBatch(class_obj, academic_year, trimester).students
+        if options["limit"]:
+            students = students[: options["limit"]]
+        if not students:
+            raise CommandError(f"No students in class {class_obj.name}.")
+
+        self.stdout.write(
+            f"\n📄 {class_obj.name} — T{trimester} ({academic_year.name}): "
+            f"{len(students)} bulletins\n"
+        )
+
+        results = {
+            "per-student": self._run_per_student(
+                class_obj, academic_year, trimester, students
+            ),
+            "batch": self._run_batch(class_obj, academic_year, trimester, students),
+        }
+
+        self.stdout.write(
+            f"  {'path':<13}{'total (s)':>11}{'ms/bulletin':>14}{'queries':>10}"
+        )
+        for path, (elapsed, queries) in results.items():
+            self.stdout.write(
+                f"  {path:<13}{elapsed:>11.2f}"
+                f"{elapsed * 1000 / len(students):>14.1f}{queries:>10}"
+            )
+
+        before = results["per-student"][0]
+        after = results["batch"][0]
+        if after > 0:
+            self.stdout.write(self.style.SUCCESS(f"\n  ✅ Speed-up: ×{before / after:.1f}"))
+
+    # ── paths ───────────────────────────────────────────────────────────
+
+    def _run_per_student(self, class_obj, academic_year, trimester, students):
+        from apps.grades.report_cards import ReportCardBatch, ReportCardRenderer
+
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            for student in students:
+                batch = ReportCardBatch(
+                    class_obj, academic_year, trimester, students=[student]
+                )
+                renderer = ReportCardRenderer()
+                renderer.render(batch.context(student, batch.report_card(student)))
+            elapsed = time.perf_counter() - start
+        return elapsed, len(ctx.captured_queries)
+
+    def _run_batch(self, class_obj, academic_year, trimester, students):
+        from apps.grades.report_cards import ReportCardBatch, ReportCardRenderer
+
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            batch = ReportCardBatch(class_obj, academic_year, trimester, students=students)
+            renderer = ReportCardRenderer()
+            for student in batch.students:
+                renderer.render(batch.context(student, batch.report_card(student)))
+            elapsed = time.perf_counter() - start
+        return elapsed, len(ctx.captured_queries)
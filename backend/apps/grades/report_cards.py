@@ -0,0 +1,258 @@
+"""
+╔══════════════════════════════════════════════════════════════════════════╗
+║  Grades — Report card (bulletin) rendering                             ║
+║                                                                        ║
+║  ReportCardBatch     — all data for a class's bulletins, loaded in a   ║
+║                        fixed number of queries (not per student)       ║
+║  ReportCardRenderer  — template + stylesheet + fonts compiled once     ║
+║                        per worker process, reused for every PDF        ║
+║  render_report_cards — render, upload and upsert ReportCard rows       ║
+╚══════════════════════════════════════════════════════════════════════════╝
+"""
+
+import logging
+from collections import defaultdict
+from functools import lru_cache
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template.loader import get_template, render_to_string
+
+from apps.grades.caching import DEFAULT_COEFFICIENT, coefficient_map
+
+logger = logging.getLogger(__name__)
+
+REPORT_CARD_TEMPLATE = "grades/report_card.html"
+REPORT_CARD_STYLESHEET = "grades/report_card.css"
+
+
+def report_card_storage_path(school_id, academic_year_name, trimester, student) -> str:
+    return (
+        f"report_cards/{school_id}/"
+        f"{academic_year_name}/T{trimester}/"
+        f"{student.user.last_name}_{student.user.first_name}_{student.pk}.pdf"
+    )
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Data loading
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+class ReportCardBatch:
+    """
+    Prefetch everything the bulletins of one class need: students,
+    SubjectAverages, TrimesterAverages, coefficients and existing
+    ReportCards (comments).
+
+    ``students`` restricts the batch (e.g. a single student); by default
+    every active student of the class is included.
+    """
+
+    def __init__(self, class_obj, academic_year, trimester: int, students=None):
+        from apps.academics.models import StudentProfile
+        from apps.grades.models import ReportCard, SubjectAverage, TrimesterAverage
+
+        self.class_obj = class_obj
+        self.school = class_obj.section.school
+        self.academic_year = academic_year
+        self.trimester = trimester
+
+        class_students = (
+            StudentProfile.objects.filter(
+                current_class=class_obj,
+                is_deleted=False,
+            )
+            .select_related("user")
+            .order_by("user__last_name", "user__first_name")
+        )
+        if students is None:
+            self.students = list(class_students)
+            self.total_students = len(self.students)
+        else:
+            self.students = list(students)
+            self.total_students = class_students.count()
+
+        student_ids = [s.pk for s in self.students]
+        coefficients = coefficient_map(class_obj)
+
+        self.subject_rows = defaultdict(list)
+        for sa in (
+            SubjectAverage.objects.filter(
+                student_id__in=student_ids,
+                classroom=class_obj,
+                academic_year=academic_year,
+                trimester=trimester,
+            )
+            .select_related("subject")
+            .order_by("subject__name")
+        ):
+            self.subject_rows[sa.student_id].append(
+                {
+                    "name": sa.subject.name,
+                    "coefficient": coefficients.get(sa.subject_id, DEFAULT_COEFFICIENT),
+                    "average": sa.effective_average,
+                }
+            )
+
+        self.trimester_averages = {
+            ta.student_id: ta
+            for ta in TrimesterAverage.objects.filter(
+                student_id__in=student_ids,
+                classroom=class_obj,
+                academic_year=academic_year,
+                trimester=trimester,
+            )
+        }
+        self.report_cards = {
+            rc.student_id: rc
+            for rc in ReportCard.objects.filter(
+                student_id__in=student_ids,
+                academic_year=academic_year,
+                trimester=trimester,
+            )
+        }
+
+    def report_card(self, student):
+        """Existing ReportCard of the student, or an unsaved one."""
+        from apps.grades.models import ReportCard
+
+        report_card = self.report_cards.get(student.pk)
+        if report_card is None:
+            report_card = ReportCard(
+                student=student,
+                academic_year=self.academic_year,
+                trimester=self.trimester,
+            )
+        trim_avg = self.trimester_averages.get(student.pk)
+        report_card.class_obj = self.class_obj
+        report_card.general_average = trim_avg.effective_average if trim_avg else None
+        report_card.rank = trim_avg.rank_in_class if trim_avg else None
+        report_card.total_students = self.total_students
+        return report_card
+
+    def context(self, student, report_card) -> dict:
+        trim_avg = self.trimester_averages.get(student.pk)
+        return {
+            "school": self.school,
+            "student": student,
+            "student_user": student.user,
+            "class_obj": self.class_obj,
+            "academic_year": self.academic_year,
+            "trimester": self.trimester,
+            "subject_rows": self.subject_rows.get(student.pk, []),
+            "overall_average": report_card.general_average,
+            "rank": report_card.rank,
+            "appreciation": trim_avg.appreciation if trim_avg else "",
+            "total_students": self.total_students,
+            "admin_comment": report_card.admin_comment,
+            "teacher_comment": report_card.teacher_comment,
+        }
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Rendering
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+class ReportCardRenderer:
+    """
+    Compiled report card template, stylesheet and font configuration.
+
+    WeasyPrint parses the CSS and loads fonts once here instead of once
+    per document; use get_renderer() to share an instance per process.
+    """
+
+    def __init__(self):
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        self.template = get_template(REPORT_CARD_TEMPLATE)
+        self.font_config = FontConfiguration()
+        self.stylesheet = CSS(
+            string=render_to_string(REPORT_CARD_STYLESHEET),
+            font_config=self.font_config,
+        )
+
+    def render(self, context: dict) -> bytes:
+        from weasyprint import HTML
+
+        html_content = self.template.render(context)
+        return HTML(string=html_content, base_url="").write_pdf(
+            stylesheets=[self.stylesheet],
+            font_config=self.font_config,
+        )
+
+
+@lru_cache(maxsize=1)
+def get_renderer() -> ReportCardRenderer:
+    return ReportCardRenderer()
+
+
+def render_report_cards(batch: ReportCardBatch, on_rendered=None) -> list[dict]:
+    """
+    Render, upload and record the bulletin of every student of ``batch``.
+
+    A failing student does not stop the batch: its result carries the
+    exception instead of a path/url. ``on_rendered(result)`` is called
+    after each student (progress reporting). ReportCard rows are upserted
+    in bulk at the end, including when the loop is interrupted.
+
+    Returns one {"student", "path", "url", "error"} dict per student.
+    """
+    from apps.grades.models import ReportCard
+
+    renderer = get_renderer()
+    results = []
+    to_save = []
+
+    try:
+        for student in batch.students:
+            result = {"student": student, "path": None, "url": None, "error": None}
+            try:
+                report_card = batch.report_card(student)
+                pdf_bytes = renderer.render(batch.context(student, report_card))
+
+                result["path"] = default_storage.save(
+                    report_card_storage_path(
+                        batch.school.pk, batch.academic_year.name, batch.trimester, student
+                    ),
+                    ContentFile(pdf_bytes),
+                )
+                result["url"] = default_storage.url(result["path"])
+                report_card.pdf_url = result["url"]
+                to_save.append(report_card)
+            except Exception as exc:
+                result["error"] = exc
+                logger.exception(
+                    "Report card rendering failed for student %s", student.pk
+                )
+
+            results.append(result)
+            if on_rendered is not None:
+                on_rendered(result)
+    finally:
+        if to_save:
+            ReportCard.objects.bulk_create(
+                to_save,
+                batch_size=200,
+                update_conflicts=True,
+                unique_fields=["student", "academic_year", "trimester"],
+                update_fields=[
+                    "class_obj",
+                    "general_average",
+                    "rank",
+                    "total_students",
+                    "pdf_url",
+                    "updated_at",
+                ],
+            )
+
+    logger.info(
+        "Report cards rendered — class=%s T%d: %d OK, %d errors",
+        batch.class_obj,
+        batch.trimester,
+        len(to_save),
+        len(results) - len(to_save),
+    )
+    return results
@@ -11,11 +11,12 @@
 ║  Public API:                                                           ║
 ║    1. calculate_subject_average   (single student/subject/trimester)   ║
 ║    2. calculate_trimester_average (single student/trimester)           ║
-║    3. calculate_rankings          (4-level dense ranking)              ║
+║    3. calculate_rankings          (4-level dense ranking, SQL window)  ║
 ║    4. recalculate_cascade         (atomic: subj → trim → rank → ann)  ║
 ║    5. admin_override_average      (manual override + audit log)        ║
 ║    6. lock_trimester / unlock_trimester                                ║
 ║    7. recalculate_classroom_trimester  (bulk for a whole class)        ║
+║    8. bulk_upsert_grades          (roster check + one upsert + audit)  ║
 ╚══════════════════════════════════════════════════════════════════════════╝
 """
 
@@ -25,10 +26,18 @@ import logging
 from decimal import ROUND_HALF_UP, Decimal
 from typing import Optional
 
-from django.db import transaction
-from django.db.models import QuerySet
+from django.db import connection, transaction
+from django.db.models import F, QuerySet, Window
+from django.db.models.functions import Coalesce, DenseRank
 from django.utils import timezone
 
+from apps.grades.caching import DEFAULT_COEFFICIENT, coefficient_map, exam_type_map
+from apps.grades.snapshots import (
+    invalidate_classroom_averages,
+    invalidate_student_averages,
+    rebuild_classroom_averages,
+)
+
 logger = logging.getLogger(__name__)
 
 
@@ -91,7 +100,7 @@ def calculate_subject_average(
     """
     from apps.academics.models import Class as Classroom
     from apps.academics.models import StudentProfile, Subject
-    from apps.grades.models import ExamType, Grade, SubjectAverage
+    from apps.grades.models import Grade, SubjectAverage
     from apps.schools.models import AcademicYear
 
     # ── Resolve entities (accept both UUID strings and model instances) ──
@@ -114,15 +123,14 @@ def calculate_subject_average(
             "Déverrouillez d'abord pour recalculer."
         )
 
-    # ── Fetch exam types for this combo ─────────────────────────────────
-    exam_types = ExamType.objects.filter(
-        subject=subject,
-        classroom=classroom,
-        academic_year=academic_year,
-        trimester=trimester,
-    )
+    # ── Fetch exam types for this combo (cached per classroom/trimester) ─
+    exam_types = [
+        et
+        for et in exam_type_map(classroom.pk, academic_year.pk, trimester)
+        if et["subject_id"] == subject.pk
+    ]
 
-    if not exam_types.exists():
+    if not exam_types:
         logger.debug(
             "No ExamType found for %s / %s / T%s — skipping",
             classroom,
@@ -131,11 +139,19 @@ def calculate_subject_average(
         )
         return None
 
+    grades = {
+        g.exam_type_id: g
+        for g in Grade.objects.filter(
+            student=student,
+            exam_type_id__in=[et["id"] for et in exam_types],
+        )
+    }
+
     weighted_sum = Decimal("0")
     total_percentage = Decimal("0")
 
     for et in exam_types:
-        grade = Grade.objects.filter(student=student, exam_type=et).first()
+        grade = grades.get(et["id"])
 
         if grade is None:
             # No grade entered yet for this exam type — skip it
@@ -148,13 +164,13 @@ def calculate_subject_average(
             continue
 
         # Normalise to /20 scale
-        if et.max_score and et.max_score > 0:
-            normalised = Decimal(str(effective)) * Decimal("20") / et.max_score
+        if et["max_score"] and et["max_score"] > 0:
+            normalised = Decimal(str(effective)) * Decimal("20") / et["max_score"]
         else:
             normalised = Decimal(str(effective))
 
-        weighted_sum += normalised * et.percentage
-        total_percentage += et.percentage
+        weighted_sum += normalised * et["percentage"]
+        total_percentage += et["percentage"]
 
     if total_percentage == 0:
         return None
@@ -259,13 +275,14 @@ def calculate_trimester_average(
 
     numerator = Decimal("0")
     denominator = Decimal("0")
+    coefficients = coefficient_map(classroom)
 
     for sa in subject_averages:
         avg = sa.effective_average
         if avg is None:
             continue
 
-        coeff = _get_coefficient(classroom, sa.subject)
+        coeff = coefficients.get(sa.subject_id, DEFAULT_COEFFICIENT)
         numerator += avg * coeff
         denominator += coeff
 
@@ -309,6 +326,8 @@ def calculate_rankings(
     classroom_id,
     academic_year_id,
     trimester: int,
+    *,
+    method: str = "window",
 ) -> None:
     """
     Calculer et mettre à jour les 4 classements pour tous les élèves :
@@ -322,7 +341,12 @@ def calculate_rankings(
        (Primaire OU CEM OU Lycée)
 
     En cas d'égalité de moyenne → même rang (dense ranking).
-    Utilise bulk_update pour la performance.
+
+    method="window" (défaut) : les 4 rangs sont calculés en une seule requête
+    SQL (DENSE_RANK() OVER (PARTITION BY …)) sur toute la section, et seules
+    les lignes dont un rang a changé sont réécrites.
+    method="python" : ancien chemin (tri Python + bulk_update de toutes les
+    lignes, 4 passes) — conservé pour le benchmark_rankings.
     """
     from apps.academics.models import Class as Classroom
     from apps.grades.models import TrimesterAverage
@@ -331,6 +355,39 @@ def calculate_rankings(
     classroom = _resolve(classroom_id, Classroom)
     academic_year = _resolve(academic_year_id, AcademicYear)
 
+    if method == "python":
+        _calculate_rankings_python(classroom, academic_year, trimester)
+        return
+
+    section_avgs = TrimesterAverage.objects.filter(
+        classroom__section_id=classroom.section_id,
+        academic_year=academic_year,
+        trimester=trimester,
+    )
+    updated = _window_assign_ranks(
+        section_avgs,
+        {
+            "rank_in_class": [F("classroom_id")],
+            # Only classes with a stream (lycée) get a rank_in_stream
+            "rank_in_stream": [F("classroom__level_id"), F("classroom__stream_id")],
+            "rank_in_level": [F("classroom__level_id")],
+            "rank_in_section": None,
+        },
+        nullable_partition={"rank_in_stream": "classroom__stream_id"},
+    )
+
+    logger.info(
+        "Rankings calculated for classroom=%s T%s (%d rows updated in section)",
+        classroom,
+        trimester,
+        updated,
+    )
+
+
+def _calculate_rankings_python(classroom, academic_year, trimester: int) -> None:
+    """Legacy ranking path: one Python sort + full bulk_update per scope."""
+    from apps.grades.models import TrimesterAverage
+
     # ── rank_in_class ─────────────────────────────────────────────────
     class_avgs = (
         TrimesterAverage.objects.filter(
@@ -382,8 +439,15 @@ def calculate_rankings(
 def calculate_annual_rankings(
     classroom_id,
     academic_year_id,
+    *,
+    method: str = "window",
 ) -> None:
-    """Rank students by their annual average within class and level."""
+    """
+    Rank students by their annual average within class and level.
+
+    Same two paths as calculate_rankings: "window" computes both ranks for
+    the whole level in one DENSE_RANK() query and writes only changed rows.
+    """
     from apps.academics.models import Class as Classroom
     from apps.grades.models import AnnualAverage
     from apps.schools.models import AcademicYear
@@ -391,17 +455,31 @@ def calculate_annual_rankings(
     classroom = _resolve(classroom_id, Classroom)
     academic_year = _resolve(academic_year_id, AcademicYear)
 
-    class_avgs = AnnualAverage.objects.filter(
-        classroom=classroom,
-        academic_year=academic_year,
-    ).order_by()
-    _assign_ranks(class_avgs, "rank_in_class")
+    if method == "python":
+        class_avgs = AnnualAverage.objects.filter(
+            classroom=classroom,
+            academic_year=academic_year,
+        ).order_by()
+        _assign_ranks(class_avgs, "rank_in_class")
+
+        level_avgs = AnnualAverage.objects.filter(
+            classroom__level=classroom.level,
+            academic_year=academic_year,
+        ).order_by()
+        _assign_ranks(level_avgs, "rank_in_level")
+        return
 
     level_avgs = AnnualAverage.objects.filter(
-        classroom__level=classroom.level,
+        classroom__level_id=classroom.level_id,
         academic_year=academic_year,
-    ).order_by()
-    _assign_ranks(level_avgs, "rank_in_level")
+    )
+    _window_assign_ranks(
+        level_avgs,
+        {
+            "rank_in_class": [F("classroom_id")],
+            "rank_in_level": None,
+        },
+    )
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -727,6 +805,7 @@ def lock_trimester(
         locked_at=now,
         locked_by=director_user,
     )
+    invalidate_classroom_averages(classroom.pk)
 
     logger.info(
         "LOCK_TRIMESTER: classroom=%s T%s | trimester_avgs=%d, subject_avgs=%d | by=%s",
@@ -831,6 +910,7 @@ def unlock_trimester(
         locked_at=None,
         locked_by=None,
     )
+    invalidate_classroom_averages(classroom.pk)
 
     logger.warning(
         "UNLOCK_TRIMESTER: classroom=%s T%s | reason='%s' | "
@@ -871,98 +951,334 @@ def recalculate_classroom_trimester(
       3. Recalculate rankings
       4. If all 3 trimesters have data → recalculate annual averages + rankings
 
+    Set-based: every Grade, ExamType, coefficient and existing average of the
+    classroom is loaded in a handful of queries, all averages are computed in
+    memory (same redistribution / ROUND_HALF_UP rules as the per-student
+    functions above) and written back with bulk upserts.
+
     Returns a summary dict with counts.
     """
     from apps.academics.models import Class as Classroom
     from apps.academics.models import StudentProfile
-    from apps.academics.models import Subject as AcademicSubject
-    from apps.grades.models import ExamType
     from apps.schools.models import AcademicYear
 
     classroom = _resolve(classroom_id, Classroom)
     academic_year = _resolve(academic_year_id, AcademicYear)
 
-    students = StudentProfile.objects.filter(
-        current_class=classroom,
-        is_deleted=False,
+    student_ids = list(
+        StudentProfile.objects.filter(
+            current_class=classroom,
+            is_deleted=False,
+        ).values_list("id", flat=True)
     )
 
-    # Discover all subjects taught in this classroom/trimester
-    subject_ids = (
-        ExamType.objects.filter(
+    with transaction.atomic():
+        subject_avg_count, subj_locked = _bulk_subject_averages(
+            classroom, academic_year, trimester, student_ids
+        )
+        trim_avg_count, trim_locked = _bulk_trimester_averages(
+            classroom, academic_year, trimester, student_ids
+        )
+
+        # Step 3: Rankings
+        calculate_rankings(classroom, academic_year, trimester)
+
+        # Step 4: Annual (if all 3 trimesters done)
+        annual_count, annual_locked = _bulk_annual_averages(
+            classroom, academic_year, student_ids
+        )
+        if annual_count > 0:
+            calculate_annual_rankings(classroom, academic_year)
+
+        # Bulk writes bypass the average signals: rebuild the class's
+        # averages snapshots once the new values are visible.
+        transaction.on_commit(
+            lambda: rebuild_classroom_averages(classroom.pk), robust=True
+        )
+
+    summary = {
+        "classroom": str(classroom),
+        "trimester": trimester,
+        "students": len(student_ids),
+        "subject_averages": subject_avg_count,
+        "trimester_averages": trim_avg_count,
+        "annual_averages": annual_count,
+        "locked_skipped": subj_locked + trim_locked + annual_locked,
+    }
+    logger.info("Recalculation complete: %s", summary)
+    return summary
+
+
+def _bulk_subject_averages(classroom, academic_year, trimester, student_ids):
+    """
+    Compute every SubjectAverage of a classroom/trimester in memory.
+
+    Mirrors calculate_subject_average(): missing grades are left out and
+    their percentage redistributed, absences count as 0, scores are
+    normalised to /20.  Locked rows are left untouched.
+
+    Returns (saved_count, locked_skipped).
+    """
+    from apps.grades.models import Grade, SubjectAverage
+
+    exam_types = exam_type_map(classroom.pk, academic_year.pk, trimester)
+    if not exam_types or not student_ids:
+        return 0, 0
+
+    grades = {
+        (g["student_id"], g["exam_type_id"]): g
+        for g in Grade.objects.filter(
+            exam_type_id__in=[et["id"] for et in exam_types],
+            student_id__in=student_ids,
+        ).values("student_id", "exam_type_id", "score", "is_absent")
+    }
+    locked = set(
+        SubjectAverage.objects.filter(
             classroom=classroom,
             academic_year=academic_year,
             trimester=trimester,
-        )
-        .values_list("subject", flat=True)
-        .distinct()
+            student_id__in=student_ids,
+            is_locked=True,
+        ).values_list("student_id", "subject_id")
     )
-    subject_objs = AcademicSubject.objects.filter(id__in=subject_ids)
 
-    subject_avg_count = 0
-    trim_avg_count = 0
+    subject_ids = list(dict.fromkeys(et["subject_id"] for et in exam_types))
+    now = timezone.now()
+    to_save = []
     locked_skipped = 0
 
-    for student in students:
-        # Step 1: Subject averages
-        for subj in subject_objs:
-            try:
-                result = calculate_subject_average(
-                    student,
-                    subj,
-                    classroom,
-                    academic_year,
-                    trimester,
-                    save=True,
-                )
-                if result is not None:
-                    subject_avg_count += 1
-            except LockedException:
+    for student_id in student_ids:
+        for subject_id in subject_ids:
+            if (student_id, subject_id) in locked:
                 locked_skipped += 1
+                continue
 
-        # Step 2: Trimester average
-        try:
-            result = calculate_trimester_average(
-                student,
-                classroom,
-                academic_year,
-                trimester,
-                save=True,
+            weighted_sum = Decimal("0")
+            total_percentage = Decimal("0")
+            for et in exam_types:
+                if et["subject_id"] != subject_id:
+                    continue
+                grade = grades.get((student_id, et["id"]))
+                if grade is None:
+                    continue
+                effective = 0 if grade["is_absent"] else grade["score"]
+                if effective is None:
+                    continue
+                if et["max_score"] and et["max_score"] > 0:
+                    normalised = (
+                        Decimal(str(effective)) * Decimal("20") / et["max_score"]
+                    )
+                else:
+                    normalised = Decimal(str(effective))
+                weighted_sum += normalised * et["percentage"]
+                total_percentage += et["percentage"]
+
+            if total_percentage == 0:
+                continue
+
+            to_save.append(
+                SubjectAverage(
+                    student_id=student_id,
+                    subject_id=subject_id,
+                    classroom=classroom,
+                    academic_year=academic_year,
+                    trimester=trimester,
+                    calculated_average=(weighted_sum / total_percentage).quantize(
+                        Decimal("0.01"), rounding=ROUND_HALF_UP
+                    ),
+                    last_calculated_at=now,
+                )
             )
-            if result is not None:
-                trim_avg_count += 1
-        except LockedException:
+
+    if to_save:
+        SubjectAverage.objects.bulk_create(
+            to_save,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=[
+                "student",
+                "subject",
+                "classroom",
+                "academic_year",
+                "trimester",
+            ],
+            update_fields=["calculated_average", "last_calculated_at"],
+        )
+    return len(to_save), locked_skipped
+
+
+def _bulk_trimester_averages(classroom, academic_year, trimester, student_ids):
+    """
+    Compute every TrimesterAverage of a classroom/trimester in memory from
+    the (freshly written) SubjectAverages, like calculate_trimester_average().
+
+    Returns (saved_count, locked_skipped).
+    """
+    from apps.grades.models import SubjectAverage, TrimesterAverage
+
+    if not student_ids:
+        return 0, 0
+
+    existing = {
+        ta["student_id"]: ta
+        for ta in TrimesterAverage.objects.filter(
+            classroom=classroom,
+            academic_year=academic_year,
+            trimester=trimester,
+            student_id__in=student_ids,
+        ).values("student_id", "manual_override", "is_locked")
+    }
+
+    per_student: dict = {}
+    for sa in SubjectAverage.objects.filter(
+        classroom=classroom,
+        academic_year=academic_year,
+        trimester=trimester,
+        student_id__in=student_ids,
+    ).values("student_id", "subject_id", "calculated_average", "manual_override"):
+        per_student.setdefault(sa["student_id"], []).append(sa)
+
+    coefficients = coefficient_map(classroom)
+
+    to_save = []
+    locked_skipped = 0
+    for student_id in student_ids:
+        current = existing.get(student_id)
+        if current and current["is_locked"]:
             locked_skipped += 1
+            continue
 
-    # Step 3: Rankings
-    calculate_rankings(classroom, academic_year, trimester)
+        numerator = Decimal("0")
+        denominator = Decimal("0")
+        for sa in per_student.get(student_id, ()):
+            avg = (
+                sa["manual_override"]
+                if sa["manual_override"] is not None
+                else sa["calculated_average"]
+            )
+            if avg is None:
+                continue
+            coeff = coefficients.get(sa["subject_id"], DEFAULT_COEFFICIENT)
+            numerator += avg * coeff
+            denominator += coeff
 
-    # Step 4: Annual (if all 3 trimesters done)
-    annual_count = 0
-    for student in students:
-        result = _calculate_annual_average_internal(
-            student,
-            classroom,
-            academic_year,
-            save=True,
+        if denominator == 0:
+            continue
+
+        obj = TrimesterAverage(
+            student_id=student_id,
+            classroom=classroom,
+            academic_year=academic_year,
+            trimester=trimester,
+            calculated_average=(numerator / denominator).quantize(
+                Decimal("0.01"), rounding=ROUND_HALF_UP
+            ),
+            # Only used to derive the appreciation; never written back.
+            manual_override=current["manual_override"] if current else None,
         )
-        if result is not None:
-            annual_count += 1
+        obj.compute_appreciation()
+        to_save.append(obj)
+
+    if to_save:
+        TrimesterAverage.objects.bulk_create(
+            to_save,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["student", "classroom", "academic_year", "trimester"],
+            update_fields=["calculated_average", "appreciation", "updated_at"],
+        )
+    return len(to_save), locked_skipped
 
-    if annual_count > 0:
-        calculate_annual_rankings(classroom, academic_year)
 
-    summary = {
-        "classroom": str(classroom),
-        "trimester": trimester,
-        "students": students.count(),
-        "subject_averages": subject_avg_count,
-        "trimester_averages": trim_avg_count,
-        "annual_averages": annual_count,
-        "locked_skipped": locked_skipped,
+def _bulk_annual_averages(classroom, academic_year, student_ids):
+    """
+    Compute AnnualAverages for every student of the classroom that has all
+    three trimesters, like _calculate_annual_average_internal().
+
+    Returns (saved_count, locked_skipped).
+    """
+    from apps.grades.models import AnnualAverage, TrimesterAverage, TrimesterConfig
+
+    if not student_ids:
+        return 0, 0
+
+    trim_maps: dict = {}
+    incomplete = set()
+    for ta in TrimesterAverage.objects.filter(
+        classroom=classroom,
+        academic_year=academic_year,
+        student_id__in=student_ids,
+    ).values("student_id", "trimester", "calculated_average", "manual_override"):
+        avg = (
+            ta["manual_override"]
+            if ta["manual_override"] is not None
+            else ta["calculated_average"]
+        )
+        if avg is None:
+            incomplete.add(ta["student_id"])
+        trim_maps.setdefault(ta["student_id"], {})[ta["trimester"]] = avg
+
+    candidates = [
+        sid
+        for sid in student_ids
+        if sid not in incomplete and len(trim_maps.get(sid, {})) >= 3
+    ]
+    if not candidates:
+        return 0, 0
+
+    config = TrimesterConfig.objects.filter(
+        school_id=classroom.section.school_id
+    ).first()
+    w1 = config.weight_t1 if config else Decimal("1")
+    w2 = config.weight_t2 if config else Decimal("1")
+    w3 = config.weight_t3 if config else Decimal("1")
+    decimal_places = config.decimal_places if config else 2
+
+    total_weight = w1 + w2 + w3
+    if total_weight == 0:
+        return 0, 0
+    quant = Decimal("0.1") if decimal_places == 1 else Decimal("0.01")
+
+    existing = {
+        aa["student_id"]: aa
+        for aa in AnnualAverage.objects.filter(
+            classroom=classroom,
+            academic_year=academic_year,
+            student_id__in=candidates,
+        ).values("student_id", "manual_override", "is_locked")
     }
-    logger.info("Recalculation complete: %s", summary)
-    return summary
+
+    to_save = []
+    locked_skipped = 0
+    for student_id in candidates:
+        current = existing.get(student_id)
+        if current and current["is_locked"]:
+            locked_skipped += 1
+            continue
+
+        trim_map = trim_maps[student_id]
+        weighted_sum = trim_map[1] * w1 + trim_map[2] * w2 + trim_map[3] * w3
+        obj = AnnualAverage(
+            student_id=student_id,
+            classroom=classroom,
+            academic_year=academic_year,
+            calculated_average=(weighted_sum / total_weight).quantize(
+                quant, rounding=ROUND_HALF_UP
+            ),
+            manual_override=current["manual_override"] if current else None,
+        )
+        obj.compute_appreciation()
+        to_save.append(obj)
+
+    if to_save:
+        AnnualAverage.objects.bulk_create(
+            to_save,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["student", "classroom", "academic_year"],
+            update_fields=["calculated_average", "appreciation", "updated_at"],
+        )
+    return len(to_save), locked_skipped
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -1007,38 +1323,6 @@ def _resolve(value, model_class):
     return model_class.objects.get(pk=value)
 
 
-def _get_coefficient(classroom, subject) -> Decimal:
-    """
-    Look up the coefficient for a subject in the class's level/stream.
-    Falls back to stream=None, then defaults to 1.
-    """
-    from apps.academics.models import LevelSubject
-
-    try:
-        ls = LevelSubject.objects.get(
-            level=classroom.level,
-            stream=classroom.stream,
-            subject=subject,
-        )
-        return ls.coefficient
-    except LevelSubject.DoesNotExist:
-        # Try without stream (for CEM / primaire)
-        try:
-            ls = LevelSubject.objects.get(
-                level=classroom.level,
-                stream__isnull=True,
-                subject=subject,
-            )
-            return ls.coefficient
-        except LevelSubject.DoesNotExist:
-            logger.warning(
-                "No LevelSubject found for %s / %s — defaulting coefficient to 1",
-                classroom.level,
-                subject,
-            )
-            return Decimal("1")
-
-
 def _assign_ranks(queryset: QuerySet, rank_field: str) -> None:
     """
     Compute dense ranks for a queryset of TrimesterAverage or AnnualAverage
@@ -1075,6 +1359,107 @@ def _assign_ranks(queryset: QuerySet, rank_field: str) -> None:
             [rank_field],
             batch_size=200,
         )
+        invalidate_student_averages(obj.student_id for obj, _ in items)
+
+
+def _window_assign_ranks(
+    queryset: QuerySet,
+    partitions: dict,
+    nullable_partition: Optional[dict] = None,
+) -> int:
+    """
+    Dense-rank a queryset of TrimesterAverage or AnnualAverage in SQL.
+
+    ``partitions`` maps each rank field to its PARTITION BY expressions
+    (None = the whole queryset). All ranks are computed in one statement:
+
+        DENSE_RANK() OVER (PARTITION BY … ORDER BY
+                           COALESCE(manual_override, calculated_average)
+                           DESC NULLS LAST)
+
+    Rows without an effective average get None. ``nullable_partition``
+    maps a rank field to a column: rows where that column is NULL keep
+    their current value for that rank (e.g. rank_in_stream for classes
+    without a filière). Only rows whose ranks changed are written, and
+    the averages snapshots of their students are dropped.
+
+    Returns the number of rows updated.
+    """
+    nullable_partition = nullable_partition or {}
+    effective = Coalesce("manual_override", "calculated_average")
+    order_by = effective.desc(nulls_last=True)
+
+    annotations = {
+        f"_new_{field}": Window(
+            expression=DenseRank(),
+            partition_by=parts,
+            order_by=order_by,
+        )
+        for field, parts in partitions.items()
+    }
+    rows = (
+        queryset.order_by()
+        .annotate(_effective=effective, **annotations)
+        .values_list(
+            "pk",
+            "_effective",
+            *nullable_partition.values(),
+            *partitions.keys(),
+            *annotations.keys(),
+            "student_id",
+        )
+    )
+
+    fields = list(partitions)
+    n_nullable = len(nullable_partition)
+    guards = dict(zip(nullable_partition, range(2, 2 + n_nullable)))
+    current_at = 2 + n_nullable
+    new_at = current_at + len(fields)
+
+    changed = []
+    changed_students = []
+    for row in rows:
+        current = dict(zip(fields, row[current_at:new_at]))
+        desired = dict(current)
+        for i, field in enumerate(fields):
+            if field in guards and row[guards[field]] is None:
+                continue
+            desired[field] = row[new_at + i] if row[1] is not None else None
+        if desired != current:
+            changed.append((row[0], *(desired[f] for f in fields)))
+            changed_students.append(row[-1])
+
+    _write_ranks(queryset.model, fields, changed)
+    invalidate_student_averages(changed_students)
+    return len(changed)
+
+
+def _write_ranks(model, fields: list, rows: list, batch_size: int = 1000) -> None:
+    """
+    Write (pk, rank, rank, …) tuples with one UPDATE … FROM (VALUES …) per
+    batch. bulk_update() would emit one CASE WHEN per field and row, which
+    dominates the cost once a whole section is re-ranked.
+    """
+    if not rows:
+        return
+
+    qn = connection.ops.quote_name
+    meta = model._meta
+    pk_col = meta.pk.column
+    columns = [meta.get_field(f).column for f in fields]
+    row_sql = "(%s::uuid" + ", %s::integer" * len(columns) + ")"
+    set_sql = ", ".join(f"{qn(c)} = v.{qn(c)}" for c in columns)
+    alias_sql = ", ".join(qn(c) for c in [pk_col, *columns])
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                f"UPDATE {qn(meta.db_table)} AS t SET {set_sql} "
+                f"FROM (VALUES {', '.join([row_sql] * len(batch))}) "
+                f"AS v({alias_sql}) WHERE t.{qn(pk_col)} = v.{qn(pk_col)}",
+                [value for row in batch for value in row],
+            )
 
 
 def _calculate_annual_average_internal(
@@ -1390,98 +1775,20 @@ def get_student_averages(student_id, academic_year_id=None) -> dict:
     - Trimester averages
     - Annual average
     - Rankings
+
+    Always read from the database; the API serves the cached copy
+    (snapshots.student_averages_snapshot).
     """
     from apps.academics.models import StudentProfile
-    from apps.grades.models import AnnualAverage, SubjectAverage, TrimesterAverage
+    from apps.grades.snapshots import build_averages_documents
 
     student = _resolve(student_id, StudentProfile)
-    classroom = student.current_class
-
-    if not classroom:
-        return {"error": "Élève sans classe assignée."}
-
-    filters = {"student": student, "classroom": classroom}
     if academic_year_id:
         from apps.schools.models import AcademicYear
 
-        academic_year = _resolve(academic_year_id, AcademicYear)
-        filters["academic_year"] = academic_year
-
-    # Subject averages
-    subject_avgs = (
-        SubjectAverage.objects.filter(**filters)
-        .select_related("subject")
-        .order_by("trimester", "subject__name")
-    )
-
-    # Trimester averages
-    trimester_avgs = TrimesterAverage.objects.filter(**filters).order_by("trimester")
-
-    # Annual average
-    annual_filters = {
-        "student": student,
-        "classroom": classroom,
-    }
-    if "academic_year" in filters:
-        annual_filters["academic_year"] = filters["academic_year"]
-
-    annual_avgs = AnnualAverage.objects.filter(**annual_filters)
+        academic_year_id = _resolve(academic_year_id, AcademicYear).pk
 
-    result = {
-        "student_id": str(student.pk),
-        "student_name": student.user.full_name,
-        "classroom": str(classroom),
-        "subject_averages": [],
-        "trimester_averages": [],
-        "annual_averages": [],
-    }
-
-    for sa in subject_avgs:
-        result["subject_averages"].append(
-            {
-                "id": str(sa.pk),
-                "subject": sa.subject.name,
-                "trimester": sa.trimester,
-                "calculated_average": str(sa.calculated_average) if sa.calculated_average else None,
-                "manual_override": str(sa.manual_override) if sa.manual_override else None,
-                "effective_average": str(sa.effective_average) if sa.effective_average else None,
-                "is_published": sa.is_published,
-                "is_locked": sa.is_locked,
-            }
-        )
-
-    for ta in trimester_avgs:
-        result["trimester_averages"].append(
-            {
-                "id": str(ta.pk),
-                "trimester": ta.trimester,
-                "calculated_average": str(ta.calculated_average) if ta.calculated_average else None,
-                "manual_override": str(ta.manual_override) if ta.manual_override else None,
-                "effective_average": str(ta.effective_average) if ta.effective_average else None,
-                "rank_in_class": ta.rank_in_class,
-                "rank_in_stream": ta.rank_in_stream,
-                "rank_in_level": ta.rank_in_level,
-                "rank_in_section": ta.rank_in_section,
-                "appreciation": ta.appreciation,
-                "is_published": ta.is_published,
-                "is_locked": ta.is_locked,
-            }
-        )
-
-    for aa in annual_avgs:
-        result["annual_averages"].append(
-            {
-                "id": str(aa.pk),
-                "calculated_average": str(aa.calculated_average) if aa.calculated_average else None,
-                "manual_override": str(aa.manual_override) if aa.manual_override else None,
-                "effective_average": str(aa.effective_average) if aa.effective_average else None,
-                "rank_in_class": aa.rank_in_class,
-                "rank_in_level": aa.rank_in_level,
-                "appreciation": aa.appreciation,
-            }
-        )
-
-    return result
+    return build_averages_documents([student], academic_year_id)[student.pk]
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -1507,10 +1814,10 @@ def parse_csv_grades(
     """
     import csv
     import io as _io
-    from difflib import SequenceMatcher
 
     from apps.academics.models import StudentProfile
     from apps.grades.models import ExamType
+    from core.name_matching import FUZZY_THRESHOLD, NameIndex, normalize_name
 
     exam_type = _resolve(exam_type_id, ExamType)
     classroom = exam_type.classroom
@@ -1544,16 +1851,16 @@ def parse_csv_grades(
             "Le fichier doit contenir : nom, prénom, note (séparateur: ;)"
         )
 
-    # Load classroom roster
-    roster = StudentProfile.objects.filter(
-        current_class=classroom,
-        is_deleted=False,
-    ).select_related("user")
-
-    roster_map = {}
-    for sp in roster:
-        key = f"{sp.user.last_name.lower().strip()} {sp.user.first_name.lower().strip()}"
-        roster_map[key] = sp
+    # Load classroom roster and index it once for every row
+    roster = list(
+        StudentProfile.objects.filter(
+            current_class=classroom,
+            is_deleted=False,
+        ).select_related("user")
+    )
+    roster_index = NameIndex(
+        (sp.user.last_name, sp.user.first_name, sp) for sp in roster
+    )
 
     matched = []
     unmatched = []
@@ -1590,45 +1897,15 @@ def parse_csv_grades(
                 )
                 continue
 
-        # Match student
-        lookup_key = f"{nom.lower()} {prenom.lower()}"
-        student = roster_map.get(lookup_key)
-
-        if not student:
-            # Fuzzy match
-            best_match = None
-            best_ratio = 0
-            for key, sp in roster_map.items():
-                ratio = SequenceMatcher(None, lookup_key, key).ratio()
-                if ratio > best_ratio:
-                    best_ratio = ratio
-                    best_match = sp
-
-            if best_ratio >= 0.8:
-                matched.append(
-                    {
-                        "row": row_idx,
-                        "csv_nom": nom,
-                        "csv_prenom": prenom,
-                        "student_id": str(best_match.pk),
-                        "student_name": best_match.user.full_name,
-                        "score": str(score) if score is not None else None,
-                        "fuzzy_match": True,
-                        "match_confidence": round(best_ratio, 2),
-                    }
-                )
-            else:
-                unmatched.append(
-                    {
-                        "row": row_idx,
-                        "csv_nom": nom,
-                        "csv_prenom": prenom,
-                        "score": str(score) if score is not None else None,
-                        "best_suggestion": best_match.user.full_name if best_match else None,
-                        "confidence": round(best_ratio, 2) if best_match else 0,
-                    }
-                )
-        else:
+        # Match student (normalised exact key, then folded / fuzzy
+        # candidates); several equally close students → unmatched
+        candidates, ratio = roster_index.matches(nom, prenom)
+        student = candidates[0] if len(candidates) == 1 else None
+
+        if student and ratio >= FUZZY_THRESHOLD:
+            fuzzy = normalize_name(f"{nom} {prenom}") != normalize_name(
+                f"{student.user.last_name} {student.user.first_name}"
+            )
             matched.append(
                 {
                     "row": row_idx,
@@ -1637,8 +1914,24 @@ def parse_csv_grades(
                     "student_id": str(student.pk),
                     "student_name": student.user.full_name,
                     "score": str(score) if score is not None else None,
-                    "fuzzy_match": False,
-                    "match_confidence": 1.0,
+                    "fuzzy_match": fuzzy,
+                    "match_confidence": round(ratio, 2) if fuzzy else 1.0,
+                }
+            )
+        else:
+            unmatched.append(
+                {
+                    "row": row_idx,
+                    "csv_nom": nom,
+                    "csv_prenom": prenom,
+                    "score": str(score) if score is not None else None,
+                    "best_suggestion": (
+                        " / ".join(sp.user.full_name for sp in candidates)
+                        if candidates
+                        else None
+                    ),
+                    "confidence": round(ratio, 2) if candidates else 0,
+                    "ambiguous": len(candidates) > 1,
                 }
             )
 
@@ -1646,7 +1939,7 @@ def parse_csv_grades(
         "exam_type_id": str(exam_type.pk),
         "exam_type_name": str(exam_type),
         "classroom": str(classroom),
-        "total_roster": roster.count(),
+        "total_roster": len(roster),
         "matched": matched,
         "unmatched": unmatched,
         "errors": errors,
@@ -1656,60 +1949,212 @@ def parse_csv_grades(
 def confirm_csv_import(
     preview_data: dict,
     teacher_user,
+    request=None,
 ) -> dict:
     """
     Confirm a CSV import preview and save grades as DRAFT.
 
     Takes the matched list from parse_csv_grades result.
-    Creates/updates Grade records with status=DRAFT.
+    Creates/updates Grade records with status=DRAFT through
+    bulk_upsert_grades (one upsert, one audit batch, one recalculation).
     """
-    from apps.academics.models import StudentProfile
     from apps.grades.models import ExamType, Grade
 
     exam_type_id = preview_data.get("exam_type_id")
     exam_type = _resolve(exam_type_id, ExamType)
-    matched = preview_data.get("matched", [])
-
-    saved = 0
-    errors = []
-
-    for item in matched:
-        student_id = item.get("student_id")
-        score_str = item.get("score")
-
-        if not student_id:
-            continue
 
-        try:
-            student = StudentProfile.objects.get(pk=student_id, is_deleted=False)
-        except StudentProfile.DoesNotExist:
-            errors.append({"student_id": student_id, "error": "Élève introuvable"})
+    items = []
+    for item in preview_data.get("matched", []):
+        if not item.get("student_id"):
             continue
-
+        score_str = item.get("score")
         score = Decimal(score_str) if score_str else None
-        is_absent = score is None
-
-        grade, _ = Grade.objects.update_or_create(
-            student=student,
-            exam_type=exam_type,
-            defaults={
+        items.append(
+            {
+                "student_id": item["student_id"],
                 "score": score,
-                "is_absent": is_absent,
-                "entered_by": teacher_user,
-                "status": Grade.Status.DRAFT,
-            },
+                "is_absent": score is None,
+            }
         )
-        saved += 1
+
+    result = bulk_upsert_grades(
+        exam_type,
+        items,
+        teacher_user,
+        status=Grade.Status.DRAFT,
+        audit_action="GRADE_CSV_IMPORTED",
+        request=request,
+    )
 
     logger.info(
         "CSV_IMPORT_CONFIRM: exam_type=%s saved=%d errors=%d by=%s",
         exam_type,
-        saved,
-        len(errors),
+        result["saved"],
+        len(result["errors"]),
         teacher_user.pk,
     )
     return {
         "exam_type": str(exam_type),
-        "saved": saved,
-        "errors": errors,
+        "saved": result["saved"],
+        "errors": result["errors"],
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# 11. BULK GRADE INGEST — roster check, one upsert, one audit batch
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def bulk_upsert_grades(
+    exam_type_id,
+    items: list[dict],
+    entered_by,
+    *,
+    status: Optional[str] = None,
+    audit_action: str = "GRADE_ENTERED",
+    request=None,
+) -> dict:
+    """
+    Enregistrer en une fois les notes d'un examen pour plusieurs élèves.
+
+    1. Valide tous les student_id contre l'effectif de la classe (1 requête)
+       et les notes contre le barème de l'ExamType.
+    2. Upsert de toutes les Grade en un seul bulk_create(update_conflicts=True)
+       dans une transaction (pas de signal post_save par note).
+    3. Un seul lot d'audit (audit.log_grade_actions).
+    4. Une seule recalculation de la classe, après commit
+       (tasks.schedule_classroom_cascade).
+
+    Args:
+        exam_type_id: UUID or ExamType instance
+        items:        [{"student_id", "score", "is_absent"}, …]
+        entered_by:   User saving the grades
+        status:       force Grade.status (e.g. DRAFT on CSV import);
+                      None keeps the status of existing grades
+        audit_action: GradeAuditLog action for each saved grade
+        request:      used for the audit IP address
+
+    Returns:
+        {"saved": n, "errors": [{"index", "student_id", "error"}, …]}
+        — when a student appears twice, the last item wins.
+    """
+    from apps.academics.models import StudentProfile
+    from apps.grades.audit import log_grade_actions
+    from apps.grades.models import ExamType, Grade
+    from apps.grades.tasks import schedule_classroom_cascade
+
+    exam_type = _resolve(exam_type_id, ExamType)
+    errors = []
+
+    roster = {
+        str(pk): pk
+        for pk in StudentProfile.objects.filter(
+            pk__in=[item["student_id"] for item in items],
+            current_class_id=exam_type.classroom_id,
+            is_deleted=False,
+        ).values_list("pk", flat=True)
     }
+
+    valid = {}
+    for idx, item in enumerate(items):
+        student_id = str(item["student_id"])
+        score = item.get("score")
+        if student_id not in roster:
+            errors.append(
+                {"index": idx, "student_id": student_id, "error": "Élève introuvable."}
+            )
+            continue
+        if score is not None and score > exam_type.max_score:
+            errors.append(
+                {
+                    "index": idx,
+                    "student_id": student_id,
+                    "error": f"Note {score} dépasse le barème {exam_type.max_score}.",
+                }
+            )
+            continue
+        valid[roster[student_id]] = {
+            "score": score,
+            "is_absent": item.get("is_absent", False),
+        }
+
+    if not valid:
+        return {"saved": 0, "errors": errors}
+
+    update_fields = ["score", "is_absent", "entered_by", "updated_at"]
+    if status is not None:
+        update_fields.append("status")
+
+    with transaction.atomic():
+        existing = {
+            row["student_id"]: row
+            for row in Grade.objects.filter(
+                exam_type=exam_type,
+                student_id__in=list(valid),
+            ).values("id", "student_id", "score", "status")
+        }
+
+        grades = []
+        for student_id, values in valid.items():
+            current = existing.get(student_id)
+            grade = Grade(
+                student_id=student_id,
+                exam_type=exam_type,
+                score=values["score"],
+                is_absent=values["is_absent"],
+                entered_by=entered_by,
+                status=status or (current["status"] if current else Grade.Status.DRAFT),
+            )
+            if current:
+                # Keep the existing row's id (audit object_id)
+                grade.pk = current["id"]
+            grades.append(grade)
+
+        Grade.objects.bulk_create(
+            grades,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["student", "exam_type"],
+            update_fields=update_fields,
+        )
+
+        log_grade_actions(
+            [
+                {
+                    "action": audit_action,
+                    "instance": grade,
+                    "student": StudentProfile(pk=grade.student_id),
+                    "old_value": (
+                        existing[grade.student_id]["score"]
+                        if grade.student_id in existing
+                        else None
+                    ),
+                    "new_value": grade.score,
+                    "subject_name": str(exam_type.subject),
+                    "exam_name": exam_type.name,
+                    "trimester": exam_type.trimester,
+                }
+                for grade in grades
+            ],
+            performed_by=entered_by,
+            request=request,
+        )
+
+        classroom_id = str(exam_type.classroom_id)
+        academic_year_id = str(exam_type.academic_year_id)
+        trimester = exam_type.trimester
+        transaction.on_commit(
+            lambda: schedule_classroom_cascade(
+                classroom_id, academic_year_id, trimester
+            ),
+            robust=True,
+        )
+
+    logger.info(
+        "Bulk grades saved: exam_type=%s saved=%d errors=%d by=%s",
+        exam_type.pk,
+        len(grades),
+        len(errors),
+        getattr(entered_by, "pk", None),
+    )
+    return {"saved": len(grades), "errors": errors}
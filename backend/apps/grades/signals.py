@@ -3,23 +3,31 @@
 ║  Grades Signals                                                        ║
 ║                                                                        ║
 ║  post_save  / post_delete on Grade                                     ║
-║     → async_recalculate_cascade (full pipeline via Celery)             ║
+║     → schedule_classroom_cascade (on commit, debounced per classroom)  ║
 ║                                                                        ║
 ║  post_save on GradeAppeal                                              ║
 ║     → notify_appeal_assigned  (teacher / admin notification)           ║
+║                                                                        ║
+║  pre_save / post_save / post_delete on LevelSubject, ExamType          ║
+║     → invalidate the lookup caches (caching.py)                        ║
+║                                                                        ║
+║  post_save / post_delete on Subject/Trimester/AnnualAverage,           ║
+║  post_save on StudentProfile                                           ║
+║     → invalidate the student's averages snapshot (snapshots.py)        ║
 ╚══════════════════════════════════════════════════════════════════════════╝
 """
 
 import logging
 
-from django.db.models.signals import post_delete, post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
 logger = logging.getLogger(__name__)
 
 
 # ═══════════════════════════════════════════════════════════════════════════
-#  Grade  →  async_recalculate_cascade
+#  Grade  →  schedule_classroom_cascade
 # ═══════════════════════════════════════════════════════════════════════════
 
 
@@ -40,11 +48,14 @@ def cascade_on_grade_delete(sender, instance, **kwargs):
 
 def _dispatch_cascade(grade_instance):
     """
-    Extract context from a Grade instance and fire the Celery task.
-    All IDs are stringified for JSON serialisation.
+    Mark the grade's classroom/trimester dirty once the transaction commits.
+
+    Grades saved in the same window (bulk entry, CSV import) are coalesced
+    by schedule_classroom_cascade into a single batched recompute and one
+    ranking pass, instead of one full cascade per Grade.
     """
     try:
-        from apps.grades.tasks import async_recalculate_cascade
+        from apps.grades.tasks import schedule_classroom_cascade
 
         et = grade_instance.exam_type
         if et is None:
@@ -53,19 +64,23 @@ def _dispatch_cascade(grade_instance):
             )
             return
 
-        async_recalculate_cascade.delay(
-            student_id=str(grade_instance.student_id),
-            subject_id=str(et.subject_id),
-            classroom_id=str(et.classroom_id),
-            academic_year_id=str(et.academic_year_id),
-            trimester=et.trimester,
+        classroom_id = str(et.classroom_id)
+        academic_year_id = str(et.academic_year_id)
+        trimester = et.trimester
+
+        transaction.on_commit(
+            lambda: schedule_classroom_cascade(
+                classroom_id, academic_year_id, trimester
+            ),
+            robust=True,
         )
 
         logger.debug(
-            "Dispatched async_recalculate_cascade for student=%s subject=%s T%s",
+            "Cascade pending for classroom=%s T%s (student=%s subject=%s)",
+            classroom_id,
+            trimester,
             grade_instance.student_id,
             et.subject_id,
-            et.trimester,
         )
     except Exception:
         logger.exception("Error dispatching cascade after Grade save/delete")
@@ -98,3 +113,93 @@ def notify_on_appeal_save(sender, instance, created, **kwargs):
         )
     except Exception:
         logger.exception("Error dispatching appeal notification for %s", instance.pk)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  LevelSubject / ExamType  →  lookup cache invalidation
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def _invalidate(invalidator, instance):
+    """
+    Invalidate now (later reads in the same transaction) and again on
+    commit (a concurrent reader may have re-cached the old rows meanwhile).
+    """
+    try:
+        invalidator(instance)
+        transaction.on_commit(lambda: invalidator(instance), robust=True)
+    except Exception:
+        logger.exception("Error invalidating grades lookup cache for %s", instance.pk)
+
+
+def _invalidate_previous(sender, instance, invalidator, fields):
+    """On update, also drop the entry of the scope the row is moving out of."""
+    if instance._state.adding or instance.pk is None:
+        return
+    values = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+    if values is not None and values != tuple(getattr(instance, f) for f in fields):
+        _invalidate(invalidator, sender(pk=instance.pk, **dict(zip(fields, values))))
+
+
+@receiver(pre_save, sender="academics.LevelSubject")
+def coefficients_before_save(sender, instance, **kwargs):
+    from apps.grades.caching import invalidate_coefficient_map
+
+    _invalidate_previous(
+        sender, instance, invalidate_coefficient_map,
+        ("school_id", "level_id", "stream_id"),
+    )
+
+
+@receiver(post_save, sender="academics.LevelSubject")
+@receiver(post_delete, sender="academics.LevelSubject")
+def coefficients_changed(sender, instance, **kwargs):
+    from apps.grades.caching import invalidate_coefficient_map
+
+    _invalidate(invalidate_coefficient_map, instance)
+
+
+@receiver(pre_save, sender="grades.ExamType")
+def exam_types_before_save(sender, instance, **kwargs):
+    from apps.grades.caching import invalidate_exam_type_map
+
+    _invalidate_previous(
+        sender, instance, invalidate_exam_type_map,
+        ("classroom_id", "academic_year_id", "trimester"),
+    )
+
+
+@receiver(post_save, sender="grades.ExamType")
+@receiver(post_delete, sender="grades.ExamType")
+def exam_types_changed(sender, instance, **kwargs):
+    from apps.grades.caching import invalidate_exam_type_map
+
+    _invalidate(invalidate_exam_type_map, instance)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Averages / StudentProfile  →  averages snapshot invalidation
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def _invalidate_student_snapshot(instance):
+    from apps.grades.snapshots import invalidate_student_averages
+
+    invalidate_student_averages([getattr(instance, "student_id", instance.pk)])
+
+
+@receiver(post_save, sender="grades.SubjectAverage")
+@receiver(post_delete, sender="grades.SubjectAverage")
+@receiver(post_save, sender="grades.TrimesterAverage")
+@receiver(post_delete, sender="grades.TrimesterAverage")
+@receiver(post_save, sender="grades.AnnualAverage")
+@receiver(post_delete, sender="grades.AnnualAverage")
+def averages_changed(sender, instance, **kwargs):
+    """Per-row saves (override, per-student recalculation, deletes)."""
+    _invalidate(_invalidate_student_snapshot, instance)
+
+
+@receiver(post_save, sender="academics.StudentProfile")
+def student_profile_changed(sender, instance, **kwargs):
+    """The snapshot follows the student's current class."""
+    _invalidate(_invalidate_student_snapshot, instance)
@@ -0,0 +1,237 @@
+"""
+╔══════════════════════════════════════════════════════════════════════════╗
+║  Grades — Student averages snapshots                                   ║
+║                                                                        ║
+║  The averages overview of a student (GET …/students/{id}/averages/)    ║
+║  is precomputed as a JSON-ready document with its ETag and stored in   ║
+║  Redis (Django cache), one entry per student:                          ║
+║                                                                        ║
+║    {"version": 1,                                                      ║
+║     "documents": {"current" | academic_year_id: {"etag", "data"}}}     ║
+║                                                                        ║
+║  build_averages_documents()  — documents for many students, 3 queries  ║
+║  student_averages_snapshot() — cached document + ETag for one student  ║
+║  rebuild_classroom_averages()— eager rebuild after the grade cascade   ║
+║  invalidate_student_averages() / invalidate_classroom_averages()      ║
+║                                                                        ║
+║  Invalidated by the average signals (signals.py), the bulk average     ║
+║  writers and ranking passes (services.py) and the publish/lock paths.  ║
+╚══════════════════════════════════════════════════════════════════════════╝
+"""
+
+import hashlib
+import json
+import logging
+from collections import defaultdict
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Bump when the document layout changes: older entries are then ignored.
+AVERAGES_SNAPSHOT_VERSION = 1
+
+# Entries are invalidated on write; the TTL is only a safety net.
+AVERAGES_SNAPSHOT_TTL = 60 * 60 * 24 * 7  # 7 days
+
+CURRENT_YEAR = "current"
+
+
+def _snapshot_key(student_id) -> str:
+    return f"grades_student_averages_{student_id}"
+
+
+def _decimal(value):
+    return str(value) if value else None
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Building
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def build_averages_documents(students, academic_year_id=None) -> dict:
+    """
+    Return {student_id: averages overview} for StudentProfiles loaded with
+    their user, in three queries whatever the number of students.
+
+    Only rows of each student's current class are included, restricted to
+    ``academic_year_id`` when given (same contract as get_student_averages).
+    """
+    from apps.grades.models import AnnualAverage, SubjectAverage, TrimesterAverage
+
+    documents = {}
+    classes = {}
+    for student in students:
+        if not student.current_class_id:
+            documents[student.pk] = {"error": "Élève sans classe assignée."}
+            continue
+        classes[student.pk] = student.current_class_id
+        documents[student.pk] = {
+            "student_id": str(student.pk),
+            "student_name": student.user.full_name,
+            "classroom": str(student.current_class),
+            "subject_averages": [],
+            "trimester_averages": [],
+            "annual_averages": [],
+        }
+    if not classes:
+        return documents
+
+    filters = {
+        "student_id__in": list(classes),
+        "classroom_id__in": set(classes.values()),
+    }
+    if academic_year_id:
+        filters["academic_year_id"] = academic_year_id
+
+    rows = defaultdict(list)
+    for model, order_by in (
+        (SubjectAverage, ("trimester", "subject__name")),
+        (TrimesterAverage, ("trimester",)),
+        (AnnualAverage, ()),
+    ):
+        queryset = model.objects.filter(**filters).order_by(*order_by)
+        if model is SubjectAverage:
+            queryset = queryset.select_related("subject")
+        for obj in queryset:
+            if classes[obj.student_id] == obj.classroom_id:
+                rows[model, obj.student_id].append(obj)
+
+    for student_id, document in documents.items():
+        if student_id not in classes:
+            continue
+        document["subject_averages"] = [
+            {
+                "id": str(sa.pk),
+                "subject": sa.subject.name,
+                "trimester": sa.trimester,
+                "calculated_average": _decimal(sa.calculated_average),
+                "manual_override": _decimal(sa.manual_override),
+                "effective_average": _decimal(sa.effective_average),
+                "is_published": sa.is_published,
+                "is_locked": sa.is_locked,
+            }
+            for sa in rows[SubjectAverage, student_id]
+        ]
+        document["trimester_averages"] = [
+            {
+                "id": str(ta.pk),
+                "trimester": ta.trimester,
+                "calculated_average": _decimal(ta.calculated_average),
+                "manual_override": _decimal(ta.manual_override),
+                "effective_average": _decimal(ta.effective_average),
+                "rank_in_class": ta.rank_in_class,
+                "rank_in_stream": ta.rank_in_stream,
+                "rank_in_level": ta.rank_in_level,
+                "rank_in_section": ta.rank_in_section,
+                "appreciation": ta.appreciation,
+                "is_published": ta.is_published,
+                "is_locked": ta.is_locked,
+            }
+            for ta in rows[TrimesterAverage, student_id]
+        ]
+        document["annual_averages"] = [
+            {
+                "id": str(aa.pk),
+                "calculated_average": _decimal(aa.calculated_average),
+                "manual_override": _decimal(aa.manual_override),
+                "effective_average": _decimal(aa.effective_average),
+                "rank_in_class": aa.rank_in_class,
+                "rank_in_level": aa.rank_in_level,
+                "appreciation": aa.appreciation,
+            }
+            for aa in rows[AnnualAverage, student_id]
+        ]
+    return documents
+
+
+def _snapshot(data: dict) -> dict:
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return {"etag": hashlib.sha1(payload.encode()).hexdigest(), "data": data}
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Reading
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def student_averages_snapshot(student_id, academic_year_id=None) -> dict:
+    """
+    Return {"etag", "data"} for a student's averages overview.
+
+    A cache hit costs one Redis GET and no query; on a miss the document
+    is built and stored next to the student's other cached variants.
+    """
+    from apps.academics.models import StudentProfile
+
+    variant = str(academic_year_id) if academic_year_id else CURRENT_YEAR
+    key = _snapshot_key(student_id)
+    entry = cache.get(key)
+    if entry and entry.get("version") == AVERAGES_SNAPSHOT_VERSION:
+        snapshot = entry["documents"].get(variant)
+        if snapshot is not None:
+            return snapshot
+    else:
+        entry = {"version": AVERAGES_SNAPSHOT_VERSION, "documents": {}}
+
+    student = StudentProfile.objects.select_related("user", "current_class").get(
+        pk=student_id
+    )
+    snapshot = _snapshot(
+        build_averages_documents([student], academic_year_id)[student.pk]
+    )
+    entry["documents"][variant] = snapshot
+    cache.set(key, entry, timeout=AVERAGES_SNAPSHOT_TTL)
+    return snapshot
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Rebuild / invalidation
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def rebuild_classroom_averages(classroom_id) -> int:
+    """
+    Rebuild the "current" snapshot of every student of a classroom in one
+    pass (called by the grade cascade once the averages are recomputed).
+    Other variants of these students are dropped. Returns the count.
+    """
+    from apps.academics.models import StudentProfile
+
+    students = list(
+        StudentProfile.objects.filter(
+            current_class_id=classroom_id,
+            is_deleted=False,
+        ).select_related("user", "current_class")
+    )
+    documents = build_averages_documents(students)
+    cache.set_many(
+        {
+            _snapshot_key(student_id): {
+                "version": AVERAGES_SNAPSHOT_VERSION,
+                "documents": {CURRENT_YEAR: _snapshot(data)},
+            }
+            for student_id, data in documents.items()
+        },
+        timeout=AVERAGES_SNAPSHOT_TTL,
+    )
+    return len(documents)
+
+
+def invalidate_student_averages(student_ids) -> None:
+    """Drop the cached snapshots of the given students (all variants)."""
+    keys = [_snapshot_key(student_id) for student_id in set(student_ids)]
+    if keys:
+        cache.delete_many(keys)
+
+
+def invalidate_classroom_averages(classroom_id) -> None:
+    """Drop the snapshots of every student currently in the classroom."""
+    from apps.academics.models import StudentProfile
+
+    invalidate_student_averages(
+        StudentProfile.objects.filter(current_class_id=classroom_id).values_list(
+            "pk", flat=True
+        )
+    )
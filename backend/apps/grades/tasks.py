@@ -9,13 +9,19 @@
 ║    4. generate_report_card_pdf      — single student PDF bulletin      ║
 ║    5. generate_class_report_cards   — all students → ZIP bundle        ║
 ║    6. recalculate_classroom_task    — full pipeline (bulk)             ║
-║    7. generate_school_report_cards  — school-wide ZIP + progress       ║
+║    7. generate_school_report_cards  — school-wide chord + progress     ║
+║       render_class_report_cards     — per-class chunk (chord header)   ║
+║       bundle_school_report_cards    — streamed ZIP (chord callback)    ║
+║       fail_school_report_cards      — marks the job failed (errback)   ║
 ║    8. send_report_cards_to_parents  — notify parents with PDF link     ║
+║    9. flush_classroom_cascade       — debounced classroom recompute    ║
 ╚══════════════════════════════════════════════════════════════════════════╝
 """
 
-import io
 import logging
+import shutil
+import tempfile
+import time
 import zipfile
 
 from celery import shared_task
@@ -212,6 +218,40 @@ def notify_appeal_assigned(self, appeal_id: str) -> dict:
         raise self.retry(exc=exc)
 
 
+# ---------------------------------------------------------------------------
+# Report card ZIP helper (streamed bundles)
+# ---------------------------------------------------------------------------
+
+# ZIPs stay in memory up to this size, then spill to a temp file on disk
+REPORT_CARDS_ZIP_SPOOL_BYTES = 16 * 1024 * 1024
+
+
+def _stream_zip_to_storage(entries, zip_filename: str) -> str:
+    """
+    Bundle stored PDFs into a ZIP and upload it.
+
+    ``entries`` is an iterable of (storage_path, arc_name). Files are
+    copied chunk by chunk into a spooled temp file, so memory stays
+    bounded whatever the number of bulletins.
+    """
+    from django.core.files import File
+    from django.core.files.storage import default_storage
+
+    with tempfile.SpooledTemporaryFile(max_size=REPORT_CARDS_ZIP_SPOOL_BYTES) as spool:
+        with zipfile.ZipFile(spool, "w", zipfile.ZIP_DEFLATED) as zf:
+            for storage_path, arc_name in entries:
+                if not default_storage.exists(storage_path):
+                    continue
+                with default_storage.open(storage_path, "rb") as src, zf.open(
+                    arc_name, "w"
+                ) as dst:
+                    shutil.copyfileobj(src, dst)
+
+        spool.seek(0)
+        saved_zip = default_storage.save(zip_filename, File(spool, name=zip_filename))
+    return default_storage.url(saved_zip)
+
+
 # ---------------------------------------------------------------------------
 # 4. generate_report_card_pdf — single student bulletin
 # ---------------------------------------------------------------------------
@@ -233,14 +273,14 @@ def generate_report_card_pdf(
     3. Convert to PDF with WeasyPrint.
     4. Upload to storage.
     5. Save URL to ReportCard record.
+
+    Single-student case of the class batch renderer
+    (apps.grades.report_cards); template and stylesheet are compiled
+    once per worker.
     """
     try:
-        from django.core.files.base import ContentFile
-        from django.core.files.storage import default_storage
-        from django.template.loader import render_to_string
-
-        from apps.academics.models import LevelSubject, StudentProfile
-        from apps.grades.models import ReportCard, SubjectAverage, TrimesterAverage
+        from apps.academics.models import StudentProfile
+        from apps.grades.report_cards import ReportCardBatch, render_report_cards
         from apps.schools.models import AcademicYear
 
         # Resolve entities
@@ -248,6 +288,7 @@ def generate_report_card_pdf(
             "user",
             "current_class__section__school",
             "current_class__level",
+            "current_class__stream",
         ).get(pk=student_id)
 
         academic_year = AcademicYear.objects.get(pk=academic_year_id)
@@ -255,115 +296,18 @@ def generate_report_card_pdf(
         if class_obj is None:
             return None
 
-        school = class_obj.section.school
-
-        # Gather subject averages
-        subject_avgs = (
-            SubjectAverage.objects.filter(
-                student=student,
-                classroom=class_obj,
-                academic_year=academic_year,
-                trimester=trimester,
-            )
-            .select_related("subject")
-            .order_by("subject__name")
-        )
-
-        subject_rows = []
-        for sa in subject_avgs:
-            try:
-                ls = LevelSubject.objects.get(
-                    level=class_obj.level,
-                    stream=class_obj.stream,
-                    subject=sa.subject,
-                )
-                coeff = ls.coefficient
-            except LevelSubject.DoesNotExist:
-                coeff = 1
-
-            subject_rows.append(
-                {
-                    "name": sa.subject.name,
-                    "coefficient": coeff,
-                    "average": sa.effective_average,
-                }
-            )
-
-        # Get trimester average
-        try:
-            trim_avg = TrimesterAverage.objects.get(
-                student=student,
-                classroom=class_obj,
-                academic_year=academic_year,
-                trimester=trimester,
-            )
-            overall_avg = trim_avg.effective_average
-            rank = trim_avg.rank_in_class
-            appreciation = trim_avg.appreciation
-        except TrimesterAverage.DoesNotExist:
-            overall_avg = None
-            rank = None
-            appreciation = ""
-
-        total_students = StudentProfile.objects.filter(
-            current_class=class_obj,
-            is_deleted=False,
-        ).count()
-
-        # Get or create ReportCard
-        report_card, _ = ReportCard.objects.get_or_create(
-            student=student,
-            academic_year=academic_year,
-            trimester=trimester,
-            defaults={"class_obj": class_obj},
-        )
-        report_card.class_obj = class_obj
-        report_card.general_average = overall_avg
-        report_card.rank = rank
-        report_card.total_students = total_students
-
-        # Render HTML → PDF
-        context = {
-            "school": school,
-            "student": student,
-            "student_user": student.user,
-            "class_obj": class_obj,
-            "academic_year": academic_year,
-            "trimester": trimester,
-            "subject_rows": subject_rows,
-            "overall_average": overall_avg,
-            "rank": rank,
-            "appreciation": appreciation,
-            "total_students": total_students,
-            "admin_comment": report_card.admin_comment,
-            "teacher_comment": report_card.teacher_comment,
-        }
-
-        html_content = render_to_string("grades/report_card.html", context)
-
-        from weasyprint import HTML
-
-        pdf_bytes = HTML(string=html_content, base_url="").write_pdf()
-
-        # Upload PDF
-        filename = (
-            f"report_cards/{school.pk}/"
-            f"{academic_year.name}/T{trimester}/"
-            f"{student.user.last_name}_{student.user.first_name}_{student.pk}.pdf"
-        )
-        saved_path = default_storage.save(filename, ContentFile(pdf_bytes))
-        pdf_url = default_storage.url(saved_path)
-
-        report_card.pdf_url = pdf_url
-        report_card.save()
+        batch = ReportCardBatch(class_obj, academic_year, trimester, students=[student])
+        (result,) = render_report_cards(batch)
+        if result["error"] is not None:
+            raise result["error"]
 
         logger.info(
             "Report card PDF generated — student=%s trimester=%d url=%s",
             student_id,
             trimester,
-            pdf_url,
+            result["url"],
         )
-        return pdf_url
+        return result["url"]
 
     except Exception as exc:
         logger.exception("Report card generation failed for student %s", student_id)
@@ -386,70 +330,44 @@ def generate_class_report_cards(
     Generate report card PDFs for every student in a class, bundle into ZIP.
     """
     try:
-        from django.core.files.base import ContentFile
-        from django.core.files.storage import default_storage
-
-        from apps.academics.models import Class, StudentProfile
+        from apps.academics.models import Class
+        from apps.grades.report_cards import ReportCardBatch, render_report_cards
         from apps.schools.models import AcademicYear
 
         class_obj = Class.objects.select_related(
             "section__school",
             "academic_year",
+            "level",
+            "stream",
         ).get(pk=class_id)
 
         academic_year = AcademicYear.objects.get(pk=academic_year_id)
         school = class_obj.section.school
 
-        students = (
-            StudentProfile.objects.filter(
-                current_class=class_obj,
-                is_deleted=False,
-            )
-            .select_related("user")
-            .order_by("user__last_name", "user__first_name")
-        )
-
-        if not students.exists():
+        batch = ReportCardBatch(class_obj, academic_year, trimester)
+        if not batch.students:
             logger.warning("No students in class %s", class_id)
             return None
 
-        # Generate individual PDFs
-        for student in students:
-            try:
-                generate_report_card_pdf(
-                    str(student.pk),
-                    trimester,
-                    academic_year_id,
-                )
-            except Exception:
-                logger.exception(
-                    "PDF generation failed for student %s in class %s",
-                    student.pk,
-                    class_id,
-                )
+        # Generate individual PDFs (one batch: shared queries + renderer)
+        results = render_report_cards(batch)
 
         # Bundle into ZIP
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-            for student in students:
-                storage_path = (
-                    f"report_cards/{school.pk}/"
-                    f"{academic_year.name}/T{trimester}/"
-                    f"{student.user.last_name}_{student.user.first_name}_{student.pk}.pdf"
+        zip_url = _stream_zip_to_storage(
+            (
+                (
+                    r["path"],
+                    f"{r['student'].user.last_name}_{r['student'].user.first_name}.pdf",
                 )
-                if default_storage.exists(storage_path):
-                    with default_storage.open(storage_path, "rb") as f:
-                        label = f"{student.user.last_name}_{student.user.first_name}"
-                        zf.writestr(f"{label}.pdf", f.read())
-
-        zip_buffer.seek(0)
-        zip_filename = (
-            f"report_cards/{school.pk}/"
-            f"{academic_year.name}/T{trimester}/"
-            f"class_{class_obj.name}_T{trimester}.zip"
+                for r in results
+                if r["path"]
+            ),
+            (
+                f"report_cards/{school.pk}/"
+                f"{academic_year.name}/T{trimester}/"
+                f"class_{class_obj.name}_T{trimester}.zip"
+            ),
         )
-        saved_zip = default_storage.save(zip_filename, ContentFile(zip_buffer.read()))
-        zip_url = default_storage.url(saved_zip)
 
         # Notify admins
         from apps.accounts.models import User
@@ -516,9 +434,51 @@ def recalculate_classroom_task(
 
 
 # ---------------------------------------------------------------------------
-# 7. generate_school_report_cards — school-wide ZIP with progress tracking
+# 7. generate_school_report_cards — school-wide chord with progress tracking
+#
+#    generate_school_report_cards   fan-out: one chunk per class
+#      └─ render_class_report_cards   (chord header, runs on the pool)
+#           └─ bundle_school_report_cards   (chord callback, streamed ZIP)
+#              └─ fail_school_report_cards  (link_error: a chunk failed)
 # ---------------------------------------------------------------------------
 
+REPORT_CARDS_PROGRESS_TTL = 7200  # 2 hours
+
+
+def _update_report_progress(
+    progress_key: str,
+    *,
+    completed: int = 0,
+    student_error: dict | None = None,
+    **fields,
+) -> None:
+    """
+    Read-modify-write the progress dict under a short cache lock, so the
+    chunks running in parallel never overwrite each other's increments.
+    """
+    from django.core.cache import cache
+
+    lock_key = f"{progress_key}_lock"
+    for _ in range(100):
+        locked = cache.add(lock_key, True, timeout=10)
+        if locked:
+            break
+        time.sleep(0.05)
+    else:
+        logger.warning("Progress lock busy for %s — updating anyway", progress_key)
+
+    try:
+        progress = cache.get(progress_key) or {}
+        progress["completed"] = progress.get("completed", 0) + completed
+        if student_error is not None:
+            # Keep last 10 errors
+            progress["errors"] = (progress.get("errors", []) + [student_error])[-10:]
+        progress.update(fields)
+        cache.set(progress_key, progress, timeout=REPORT_CARDS_PROGRESS_TTL)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
 
 @shared_task(bind=True, max_retries=2, default_retry_delay=120)
 def generate_school_report_cards(
@@ -531,123 +491,183 @@ def generate_school_report_cards(
 ) -> str | None:
     """
     Generate report card PDFs for ALL classes in a school, bundle into ZIP.
-    Progress is tracked via Django cache (key: report_cards_progress_{task_id}).
+
+    Fans out one render_class_report_cards chunk per class to the worker
+    pool (Celery chord); bundle_school_report_cards builds the ZIP once
+    every chunk is done. Progress is tracked via Django cache
+    (key: report_cards_progress_{task_id}).
+
+    Returns the id of the bundling task.
     """
+    from celery import chord
     from django.core.cache import cache
-    from django.core.files.base import ContentFile
-    from django.core.files.storage import default_storage
+    from django.db.models import Count
 
-    from apps.academics.models import Class, StudentProfile
+    from apps.academics.models import StudentProfile
     from apps.schools.models import AcademicYear, School
 
+    progress_key = f"report_cards_progress_{self.request.id}"
+
     try:
         school = School.objects.get(pk=school_id)
         academic_year = AcademicYear.objects.get(pk=academic_year_id)
 
-        classes = Class.objects.filter(
-            section__school=school,
-            academic_year=academic_year,
-        ).select_related("section", "level")
-
-        # Count total students for progress tracking
-        total_students = StudentProfile.objects.filter(
-            current_class__in=classes,
-            is_deleted=False,
-        ).count()
+        # Students per class, in one query
+        class_sizes = dict(
+            StudentProfile.objects.filter(
+                current_class__section__school=school,
+                current_class__academic_year=academic_year,
+                is_deleted=False,
+            )
+            .values_list("current_class")
+            .annotate(n=Count("id"))
+            .order_by()
+        )
+        total_students = sum(class_sizes.values())
 
         if total_students == 0:
             return None
 
-        progress_key = f"report_cards_progress_{self.request.id}"
         cache.set(progress_key, {
             "status": "running",
             "total": total_students,
             "completed": 0,
             "current_class": "",
             "errors": [],
-        }, timeout=7200)
+        }, timeout=REPORT_CARDS_PROGRESS_TTL)
 
-        completed = 0
-        errors = []
-
-        for class_obj in classes:
-            students = (
-                StudentProfile.objects.filter(
-                    current_class=class_obj,
-                    is_deleted=False,
-                )
-                .select_related("user")
-                .order_by("user__last_name", "user__first_name")
+        header = [
+            render_class_report_cards.s(
+                str(class_id), trimester, academic_year_id, progress_key
             )
+            for class_id in class_sizes
+        ]
+        callback = bundle_school_report_cards.s(
+            school_id, academic_year_id, trimester, progress_key, send_to_parents
+        )
+        # A chunk failing for good skips the callback: mark the job failed
+        callback.link_error(fail_school_report_cards.s(progress_key))
+        result = chord(header)(callback)
 
-            cache.set(progress_key, {
-                "status": "running",
-                "total": total_students,
-                "completed": completed,
-                "current_class": class_obj.name,
-                "errors": errors[-10:],  # Keep last 10 errors
-            }, timeout=7200)
-
-            for student in students:
-                try:
-                    generate_report_card_pdf(
-                        str(student.pk),
-                        trimester,
-                        academic_year_id,
-                    )
-                except Exception as e:
-                    errors.append({
-                        "student": str(student.pk),
-                        "name": student.user.get_full_name(),
-                        "error": str(e)[:200],
-                    })
-                    logger.exception(
-                        "PDF failed for student %s in school-wide gen",
-                        student.pk,
-                    )
-                completed += 1
-
-        # Bundle all PDFs into a school ZIP
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-            for class_obj in classes:
-                students = StudentProfile.objects.filter(
-                    current_class=class_obj,
-                    is_deleted=False,
-                ).select_related("user")
-
-                for student in students:
-                    storage_path = (
-                        f"report_cards/{school.pk}/"
-                        f"{academic_year.name}/T{trimester}/"
-                        f"{student.user.last_name}_{student.user.first_name}_{student.pk}.pdf"
-                    )
-                    if default_storage.exists(storage_path):
-                        with default_storage.open(storage_path, "rb") as f:
-                            arc_name = (
-                                f"{class_obj.name}/"
-                                f"{student.user.last_name}_{student.user.first_name}.pdf"
-                            )
-                            zf.writestr(arc_name, f.read())
-
-        zip_buffer.seek(0)
-        zip_filename = (
-            f"report_cards/{school.pk}/"
-            f"{academic_year.name}/T{trimester}/"
-            f"school_T{trimester}_all_classes.zip"
+        logger.info(
+            "School report cards dispatched — school=%s T%d, %d classes, %d students",
+            school_id, trimester, len(header), total_students,
         )
-        saved_zip = default_storage.save(zip_filename, ContentFile(zip_buffer.read()))
-        zip_url = default_storage.url(saved_zip)
+        return result.id
 
-        # Update progress to completed
+    except Exception as exc:
+        logger.exception("School report cards failed — school=%s", school_id)
         cache.set(progress_key, {
-            "status": "completed",
-            "total": total_students,
-            "completed": completed,
-            "current_class": "",
-            "errors": errors[-10:],
-            "zip_url": zip_url,
-        }, timeout=7200)
+            "status": "failed",
+            "error": str(exc)[:500],
+        }, timeout=REPORT_CARDS_PROGRESS_TTL)
+        raise self.retry(exc=exc)
+
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=60)
+def render_class_report_cards(
+    self,
+    class_id: str,
+    trimester: int,
+    academic_year_id: str,
+    progress_key: str,
+) -> dict:
+    """
+    Chord chunk: render the bulletins of one class.
+
+    Per-student failures are recorded in the progress dict and do not
+    fail the chunk (the ZIP is built with whatever succeeded).
+    Returns {"entries": [[storage_path, arc_name], …], "errors": n}.
+    """
+    from apps.academics.models import Class
+    from apps.grades.report_cards import ReportCardBatch, render_report_cards
+    from apps.schools.models import AcademicYear
+
+    try:
+        class_obj = Class.objects.select_related(
+            "section__school", "level", "stream"
+        ).get(pk=class_id)
+        academic_year = AcademicYear.objects.get(pk=academic_year_id)
+        batch = ReportCardBatch(class_obj, academic_year, trimester)
+    except Exception as exc:
+        logger.exception("Report card chunk failed — class=%s", class_id)
+        raise self.retry(exc=exc)
+
+    def on_rendered(result):
+        student = result["student"]
+        error = None
+        if result["error"] is not None:
+            error = {
+                "student": str(student.pk),
+                "name": student.user.full_name,
+                "error": str(result["error"])[:200],
+            }
+        _update_report_progress(
+            progress_key,
+            completed=1,
+            student_error=error,
+            current_class=class_obj.name,
+        )
+
+    results = render_report_cards(batch, on_rendered=on_rendered)
+
+    return {
+        "entries": [
+            [
+                r["path"],
+                f"{class_obj.name}/"
+                f"{r['student'].user.last_name}_{r['student'].user.first_name}.pdf",
+            ]
+            for r in results
+            if r["path"]
+        ],
+        "errors": sum(1 for r in results if r["error"] is not None),
+    }
+
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=120)
+def bundle_school_report_cards(
+    self,
+    chunk_results: list,
+    school_id: str,
+    academic_year_id: str,
+    trimester: int,
+    progress_key: str,
+    send_to_parents: bool = False,
+) -> str | None:
+    """
+    Chord callback: stream every rendered PDF into the school ZIP, mark
+    the progress as completed and notify admins (and parents if asked).
+    """
+    from apps.schools.models import AcademicYear, School
+
+    try:
+        school = School.objects.get(pk=school_id)
+        academic_year = AcademicYear.objects.get(pk=academic_year_id)
+
+        zip_url = _stream_zip_to_storage(
+            (
+                (storage_path, arc_name)
+                for result in chunk_results
+                for storage_path, arc_name in result["entries"]
+            ),
+            (
+                f"report_cards/{school.pk}/"
+                f"{academic_year.name}/T{trimester}/"
+                f"school_T{trimester}_all_classes.zip"
+            ),
+        )
+
+        error_count = sum(result["errors"] for result in chunk_results)
+        completed = sum(len(result["entries"]) for result in chunk_results) + error_count
+
+        # Update progress to completed
+        _update_report_progress(
+            progress_key,
+            status="completed",
+            current_class="",
+            zip_url=zip_url,
+        )
 
         # Send to parents if requested
         if send_to_parents:
@@ -671,7 +691,7 @@ def generate_school_report_cards(
                 body=(
                     f"Tous les bulletins T{trimester} ({academic_year.name}) "
                     f"ont été générés. {completed} élèves traités, "
-                    f"{len(errors)} erreur(s)."
+                    f"{error_count} erreur(s)."
                 ),
                 notification_type="REPORT_CARD",
                 related_object_id=str(school.pk),
@@ -680,21 +700,38 @@ def generate_school_report_cards(
 
         logger.info(
             "School report cards ZIP — school=%s T%d url=%s (%d OK, %d errors)",
-            school_id, trimester, zip_url, completed - len(errors), len(errors),
+            school_id, trimester, zip_url, completed - error_count, error_count,
         )
         return zip_url
 
     except Exception as exc:
-        logger.exception("School report cards failed — school=%s", school_id)
-        progress_key = f"report_cards_progress_{self.request.id}"
-        from django.core.cache import cache
-        cache.set(progress_key, {
-            "status": "failed",
-            "error": str(exc)[:500],
-        }, timeout=7200)
+        logger.exception("School report cards bundling failed — school=%s", school_id)
+        _update_report_progress(
+            progress_key,
+            status="failed",
+            error=str(exc)[:500],
+        )
         raise self.retry(exc=exc)
 
 
+@shared_task
+def fail_school_report_cards(request, exc, traceback, progress_key: str) -> None:
+    """
+    Chord error callback: a chunk (or the bundling) failed after its
+    retries, so the ZIP will never be built — mark the progress failed
+    instead of leaving it "running" until the cache entry expires.
+    """
+    logger.error(
+        "School report cards failed — task=%s progress=%s: %s",
+        getattr(request, "id", None), progress_key, exc,
+    )
+    _update_report_progress(
+        progress_key,
+        status="failed",
+        error=str(exc)[:500],
+    )
+
+
 # ---------------------------------------------------------------------------
 # 8. send_report_cards_to_parents — notify parents with PDF links
 # ---------------------------------------------------------------------------
@@ -762,3 +799,104 @@ def send_report_cards_to_parents(
     except Exception as exc:
         logger.exception("Send to parents failed — school=%s", school_id)
         return {"status": "failed", "error": str(exc)[:200]}
+
+
+# ---------------------------------------------------------------------------
+# 9. flush_classroom_cascade — debounced, coalesced cascade per classroom
+# ---------------------------------------------------------------------------
+
+
+def _cascade_pending_key(classroom_id, academic_year_id, trimester) -> str:
+    return f"grades_cascade_pending_{classroom_id}_{academic_year_id}_T{trimester}"
+
+
+def schedule_classroom_cascade(
+    classroom_id: str,
+    academic_year_id: str,
+    trimester: int,
+) -> bool:
+    """
+    Coalesce grade changes into one recompute per classroom/trimester.
+
+    The first call in a debounce window marks the classroom dirty in the
+    cache (atomic ``add`` → Redis SET NX) and enqueues flush_classroom_cascade
+    with a countdown; every further call while the marker exists is a no-op.
+    A teacher saving 40 grades therefore enqueues a single task.
+
+    Returns True if a flush was enqueued.
+    """
+    from django.conf import settings
+    from django.core.cache import cache
+
+    window = getattr(settings, "GRADE_CASCADE_DEBOUNCE_SECONDS", 5)
+    key = _cascade_pending_key(classroom_id, academic_year_id, trimester)
+
+    # The marker outlives the window so a backed-up queue does not cause
+    # duplicate flushes; it is deleted by the flush itself.
+    if not cache.add(key, True, timeout=window * 12 + 60):
+        return False
+
+    try:
+        flush_classroom_cascade.apply_async(
+            args=[str(classroom_id), str(academic_year_id), trimester],
+            countdown=window,
+        )
+    except Exception:
+        # No flush will clear the marker: drop it so the next change retries
+        cache.delete(key)
+        raise
+    logger.debug(
+        "Scheduled flush_classroom_cascade — classroom=%s T%s in %ss",
+        classroom_id,
+        trimester,
+        window,
+    )
+    return True
+
+
+@shared_task(
+    bind=True,
+    max_retries=3,
+    default_retry_delay=10,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+)
+def flush_classroom_cascade(
+    self,
+    classroom_id: str,
+    academic_year_id: str,
+    trimester: int,
+) -> dict:
+    """
+    Recompute every average of a dirty classroom/trimester in one batch,
+    followed by a single ranking pass.
+
+    The pending marker is cleared *before* reading the grades so any grade
+    committed during the recompute schedules a fresh flush.
+    """
+    from django.core.cache import cache
+
+    cache.delete(_cascade_pending_key(classroom_id, academic_year_id, trimester))
+
+    try:
+        from apps.grades.services import recalculate_classroom_trimester
+
+        result = recalculate_classroom_trimester(
+            classroom_id,
+            academic_year_id,
+            trimester,
+        )
+        logger.info(
+            "flush_classroom_cascade OK — classroom=%s T%s → %s",
+            classroom_id,
+            trimester,
+            result,
+        )
+        return result
+    except Exception as exc:
+        logger.exception(
+            "flush_classroom_cascade FAILED — classroom=%s T%s",
+            classroom_id,
+            trimester,
+        )
+        raise self.retry(exc=exc)
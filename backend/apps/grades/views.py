@@ -76,6 +76,7 @@ from .serializers import (
     TrimesterRecalcSerializer,
     TrimesterUnlockSerializer,
 )
+from .snapshots import invalidate_classroom_averages, student_averages_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -203,62 +204,19 @@ class GradeBulkEnterView(APIView):
         ser = GradeBulkEnterSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
 
-        exam_type = get_object_or_404(ExamType, pk=ser.validated_data["exam_type_id"])
-        user = request.user
-        saved = 0
-        errors = []
-
-        for idx, item in enumerate(ser.validated_data["grades"]):
-            try:
-                student = StudentProfile.objects.get(
-                    pk=item["student_id"],
-                    is_deleted=False,
-                )
-            except StudentProfile.DoesNotExist:
-                errors.append({"index": idx, "error": "Élève introuvable."})
-                continue
-
-            score = item.get("score")
-            is_absent = item.get("is_absent", False)
-
-            if score is not None and score > exam_type.max_score:
-                errors.append(
-                    {
-                        "index": idx,
-                        "error": f"Note {score} dépasse le barème {exam_type.max_score}.",
-                    }
-                )
-                continue
-
-            grade, _ = Grade.objects.update_or_create(
-                student=student,
-                exam_type=exam_type,
-                defaults={
-                    "score": score,
-                    "is_absent": is_absent,
-                    "entered_by": user,
-                },
-            )
-            saved += 1
-            # Audit
-            log_grade_action(
-                action="GRADE_ENTERED",
-                instance=grade,
-                performed_by=user,
-                request=request,
-                student=student,
-                new_value=score,
-                subject_name=str(exam_type.subject),
-                exam_name=exam_type.name,
-                trimester=exam_type.trimester,
-            )
-            # Note: post_save signal on Grade will trigger async_recalculate_cascade
+        from .services import bulk_upsert_grades
 
-        return Response(
-            {"saved": saved, "errors": errors},
-            status=status.HTTP_200_OK,
+        exam_type = get_object_or_404(ExamType, pk=ser.validated_data["exam_type_id"])
+        # Roster check, one upsert, one audit batch, one classroom cascade
+        result = bulk_upsert_grades(
+            exam_type,
+            ser.validated_data["grades"],
+            request.user,
+            request=request,
         )
 
+        return Response(result, status=status.HTTP_200_OK)
+
 
 class GradeListView(APIView):
     """
@@ -643,6 +601,9 @@ class SubjectAveragePublishView(APIView):
             published_by=request.user,
         )
 
+        if count:
+            invalidate_classroom_averages(ser.validated_data["classroom_id"])
+
         return Response({"published_count": count})
 
 
@@ -811,6 +772,9 @@ class TrimesterPublishView(APIView):
             published_by=request.user,
         )
 
+        if count:
+            invalidate_classroom_averages(ser.validated_data["classroom_id"])
+
         return Response({"published_count": count})
 
 
@@ -1539,14 +1503,15 @@ class StudentAveragesView(APIView):
     - Subject averages per trimester
     - Trimester averages with rankings
     - Annual averages
+
+    Served from the cached snapshot with an ETag; clients sending it back
+    in If-None-Match get a 304 while the averages are unchanged.
     """
 
     permission_classes = [permissions.IsAuthenticated]
 
     @extend_schema(tags=["grades"], summary="Get student averages overview")
     def get(self, request, student_id):
-        from .services import get_student_averages
-
         academic_year_id = request.query_params.get("academic_year_id")
 
         # Permission: student sees own, teacher sees their class, admin sees school
@@ -1601,8 +1566,13 @@ class StudentAveragesView(APIView):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        result = get_student_averages(student_id, academic_year_id)
-        return Response(result)
+        # Precomputed document + ETag: one cache read, 304 when unchanged
+        snapshot = student_averages_snapshot(student_id, academic_year_id)
+        etag = f'"{snapshot["etag"]}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in request.headers.get("If-None-Match", ""):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(snapshot["data"], headers=headers)
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -1692,21 +1662,11 @@ class CSVImportConfirmView(APIView):
 
         from .services import confirm_csv_import
 
+        # Audited per grade (one batch) by bulk_upsert_grades
         result = confirm_csv_import(
             preview_data=ser.validated_data,
             teacher_user=request.user,
-        )
-
-        # Audit
-        exam_type = get_object_or_404(ExamType, pk=ser.validated_data["exam_type_id"])
-        log_grade_action(
-            action="GRADE_CSV_IMPORTED",
-            instance=exam_type,
-            performed_by=request.user,
             request=request,
-            subject_name=str(exam_type.subject),
-            exam_name=exam_type.name,
-            trimester=exam_type.trimester,
         )
 
         return Response(result)
@@ -2230,16 +2190,18 @@ class MENExportView(APIView):
     Query params: academic_year_id, trimester, class_id (optional)
 
     Exports grade data in official MEN (Ministère de l'Éducation Nationale) format.
-    Returns Excel file for BEP/BEM/BAC exam preparation.
+    Returns Excel file for BEP/BEM/BAC exam preparation, one sheet per class,
+    written in constant memory; ``?async=true`` builds it in the background
+    and sends a download link when done.
     """
 
     permission_classes = [permissions.IsAuthenticated, IsAdminOnly]
 
     @extend_schema(tags=["grades"], summary="Export grades in MEN official format")
     def get(self, request):
-        import openpyxl
-        from django.http import HttpResponse
-        from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+        from core.exports import start_export_job, xlsx_response
+
+        from apps.schools.models import AcademicYear
 
         school = _resolve_school(request)
         if not school:
@@ -2247,7 +2209,6 @@ class MENExportView(APIView):
 
         academic_year_id = request.query_params.get("academic_year_id")
         trimester = request.query_params.get("trimester")
-        class_id = request.query_params.get("class_id")
 
         if not academic_year_id or not trimester:
             return Response(
@@ -2255,134 +2216,107 @@ class MENExportView(APIView):
                 status=400,
             )
 
-        from apps.academics.models import Class, LevelSubject, StudentProfile
-        from apps.schools.models import AcademicYear
-
-        academic_year = get_object_or_404(AcademicYear, pk=academic_year_id)
+        get_object_or_404(AcademicYear, pk=academic_year_id)
 
-        if class_id:
-            classes = Class.objects.filter(pk=class_id, section__school=school)
-        else:
-            classes = Class.objects.filter(
-                section__school=school,
-                academic_year=academic_year,
-            )
+        params = request.query_params.dict()
+        filename = f"MEN_export_{school.name}_T{trimester}.xlsx"
+        if params.get("async") == "true":
+            return start_export_job("grades_men", request, school, params, "xlsx", filename)
+        return xlsx_response(filename, men_export_sheets(school, params))
 
-        classes = classes.select_related("level", "section")
 
-        wb = openpyxl.Workbook()
-        wb.remove(wb.active)
-
-        header_font = Font(bold=True, size=12)
-        header_fill = PatternFill(start_color="1F4E79", end_color="1F4E79", fill_type="solid")
-        header_font_white = Font(bold=True, color="FFFFFF", size=10)
-        thin_border = Border(
-            left=Side(style="thin"),
-            right=Side(style="thin"),
-            top=Side(style="thin"),
-            bottom=Side(style="thin"),
-        )
+def men_export_sheets(school, params) -> list:
+    """
+    Export builder (core.exports) of the MEN grade sheets: one sheet per
+    class, with the subject and trimester averages of the whole class
+    loaded in two queries (instead of one query per student and subject).
+    """
+    from core.exports import EXPORT_CHUNK_SIZE, Sheet
 
-        for class_obj in classes:
-            ws = wb.create_sheet(title=class_obj.name[:31])
+    from apps.academics.models import Class, LevelSubject
+    from apps.schools.models import AcademicYear
 
-            # Header
-            ws.merge_cells("A1:H1")
-            ws["A1"] = "الجمهورية الجزائرية الديمقراطية الشعبية"
-            ws["A1"].font = header_font
-            ws["A1"].alignment = Alignment(horizontal="center")
+    academic_year = AcademicYear.objects.get(pk=params["academic_year_id"])
+    trimester = int(params["trimester"])
+    class_id = params.get("class_id")
 
-            ws.merge_cells("A2:H2")
-            ws["A2"] = f"وزارة التربية الوطنية — {school.name}"
-            ws["A2"].alignment = Alignment(horizontal="center")
+    if class_id:
+        classes = Class.objects.filter(pk=class_id, section__school=school)
+    else:
+        classes = Class.objects.filter(
+            section__school=school,
+            academic_year=academic_year,
+        )
+    classes = classes.select_related("level", "section")
 
-            ws.merge_cells("A3:H3")
-            ws["A3"] = f"كشف النقاط — القسم: {class_obj.name} — الفصل {trimester} — {academic_year.name}"
-            ws["A3"].font = Font(bold=True, size=11)
-            ws["A3"].alignment = Alignment(horizontal="center")
+    def value(avg):
+        return float(avg) if avg is not None else ""
 
-            # Get subjects for this level
-            subjects = LevelSubject.objects.filter(
+    def rows(class_obj, subjects):
+        scope = {
+            "classroom": class_obj,
+            "academic_year": academic_year,
+            "trimester": trimester,
+        }
+        subject_avgs = {
+            (sa.student_id, sa.subject_id): sa.effective_average
+            for sa in SubjectAverage.objects.filter(**scope)
+        }
+        trimester_avgs = {
+            ta.student_id: ta for ta in TrimesterAverage.objects.filter(**scope)
+        }
+        students = (
+            StudentProfile.objects.filter(
+                current_class=class_obj,
+                is_deleted=False,
+            )
+            .select_related("user")
+            .order_by("user__last_name", "user__first_name")
+        )
+        for number, student in enumerate(
+            students.iterator(chunk_size=EXPORT_CHUNK_SIZE), 1
+        ):
+            full_name = (
+                f"{getattr(student.user, 'last_name_ar', student.user.last_name)} "
+                f"{getattr(student.user, 'first_name_ar', student.user.first_name)}"
+            )
+            row = [number, full_name]
+            row += [
+                value(subject_avgs.get((student.pk, ls.subject_id)))
+                for ls in subjects
+            ]
+            ta = trimester_avgs.get(student.pk)
+            if ta is not None:
+                row += [value(ta.effective_average), ta.rank_in_class, ta.appreciation]
+            else:
+                row += ["", "", ""]
+            yield row
+
+    sheets = []
+    for class_obj in classes:
+        subjects = list(
+            LevelSubject.objects.filter(
                 level=class_obj.level,
                 stream=class_obj.stream,
             ).select_related("subject").order_by("subject__name")
-
-            # Column headers
-            headers = ["الرقم", "الاسم واللقب"]
-            for ls in subjects:
-                headers.append(f"{ls.subject.name}\n(/{ls.coefficient})")
-            headers += ["المعدل", "الترتيب", "التقدير"]
-
-            for col, h in enumerate(headers, 1):
-                cell = ws.cell(row=5, column=col, value=h)
-                cell.font = header_font_white
-                cell.fill = header_fill
-                cell.border = thin_border
-                cell.alignment = Alignment(horizontal="center", wrap_text=True)
-
-            # Students data
-            students = (
-                StudentProfile.objects.filter(
-                    current_class=class_obj,
-                    is_deleted=False,
-                )
-                .select_related("user")
-                .order_by("user__last_name_ar", "user__first_name_ar")
-            )
-
-            for row_idx, student in enumerate(students, 6):
-                ws.cell(row=row_idx, column=1, value=row_idx - 5).border = thin_border
-                full_name = (
-                    f"{getattr(student.user, 'last_name_ar', student.user.last_name)} "
-                    f"{getattr(student.user, 'first_name_ar', student.user.first_name)}"
-                )
-                ws.cell(row=row_idx, column=2, value=full_name).border = thin_border
-
-                for col_idx, ls in enumerate(subjects, 3):
-                    try:
-                        sa = SubjectAverage.objects.get(
-                            student=student,
-                            subject=ls.subject,
-                            classroom=class_obj,
-                            academic_year=academic_year,
-                            trimester=int(trimester),
-                        )
-                        val = float(sa.effective_average)
-                    except SubjectAverage.DoesNotExist:
-                        val = ""
-                    cell = ws.cell(row=row_idx, column=col_idx, value=val)
-                    cell.border = thin_border
-                    cell.alignment = Alignment(horizontal="center")
-
-                # Trimester average, rank, appreciation
-                col_avg = len(subjects) + 3
-                try:
-                    ta = TrimesterAverage.objects.get(
-                        student=student,
-                        classroom=class_obj,
-                        academic_year=academic_year,
-                        trimester=int(trimester),
-                    )
-                    ws.cell(row=row_idx, column=col_avg, value=float(ta.effective_average)).border = thin_border
-                    ws.cell(row=row_idx, column=col_avg + 1, value=ta.rank_in_class).border = thin_border
-                    ws.cell(row=row_idx, column=col_avg + 2, value=ta.appreciation).border = thin_border
-                except TrimesterAverage.DoesNotExist:
-                    for c in range(3):
-                        ws.cell(row=row_idx, column=col_avg + c, value="").border = thin_border
-
-            # Auto-adjust column widths
-            for col in ws.columns:
-                max_len = 0
-                for cell in col:
-                    if cell.value:
-                        max_len = max(max_len, len(str(cell.value)))
-                ws.column_dimensions[col[0].column_letter].width = max(max_len + 2, 12)
-
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
-        response["Content-Disposition"] = (
-            f'attachment; filename="MEN_export_{school.name}_T{trimester}.xlsx"'
+        columns = [("الرقم", 8), ("الاسم واللقب", 30)]
+        columns += [
+            (f"{ls.subject.name}\n(/{ls.coefficient})", 14) for ls in subjects
+        ]
+        columns += [("المعدل", 12), ("الترتيب", 12), ("التقدير", 20)]
+        sheets.append(
+            Sheet(
+                title=class_obj.name,
+                columns=columns,
+                rows=rows(class_obj, subjects),
+                preamble=[
+                    "الجمهورية الجزائرية الديمقراطية الشعبية",
+                    f"وزارة التربية الوطنية — {school.name}",
+                    f"كشف النقاط — القسم: {class_obj.name} — الفصل {trimester} "
+                    f"— {academic_year.name}",
+                ],
+                bordered=True,
+            )
         )
-        wb.save(response)
-        return response
+    return sheets
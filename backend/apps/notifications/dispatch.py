@@ -0,0 +1,315 @@
+"""
+╔══════════════════════════════════════════════════════════════════════════╗
+║  Notifications — Multi-channel dispatcher                              ║
+║                                                                        ║
+║  One entry point for every fan-out (in-app + push + SMS + WebSocket).  ║
+║  A batch of NotificationIntents is delivered with a fixed number of    ║
+║  queries whatever its size:                                            ║
+║                                                                        ║
+║    1. preferences of every recipient      — 1 SELECT                   ║
+║    2. Notification rows                    — bulk INSERT (+ cached     ║
+║       unread counters, apps.notifications.inbox)                       ║
+║    3. device tokens of the push recipients — 1 SELECT, then FCM        ║
+║       multicast per identical payload (chunks of 500 tokens);          ║
+║       tokens FCM reports unregistered are deleted                      ║
+║    4. SMS (URGENT + sms_<category> enabled) — bulk INSERT + send task  ║
+║    5. WebSocket events                     — one channel-layer batch   ║
+║                                                                        ║
+║  Preferences: INFO = in-app only, IMPORTANT = + push (unless the       ║
+║  category is muted or silent mode is on), URGENT = + SMS, and push     ║
+║  even in silent mode.                                                  ║
+╚══════════════════════════════════════════════════════════════════════════╝
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+
+from . import inbox
+
+logger = logging.getLogger(__name__)
+
+# Tokens per send_each_for_multicast call (FCM limit)
+FCM_MULTICAST_LIMIT = 500
+
+# Notification.notification_type → Notification.category
+TYPE_CATEGORIES = {
+    "GRADE": "ACADEMIC",
+    "HOMEWORK": "ACADEMIC",
+    "REPORT_CARD": "ACADEMIC",
+    "ATTENDANCE": "ATTENDANCE",
+    "PAYMENT": "FINANCE",
+    "LIBRARY": "LIBRARY",
+    "TRANSPORT": "TRANSPORT",
+    "CANTEEN": "CANTEEN",
+    "MESSAGE": "MESSAGE",
+}
+
+# Notification.category → suffix of the push_* / sms_* preference fields
+PREFERENCE_KEYS = {"MESSAGE": "messages"}
+
+
+@dataclass
+class NotificationIntent:
+    """
+    One notification for one user.
+
+    ``push_title`` / ``push_body`` override the in-app text on the device
+    (shorter wording), ``data`` is the FCM data payload. ``ws_event`` is
+    the channel-layer event sent to ``notifications_<user_id>``; by
+    default a generic ``notification`` event carrying the in-app row.
+    """
+
+    user_id: object
+    school_id: object
+    title: str
+    body: str
+    notification_type: str = "SYSTEM"
+    priority: str = "IMPORTANT"
+    related_object_id: object = None
+    related_object_type: str | None = None
+    data: dict = field(default_factory=dict)
+    push_title: str | None = None
+    push_body: str | None = None
+    sms_text: str | None = None
+    ws_event: dict | None = None
+
+
+def category_for(notification_type: str) -> str:
+    return TYPE_CATEGORIES.get(notification_type, "SYSTEM")
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Dispatcher
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def dispatch(intents, *, websocket: bool = True) -> dict:
+    """
+    Deliver a batch of NotificationIntents on every channel they are
+    entitled to (see module docstring). Returns the counts per channel.
+    """
+    from apps.notifications.models import Notification, NotificationPreference
+
+    intents = list(intents)
+    result = {"notifications": 0, "push_tokens": 0, "pruned_tokens": 0, "sms": 0, "websocket": 0}
+    if not intents:
+        return result
+
+    prefs = {
+        str(pref.user_id): pref
+        for pref in NotificationPreference.objects.filter(
+            user_id__in={intent.user_id for intent in intents}
+        )
+    }
+    defaults = NotificationPreference()
+
+    notifications = Notification.objects.bulk_create(
+        [
+            Notification(
+                user_id=intent.user_id,
+                school_id=intent.school_id,
+                title=intent.title[:255],
+                body=intent.body,
+                notification_type=intent.notification_type,
+                priority=intent.priority,
+                category=category_for(intent.notification_type),
+                related_object_id=intent.related_object_id,
+                related_object_type=intent.related_object_type,
+            )
+            for intent in intents
+        ],
+        batch_size=500,
+    )
+    result["notifications"] = len(notifications)
+    # bulk_create sends no post_save: update the cached inbox state here
+    inbox.notifications_created(notifications)
+
+    push, sms = [], []
+    for intent, notification in zip(intents, notifications):
+        pref = prefs.get(str(intent.user_id), defaults)
+        key = PREFERENCE_KEYS.get(notification.category, notification.category)
+        urgent = intent.priority == Notification.Priority.URGENT
+        if (
+            intent.priority != Notification.Priority.INFO
+            and pref.is_push_enabled(key)
+            and (urgent or not pref.is_in_silent_mode())
+        ):
+            push.append((intent, notification))
+        if urgent and pref.is_sms_enabled(key):
+            sms.append((intent, notification))
+
+    if push:
+        sent = send_pushes(
+            [
+                (
+                    intent.user_id,
+                    intent.push_title or intent.title,
+                    intent.push_body or intent.body,
+                    intent.data,
+                )
+                for intent, _ in push
+            ]
+        )
+        result["push_tokens"] = sent["tokens"]
+        result["pruned_tokens"] = sent["pruned"]
+        reached = sent["users"]
+        Notification.objects.filter(
+            pk__in=[n.pk for intent, n in push if str(intent.user_id) in reached]
+        ).update(push_sent=True)
+
+    if sms:
+        result["sms"] = _send_sms(sms)
+
+    if websocket:
+        result["websocket"] = send_ws_events(
+            [
+                (
+                    f"notifications_{intent.user_id}",
+                    intent.ws_event or _notification_event(notification),
+                )
+                for intent, notification in zip(intents, notifications)
+            ]
+        )
+    return result
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Channels
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def send_pushes(pushes, *, tokens_by_user=None) -> dict:
+    """
+    FCM delivery of (user_id, title, body, data) tuples.
+
+    Device tokens are fetched in one query (or taken from
+    ``tokens_by_user``, {str(user_id): [tokens]}, when the caller already
+    has them — see core.audience); tuples with the same payload
+    share send_each_for_multicast calls of up to FCM_MULTICAST_LIMIT
+    tokens, and the tokens reported unregistered are deleted at the end.
+    Returns {"tokens": sent, "pruned": deleted, "users": {user ids reached}}.
+    """
+    from apps.notifications.models import DeviceToken
+    from core.firebase import send_push_to_multiple
+
+    result = {"tokens": 0, "pruned": 0, "users": set()}
+    pushes = list(pushes)
+    if not pushes:
+        return result
+
+    if tokens_by_user is None:
+        tokens_by_user = {}
+        for user_id, token in DeviceToken.objects.filter(
+            user_id__in={user_id for user_id, *_ in pushes}
+        ).values_list("user_id", "token"):
+            tokens_by_user.setdefault(str(user_id), []).append(token)
+
+    payloads = {}
+    for user_id, title, body, data in pushes:
+        tokens = tokens_by_user.get(str(user_id))
+        if not tokens:
+            continue
+        key = (title, body, json.dumps(data or {}, sort_keys=True, default=str))
+        payload = payloads.setdefault(key, (title, body, data or {}, {}))
+        for token in tokens:
+            payload[3][token] = str(user_id)
+
+    unregistered = []
+    for title, body, data, owners in payloads.values():
+        tokens = list(owners)
+        for start in range(0, len(tokens), FCM_MULTICAST_LIMIT):
+            chunk = tokens[start : start + FCM_MULTICAST_LIMIT]
+            try:
+                response = send_push_to_multiple(chunk, title, body, data)
+            except Exception:
+                logger.exception("Multicast push failed (%d tokens)", len(chunk))
+                continue
+            dead = set(response.get("unregistered_tokens") or ())
+            unregistered.extend(dead)
+            result["tokens"] += len(chunk)
+            result["users"].update(owners[token] for token in chunk if token not in dead)
+
+    if unregistered:
+        result["pruned"], _ = DeviceToken.objects.filter(token__in=unregistered).delete()
+        logger.info("Pruned %d unregistered FCM tokens", result["pruned"])
+    return result
+
+
+def send_ws_events(events) -> int:
+    """
+    Send (group, event) pairs through the channel layer in one event-loop
+    round trip (concurrent group_send) instead of one async_to_sync call
+    per recipient. Best-effort: recipients may not be connected.
+    """
+    import asyncio
+
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+
+    events = list(events)
+    if not events:
+        return 0
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return 0
+
+    async def send_all():
+        return await asyncio.gather(
+            *(channel_layer.group_send(group, event) for group, event in events),
+            return_exceptions=True,
+        )
+
+    try:
+        results = async_to_sync(send_all)()
+    except Exception:
+        logger.warning("WebSocket fan-out failed for %d events", len(events))
+        return 0
+    return sum(1 for outcome in results if not isinstance(outcome, Exception))
+
+
+def _notification_event(notification) -> dict:
+    return {
+        "type": "notification",
+        "id": str(notification.pk),
+        "title": notification.title,
+        "body": notification.body,
+        "notification_type": notification.notification_type,
+        "priority": notification.priority,
+    }
+
+
+def _send_sms(entries) -> int:
+    """Queue one SMSMessage per (intent, notification) and its send task."""
+    from apps.accounts.models import User
+    from apps.notifications.models import Notification
+    from apps.sms.models import SMSMessage
+    from apps.sms.tasks import send_sms_task
+
+    users = {
+        str(user.pk): user
+        for user in User.objects.filter(
+            pk__in={intent.user_id for intent, _ in entries}
+        ).only("pk", "phone_number", "first_name", "last_name")
+    }
+    messages, notified = [], []
+    for intent, notification in entries:
+        user = users.get(str(intent.user_id))
+        if user is None or not user.phone_number:
+            continue
+        messages.append(
+            SMSMessage(
+                school_id=intent.school_id,
+                recipient_phone=user.phone_number,
+                recipient_name=user.full_name[:150],
+                content=intent.sms_text or f"{intent.title} — {intent.body}",
+                event_type=SMSMessage.EventType.CUSTOM,
+            )
+        )
+        notified.append(notification.pk)
+
+    SMSMessage.objects.bulk_create(messages, batch_size=500)
+    Notification.objects.filter(pk__in=notified).update(sms_sent=True)
+    for message in messages:
+        send_sms_task.delay(str(message.pk))
+    return len(messages)
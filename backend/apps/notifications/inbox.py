@@ -0,0 +1,177 @@
+"""
+Cached notification inbox state, polled by the mobile apps on every
+app focus (unread badge + "anything new?").
+
+Two cache entries per user in the default cache (Redis):
+
+    notif_unread_<user_id>  →  number of unread notifications
+    notif_latest_<user_id>  →  created_at (ISO) of the newest notification
+
+Both are filled from the database on a cache miss, then kept up to date
+from the writes: a created notification increments the counter and
+moves the latest marker forward (post_save signal, dispatcher bulk
+inserts), marking read decrements it, mark-all-read resets it to 0.
+Updates are applied once the transaction commits. A counter that
+missed an update (cache eviction, write racing a recompute) is
+corrected when it expires, after INBOX_CACHE_TTL seconds.
+
+So the common poll — nothing new since the client's cursor — is
+answered from Redis without touching Postgres:
+
+    from apps.notifications import inbox
+    if not inbox.has_new_since(user.pk, cursor): ...
+"""
+
+import logging
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+# Cached counters and markers are recomputed from the database at least
+# this often
+INBOX_CACHE_TTL = 60 * 60
+
+
+def _unread_key(user_id) -> str:
+    return f"notif_unread_{user_id}"
+
+
+def _latest_key(user_id) -> str:
+    return f"notif_latest_{user_id}"
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Reads
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def unread_count(user_id) -> int:
+    """Unread notifications of the user (COUNT query on a cache miss)."""
+    try:
+        count = cache.get(_unread_key(user_id))
+    except Exception:
+        logger.warning("Unread counter lookup failed for user %s", user_id)
+        count = None
+    if count is not None:
+        return max(count, 0)
+
+    from apps.notifications.models import Notification
+
+    count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+    try:
+        # add(): never overwrite a counter updated in the meantime
+        cache.add(_unread_key(user_id), count, timeout=INBOX_CACHE_TTL)
+    except Exception:
+        pass
+    return count
+
+
+def latest_created_at(user_id):
+    """created_at of the user's newest notification, None if none."""
+    try:
+        cached = cache.get(_latest_key(user_id))
+    except Exception:
+        logger.warning("Inbox marker lookup failed for user %s", user_id)
+        cached = None
+    if cached is not None:
+        return parse_datetime(cached) if cached else None
+
+    from apps.notifications.models import Notification
+
+    latest = (
+        Notification.objects.filter(user_id=user_id)
+        .order_by("-created_at")
+        .values_list("created_at", flat=True)
+        .first()
+    )
+    try:
+        cache.add(
+            _latest_key(user_id),
+            latest.isoformat() if latest else "",
+            timeout=INBOX_CACHE_TTL,
+        )
+    except Exception:
+        pass
+    return latest
+
+
+def has_new_since(user_id, since) -> bool:
+    """Whether the user has a notification created after ``since``."""
+    latest = latest_created_at(user_id)
+    return latest is not None and latest > since
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Writes (applied on commit)
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def notifications_created(notifications) -> None:
+    """Count new notifications in their users' counters and markers."""
+    unread = Counter()
+    latest = {}
+    for notification in notifications:
+        user_id = str(notification.user_id)
+        if not notification.is_read:
+            unread[user_id] += 1
+        if user_id not in latest or notification.created_at > latest[user_id]:
+            latest[user_id] = notification.created_at
+    if latest:
+        transaction.on_commit(lambda: _apply_created(unread, latest))
+
+
+def notifications_read(user_id, count: int = 1) -> None:
+    """``count`` notifications of the user were marked read."""
+    if count:
+        transaction.on_commit(lambda: _decrement(user_id, count))
+
+
+def all_read(user_id) -> None:
+    """Every notification of the user was marked read."""
+    transaction.on_commit(lambda: _reset(user_id))
+
+
+def _apply_created(unread, latest) -> None:
+    for user_id, count in unread.items():
+        try:
+            cache.incr(_unread_key(user_id), count)
+        except ValueError:
+            pass  # not cached: recomputed on the next read
+        except Exception:
+            logger.warning("Unread counter update failed for user %s", user_id)
+
+    try:
+        cached = cache.get_many([_latest_key(user_id) for user_id in latest])
+        cache.set_many(
+            {
+                _latest_key(user_id): created_at.isoformat()
+                for user_id, created_at in latest.items()
+                if not cached.get(_latest_key(user_id))
+                or parse_datetime(cached[_latest_key(user_id)]) < created_at
+            },
+            timeout=INBOX_CACHE_TTL,
+        )
+    except Exception:
+        logger.warning("Inbox marker update failed for %d users", len(latest))
+
+
+def _decrement(user_id, count) -> None:
+    key = _unread_key(user_id)
+    try:
+        if cache.decr(key, count) < 0:
+            cache.delete(key)
+    except ValueError:
+        pass  # not cached
+    except Exception:
+        logger.warning("Unread counter update failed for user %s", user_id)
+
+
+def _reset(user_id) -> None:
+    try:
+        cache.set(_unread_key(user_id), 0, timeout=INBOX_CACHE_TTL)
+    except Exception:
+        logger.warning("Unread counter reset failed for user %s", user_id)
@@ -0,0 +1,60 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_push_outbox'),
+        ('schools', '0007_contentresource'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('notification_type', models.CharField(choices=[('GRADE', 'Grade'), ('HOMEWORK', 'Homework'), ('ATTENDANCE', 'Attendance'), ('ANNOUNCEMENT', 'Announcement'), ('MESSAGE', 'Message'), ('REPORT_CARD', 'Report Card'), ('PAYMENT', 'Payment'), ('EVENT', 'Event'), ('DISCIPLINE', 'Discipline'), ('LIBRARY', 'Library'), ('TRANSPORT', 'Transport'), ('CANTEEN', 'Canteen'), ('INFIRMERIE', 'Infirmerie'), ('SMS', 'SMS'), ('SYSTEM', 'System')], max_length=20)),
+                ('priority', models.CharField(choices=[('URGENT', 'Urgente (push + SMS)'), ('IMPORTANT', 'Importante (push)'), ('INFO', 'Information (in-app)')], max_length=10)),
+                ('category', models.CharField(choices=[('ACADEMIC', 'Académique'), ('ATTENDANCE', 'Présences'), ('FINANCE', 'Finances'), ('LIBRARY', 'Bibliothèque'), ('TRANSPORT', 'Transport'), ('CANTEEN', 'Cantine'), ('MESSAGE', 'Messages'), ('SYSTEM', 'Système')], max_length=15)),
+                ('related_object_id', models.UUIDField(blank=True, null=True)),
+                ('related_object_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('is_read', models.BooleanField(default=True)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('push_sent', models.BooleanField(default=False)),
+                ('sms_sent', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'notifications_archive',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['user'], name='notif_user_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', True)), fields=['created_at'], name='notif_read_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='school',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='schools.school'),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -85,11 +85,75 @@ class Notification(models.Model):
     class Meta:
         db_table = "notifications"
         ordering = ["-created_at"]
+        indexes = [
+            # Inbox page and delta sync (created_at > cursor)
+            models.Index(fields=["user", "-created_at"], name="notif_user_created_idx"),
+            # Unread counter recomputed after a cache miss
+            models.Index(
+                fields=["user"],
+                condition=models.Q(is_read=False),
+                name="notif_user_unread_idx",
+            ),
+            # Archival of old read notifications
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(is_read=True),
+                name="notif_read_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.full_name}: {self.title}"
 
 
+# ---------------------------------------------------------------------------
+# NotificationArchive — read notifications past the retention period
+# ---------------------------------------------------------------------------
+
+
+class NotificationArchive(models.Model):
+    """
+    Read notifications older than NOTIFICATION_RETENTION_DAYS, moved out
+    of the ``notifications`` table by
+    ``apps.notifications.tasks.archive_read_notifications`` so the inbox
+    queries only scan recent rows. Same columns, plus ``archived_at``.
+    """
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    user = models.ForeignKey(
+        "accounts.User",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    school = models.ForeignKey(
+        "schools.School",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    title = models.CharField(max_length=255)
+    body = models.TextField()
+    notification_type = models.CharField(
+        max_length=20, choices=Notification.NotificationType.choices
+    )
+    priority = models.CharField(max_length=10, choices=Notification.Priority.choices)
+    category = models.CharField(max_length=15, choices=Notification.Category.choices)
+    related_object_id = models.UUIDField(null=True, blank=True)
+    related_object_type = models.CharField(max_length=50, blank=True, null=True)
+    is_read = models.BooleanField(default=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+    push_sent = models.BooleanField(default=False)
+    sms_sent = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "notifications_archive"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"[archive] {self.user_id}: {self.title}"
+
+
 # ---------------------------------------------------------------------------
 # NotificationPreference — per-user notification settings
 # ---------------------------------------------------------------------------
@@ -188,3 +252,37 @@ class DeviceToken(models.Model):
 
     def __str__(self):
         return f"{self.user.full_name} — {self.platform} token"
+
+
+# ---------------------------------------------------------------------------
+# PushOutbox — push notifications waiting for the push worker
+# ---------------------------------------------------------------------------
+
+
+class PushOutbox(models.Model):
+    """
+    Push intent written by the WebSocket consumers instead of calling FCM
+    from the event loop. Rows are drained in batches by
+    ``apps.notifications.tasks.drain_push_outbox``, which coalesces the
+    rows of a user sharing a ``group_key`` (same conversation / room)
+    into a single notification.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        "accounts.User",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    group_key = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "push_outbox"
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"Push → {self.user_id} ({self.group_key or self.title})"
@@ -0,0 +1,21 @@
+"""
+╔══════════════════════════════════════════════════════════════════════════╗
+║  Notification Signals                                                  ║
+║                                                                        ║
+║  post_save on Notification (created)                                   ║
+║     → the user's cached unread counter and newest-notification marker  ║
+║       (apps.notifications.inbox) are updated once the row commits.     ║
+║       Bulk inserts (dispatcher) update them explicitly.                ║
+╚══════════════════════════════════════════════════════════════════════════╝
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import inbox
+
+
+@receiver(post_save, sender="notifications.Notification")
+def notification_created(sender, instance, created, **kwargs):
+    if created:
+        inbox.notifications_created([instance])
@@ -1,11 +1,10 @@
 """
 Celery tasks for sending push notifications via Firebase V1 API.
+Fan-outs go through the multi-channel dispatcher (dispatch.py).
 """
 
 import logging
 
-import logging
-
 from celery import shared_task
 
 logger = logging.getLogger(__name__)
@@ -21,63 +20,50 @@ def send_notification(
     related_object_type: str | None = None,
 ):
     """
-    Send a push notification to a single user via Firebase V1 API.
-    Called asynchronously via Celery.
+    In-app notification + push (+ WebSocket) for a single user, through
+    the dispatcher. Called asynchronously via Celery.
     """
     from django.contrib.auth import get_user_model
 
-    from core.firebase import send_push_notification as firebase_send
+    from apps.notifications.dispatch import NotificationIntent, dispatch
 
     User = get_user_model()
-    try:
-        user = User.objects.get(id=user_id)
-        if not user.fcm_token:
-            return {"status": "skipped", "reason": "No FCM token"}
-
-        result = firebase_send(
-            device_token=user.fcm_token,
-            title=title,
-            body=body,
-            data=data,
-        )
-
-        if result.get("success"):
-            return {
-                "status": "sent",
-                "user_id": str(user_id),
-                "message_id": result["message_id"],
-            }
-
-        # If token is unregistered, clear it from the user
-        if result.get("error") == "token_unregistered":
-            user.fcm_token = None
-            user.save(update_fields=["fcm_token"])
-            logger.warning("Cleared expired FCM token for user %s", user_id)
-
-        return {
-            "status": "failed",
-            "user_id": str(user_id),
-            "error": result.get("error"),
-        }
-
-    except User.DoesNotExist:
+    school_id = User.objects.filter(pk=user_id).values_list("school_id", flat=True).first()
+    if school_id is None:
         return {"status": "failed", "reason": "User not found"}
 
-    Notification.objects.create(
-        user=user,
-        school=user.school,
-        title=title,
-        body=body,
-        notification_type=notification_type,
-        related_object_id=related_object_id,
-        related_object_type=related_object_type,
+    dispatch(
+        [
+            NotificationIntent(
+                user_id=user_id,
+                school_id=school_id,
+                title=title,
+                body=body,
+                notification_type=notification_type,
+                related_object_id=related_object_id,
+                related_object_type=related_object_type,
+            )
+        ]
     )
-
-    # Fire push (async chained task)
-    send_push_notification.delay(user_id, title, body)
     return {"status": "created", "user_id": user_id}
 
 
+# ---------------------------------------------------------------------------
+# 2. dispatch_notifications — a whole batch in one task
+# ---------------------------------------------------------------------------
+
+
+@shared_task
+def dispatch_notifications(intents: list[dict]):
+    """
+    Deliver a batch of NotificationIntents given as dicts (JSON-friendly
+    for Celery): one task per fan-out instead of one per recipient.
+    """
+    from apps.notifications.dispatch import NotificationIntent, dispatch
+
+    return dispatch(NotificationIntent(**intent) for intent in intents)
+
+
 # ---------------------------------------------------------------------------
 # 3. notify_parents_of_absence
 # ---------------------------------------------------------------------------
@@ -90,6 +76,7 @@ def notify_parents_of_absence(student_profile_id: str, date_str: str):
     who was marked absent on the given date.
     """
     from apps.academics.models import StudentProfile
+    from apps.notifications.dispatch import NotificationIntent, dispatch
 
     try:
         student = StudentProfile.objects.select_related("user").get(
@@ -98,15 +85,18 @@ def notify_parents_of_absence(student_profile_id: str, date_str: str):
     except StudentProfile.DoesNotExist:
         return {"status": "failed", "reason": "Student not found"}
 
-    for parent_profile in student.parents.select_related("user").all():
-        send_notification.delay(
-            user_id=str(parent_profile.user_id),
+    dispatch(
+        NotificationIntent(
+            user_id=parent_profile.user_id,
+            school_id=parent_profile.user.school_id,
             title="Absence Alert",
             body=(f"{student.user.full_name} was marked absent on {date_str}."),
             notification_type="ATTENDANCE",
             related_object_id=str(student.pk),
             related_object_type="StudentProfile",
         )
+        for parent_profile in student.parents.select_related("user")
+    )
 
     return {"status": "notified", "student": str(student_profile_id)}
 
@@ -123,44 +113,50 @@ def notify_grade_published(grade_id: str):
     when a grade is published.
     """
     from apps.grades.models import Grade
+    from apps.notifications.dispatch import NotificationIntent, dispatch
 
     try:
-        grade = Grade.objects.select_related("student__user", "exam_type__subject").get(
-            pk=grade_id
-        )
+        grade = Grade.objects.select_related(
+            "student__user", "exam_type__subject"
+        ).get(pk=grade_id)
     except Grade.DoesNotExist:
         return {"status": "failed", "reason": "Grade not found"}
 
-    title = "New grade published"
     et = grade.exam_type
     body = f"{et.subject.name} T{et.trimester} {et.name}: {grade.score}/{et.max_score}"
+    common = {
+        "notification_type": "GRADE",
+        "related_object_id": str(grade.pk),
+        "related_object_type": "Grade",
+    }
 
-    # Notify student
-    send_notification.delay(
-        user_id=str(grade.student.user_id),
-        title=title,
-        body=f"Your {body}",
-        notification_type="GRADE",
-        related_object_id=str(grade.pk),
-        related_object_type="Grade",
-    )
-
-    # Notify parents
-    for parent_profile in grade.student.parents.select_related("user").all():
-        send_notification.delay(
-            user_id=str(parent_profile.user_id),
+    student_user = grade.student.user
+    intents = [
+        NotificationIntent(
+            user_id=student_user.pk,
+            school_id=student_user.school_id,
+            title="New grade published",
+            body=f"Your {body}",
+            **common,
+        )
+    ]
+    intents += [
+        NotificationIntent(
+            user_id=parent_profile.user_id,
+            school_id=parent_profile.user.school_id,
             title="Grade published",
-            body=f"{grade.student.user.full_name}'s {body}",
-            notification_type="GRADE",
-            related_object_id=str(grade.pk),
-            related_object_type="Grade",
+            body=f"{student_user.full_name}'s {body}",
+            **common,
         )
+        for parent_profile in grade.student.parents.select_related("user")
+    ]
+    dispatch(intents)
 
     return {"status": "notified", "grade": grade_id}
 
 
 # ---------------------------------------------------------------------------
-# 5. notify_admin_grade_submitted — in-app only
+# 5. send_bulk_notification — push only
 # ---------------------------------------------------------------------------
 
 
@@ -169,36 +165,19 @@ def send_bulk_notification(
     user_ids: list[str], title: str, body: str, data: dict | None = None
 ):
     """
-    Send push notification to multiple users.
-    Collects FCM tokens and uses Firebase multicast (up to 500 per call).
+    Send push notification to multiple users (no in-app row).
+    Device tokens are fetched in one query and sent by FCM multicast
+    (up to 500 per call); unregistered tokens are pruned.
     """
-    from django.contrib.auth import get_user_model
-
-    from core.firebase import send_push_to_multiple
+    from apps.notifications.dispatch import send_pushes
 
-    User = get_user_model()
-    tokens = list(
-        User.objects.filter(
-            id__in=user_ids,
-            fcm_token__isnull=False,
-        )
-        .exclude(fcm_token="")
-        .values_list("fcm_token", flat=True)
-    )
-
-    if not tokens:
+    result = send_pushes((user_id, title, body, data) for user_id in user_ids)
+    if not result["tokens"]:
         return {"status": "skipped", "reason": "No valid FCM tokens"}
-
-    result = send_push_to_multiple(
-        device_tokens=tokens,
-        title=title,
-        body=body,
-        data=data,
-    )
     return {
         "status": "sent",
-        "success_count": result["success_count"],
-        "failure_count": result["failure_count"],
+        "tokens": result["tokens"],
+        "pruned_tokens": result["pruned"],
     }
 
 
@@ -258,3 +237,221 @@ def send_weekly_notification_summary():
         )
 
     return {"status": "done", "users_notified": prefs.count()}
+
+
+# ---------------------------------------------------------------------------
+# 7. drain_push_outbox — coalesced, batched FCM delivery of PushOutbox rows
+# ---------------------------------------------------------------------------
+
+PUSH_OUTBOX_PENDING_KEY = "push_outbox_drain_pending"
+
+# Rows locked and delivered per transaction by drain_push_outbox
+PUSH_OUTBOX_BATCH_SIZE = 500
+
+
+def queue_push(user_ids, title: str, body: str, data=None, group_key: str = "") -> int:
+    """
+    Write one PushOutbox row per offline user among ``user_ids`` and make
+    sure a drain is scheduled. Nothing is sent to FCM here: the caller
+    (typically a WebSocket consumer) only pays for one INSERT and, for
+    the first push of a coalescing window, one broker publish.
+
+    Returns the number of rows written.
+    """
+    from apps.notifications.models import PushOutbox
+    from core.presence import offline_user_ids
+
+    user_ids = offline_user_ids(user_ids)
+    if not user_ids:
+        return 0
+
+    PushOutbox.objects.bulk_create(
+        [
+            PushOutbox(
+                user_id=user_id,
+                title=title[:255],
+                body=body,
+                data=data or {},
+                group_key=group_key,
+            )
+            for user_id in user_ids
+        ]
+    )
+    schedule_push_drain()
+    return len(user_ids)
+
+
+def schedule_push_drain() -> bool:
+    """
+    Enqueue drain_push_outbox once per coalescing window.
+
+    Same debounce as the grade cascade: the first call sets the pending
+    marker (cache ``add`` → Redis SET NX) and enqueues the drain with a
+    countdown, the following calls are no-ops until the drain starts.
+    Messages sent in a burst are therefore delivered by a single drain,
+    which folds them into one notification per user and conversation.
+
+    Returns True if a drain was enqueued.
+    """
+    from django.conf import settings
+    from django.core.cache import cache
+
+    window = getattr(settings, "PUSH_OUTBOX_COALESCE_SECONDS", 3)
+    if not cache.add(PUSH_OUTBOX_PENDING_KEY, True, timeout=window * 12 + 60):
+        return False
+    drain_push_outbox.apply_async(countdown=window)
+    return True
+
+
+def coalesce_pushes(rows) -> list:
+    """
+    Fold PushOutbox rows into notifications: the rows of one user with the
+    same ``group_key`` become a single push carrying the latest title and
+    data with "N nouveaux messages" as body. Rows without a group key are
+    kept as they are. Returns (user_id, title, body, data) tuples in the
+    order of the rows.
+    """
+    groups = {}
+    for row in rows:
+        key = (row.user_id, row.group_key or f"row:{row.pk}")
+        groups.setdefault(key, []).append(row)
+
+    pushes = []
+    for (user_id, _), group in groups.items():
+        latest = group[-1]
+        if len(group) == 1:
+            pushes.append((user_id, latest.title, latest.body, latest.data))
+        else:
+            pushes.append(
+                (
+                    user_id,
+                    latest.title,
+                    f"{len(group)} nouveaux messages",
+                    {**latest.data, "count": len(group)},
+                )
+            )
+    return pushes
+
+
+def deliver_pushes(pushes) -> int:
+    """
+    Send coalesced pushes (dispatch.send_pushes) to the users who are
+    still offline; those who came online since the push was queued are
+    skipped. Returns the number of tokens targeted.
+    """
+    from apps.notifications.dispatch import send_pushes
+    from core.presence import offline_user_ids
+
+    offline = set(offline_user_ids({user_id for user_id, *_ in pushes}))
+    if not offline:
+        return 0
+    return send_pushes(push for push in pushes if push[0] in offline)["tokens"]
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def drain_push_outbox(self, batch_size: int = PUSH_OUTBOX_BATCH_SIZE):
+    """
+    Deliver the queued PushOutbox rows, ``batch_size`` rows per
+    transaction. Rows are locked with SKIP LOCKED so concurrent drains
+    (debounced run + beat sweep) never send the same row twice, and
+    are deleted in the transaction that delivered them.
+
+    Routed to the dedicated ``push`` queue (CELERY_TASK_ROUTES).
+    """
+    from django.core.cache import cache
+    from django.db import transaction
+
+    from apps.notifications.models import PushOutbox
+
+    # Pushes queued from now on schedule a new drain
+    cache.delete(PUSH_OUTBOX_PENDING_KEY)
+
+    rows_done = tokens_sent = 0
+    try:
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    PushOutbox.objects.select_for_update(skip_locked=True).order_by("id")[
+                        :batch_size
+                    ]
+                )
+                if not rows:
+                    break
+                tokens_sent += deliver_pushes(coalesce_pushes(rows))
+                PushOutbox.objects.filter(pk__in=[row.pk for row in rows]).delete()
+            rows_done += len(rows)
+            if len(rows) < batch_size:
+                break
+    except Exception as exc:
+        logger.exception("drain_push_outbox failed")
+        raise self.retry(exc=exc)
+
+    if rows_done:
+        logger.info("Push outbox: %d rows drained, %d tokens targeted", rows_done, tokens_sent)
+    return {"rows": rows_done, "tokens": tokens_sent}
+
+
+# ---------------------------------------------------------------------------
+# 8. archive_read_notifications — retention of the notifications table
+# ---------------------------------------------------------------------------
+
+# Rows moved per statement by archive_read_notifications
+ARCHIVE_BATCH_SIZE = 5000
+
+_ARCHIVE_COLUMNS = (
+    "id, user_id, school_id, title, body, notification_type, priority, category, "
+    "related_object_id, related_object_type, is_read, read_at, push_sent, sms_sent, "
+    "created_at"
+)
+
+
+@shared_task
+def archive_read_notifications(
+    retention_days: int | None = None, batch_size: int = ARCHIVE_BATCH_SIZE
+):
+    """
+    Move the read notifications older than ``retention_days`` (default
+    NOTIFICATION_RETENTION_DAYS) to ``notifications_archive``.
+
+    Each batch is a single DELETE … RETURNING feeding an INSERT, so a row
+    is never in both tables nor lost; SKIP LOCKED leaves the rows being
+    updated by the app to the next run. Unread notifications are never
+    archived, so the cached unread counters stay valid.
+    Runs nightly via Celery beat.
+    """
+    from datetime import timedelta
+
+    from django.conf import settings
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from .models import Notification, NotificationArchive
+
+    if retention_days is None:
+        retention_days = settings.NOTIFICATION_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    table = Notification._meta.db_table
+    sql = (
+        f"WITH moved AS ("
+        f"  DELETE FROM {table} WHERE id IN ("
+        f"    SELECT id FROM {table} WHERE is_read AND created_at < %s"
+        f"    LIMIT %s FOR UPDATE SKIP LOCKED"
+        f"  ) RETURNING {_ARCHIVE_COLUMNS}"
+        f") "
+        f"INSERT INTO {NotificationArchive._meta.db_table} ({_ARCHIVE_COLUMNS}, archived_at) "
+        f"SELECT {_ARCHIVE_COLUMNS}, NOW() FROM moved"
+    )
+
+    archived = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [cutoff, batch_size])
+            moved = cursor.rowcount
+        archived += moved
+        if moved < batch_size:
+            break
+
+    if archived:
+        logger.info("Archived %d read notifications older than %s", archived, cutoff.date())
+    return {"archived": archived, "cutoff": cutoff.isoformat()}
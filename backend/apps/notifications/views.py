@@ -6,11 +6,13 @@ from datetime import timedelta
 
 from django.db.models import Count, Q
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from drf_spectacular.utils import OpenApiResponse, extend_schema, inline_serializer
 from rest_framework import permissions, serializers, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from . import inbox
 from .models import DeviceToken, Notification, NotificationPreference
 from .serializers import (
     DeviceTokenSerializer,
@@ -39,6 +41,11 @@ class NotificationListView(APIView):
     """
     GET /api/v1/notifications/
     List notifications for the current user.
+
+    With ``?since=<cursor>`` (created_at of the newest notification the
+    client holds) only the newer notifications are returned, oldest
+    first, with the next cursor and the unread count. When nothing is
+    new the answer comes from the cached inbox state, without a query.
     """
 
     permission_classes = [permissions.IsAuthenticated]
@@ -49,37 +56,80 @@ class NotificationListView(APIView):
         description=(
             "List notifications for the current user. "
             "Filterable by **is_read**, **type**, **priority**, **category** query params. "
-            "Returns last 30 days by default."
+            "Returns last 30 days by default. "
+            "With **since** (ISO datetime cursor), returns only newer notifications "
+            "as `{results, cursor, has_more, unread_count}`."
         ),
         responses={200: NotificationSerializer(many=True)},
     )
     def get(self, request):
+        page_size = min(int(request.query_params.get("page_size", 50)), 200)
+
+        since = request.query_params.get("since")
+        if since is not None:
+            return self._delta(request, since, page_size)
+
         # 30-day window by default
         thirty_days_ago = timezone.now() - timedelta(days=30)
         qs = Notification.objects.filter(
             user=request.user, created_at__gte=thirty_days_ago
         ).order_by("-created_at")
+        qs = self._filter(qs, request.query_params)
 
-        # Optional filters
-        is_read = request.query_params.get("is_read")
+        serializer = NotificationSerializer(qs[:page_size], many=True)
+        return Response(serializer.data)
+
+    @staticmethod
+    def _filter(qs, params):
+        is_read = params.get("is_read")
         if is_read is not None:
             qs = qs.filter(is_read=is_read.lower() == "true")
 
-        notification_type = request.query_params.get("type")
+        notification_type = params.get("type")
         if notification_type:
             qs = qs.filter(notification_type=notification_type.upper())
 
-        priority = request.query_params.get("priority")
+        priority = params.get("priority")
         if priority:
             qs = qs.filter(priority=priority.upper())
 
-        category = request.query_params.get("category")
+        category = params.get("category")
         if category:
             qs = qs.filter(category=category.upper())
+        return qs
 
-        page_size = min(int(request.query_params.get("page_size", 50)), 200)
-        serializer = NotificationSerializer(qs[:page_size], many=True)
-        return Response(serializer.data)
+    def _delta(self, request, since, page_size):
+        # An unencoded "+" of the UTC offset arrives as a space
+        cursor = parse_datetime(since.strip().replace(" ", "+"))
+        if cursor is None:
+            return Response(
+                {"detail": "since must be an ISO 8601 datetime."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if timezone.is_naive(cursor):
+            cursor = timezone.make_aware(cursor)
+
+        user = request.user
+        results, has_more = [], False
+        if inbox.has_new_since(user.pk, cursor):
+            qs = Notification.objects.filter(
+                user=user,
+                created_at__gt=max(cursor, timezone.now() - timedelta(days=30)),
+            ).order_by("created_at")
+            page = list(self._filter(qs, request.query_params)[: page_size + 1])
+            has_more = len(page) > page_size
+            results = page[:page_size]
+            if results:
+                cursor = results[-1].created_at
+
+        return Response(
+            {
+                "results": NotificationSerializer(results, many=True).data,
+                "cursor": cursor.isoformat(),
+                "has_more": has_more,
+                "unread_count": inbox.unread_count(user.pk),
+            }
+        )
 
 
 # ---------------------------------------------------------------------------
@@ -106,17 +156,16 @@ class NotificationMarkReadView(APIView):
         },
     )
     def post(self, request, pk):
-        try:
-            notification = Notification.objects.get(pk=pk, user=request.user)
-        except Notification.DoesNotExist:
+        notifications = Notification.objects.filter(pk=pk, user=request.user)
+        if notifications.filter(is_read=False).update(
+            is_read=True, read_at=timezone.now()
+        ):
+            inbox.notifications_read(request.user.pk)
+        elif not notifications.exists():
             return Response(
                 {"detail": "Notification not found."},
                 status=status.HTTP_404_NOT_FOUND,
             )
-
-        notification.is_read = True
-        notification.read_at = timezone.now()
-        notification.save(update_fields=["is_read", "read_at"])
         return Response({"detail": "Marked as read."})
 
 
@@ -144,6 +193,7 @@ class NotificationMarkAllReadView(APIView):
         Notification.objects.filter(user=request.user, is_read=False).update(
             is_read=True, read_at=timezone.now()
         )
+        inbox.all_read(request.user.pk)
         return Response({"detail": "All notifications marked as read."})
 
 
@@ -162,12 +212,14 @@ class UnreadCountView(APIView):
     @extend_schema(
         tags=["notifications"],
         summary="Get unread notification count",
-        description="Return the count of unread notifications for the current user.",
+        description=(
+            "Return the count of unread notifications for the current user "
+            "(cached counter, no query in the common case)."
+        ),
         responses={200: _UnreadCountSchema},
     )
     def get(self, request):
-        count = Notification.objects.filter(user=request.user, is_read=False).count()
-        return Response({"unread_count": count})
+        return Response({"unread_count": inbox.unread_count(request.user.pk)})
 
 
 # ---------------------------------------------------------------------------
@@ -0,0 +1,132 @@
+"""
+SMS sending engine — balance reservation, rate-aware delivery, bulk
+result recording.
+
+Used by the single-SMS task and by campaigns:
+
+  1. reserve_balance takes the SMS credit for a whole batch in one
+     locked UPDATE (F expression), so concurrent senders can never
+     overdraw ``SMSConfig.remaining_balance``;
+  2. the gateway delivers the batch within its provider limits
+     (pooled connections, max_concurrency in flight, token bucket,
+     native batch requests where available — see gateway.py);
+  3. every SMSMessage result is written with one bulk_update and the
+     credit of the failed sends is given back.
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+NO_GATEWAY = "Aucune passerelle SMS configurée"
+BALANCE_EXHAUSTED = "Solde SMS épuisé"
+
+# SMSMessage fields written after a send attempt
+RESULT_FIELDS = [
+    "status",
+    "gateway_message_id",
+    "sent_at",
+    "cost",
+    "error_message",
+    "updated_at",
+]
+
+
+def reserve_balance(config_id, wanted: int) -> int:
+    """Take up to ``wanted`` SMS credits; returns the number granted."""
+    from .models import SMSConfig
+
+    if wanted <= 0:
+        return 0
+    with transaction.atomic():
+        balance = (
+            SMSConfig.objects.select_for_update()
+            .filter(pk=config_id)
+            .values_list("remaining_balance", flat=True)
+            .first()
+        )
+        granted = min(wanted, balance or 0)
+        if granted:
+            SMSConfig.objects.filter(pk=config_id).update(
+                remaining_balance=F("remaining_balance") - granted
+            )
+    return granted
+
+
+def release_balance(config_id, count: int) -> None:
+    """Give back credits reserved for sends that failed."""
+    from .models import SMSConfig
+
+    if count > 0:
+        SMSConfig.objects.filter(pk=config_id).update(
+            remaining_balance=F("remaining_balance") + count
+        )
+
+
+def mark_failed(messages, error: str) -> int:
+    """Record ``error`` on every message (one bulk UPDATE)."""
+    from .models import SMSMessage
+
+    now = timezone.now()
+    for msg in messages:
+        msg.status = SMSMessage.Status.FAILED
+        msg.error_message = error
+        msg.updated_at = now
+    SMSMessage.objects.bulk_update(messages, RESULT_FIELDS, batch_size=500)
+    return len(messages)
+
+
+def send_messages(config, messages) -> dict:
+    """
+    Send pending SMSMessages of one school through its gateway.
+    Messages beyond the remaining balance fail with BALANCE_EXHAUSTED.
+    Returns {"sent": n, "failed": n}.
+    """
+    from .gateway import get_gateway
+    from .models import SMSConfig, SMSMessage
+
+    messages = list(messages)
+    if not messages:
+        return {"sent": 0, "failed": 0}
+
+    granted = reserve_balance(config.pk, len(messages))
+    to_send, refused = messages[:granted], messages[granted:]
+
+    results = get_gateway(config).deliver(
+        [{"phone": msg.recipient_phone, "message": msg.content} for msg in to_send]
+    )
+
+    now = timezone.now()
+    sent = 0
+    for msg, result in zip(to_send, results):
+        msg.updated_at = now
+        if result.success:
+            msg.status = SMSMessage.Status.SENT
+            msg.gateway_message_id = result.message_id
+            msg.sent_at = now
+            msg.cost = config.cost_per_sms
+            sent += 1
+        else:
+            msg.status = SMSMessage.Status.FAILED
+            msg.error_message = result.error
+    SMSMessage.objects.bulk_update(to_send, RESULT_FIELDS, batch_size=500)
+    release_balance(config.pk, len(to_send) - sent)
+    failed = len(to_send) - sent + (mark_failed(refused, BALANCE_EXHAUSTED) if refused else 0)
+
+    remaining = (
+        SMSConfig.objects.filter(pk=config.pk)
+        .values_list("remaining_balance", flat=True)
+        .first()
+    )
+    if remaining is not None and remaining <= config.alert_threshold:
+        logger.warning(
+            "SMS balance low for school %s: %d remaining (threshold: %d)",
+            config.school_id,
+            remaining,
+            config.alert_threshold,
+        )
+    return {"sent": sent, "failed": failed}
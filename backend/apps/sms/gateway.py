@@ -1,15 +1,67 @@
 """
 SMS Gateway abstraction — supports multiple Algerian and international providers.
 
-Each provider implements the BaseSMSGateway interface.
+Each provider implements the BaseSMSGateway interface and declares its
+sending limits: parallel requests (``max_concurrency``), sustained
+messages per second (``rate_per_second``, enforced by a token bucket
+shared by every sender of the same account in the process) and, for
+providers with a batch endpoint, recipients per request
+(``bulk_size``). Limits can be overridden per provider with the
+SMS_GATEWAY_LIMITS setting.
+
+HTTP calls go through one pooled requests.Session per provider account,
+so consecutive sends reuse their keep-alive connections.
 """
 
 import abc
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
 
+# ---------------------------------------------------------------------------
+# Connection pools and rate limits (per process, per provider account)
+# ---------------------------------------------------------------------------
+
+_sessions = {}
+_buckets = {}
+_registry_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: ``rate`` tokens per second, at most
+    ``capacity`` saved up. ``acquire(n)`` blocks until n tokens are
+    available.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n: int = 1) -> None:
+        if self.rate <= 0:
+            return
+        n = min(n, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+
 class SMSResult:
     """Result of a single SMS send attempt."""
 
@@ -24,11 +76,64 @@ class SMSResult:
 class BaseSMSGateway(abc.ABC):
     """Abstract base class for SMS gateways."""
 
-    def __init__(self, api_key: str, api_secret: str, api_url: str, sender_name: str):
+    # Parallel HTTP requests allowed by the provider
+    max_concurrency = 4
+    # Sustained messages per second
+    rate_per_second = 10
+    # Recipients per native batch request (0 = no batch endpoint)
+    bulk_size = 0
+
+    def __init__(
+        self,
+        api_key: str,
+        api_secret: str,
+        api_url: str,
+        sender_name: str,
+        bulk_api_url: str = "",
+    ):
         self.api_key = api_key
         self.api_secret = api_secret
         self.api_url = api_url
         self.sender_name = sender_name
+        self.bulk_api_url = bulk_api_url
+
+    @property
+    def account_key(self) -> tuple:
+        return (type(self).__name__, self.api_url, self.api_key)
+
+    @property
+    def session(self):
+        """Pooled HTTP session shared by every gateway of this account."""
+        with _registry_lock:
+            session = _sessions.get(self.account_key)
+            if session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=max(1, self.max_concurrency)
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _sessions[self.account_key] = session
+            return session
+
+    @property
+    def rate_limiter(self) -> TokenBucket:
+        """Token bucket shared by every gateway of this account."""
+        with _registry_lock:
+            bucket = _buckets.get(self.account_key)
+            if bucket is None or bucket.rate != self.rate_per_second:
+                bucket = TokenBucket(
+                    self.rate_per_second, max(self.rate_per_second, self.bulk_size)
+                )
+                _buckets[self.account_key] = bucket
+            return bucket
+
+    @property
+    def supports_bulk(self) -> bool:
+        return self.bulk_size > 0
 
     @abc.abstractmethod
     def send(self, phone: str, message: str) -> SMSResult:
@@ -49,6 +154,39 @@ class BaseSMSGateway(abc.ABC):
             results.append(self.send(r["phone"], r["message"]))
         return results
 
+    def deliver(self, recipients: list[dict]) -> list[SMSResult]:
+        """
+        Send to many recipients within the provider limits: batches of
+        ``bulk_size`` (or single sends), at most ``max_concurrency`` in
+        flight, paced by the account's token bucket. Results are in
+        recipient order.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if not recipients:
+            return []
+        size = self.bulk_size if self.supports_bulk else 1
+        chunks = [recipients[i : i + size] for i in range(0, len(recipients), size)]
+        limiter = self.rate_limiter
+
+        def run(chunk):
+            limiter.acquire(len(chunk))
+            try:
+                if len(chunk) == 1:
+                    return [self.send(chunk[0]["phone"], chunk[0]["message"])]
+                return self.send_bulk(chunk)
+            except Exception as e:
+                logger.exception("%s: batch of %d failed", type(self).__name__, len(chunk))
+                return [SMSResult(False, error=str(e))] * len(chunk)
+
+        workers = max(1, min(self.max_concurrency, len(chunks)))
+        if workers == 1:
+            batches = [run(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                batches = list(pool.map(run, chunks))
+        return [result for batch in batches for result in batch]
+
 
 # ---------------------------------------------------------------------------
 # Mobilis SMS Pro (Algeria)
@@ -58,11 +196,12 @@ class BaseSMSGateway(abc.ABC):
 class MobilisGateway(BaseSMSGateway):
     """Mobilis SMS Pro gateway integration."""
 
-    def send(self, phone: str, message: str) -> SMSResult:
-        import requests
+    max_concurrency = 8
+    rate_per_second = 25
 
+    def send(self, phone: str, message: str) -> SMSResult:
         try:
-            resp = requests.post(
+            resp = self.session.post(
                 self.api_url or "https://sms.mobilis.dz/api/send",
                 json={
                     "api_key": self.api_key,
@@ -81,10 +220,8 @@ class MobilisGateway(BaseSMSGateway):
             return SMSResult(False, error=str(e))
 
     def check_balance(self) -> int:
-        import requests
-
         try:
-            resp = requests.get(
+            resp = self.session.get(
                 self.api_url or "https://sms.mobilis.dz/api/balance",
                 params={"api_key": self.api_key},
                 timeout=10,
@@ -103,11 +240,12 @@ class MobilisGateway(BaseSMSGateway):
 class DjezzyGateway(BaseSMSGateway):
     """Djezzy Business SMS gateway."""
 
-    def send(self, phone: str, message: str) -> SMSResult:
-        import requests
+    max_concurrency = 8
+    rate_per_second = 25
 
+    def send(self, phone: str, message: str) -> SMSResult:
         try:
-            resp = requests.post(
+            resp = self.session.post(
                 self.api_url or "https://api.djezzy.dz/sms/send",
                 headers={"Authorization": f"Bearer {self.api_key}"},
                 json={
@@ -126,10 +264,8 @@ class DjezzyGateway(BaseSMSGateway):
             return SMSResult(False, error=str(e))
 
     def check_balance(self) -> int:
-        import requests
-
         try:
-            resp = requests.get(
+            resp = self.session.get(
                 self.api_url or "https://api.djezzy.dz/sms/balance",
                 headers={"Authorization": f"Bearer {self.api_key}"},
                 timeout=10,
@@ -148,11 +284,12 @@ class DjezzyGateway(BaseSMSGateway):
 class OoredooGateway(BaseSMSGateway):
     """Ooredoo Business SMS gateway."""
 
-    def send(self, phone: str, message: str) -> SMSResult:
-        import requests
+    max_concurrency = 4
+    rate_per_second = 10
 
+    def send(self, phone: str, message: str) -> SMSResult:
         try:
-            resp = requests.post(
+            resp = self.session.post(
                 self.api_url or "https://api.ooredoo.dz/sms/v1/send",
                 headers={"X-API-Key": self.api_key},
                 json={
@@ -171,10 +308,8 @@ class OoredooGateway(BaseSMSGateway):
             return SMSResult(False, error=str(e))
 
     def check_balance(self) -> int:
-        import requests
-
         try:
-            resp = requests.get(
+            resp = self.session.get(
                 self.api_url or "https://api.ooredoo.dz/sms/v1/balance",
                 headers={"X-API-Key": self.api_key},
                 timeout=10,
@@ -191,17 +326,29 @@ class OoredooGateway(BaseSMSGateway):
 
 
 class CustomGateway(BaseSMSGateway):
-    """Generic HTTP-based SMS gateway — configurable URL."""
+    """
+    Generic HTTP-based SMS gateway — configurable URL.
+
+    With a ``bulk_api_url`` the gateway sends up to 100 recipients per
+    request:  POST {"from", "messages": [{"to", "message"}, …]}  →
+    {"results": [{"id", "error"}, …]} in the same order.
+    """
+
+    max_concurrency = 16
+    rate_per_second = 100
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.bulk_api_url:
+            self.bulk_size = 100
 
     def send(self, phone: str, message: str) -> SMSResult:
         if not self.api_url:
             logger.warning("Custom gateway: no api_url configured, simulating send")
             return SMSResult(True, message_id="sim-local")
 
-        import requests
-
         try:
-            resp = requests.post(
+            resp = self.session.post(
                 self.api_url,
                 headers={
                     "Authorization": f"Bearer {self.api_key}",
@@ -228,6 +375,38 @@ class CustomGateway(BaseSMSGateway):
             logger.exception("Custom gateway SMS send error")
             return SMSResult(False, error=str(e))
 
+    def send_bulk(self, recipients: list[dict]) -> list[SMSResult]:
+        if not self.bulk_api_url:
+            return super().send_bulk(recipients)
+
+        try:
+            resp = self.session.post(
+                self.bulk_api_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={
+                    "from": self.sender_name,
+                    "messages": [
+                        {"to": r["phone"], "message": r["message"]} for r in recipients
+                    ],
+                },
+                timeout=30,
+            )
+            if resp.status_code not in (200, 201):
+                return [SMSResult(False, error=f"HTTP {resp.status_code}")] * len(recipients)
+            rows = resp.json().get("results") or []
+        except Exception as e:
+            logger.exception("Custom gateway bulk send error")
+            return [SMSResult(False, error=str(e))] * len(recipients)
+
+        results = []
+        for i in range(len(recipients)):
+            row = rows[i] if i < len(rows) else {}
+            if row.get("error"):
+                results.append(SMSResult(False, error=str(row["error"])))
+            else:
+                results.append(SMSResult(True, message_id=str(row.get("id", "ok"))))
+        return results
+
     def check_balance(self) -> int:
         return 0  # Not applicable for generic gateway
 
@@ -249,11 +428,21 @@ GATEWAY_MAP = {
 def get_gateway(config) -> BaseSMSGateway:
     """
     Build a gateway instance from an SMSConfig model instance.
+    Provider limits are overridden by SMS_GATEWAY_LIMITS, e.g.
+    {"MOBILIS": {"max_concurrency": 4, "rate_per_second": 10}}.
     """
+    from django.conf import settings
+
     cls = GATEWAY_MAP.get(config.provider, CustomGateway)
-    return cls(
+    gateway = cls(
         api_key=config.api_key,
         api_secret=config.api_secret,
         api_url=config.api_url,
         sender_name=config.sender_name,
+        bulk_api_url=getattr(config, "bulk_api_url", ""),
     )
+    limits = getattr(settings, "SMS_GATEWAY_LIMITS", {}).get(config.provider, {})
+    for name in ("max_concurrency", "rate_per_second", "bulk_size"):
+        if name in limits:
+            setattr(gateway, name, limits[name])
+    return gateway
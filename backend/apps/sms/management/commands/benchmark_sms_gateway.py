@@ -0,0 +1,172 @@
+"""
+Management command: benchmark_sms_gateway
+
+Campaign sending throughput (messages / second) against a local
+stand-in HTTP gateway, so it runs offline and costs no SMS credit.
+
+The stand-in answers POST /send (one message) and POST /bulk (the
+CustomGateway batch format) after --latency-ms milliseconds, plus
+--per-message-ms per message of a batch. Three senders are compared on
+--messages messages:
+
+  séquentiel   the former path: one requests.post per message, fresh
+               connection each time, one after the other
+  parallèle    CustomGateway.deliver without batch endpoint: pooled
+               keep-alive connections, --concurrency requests in flight
+  batch        CustomGateway.deliver with bulk_api_url: 100 recipients
+               per request
+
+--rate applies the token bucket (messages / second, 0 = unlimited) to
+the two engine senders, to check that a provider limit is respected.
+No database access.
+
+Usage:
+  python manage.py benchmark_sms_gateway
+  python manage.py benchmark_sms_gateway --messages 5000 --latency-ms 50 --rate 200
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as real gateways
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        if self.path == "/bulk":
+            messages = payload.get("messages", [])
+            time.sleep(server.latency + server.per_message * len(messages))
+            body = {"results": [{"id": f"b-{i}"} for i in range(len(messages))]}
+        else:
+            time.sleep(server.latency + server.per_message)
+            body = {"id": "s-1"}
+        with server.lock:
+            server.received += len(payload.get("messages", [None]))
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Measure SMS sending throughput against a local stand-in gateway."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--messages",
+            type=int,
+            default=2000,
+            help="Messages sent by each sender (default: 2000).",
+        )
+        parser.add_argument(
+            "--latency-ms",
+            type=float,
+            default=20,
+            help="Gateway response time per request (default: 20 ms).",
+        )
+        parser.add_argument(
+            "--per-message-ms",
+            type=float,
+            default=0.2,
+            help="Extra gateway time per message of a request (default: 0.2 ms).",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=16,
+            help="Requests in flight for the engine senders (default: 16).",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=0,
+            help="Token bucket, messages per second (default: 0 = unlimited).",
+        )
+
+    def handle(self, *args, **options):
+        n_messages = max(1, options["messages"])
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        server.daemon_threads = True
+        server.latency = options["latency_ms"] / 1000
+        server.per_message = options["per_message_ms"] / 1000
+        server.lock = threading.Lock()
+        server.received = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        recipients = [
+            {"phone": f"0550{i:06d}", "message": f"ILMI — Réunion des parents jeudi ({i})"}
+            for i in range(n_messages)
+        ]
+
+        self.stdout.write(
+            f"\n📊 SMS throughput — {n_messages} messages, gateway latency "
+            f"{options['latency_ms']:g} ms, concurrency {options['concurrency']}, "
+            f"rate {options['rate'] or '∞'} msg/s\n"
+        )
+        self.stdout.write(f"  {'émetteur':<14}{'durée':>10}{'msg/s':>10}{'requêtes':>10}")
+        try:
+            for label, run in (
+                ("séquentiel", lambda: self._sequential(base_url, recipients)),
+                ("parallèle", lambda: self._engine(base_url, recipients, options, bulk=False)),
+                ("batch", lambda: self._engine(base_url, recipients, options, bulk=True)),
+            ):
+                server.received = 0
+                start = time.perf_counter()
+                requests_made, ok = run()
+                elapsed = time.perf_counter() - start
+                if ok != n_messages or server.received != n_messages:
+                    self.stderr.write(
+                        f"  {label}: {ok} succeeded, {server.received} received"
+                    )
+                self.stdout.write(
+                    f"  {label:<14}{elapsed:>8.2f} s{n_messages / elapsed:>10.0f}"
+                    f"{requests_made:>10}"
+                )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    @staticmethod
+    def _sequential(base_url, recipients):
+        """The former send_sms_task path, one message after the other."""
+        import requests
+
+        ok = 0
+        for r in recipients:
+            resp = requests.post(
+                f"{base_url}/send",
+                json={"from": "ILMI", "to": r["phone"], "message": r["message"]},
+                timeout=15,
+            )
+            ok += resp.status_code == 200
+        return len(recipients), ok
+
+    @staticmethod
+    def _engine(base_url, recipients, options, bulk):
+        from apps.sms.gateway import CustomGateway
+
+        gateway = CustomGateway(
+            api_key="bench",
+            api_secret="",
+            api_url=f"{base_url}/send",
+            sender_name="ILMI",
+            bulk_api_url=f"{base_url}/bulk" if bulk else "",
+        )
+        gateway.max_concurrency = max(1, options["concurrency"])
+        gateway.rate_per_second = options["rate"]
+        results = gateway.deliver(recipients)
+        size = gateway.bulk_size if gateway.supports_bulk else 1
+        return -(-len(recipients) // size), sum(r.success for r in results)
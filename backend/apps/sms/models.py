@@ -38,6 +38,10 @@ class SMSConfig(TenantModel):
         blank=True,
         help_text="URL de l'API passerelle SMS",
     )
+    bulk_api_url = models.URLField(
+        blank=True,
+        help_text="URL d'envoi groupé (passerelles avec API batch)",
+    )
     monthly_quota = models.PositiveIntegerField(
         default=1000,
         help_text="Quota mensuel de SMS",
@@ -272,3 +276,26 @@ class SMSCampaign(TenantModel):
 
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
+
+    @property
+    def cache_owner(self) -> str:
+        return f"sms_campaign:{self.pk}"
+
+    def audience(self):
+        """core.audience.Audience of the parents targeted by the campaign."""
+        from core.audience import Audience
+
+        if self.target_type == self.TargetType.INDIVIDUAL:
+            return Audience(
+                school_id=self.school_id,
+                user_ids=tuple(self.target_individuals.values_list("pk", flat=True)),
+            )
+        if self.target_type == self.TargetType.SECTION and self.target_section_id:
+            return Audience(
+                school_id=self.school_id, roles=("PARENT",), section_id=self.target_section_id
+            )
+        if self.target_type == self.TargetType.CLASS and self.target_class_id:
+            return Audience(
+                school_id=self.school_id, roles=("PARENT",), class_id=self.target_class_id
+            )
+        return Audience(school_id=self.school_id, roles=("PARENT",))
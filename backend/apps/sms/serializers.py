@@ -22,6 +22,7 @@ class SMSConfigSerializer(serializers.ModelSerializer):
             "provider_display",
             "sender_name",
             "api_url",
+            "bulk_api_url",
             "monthly_quota",
             "remaining_balance",
             "alert_threshold",
@@ -49,6 +50,7 @@ class SMSConfigCreateSerializer(serializers.ModelSerializer):
             "api_key",
             "api_secret",
             "api_url",
+            "bulk_api_url",
             "monthly_quota",
             "remaining_balance",
             "alert_threshold",
@@ -18,7 +18,7 @@ logger = logging.getLogger(__name__)
 @shared_task(bind=True, max_retries=3, default_retry_delay=30)
 def send_sms_task(self, message_id: str):
     """Send a single SMS via the school's configured gateway."""
-    from .gateway import get_gateway
+    from .engine import NO_GATEWAY, mark_failed, send_messages
     from .models import SMSConfig, SMSMessage
 
     try:
@@ -32,62 +32,32 @@ def send_sms_task(self, message_id: str):
     ).first()
 
     if not config:
-        msg.status = SMSMessage.Status.FAILED
-        msg.error_message = "Aucune passerelle SMS configurée"
-        msg.save(update_fields=["status", "error_message"])
+        mark_failed([msg], NO_GATEWAY)
         return
 
-    if config.remaining_balance <= 0:
-        msg.status = SMSMessage.Status.FAILED
-        msg.error_message = "Solde SMS épuisé"
-        msg.save(update_fields=["status", "error_message"])
-        return
-
-    gateway = get_gateway(config)
-    result = gateway.send(msg.recipient_phone, msg.content)
-
-    if result.success:
-        msg.status = SMSMessage.Status.SENT
-        msg.gateway_message_id = result.message_id
-        msg.sent_at = timezone.now()
-        msg.cost = config.cost_per_sms
-        config.remaining_balance = max(0, config.remaining_balance - 1)
-        config.save(update_fields=["remaining_balance"])
-    else:
-        msg.status = SMSMessage.Status.FAILED
-        msg.error_message = result.error
-
-    msg.save(
-        update_fields=[
-            "status",
-            "gateway_message_id",
-            "sent_at",
-            "cost",
-            "error_message",
-        ]
-    )
-
-    # Alert if balance is low
-    if config.remaining_balance <= config.alert_threshold:
-        logger.warning(
-            "SMS balance low for school %s: %d remaining (threshold: %d)",
-            msg.school,
-            config.remaining_balance,
-            config.alert_threshold,
-        )
+    send_messages(config, [msg])
 
 
 # ---------------------------------------------------------------------------
 # Execute campaign
 # ---------------------------------------------------------------------------
 
+# Messages sent (and recorded) per engine call during a campaign
+CAMPAIGN_CHUNK_SIZE = 1000
+
 
 @shared_task(bind=True, max_retries=1)
 def execute_campaign_task(self, campaign_id: str):
-    """Execute a bulk SMS campaign."""
-    from apps.accounts.models import User
+    """
+    Execute a bulk SMS campaign: the messages are created with one
+    bulk_create, then sent chunk by chunk through the engine (balance
+    reserved per chunk, provider rate limits, results in bulk). The
+    campaign counters are updated after each chunk.
+    """
+    from core.audience import forget, resolve
 
-    from .models import SMSCampaign, SMSMessage
+    from .engine import NO_GATEWAY, mark_failed, send_messages
+    from .models import SMSCampaign, SMSConfig, SMSMessage
 
     try:
         campaign = SMSCampaign.objects.get(pk=campaign_id)
@@ -101,49 +71,55 @@ def execute_campaign_task(self, campaign_id: str):
     campaign.status = SMSCampaign.Status.SENDING
     campaign.save(update_fields=["status"])
 
-    # Resolve recipients
-    parents = User.objects.filter(school=campaign.school, role="PARENT", is_active=True)
-
-    if (
-        campaign.target_type == SMSCampaign.TargetType.SECTION
-        and campaign.target_section
-    ):
-        student_ids = campaign.target_section.classrooms.values_list(
-            "students__id", flat=True
-        )
-        parents = parents.filter(parent_children__id__in=student_ids).distinct()
-    elif campaign.target_type == SMSCampaign.TargetType.CLASS and campaign.target_class:
-        student_ids = campaign.target_class.students.values_list("id", flat=True)
-        parents = parents.filter(parent_children__id__in=student_ids).distinct()
-    elif campaign.target_type == SMSCampaign.TargetType.INDIVIDUAL:
-        parents = campaign.target_individuals.all()
-
-    phones = []
-    for parent in parents:
-        phone = getattr(parent, "phone", None) or getattr(parent, "phone_number", "")
-        if phone:
-            phones.append(
-                {"phone": phone, "name": parent.get_full_name(), "user": parent}
+    # Resolve recipients (reuses the resolution made for the estimate)
+    audience = campaign.audience()
+    recipients = {}
+    for recipient in resolve(audience, tokens=False, cache_for=campaign.cache_owner):
+        if recipient.phone and recipient.phone not in recipients:
+            recipients[recipient.phone] = recipient.name
+
+    messages = SMSMessage.objects.bulk_create(
+        [
+            SMSMessage(
+                school=campaign.school,
+                recipient_phone=phone,
+                recipient_name=name[:150],
+                content=campaign.message,
+                event_type=SMSMessage.EventType.CAMPAIGN,
+                campaign=campaign,
             )
-
-    campaign.total_recipients = len(phones)
+            for phone, name in recipients.items()
+        ],
+        batch_size=CAMPAIGN_CHUNK_SIZE,
+    )
+    campaign.total_recipients = len(messages)
     campaign.save(update_fields=["total_recipients"])
 
-    for entry in phones:
-        msg = SMSMessage.objects.create(
-            school=campaign.school,
-            recipient_phone=entry["phone"],
-            recipient_name=entry["name"],
-            content=campaign.message,
-            event_type=SMSMessage.EventType.CAMPAIGN,
-            campaign=campaign,
+    config = SMSConfig.objects.filter(
+        school=campaign.school, is_active=True, is_deleted=False
+    ).first()
+
+    sent = failed = 0
+    for start in range(0, len(messages), CAMPAIGN_CHUNK_SIZE):
+        chunk = messages[start : start + CAMPAIGN_CHUNK_SIZE]
+        if config:
+            counts = send_messages(config, chunk)
+        else:
+            counts = {"sent": 0, "failed": mark_failed(chunk, NO_GATEWAY)}
+        sent += counts["sent"]
+        failed += counts["failed"]
+        SMSCampaign.objects.filter(pk=campaign.pk).update(
+            sent_count=sent, failed_count=failed
         )
-        send_sms_task.delay(str(msg.pk))
-        campaign.sent_count += 1
 
+    forget(audience, campaign.cache_owner)
+    campaign.sent_count = sent
+    campaign.failed_count = failed
     campaign.status = SMSCampaign.Status.COMPLETED
     campaign.completed_at = timezone.now()
-    campaign.save(update_fields=["status", "sent_count", "completed_at"])
+    campaign.save(update_fields=["status", "sent_count", "failed_count", "completed_at"])
+    logger.info("Campaign %s: %d sent, %d failed", campaign.pk, sent, failed)
+    return {"sent": sent, "failed": failed}
 
 
 # ---------------------------------------------------------------------------
@@ -390,9 +366,10 @@ def send_arrival_sms(school_id: str, student_id: str, time: str):
 
 @shared_task
 def send_urgent_announcement_sms(school_id: str, title: str, body: str):
-    """Send urgent announcement to all parents via SMS."""
-    from apps.accounts.models import User
+    """Send urgent announcement to all parents via SMS (one engine batch)."""
+    from core.audience import Audience, resolve
 
+    from .engine import send_messages
     from .models import SMSConfig, SMSMessage
 
     config = SMSConfig.objects.filter(
@@ -401,19 +378,24 @@ def send_urgent_announcement_sms(school_id: str, title: str, body: str):
     if not config or config.remaining_balance <= 0:
         return
 
-    parents = User.objects.filter(school_id=school_id, role="PARENT", is_active=True)
-
     content = f"ILMI URGENT — {title}: {body}"[:640]
 
-    for parent in parents:
-        phone = getattr(parent, "phone", None) or getattr(parent, "phone_number", "")
-        if not phone:
-            continue
-        msg = SMSMessage.objects.create(
-            school_id=school_id,
-            recipient_phone=phone,
-            recipient_name=parent.get_full_name(),
-            content=content,
-            event_type=SMSMessage.EventType.URGENT_ANNOUNCEMENT,
-        )
-        send_sms_task.delay(str(msg.pk))
+    recipients = {}
+    for recipient in resolve(Audience(school_id=school_id, roles=("PARENT",)), tokens=False):
+        if recipient.phone and recipient.phone not in recipients:
+            recipients[recipient.phone] = recipient.name
+
+    messages = SMSMessage.objects.bulk_create(
+        [
+            SMSMessage(
+                school_id=school_id,
+                recipient_phone=phone,
+                recipient_name=name[:150],
+                content=content,
+                event_type=SMSMessage.EventType.URGENT_ANNOUNCEMENT,
+            )
+            for phone, name in recipients.items()
+        ],
+        batch_size=CAMPAIGN_CHUNK_SIZE,
+    )
+    return send_messages(config, messages)
@@ -348,44 +348,16 @@ class SMSCampaignListCreateView(APIView):
         serializer.is_valid(raise_exception=True)
         campaign = serializer.save(school=request.user.school, created_by=request.user)
 
-        # Estimate cost
-        from apps.accounts.models import User
+        # Estimate cost — the resolved audience is kept for the send
+        from core.audience import resolve
 
         config = _school_qs(SMSConfig, request.user).first()
         cost_per = float(config.cost_per_sms) if config else 5.0
 
-        if campaign.target_type == SMSCampaign.TargetType.ALL:
-            count = User.objects.filter(
-                school=request.user.school, role="PARENT", is_active=True
-            ).count()
-        elif (
-            campaign.target_type == SMSCampaign.TargetType.SECTION
-            and campaign.target_section
-        ):
-            student_ids = campaign.target_section.classrooms.values_list(
-                "students__id", flat=True
-            )
-            count = (
-                User.objects.filter(
-                    parent_children__id__in=student_ids, role="PARENT", is_active=True
-                )
-                .distinct()
-                .count()
-            )
-        elif (
-            campaign.target_type == SMSCampaign.TargetType.CLASS
-            and campaign.target_class
-        ):
-            student_ids = campaign.target_class.students.values_list("id", flat=True)
-            count = (
-                User.objects.filter(
-                    parent_children__id__in=student_ids, role="PARENT", is_active=True
-                )
-                .distinct()
-                .count()
-            )
-        else:
-            count = campaign.target_individuals.count()
+        recipients = resolve(
+            campaign.audience(), tokens=False, cache_for=campaign.cache_owner
+        )
+        count = len({r.phone for r in recipients if r.phone})
 
         campaign.total_recipients = count
         campaign.estimated_cost = count * cost_per
@@ -0,0 +1,219 @@
+"""
+Audience resolver for ILMI — who receives an SMS campaign, an
+announcement or an urgent broadcast.
+
+An Audience describes the target (school, roles, section / level /
+class, or an explicit list of users). ``resolve`` turns it into deduplicated
+Recipient rows with two queries whatever the audience size:
+
+    1. users + their notification preferences — one SELECT, the scope
+       expressed as ``id IN (subquery)`` so parents of several children
+       in the class appear once; rows streamed with .values().iterator()
+    2. their device tokens — one SELECT (optional)
+
+A section / level / class scope selects the enrolled students, the
+parents of those students and the teachers assigned to those classes
+(restricted to ``roles`` when given).
+
+A resolution can be cached for the lifetime of its owner (e.g. an SMS
+campaign estimated at creation and sent later), keyed by owner and
+target:
+
+    recipients = resolve(audience, cache_for=f"sms_campaign:{campaign.pk}")
+    ...
+    forget(audience, f"sms_campaign:{campaign.pk}")
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from functools import reduce
+from operator import or_
+
+from django.core.cache import cache
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+# Lifetime of a cached resolution (upper bound, owners call forget())
+AUDIENCE_CACHE_TTL = 60 * 60
+
+# Rows fetched per round-trip while streaming the users
+ITERATOR_CHUNK_SIZE = 2000
+
+
+@dataclass(frozen=True)
+class Audience:
+    school_id: object
+    roles: tuple = ()
+    section_id: object = None
+    level_id: object = None
+    class_id: object = None
+    # Explicit list of users (None: scope by school / roles / class); an
+    # empty tuple selects nobody.
+    user_ids: tuple | None = None
+
+    @property
+    def key(self) -> str:
+        if self.user_ids is not None:
+            ids = ",".join(sorted(str(uid) for uid in self.user_ids))
+            return "users:" + hashlib.sha1(ids.encode()).hexdigest()
+        return ":".join(
+            [
+                str(self.school_id),
+                ",".join(sorted(self.roles)) or "*",
+                f"s{self.section_id or ''}",
+                f"l{self.level_id or ''}",
+                f"c{self.class_id or ''}",
+            ]
+        )
+
+
+@dataclass
+class Recipient:
+    user_id: object
+    phone: str
+    name: str
+    role: str
+    tokens: list = field(default_factory=list)
+    # NotificationPreference field values, None if the user has none
+    preferences: dict | None = None
+
+    @property
+    def preference(self):
+        """Unsaved NotificationPreference (defaults when the user has none)."""
+        from apps.notifications.models import NotificationPreference
+
+        return NotificationPreference(**(self.preferences or {}))
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Resolution
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def user_filter(audience: Audience) -> Q:
+    """Q selecting the active users of the audience (no duplicates)."""
+    from apps.academics.models import ParentProfile, StudentProfile, TeacherAssignment
+
+    if audience.user_ids is not None:
+        if not audience.user_ids:
+            return Q(pk__in=[])
+        return Q(pk__in=audience.user_ids, is_active=True)
+
+    q = Q(school_id=audience.school_id, is_active=True)
+    roles = set(audience.roles)
+    if roles:
+        q &= Q(role__in=roles)
+
+    if audience.class_id:
+        lookup, value = "", audience.class_id
+    elif audience.level_id:
+        lookup, value = "__level", audience.level_id
+    elif audience.section_id:
+        lookup, value = "__section", audience.section_id
+    else:
+        return q
+
+    students = StudentProfile.objects.filter(**{f"current_class{lookup}_id": value})
+    teachers = TeacherAssignment.objects.filter(**{f"assigned_class{lookup}_id": value})
+    members = []
+    if not roles or "STUDENT" in roles:
+        members.append(Q(role="STUDENT", pk__in=students.values("user_id")))
+    if not roles or "PARENT" in roles:
+        members.append(
+            Q(
+                role="PARENT",
+                pk__in=ParentProfile.objects.filter(children__in=students).values("user_id"),
+            )
+        )
+    if not roles or "TEACHER" in roles:
+        members.append(Q(role="TEACHER", pk__in=teachers.values("teacher_id")))
+    if not members:
+        return Q(pk__in=[])
+    return q & reduce(or_, members)
+
+
+def resolve(audience: Audience, *, tokens: bool = True, cache_for: str | None = None):
+    """
+    Recipients of ``audience`` (list of Recipient, one per user).
+    ``tokens=False`` skips the device-token query (SMS only).
+    """
+    if cache_for:
+        key = _cache_key(audience, cache_for, tokens)
+        try:
+            cached = cache.get(key)
+        except Exception:
+            cached = None
+        if cached is not None:
+            return cached
+
+    recipients = _resolve(audience, tokens)
+
+    if cache_for:
+        try:
+            cache.set(key, recipients, timeout=AUDIENCE_CACHE_TTL)
+        except Exception:
+            logger.warning("Audience %s could not be cached", audience.key)
+    return recipients
+
+
+def forget(audience: Audience, cache_for: str) -> None:
+    """Drop the cached resolutions of ``audience`` for its owner."""
+    try:
+        cache.delete_many(
+            [_cache_key(audience, cache_for, tokens) for tokens in (True, False)]
+        )
+    except Exception:
+        pass
+
+
+def _cache_key(audience, cache_for, tokens) -> str:
+    return f"audience:{cache_for}:{int(tokens)}:{audience.key}"
+
+
+def _resolve(audience, with_tokens):
+    from apps.accounts.models import User
+    from apps.notifications.models import DeviceToken, NotificationPreference
+
+    pref_fields = [
+        f.name
+        for f in NotificationPreference._meta.concrete_fields
+        if f.name not in ("id", "user")
+    ]
+    users = User.objects.filter(user_filter(audience))
+
+    recipients = {}
+    rows = users.values(
+        "id",
+        "phone_number",
+        "first_name",
+        "last_name",
+        "role",
+        "notification_preferences__id",
+        *(f"notification_preferences__{name}" for name in pref_fields),
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    for row in rows:
+        recipients[row["id"]] = Recipient(
+            user_id=row["id"],
+            phone=row["phone_number"] or "",
+            name=f"{row['first_name']} {row['last_name']}".strip(),
+            role=row["role"],
+            preferences=(
+                {name: row[f"notification_preferences__{name}"] for name in pref_fields}
+                if row["notification_preferences__id"]
+                else None
+            ),
+        )
+
+    if with_tokens and recipients:
+        for user_id, token in (
+            DeviceToken.objects.filter(user__in=users)
+            .values_list("user_id", "token")
+            .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        ):
+            recipient = recipients.get(user_id)
+            if recipient is not None:
+                recipient.tokens.append(token)
+
+    return list(recipients.values())
@@ -0,0 +1,329 @@
+"""
+Streaming report exports (XLSX / CSV) for ILMI.
+
+An export is described by one or more ``Sheet`` objects whose ``rows`` is
+a lazy iterable — typically a generator over ``queryset.iterator()`` —
+so rows are pulled from the database chunk by chunk and never held in
+memory all at once:
+
+  * CSV  : rows are encoded on the fly into a StreamingHttpResponse;
+  * XLSX : openpyxl write-only workbook (rows are flushed to a temp file
+           as they are appended, fixed column widths instead of an
+           auto-width pass over every cell), served with FileResponse.
+
+Large ranges can run as a Celery job (``start_export_job``): the file is
+written to the default storage, the requesting user gets an in-app
+notification with the download link and the job status is readable via
+GET /api/v1/exports/<task_id>/.
+
+Used by the attendance, finance and grades exports; builders are
+registered in ``EXPORTS`` by dotted path so the worker can re-run them.
+"""
+
+import csv
+import logging
+import tempfile
+import uuid
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from celery import shared_task
+from django.core.cache import cache
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+
+# Rows fetched per database round-trip by the export builders
+EXPORT_CHUNK_SIZE = 2000
+
+# How long the status of an export job stays readable
+EXPORT_JOB_TTL = 60 * 60 * 24  # 24 h
+
+HEADER_FILL = "1F4E79"
+
+# name → builder(school, params) returning a list of Sheets
+EXPORTS = {
+    "attendance_records": "apps.attendance.views.attendance_export_sheets",
+    "finance_payments": "apps.finance.views.payment_export_sheets",
+    "grades_men": "apps.grades.views.men_export_sheets",
+}
+
+
+@dataclass
+class Sheet:
+    """
+    One worksheet of an export.
+
+    ``columns`` are (header, width) pairs; ``rows`` yields lists of cell
+    values. ``preamble`` lines are written above the header, merged over
+    all the columns. ``fills`` maps a 0-based column index to
+    {value: RGB colour} for conditional cell backgrounds (e.g. the
+    attendance status).
+    """
+
+    title: str
+    columns: list
+    rows: Iterable
+    preamble: list = field(default_factory=list)
+    fills: dict = field(default_factory=dict)
+    bordered: bool = False
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Writers
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def write_xlsx(fileobj, sheets) -> int:
+    """Write the sheets into ``fileobj`` as an XLSX workbook; returns the row count."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+    from openpyxl.utils import get_column_letter
+
+    side = Side(style="thin")
+    border = Border(left=side, right=side, top=side, bottom=side)
+    header_fill = PatternFill(start_color=HEADER_FILL, end_color=HEADER_FILL, fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    header_alignment = Alignment(horizontal="center", wrap_text=True)
+    preamble_font = Font(bold=True, size=12)
+    centered = Alignment(horizontal="center")
+
+    wb = Workbook(write_only=True)
+    count = 0
+    for sheet in sheets:
+        ws = wb.create_sheet(title=sheet.title[:31])
+        width = len(sheet.columns)
+        for idx, (_, col_width) in enumerate(sheet.columns, 1):
+            ws.column_dimensions[get_column_letter(idx)].width = col_width
+
+        row_number = 0
+        for line in sheet.preamble:
+            row_number += 1
+            cell = WriteOnlyCell(ws, value=line)
+            cell.font = preamble_font
+            cell.alignment = centered
+            ws.append([cell])
+            if width > 1:
+                ws.merged_cells.add(
+                    f"A{row_number}:{get_column_letter(width)}{row_number}"
+                )
+        if sheet.preamble:
+            ws.append([])
+
+        header = []
+        for title, _ in sheet.columns:
+            cell = WriteOnlyCell(ws, value=title)
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = header_alignment
+            if sheet.bordered:
+                cell.border = border
+            header.append(cell)
+        ws.append(header)
+
+        fills = {
+            idx: {
+                value: PatternFill(start_color=rgb, end_color=rgb, fill_type="solid")
+                for value, rgb in colours.items()
+            }
+            for idx, colours in sheet.fills.items()
+        }
+        styled = sheet.bordered or bool(fills)
+        for row in sheet.rows:
+            count += 1
+            if not styled:
+                ws.append(row)
+                continue
+            cells = []
+            for idx, value in enumerate(row):
+                cell = WriteOnlyCell(ws, value=value)
+                fill = fills.get(idx, {}).get(value)
+                if fill is not None:
+                    cell.fill = fill
+                if sheet.bordered:
+                    cell.border = border
+                cells.append(cell)
+            ws.append(cells)
+
+    wb.save(fileobj)
+    return count
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(sheet: Sheet, *, bom: bool = True):
+    """Yield the CSV text of a sheet line by line (header first)."""
+    writer = csv.writer(_Echo())
+    if bom:
+        yield "\ufeff"  # BOM for Excel
+    yield writer.writerow([title for title, _ in sheet.columns])
+    for row in sheet.rows:
+        yield writer.writerow(row)
+
+
+def write_export(fileobj, sheets, fmt: str) -> None:
+    """Write an export into a binary file object (used by the Celery job)."""
+    if fmt == "csv":
+        for sheet in sheets:
+            for line in iter_csv(sheet):
+                fileobj.write(line.encode("utf-8"))
+    else:
+        write_xlsx(fileobj, sheets)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  HTTP responses
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def csv_response(filename: str, sheet: Sheet, *, bom: bool = True):
+    """Stream a sheet as a CSV attachment."""
+    response = StreamingHttpResponse(
+        iter_csv(sheet, bom=bom), content_type=CSV_CONTENT_TYPE
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def xlsx_response(filename: str, sheets):
+    """
+    Serve sheets as an XLSX attachment. The workbook is written to a temp
+    file (constant memory) which is then streamed and closed by Django.
+    """
+    tmp = tempfile.TemporaryFile()
+    write_xlsx(tmp, sheets)
+    tmp.seek(0)
+    response = FileResponse(tmp, content_type=XLSX_CONTENT_TYPE)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  Background export jobs
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def _job_key(task_id) -> str:
+    return f"export_job_{task_id}"
+
+
+def start_export_job(
+    export: str, request, school, params: dict, fmt: str, filename: str
+):
+    """
+    Dispatch ``run_export_job`` for a school on behalf of the request's
+    user and return the 202 response pointing to the job status endpoint.
+    """
+    user = request.user
+    # The id is generated here so that the pending status is written
+    # before dispatch: a job finishing first (eager mode, idle worker)
+    # must not have its done / failed status overwritten.
+    task_id = str(uuid.uuid4())
+    cache.set(
+        _job_key(task_id),
+        {"status": "pending", "user_id": str(user.pk), "filename": filename},
+        timeout=EXPORT_JOB_TTL,
+    )
+    run_export_job.apply_async(
+        kwargs={
+            "export": export,
+            "school_id": str(school.pk),
+            "params": params,
+            "fmt": fmt,
+            "filename": filename,
+            "user_id": str(user.pk),
+        },
+        task_id=task_id,
+    )
+    return Response(
+        {
+            "task_id": task_id,
+            "status": "started",
+            "status_url": f"/api/v1/exports/{task_id}/",
+            "message": "Export lancé — un lien de téléchargement vous sera envoyé.",
+        },
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+
+@shared_task(bind=True, max_retries=1, default_retry_delay=60)
+def run_export_job(
+    self,
+    export: str,
+    school_id: str,
+    params: dict,
+    fmt: str,
+    filename: str,
+    user_id: str | None = None,
+) -> dict:
+    """
+    Build a registered export, store it and notify the requesting user
+    with the download link.
+    """
+    from django.core.files import File
+    from django.core.files.storage import default_storage
+
+    from apps.schools.models import School
+
+    key = _job_key(self.request.id)
+    job = {"status": "running", "user_id": user_id, "filename": filename}
+    cache.set(key, job, timeout=EXPORT_JOB_TTL)
+
+    try:
+        builder = import_string(EXPORTS[export])
+        school = School.objects.get(pk=school_id)
+        with tempfile.TemporaryFile() as tmp:
+            write_export(tmp, builder(school, params), fmt)
+            tmp.seek(0)
+            path = default_storage.save(
+                f"exports/{school_id}/{filename}", File(tmp, name=filename)
+            )
+        url = default_storage.url(path)
+    except Exception as exc:
+        logger.exception("Export %s failed for school %s", export, school_id)
+        cache.set(key, {**job, "status": "failed"}, timeout=EXPORT_JOB_TTL)
+        raise self.retry(exc=exc)
+
+    cache.set(key, {**job, "status": "done", "url": url}, timeout=EXPORT_JOB_TTL)
+
+    if user_id:
+        from apps.notifications.models import Notification
+
+        Notification.objects.create(
+            user_id=user_id,
+            school_id=school_id,
+            title="Export prêt",
+            body=f"Votre fichier {filename} est prêt : {url}",
+            notification_type=Notification.NotificationType.SYSTEM,
+        )
+
+    logger.info("Export %s ready for school %s: %s", export, school_id, path)
+    return {"status": "done", "url": url}
+
+
+class ExportJobStatusView(APIView):
+    """GET /api/v1/exports/{task_id}/ — status and download link of an export job."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, task_id):
+        job = cache.get(_job_key(task_id))
+        if job is None or job.get("user_id") != str(request.user.pk):
+            return Response(
+                {"status": "unknown", "message": "Export non trouvé ou expiré."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response({k: v for k, v in job.items() if k != "user_id"})
@@ -81,7 +81,9 @@ def send_push_to_multiple(
         data: Optional dict of custom key-value pairs.
 
     Returns:
-        dict with 'success_count' and 'failure_count'.
+        dict with 'success_count', 'failure_count' and
+        'unregistered_tokens' (tokens FCM reports as no longer valid,
+        to be deleted by the caller).
     """
     get_firebase_app()
 
@@ -97,7 +99,16 @@ def send_push_to_multiple(
     )
 
     response = messaging.send_each_for_multicast(message)
+    unregistered = [
+        token
+        for token, result in zip(device_tokens, response.responses)
+        if isinstance(
+            result.exception,
+            (messaging.UnregisteredError, messaging.SenderIdMismatchError),
+        )
+    ]
     return {
         "success_count": response.success_count,
         "failure_count": response.failure_count,
+        "unregistered_tokens": unregistered,
     }
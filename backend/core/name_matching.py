@@ -0,0 +1,188 @@
+"""
+Person-name matching for ILMI imports.
+
+Normalises names typed in spreadsheets (accents, case, hyphens, Arabic
+letter variants, common French transliteration spellings) and matches them
+against a roster through an index built once per roster:
+
+  * exact lookup on the normalised "nom prénom" key (word order kept);
+  * folded lookup (spelling variants folded, word order ignored), whose
+    hits are only fuzzy candidates;
+  * fuzzy lookup: a trigram index shortlists the few roster entries that
+    share the most trigrams with the query, and only those are scored
+    with difflib — instead of scoring every row against every student.
+
+A name matching several roster entries is ambiguous, never a match.
+
+Used by the grade CSV import (grades.services.parse_csv_grades).
+"""
+
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+# Arabic letter variants folded to one form (hamza carriers, alef maqsura,
+# ta marbuta); tashkeel is removed with the other combining marks.
+_ARABIC_FOLD = str.maketrans(
+    {
+        "أ": "ا",
+        "إ": "ا",
+        "آ": "ا",
+        "ٱ": "ا",
+        "ى": "ي",
+        "ئ": "ي",
+        "ؤ": "و",
+        "ة": "ه",
+        "ـ": None,  # tatweel
+    }
+)
+
+# Spelling variants of transliterated Maghrebi names
+# (Ouahiba / Wahiba, Bouchra / Bushra, Abdelkader / Abd El Kader…).
+_LATIN_FOLDS = (
+    (re.compile(r"\b(abd|ab)\s+(el|al|e|a)\s+"), r"\1\2"),
+    (re.compile(r"\b(el|al|ben|bel|bou|ait|abd)\s+"), r"\1"),
+    (re.compile(r"ou"), "u"),
+    (re.compile(r"\bw"), "u"),
+    (re.compile(r"dj"), "j"),
+    (re.compile(r"ch"), "sh"),
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"c(?=[eiy])"), "s"),
+    (re.compile(r"(?<=[a-z])h\b"), ""),
+    (re.compile(r"(?<=[a-z])e\b"), ""),
+    (re.compile(r"y"), "i"),
+    (re.compile(r"([a-z])\1+"), r"\1"),
+)
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+FUZZY_THRESHOLD = 0.8
+
+
+def normalize_name(value: str) -> str:
+    """
+    Lower-case, accent-free, punctuation-free form of a name.
+
+    "  BEN-ALI  Aïcha " → "ben ali aicha"; Arabic names keep their script
+    with letter variants folded ("فاطمة" and "فاطمه" are equal).
+    """
+    value = unicodedata.normalize("NFKD", value or "").translate(_ARABIC_FOLD)
+    value = "".join(c for c in value if not unicodedata.combining(c))
+    return " ".join(_NON_WORD.sub(" ", value.lower()).replace("_", " ").split())
+
+
+def name_key(*parts: str) -> str:
+    """
+    Matching key of a full name: normalised, transliteration variants
+    folded and words sorted, so "Benali Ahmed" == "ahmed ben ali".
+    """
+    value = normalize_name(" ".join(p for p in parts if p))
+    for pattern, replacement in _LATIN_FOLDS:
+        value = pattern.sub(replacement, value)
+    return " ".join(sorted(value.split()))
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Roster of people indexed by name.
+
+    ``entries`` is an iterable of (last_name, first_name, obj); ``obj`` is
+    what lookups return (e.g. a StudentProfile). Build it once per roster
+    and reuse it for every row of the file.
+
+    Only the strict key (``normalize_name``, word order kept) gives a
+    certain match: the folded ``name_key`` also equates distinct names
+    ("Amine" / "Amin", swapped first and last names), so it only proposes
+    fuzzy candidates.
+    """
+
+    def __init__(self, entries=(), *, shortlist: int = 10):
+        self.shortlist = shortlist
+        self._strict_keys = []
+        self._keys = []
+        self._objects = []
+        self._strict = defaultdict(list)
+        self._exact = defaultdict(list)
+        self._trigrams = defaultdict(list)
+        for last_name, first_name, obj in entries:
+            self.add(last_name, first_name, obj)
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def add(self, last_name: str, first_name: str, obj) -> None:
+        key = name_key(last_name, first_name)
+        position = len(self._objects)
+        self._strict_keys.append(normalize_name(f"{last_name} {first_name}"))
+        self._keys.append(key)
+        self._objects.append(obj)
+        self._strict[self._strict_keys[position]].append(position)
+        self._exact[key].append(position)
+        for gram in _trigrams(key):
+            self._trigrams[gram].append(position)
+
+    def exact(self, last_name: str, first_name: str) -> list:
+        """Every entry whose folded name key equals the given one."""
+        return [self._objects[p] for p in self._exact.get(name_key(last_name, first_name), ())]
+
+    def matches(self, last_name: str, first_name: str):
+        """
+        Return (objs, ratio): the closest entries and their score, or
+        ([], 0.0). More than one entry means the name is ambiguous.
+
+          * same strict key: those entries, 1.0;
+          * same folded key: those entries, scored by SequenceMatcher on
+            the strict keys but never below FUZZY_THRESHOLD (the folds
+            say it is the same name) nor 1.0 (the spelling differs);
+          * otherwise only the ``shortlist`` entries sharing the most
+            trigrams with the query are compared with SequenceMatcher;
+            the best one comes with every entry of the same folded key.
+        """
+        strict = normalize_name(f"{last_name} {first_name}")
+        key = name_key(last_name, first_name)
+        if not key:
+            return [], 0.0
+        positions = self._strict.get(strict)
+        if positions:
+            return [self._objects[p] for p in positions], 1.0
+
+        positions = self._exact.get(key)
+        if positions:
+            matcher = SequenceMatcher(None, b=strict)
+            ratio = 0.0
+            for position in positions:
+                matcher.set_seq1(self._strict_keys[position])
+                ratio = max(ratio, matcher.ratio())
+            return [self._objects[p] for p in positions], max(ratio, FUZZY_THRESHOLD)
+
+        shared = Counter()
+        for gram in _trigrams(key):
+            shared.update(self._trigrams.get(gram, ()))
+
+        best_position, best_ratio = None, 0.0
+        matcher = SequenceMatcher(None, b=key)
+        for position, _ in shared.most_common(self.shortlist):
+            matcher.set_seq1(self._keys[position])
+            ratio = matcher.ratio()
+            if ratio > best_ratio:
+                best_position, best_ratio = position, ratio
+        if best_position is None:
+            return [], 0.0
+        positions = self._exact[self._keys[best_position]]
+        return [self._objects[p] for p in positions], best_ratio
+
+    def best_match(self, last_name: str, first_name: str):
+        """
+        Return (obj, ratio) of the closest entry, or (None, 0.0);
+        (None, ratio) when several entries are equally close.
+        """
+        objs, ratio = self.matches(last_name, first_name)
+        if len(objs) != 1:
+            return None, ratio
+        return objs[0], ratio
@@ -2,7 +2,17 @@
 Standard pagination classes for ILMI API.
 """
 
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -27,3 +37,126 @@ class LargeResultsSetPagination(PageNumberPagination):
     page_size = 50
     page_size_query_param = "page_size"
     max_page_size = 200
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination on (created_at, id) for append-only
+    timelines such as chat history. Pages are read through the
+    (parent, created_at, id) index instead of an OFFSET, so loading an
+    old page or polling for new rows costs the same whatever the size
+    of the thread.
+
+    Query parameters:
+      - ``limit``  : page size (default 50, max 200)
+      - ``before`` : cursor — the page of rows just older than it
+      - ``after``  : cursor — the rows just newer than it
+      - ``since``  : ISO datetime — rows created after it (delta sync)
+    Without ``before`` / ``after`` / ``since`` the latest page is
+    returned. Rows are always returned oldest → newest, with
+    ``previous_cursor`` (pass as ``before`` to load older rows),
+    ``next_cursor`` (pass as ``after`` to poll for newer rows) and
+    ``has_more`` (more rows left in the direction that was read).
+    """
+
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = "limit"
+    query_params = ("limit", "before", "after", "since")
+
+    def is_requested(self, request) -> bool:
+        """Whether the request asks for paginated results at all."""
+        return any(param in request.query_params for param in self.query_params)
+
+    # -- cursors ------------------------------------------------------------
+
+    @staticmethod
+    def encode_cursor(obj) -> str:
+        raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(value):
+        """Cursor string → (created_at, pk); raises ValidationError."""
+        try:
+            padded = value + "=" * (-len(value) % 4)
+            created_at, pk = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+            created_at = datetime.fromisoformat(created_at)
+            uuid.UUID(pk)
+        except (ValueError, UnicodeDecodeError, binascii.Error):
+            raise ValidationError({"cursor": "Curseur invalide."})
+        return created_at, pk
+
+    def get_limit(self, request) -> int:
+        try:
+            limit = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(limit, self.max_page_size))
+
+    def get_since(self, request):
+        value = request.query_params.get("since")
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            raise ValidationError({"since": "Date invalide (ISO 8601 attendu)."})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    # -- pagination ---------------------------------------------------------
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = limit = self.get_limit(request)
+        before = request.query_params.get("before")
+        after = request.query_params.get("after")
+        self.since = since = self.get_since(request)
+        self.after_cursor = after
+
+        if before:
+            created_at, pk = self.decode_cursor(before)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+        elif after:
+            created_at, pk = self.decode_cursor(after)
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            )
+        elif since is not None:
+            queryset = queryset.filter(created_at__gt=since)
+
+        # Forward pages start at the cursor; the others end at the newest row
+        self.forward = bool(after) or (since is not None and not before)
+        if self.forward:
+            rows = list(queryset.order_by("created_at", "id")[: limit + 1])
+            self.has_more = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            rows = list(queryset.order_by("-created_at", "-id")[: limit + 1])
+            self.has_more = len(rows) > limit
+            rows = rows[:limit][::-1]
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data, **extra):
+        rows = self.page
+        if rows:
+            previous_cursor = (
+                self.encode_cursor(rows[0]) if self.forward or self.has_more else None
+            )
+            next_cursor = self.encode_cursor(rows[-1])
+        else:
+            previous_cursor = None
+            next_cursor = self.after_cursor or None
+        return Response(
+            {
+                "results": data,
+                "previous_cursor": previous_cursor,
+                "next_cursor": next_cursor,
+                "has_more": self.has_more,
+                **extra,
+            }
+        )
@@ -208,7 +208,7 @@ def require_module(module_slug: str):
                 )
             # Call original permission checks
             if original_check:
-                original_check(request)
+                original_check(self, request)
 
         cls.check_permissions = check_permissions
         return cls
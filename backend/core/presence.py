@@ -0,0 +1,98 @@
+"""
+WebSocket presence registry for ILMI.
+
+A user is "online" while at least one of their WebSocket connections
+(notification, conversation or room consumer) is open. Presence lives in
+the default cache (Redis) as one counter per user:
+
+    presence_<user_id>  →  number of open connections, TTL = PRESENCE_TTL
+
+Consumers call ``connect`` / ``disconnect`` and refresh the TTL every
+HEARTBEAT_INTERVAL seconds with ``heartbeat``; if a worker dies without
+closing its sockets the counter simply expires, so a user is never seen
+online longer than PRESENCE_TTL after their last live connection.
+
+Other apps query presence in bulk (one cache round-trip) to skip push
+notifications for users who already get the event over WebSocket:
+
+    from core.presence import offline_user_ids
+    tokens = DeviceToken.objects.filter(user_id__in=offline_user_ids(user_ids))
+"""
+
+import logging
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two heartbeats of an open connection
+HEARTBEAT_INTERVAL = 30
+
+# A user with no heartbeat for this long is considered offline
+PRESENCE_TTL = 3 * HEARTBEAT_INTERVAL
+
+
+def _key(user_id) -> str:
+    return f"presence_{user_id}"
+
+
+def connect(user_id) -> None:
+    """Register one more open connection of the user."""
+    key = _key(user_id)
+    try:
+        cache.add(key, 0, timeout=PRESENCE_TTL)
+        cache.incr(key)
+        cache.touch(key, PRESENCE_TTL)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(key, 1, timeout=PRESENCE_TTL)
+    except Exception:
+        logger.warning("Presence connect failed for user %s", user_id)
+
+
+def heartbeat(user_id) -> None:
+    """Keep the user online for another PRESENCE_TTL seconds."""
+    key = _key(user_id)
+    try:
+        if not cache.touch(key, PRESENCE_TTL):
+            # Counter lost (eviction, restart): at least this connection
+            cache.add(key, 1, timeout=PRESENCE_TTL)
+    except Exception:
+        logger.warning("Presence heartbeat failed for user %s", user_id)
+
+
+def disconnect(user_id) -> None:
+    """Unregister one open connection of the user."""
+    key = _key(user_id)
+    try:
+        if cache.decr(key) <= 0:
+            cache.delete(key)
+    except ValueError:
+        pass  # already expired
+    except Exception:
+        logger.warning("Presence disconnect failed for user %s", user_id)
+
+
+def online_user_ids(user_ids) -> set:
+    """Subset of ``user_ids`` (as str) with an open WebSocket connection."""
+    user_ids = [str(uid) for uid in user_ids]
+    if not user_ids:
+        return set()
+    try:
+        counters = cache.get_many([_key(uid) for uid in user_ids])
+    except Exception:
+        # Presence unknown: treat everybody as offline (push them)
+        logger.warning("Presence lookup failed for %d users", len(user_ids))
+        return set()
+    return {uid for uid in user_ids if (counters.get(_key(uid)) or 0) > 0}
+
+
+def is_online(user_id) -> bool:
+    return str(user_id) in online_user_ids([user_id])
+
+
+def offline_user_ids(user_ids) -> list:
+    """``user_ids`` without the online ones (order kept)."""
+    user_ids = list(user_ids)
+    online = online_user_ids(user_ids)
+    return [uid for uid in user_ids if str(uid) not in online]
@@ -114,6 +114,16 @@ app.conf.beat_schedule = {
         "task": "apps.schools.tasks.check_subscription_renewals",
         "schedule": crontab(minute=0, hour=6),
     },
+    # Push outbox sweep — every minute (catches rows whose drain was lost)
+    "drain-push-outbox": {
+        "task": "apps.notifications.tasks.drain_push_outbox",
+        "schedule": crontab(minute="*"),
+    },
+    # Notification retention — archive old read notifications daily at 03:30
+    "archive-read-notifications": {
+        "task": "apps.notifications.tasks.archive_read_notifications",
+        "schedule": crontab(minute=30, hour=3),
+    },
     # Weekly notification summary — every Sunday at 20:00
     "send-weekly-notification-summary": {
         "task": "apps.notifications.tasks.send_weekly_notification_summary",
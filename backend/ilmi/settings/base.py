@@ -299,6 +299,35 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+# Task modules outside the installed apps (not found by autodiscover_tasks)
+CELERY_IMPORTS = ["core.exports"]
+# Chat pushes are drained by a dedicated worker (docker-compose: celery_push)
+# so a burst of FCM calls never delays the other queues.
+CELERY_TASK_ROUTES = {
+    "apps.notifications.tasks.drain_push_outbox": {"queue": "push"},
+}
+
+# Grade changes are coalesced per classroom/trimester for this many seconds
+# before a single batched recompute runs (apps.grades.tasks).
+GRADE_CASCADE_DEBOUNCE_SECONDS = config(
+    "GRADE_CASCADE_DEBOUNCE_SECONDS", default=5, cast=int
+)
+
+# Chat pushes queued in the PushOutbox are held this many seconds so that
+# a burst of messages reaches a user as one "N nouveaux messages" push.
+PUSH_OUTBOX_COALESCE_SECONDS = config(
+    "PUSH_OUTBOX_COALESCE_SECONDS", default=3, cast=int
+)
+
+# Read notifications older than this are moved to notifications_archive
+# every night (apps.notifications.tasks.archive_read_notifications).
+NOTIFICATION_RETENTION_DAYS = config(
+    "NOTIFICATION_RETENTION_DAYS", default=180, cast=int
+)
+
+# Per-provider overrides of the SMS gateway limits (apps.sms.gateway), e.g.
+# {"MOBILIS": {"max_concurrency": 4, "rate_per_second": 10}}
+SMS_GATEWAY_LIMITS = {}
 
 
 # ===========================================================================
@@ -14,6 +14,8 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 
+from core.exports import ExportJobStatusView
+
 
 def health_check(request):
     """Lightweight health-check used by Docker HEALTHCHECK."""
@@ -23,6 +25,7 @@ def health_check(request):
 # API v1 URL patterns
 api_v1_patterns = [
     path("health/", health_check, name="api-health"),
+    path("exports/<str:task_id>/", ExportJobStatusView.as_view(), name="export-job-status"),
     path("auth/", include("apps.accounts.urls")),
     path("schools/", include("apps.schools.urls")),
     path("academics/", include("apps.academics.urls")),
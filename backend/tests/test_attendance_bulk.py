@@ -0,0 +1,195 @@
+"""
+Tests for the set-based attendance marking path (MarkAttendanceView):
+
+  - students are validated against the class roster in one query
+  - the query count does not grow with the class size
+  - re-marking the same date/period updates the existing records
+  - absentees are notified by a single batched task
+"""
+
+from datetime import date
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.academics.models import Class, Level, ParentProfile, StudentProfile
+from apps.accounts.models import User
+from apps.attendance.models import AttendanceRecord
+from apps.attendance.tasks import notify_parents_of_absences
+from apps.notifications.models import Notification
+from apps.schools.models import AcademicYear, School, Section
+
+MARK_URL = "/api/v1/attendance/mark/"
+DAY = date(2026, 2, 2)
+
+
+class BulkAttendanceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(name="Presence School", subdomain="presence")
+        cls.section = Section.objects.create(
+            school=cls.school,
+            section_type=Section.SectionType.PRIMARY,
+            name="Primaire",
+        )
+        cls.academic_year = AcademicYear.objects.create(
+            school=cls.school,
+            section=cls.section,
+            name="2025-2026",
+            start_date=date(2025, 9, 1),
+            end_date=date(2026, 6, 30),
+        )
+        cls.level = Level.objects.create(
+            school=cls.school,
+            section=cls.section,
+            name="3ème Année Primaire",
+            code="3AP",
+            order=3,
+        )
+        cls.klass, cls.other_klass = (
+            Class.objects.create(
+                school=cls.school,
+                section=cls.section,
+                academic_year=cls.academic_year,
+                level=cls.level,
+                name=name,
+            )
+            for name in ("3AP-A", "3AP-B")
+        )
+        cls.teacher = User.objects.create_user(
+            phone_number="0556000000",
+            password="pass1234",
+            first_name="Amina",
+            last_name="Teacher",
+            role=User.Role.TEACHER,
+            school=cls.school,
+        )
+        cls.students = [cls._student(n, cls.klass) for n in range(20)]
+        cls.outsider = cls._student(99, cls.other_klass)
+
+    @classmethod
+    def _student(cls, n, klass):
+        user = User.objects.create_user(
+            phone_number=f"0557{n:06d}",
+            password="pass1234",
+            first_name=f"Eleve{n}",
+            last_name="Presence",
+            role=User.Role.STUDENT,
+            school=cls.school,
+        )
+        profile, _ = StudentProfile.objects.get_or_create(user=user)
+        profile.current_class = klass
+        profile.save()
+        return profile
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+
+    def _mark(self, statuses, period="MORNING"):
+        return self.client.post(
+            MARK_URL,
+            {
+                "class_id": str(self.klass.pk),
+                "date": DAY.isoformat(),
+                "period": period,
+                "records": [
+                    {"student_id": str(student.pk), "status": status}
+                    for student, status in statuses
+                ],
+            },
+            format="json",
+        )
+
+
+class TestMarkAttendance(BulkAttendanceTestCase):
+    def test_roster_errors_and_counts(self):
+        resp = self._mark(
+            [(self.students[0], "PRESENT"), (self.outsider, "ABSENT")]
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["created"], 1)
+        self.assertEqual(resp.data["errors"], [
+            {"index": 1, "error": "Student not found in this class."}
+        ])
+
+        resp = self._mark(
+            [(self.students[0], "LATE"), (self.students[1], "PRESENT")]
+        )
+        self.assertEqual((resp.data["created"], resp.data["updated"]), (1, 1))
+        record = AttendanceRecord.objects.get(student=self.students[0], date=DAY)
+        self.assertEqual(record.status, "LATE")
+        self.assertEqual(record.marked_by, self.teacher)
+
+        # Another period of the same day is a separate record
+        self._mark([(self.students[0], "ABSENT")], period="AFTERNOON")
+        self.assertEqual(
+            AttendanceRecord.objects.filter(student=self.students[0]).count(), 2
+        )
+
+    def test_query_count_independent_of_class_size(self):
+        counts = []
+        for size in (5, 20):
+            AttendanceRecord.objects.all().delete()
+            with CaptureQueriesContext(connection) as ctx:
+                self._mark([(s, "PRESENT") for s in self.students[:size]])
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_absentees_notified_by_one_task(self):
+        statuses = [
+            (s, "ABSENT" if n % 4 == 0 else "PRESENT")
+            for n, s in enumerate(self.students)
+        ]
+        with patch(
+            "apps.attendance.tasks.notify_parents_of_absences.delay"
+        ) as mock_delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self._mark(statuses)
+
+        mock_delay.assert_called_once()
+        student_ids, date_str, period = mock_delay.call_args.args
+        self.assertEqual(
+            sorted(student_ids),
+            sorted(str(s.pk) for s, status in statuses if status == "ABSENT"),
+        )
+        self.assertEqual((date_str, period), (DAY.isoformat(), "MORNING"))
+
+
+class TestBatchedAbsenceNotification(BulkAttendanceTestCase):
+    def test_creates_one_notification_per_parent(self):
+        absent, present = self.students[0], self.students[1]
+        for n, student in enumerate((absent, absent, present)):
+            parent = User.objects.create_user(
+                phone_number=f"0558{n:06d}",
+                password="pass1234",
+                first_name=f"Parent{n}",
+                last_name="Presence",
+                role=User.Role.PARENT,
+                school=self.school,
+            )
+            profile, _ = ParentProfile.objects.get_or_create(user=parent)
+            profile.children.add(student)
+        for student, status in ((absent, "ABSENT"), (present, "PRESENT")):
+            AttendanceRecord.objects.create(
+                student=student,
+                class_obj=self.klass,
+                school=self.school,
+                date=DAY,
+                status=status,
+            )
+
+        with patch("core.firebase.send_push_notification"):
+            result = notify_parents_of_absences(
+                [str(absent.pk), str(present.pk)], DAY.isoformat(), "MORNING"
+            )
+
+        self.assertEqual(result["absences"], 1)
+        self.assertEqual(result["parents_notified"], 2)
+        self.assertEqual(
+            Notification.objects.filter(related_object_type="AttendanceRecord").count(),
+            2,
+        )
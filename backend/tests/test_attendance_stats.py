@@ -0,0 +1,209 @@
+"""
+Tests for the monthly attendance counters (AttendanceMonthlyStat):
+
+  - marking, re-marking, justifying and cancelling keep the counters exact
+  - rebuild_monthly_stats recounts the same rows from the records
+  - the dashboard, monthly / annual / ranking reports and the chronic
+    absenteeism task read the counters
+"""
+
+import io
+from datetime import date
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.attendance.aggregates import rebuild_monthly_stats
+from apps.attendance.models import AttendanceMonthlyStat, AttendanceRecord
+from apps.attendance.tasks import detect_chronic_absenteeism
+
+from tests.test_attendance_bulk import DAY, BulkAttendanceTestCase
+
+REPORTS_URL = "/api/v1/attendance/reports/"
+
+
+def _counters(student, month=DAY.replace(day=1)):
+    stat = AttendanceMonthlyStat.objects.filter(student=student, month=month).first()
+    if stat is None:
+        return (0, 0, 0, 0)
+    return (stat.absent, stat.late, stat.present, stat.justified)
+
+
+def _snapshot():
+    return sorted(
+        AttendanceMonthlyStat.objects.values_list(
+            "student_id", "class_obj_id", "month",
+            "absent", "late", "present", "justified", "justified_late",
+        )
+    )
+
+
+class AttendanceStatsTestCase(BulkAttendanceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            phone_number="0559000000",
+            password="pass1234",
+            first_name="Karim",
+            last_name="Admin",
+            role=User.Role.ADMIN,
+            school=self.school,
+        )
+
+    def _record(self, student, day, record_status, **kwargs):
+        return AttendanceRecord.objects.create(
+            student=student,
+            class_obj=self.klass,
+            school=self.school,
+            date=day,
+            status=record_status,
+            **kwargs,
+        )
+
+
+class TestIncrementalCounters(AttendanceStatsTestCase):
+    def test_marking_and_remarking(self):
+        first, second = self.students[:2]
+        self._mark([(first, "ABSENT"), (second, "PRESENT")])
+        self._mark([(first, "ABSENT")], period="AFTERNOON")
+        self.assertEqual(_counters(first), (2, 0, 0, 0))
+        self.assertEqual(_counters(second), (0, 0, 1, 0))
+
+        # Re-marking replaces the previous status instead of adding to it
+        self._mark([(first, "LATE"), (second, "PRESENT")])
+        self.assertEqual(_counters(first), (1, 1, 0, 0))
+        self.assertEqual(_counters(second), (0, 0, 1, 0))
+
+    def test_justify_and_cancel(self):
+        student = self.students[0]
+        self._mark([(student, "ABSENT")])
+        record = AttendanceRecord.objects.get(student=student)
+
+        self.client.force_authenticate(user=self.admin)
+        resp = self.client.patch(
+            f"/api/v1/attendance/{record.pk}/justify/",
+            {"justification_note": "Certificat médical"},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(_counters(student), (1, 0, 0, 1))
+
+        # A justified absence re-marked by the teacher stays justified
+        self.client.force_authenticate(user=self.teacher)
+        self._mark([(student, "ABSENT")])
+        self.assertEqual(_counters(student), (1, 0, 0, 1))
+
+        self.client.force_authenticate(user=self.admin)
+        resp = self.client.delete(f"/api/v1/attendance/{record.pk}/cancel/")
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(_counters(student), (0, 0, 0, 0))
+
+    def test_moving_a_record_to_another_month(self):
+        student = self.students[0]
+        record = self._record(student, DAY, "ABSENT")
+        record.date = date(2026, 3, 2)
+        record.save()
+        self.assertEqual(_counters(student), (0, 0, 0, 0))
+        self.assertEqual(_counters(student, date(2026, 3, 1)), (1, 0, 0, 0))
+
+    def test_rebuild_matches_incremental_rows(self):
+        statuses = ["ABSENT", "LATE", "PRESENT"]
+        self._mark([(s, statuses[n % 3]) for n, s in enumerate(self.students)])
+        self._mark([(s, "ABSENT") for s in self.students[:5]], period="AFTERNOON")
+        self._record(self.students[0], date(2026, 3, 3), "ABSENT", is_justified=True)
+        self._record(self.students[0], date(2026, 3, 4), "LATE", is_justified=True)
+        incremental = _snapshot()
+
+        AttendanceMonthlyStat.objects.all().delete()
+        self.assertEqual(rebuild_monthly_stats(), len(incremental))
+        self.assertEqual(_snapshot(), incremental)
+
+        AttendanceMonthlyStat.objects.update(absent=0)
+        call_command("rebuild_attendance_stats", school=str(self.school.pk), stdout=io.StringIO())
+        self.assertEqual(_snapshot(), incremental)
+
+
+class TestReportsReadCounters(AttendanceStatsTestCase):
+    def setUp(self):
+        super().setUp()
+        statuses = ["ABSENT", "LATE", "PRESENT", "PRESENT"]
+        self._mark([(s, statuses[n % 4]) for n, s in enumerate(self.students)])
+        self._mark([(self.students[0], "ABSENT")], period="AFTERNOON")
+        self.client.force_authenticate(user=self.admin)
+
+    def test_monthly_report(self):
+        resp = self.client.get(
+            f"{REPORTS_URL}monthly/",
+            {"class_id": str(self.klass.pk), "year": DAY.year, "month": DAY.month},
+        )
+        self.assertEqual(resp.status_code, 200)
+        rows = {row["student_id"]: row for row in resp.data["students"]}
+        first = rows[str(self.students[0].pk)]
+        self.assertEqual((first["absent"], first["late"], first["present"]), (2, 0, 0))
+        self.assertEqual(first["days"], {DAY.day: "ABSENT"})
+        self.assertEqual(rows[str(self.students[1].pk)]["late"], 1)
+
+    def test_annual_report(self):
+        resp = self.client.get(f"{REPORTS_URL}annual/", {"year": DAY.year})
+        self.assertEqual(resp.status_code, 200)
+        [february] = resp.data["months"]
+        self.assertEqual(february["month"], 2)
+        self.assertEqual(
+            (february["total"], february["absent"], february["late"], february["present"]),
+            (21, 6, 5, 10),
+        )
+        self.assertEqual(february["justified"], 0)
+
+    def test_annual_report_counts_justified_lates(self):
+        self._record(self.students[1], date(2026, 2, 3), "LATE", is_justified=True)
+        self._record(self.students[2], date(2026, 2, 3), "ABSENT", is_justified=True)
+        self._record(self.students[2], date(2026, 2, 4), "LATE")
+
+        resp = self.client.get(f"{REPORTS_URL}annual/", {"year": DAY.year})
+        [february] = resp.data["months"]
+        self.assertEqual(
+            (february["justified"], february["justified_absent"], february["justified_late"]),
+            (2, 1, 1),
+        )
+
+        AttendanceMonthlyStat.objects.all().delete()
+        rebuild_monthly_stats()
+        resp = self.client.get(f"{REPORTS_URL}annual/", {"year": DAY.year})
+        self.assertEqual(resp.data["months"][0]["justified"], 2)
+
+    def test_ranking_uses_counters_for_whole_months_only(self):
+        whole_month = {"date_from": "2026-02-01", "date_to": "2026-02-28"}
+        resp = self.client.get(f"{REPORTS_URL}ranking/", whole_month)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data[-1]["student_id"], str(self.students[0].pk))
+        self.assertEqual(resp.data[-1]["absent"], 2)
+
+        # Counters out of sync: only the whole-month query follows them
+        AttendanceMonthlyStat.objects.filter(student=self.students[0]).update(absent=7)
+        resp = self.client.get(f"{REPORTS_URL}ranking/", whole_month)
+        self.assertEqual(resp.data[-1]["absent"], 7)
+        resp = self.client.get(
+            f"{REPORTS_URL}ranking/", {"date_from": "2026-02-02", "date_to": "2026-02-02"}
+        )
+        self.assertEqual(resp.data[-1]["absent"], 2)
+
+    def test_dashboard_and_chronic_absenteeism(self):
+        # Only the counters say the student is at risk this month
+        AttendanceMonthlyStat.objects.filter(student=self.students[0]).update(
+            month=timezone.localdate().replace(day=1), absent=6
+        )
+        resp = self.client.get("/api/v1/attendance/stats/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["month_count"], 6)
+        self.assertEqual(
+            [row["student_id"] for row in resp.data["at_risk_students"]],
+            [str(self.students[0].pk)],
+        )
+
+        with patch("apps.attendance.tasks._send_fcm_for_users"), patch(
+            "apps.attendance.tasks._send_fcm_for_user"
+        ), patch("apps.attendance.tasks._push_ws_notification"):
+            result = detect_chronic_absenteeism()
+        self.assertEqual(result["alerts"], 1)
@@ -0,0 +1,197 @@
+"""
+Tests for the audience resolver (core.audience):
+
+  - class / section scopes reach students, their parents and teachers,
+    each user once (a parent of two children is one row)
+  - a resolution costs two queries whatever the audience size, and
+    none when it is cached for its owner
+  - SMS campaigns and announcement pushes go through it
+"""
+from unittest.mock import patch
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.audience import Audience, forget, resolve
+
+
+def _user(school, phone, role, first_name):
+    from apps.accounts.models import User
+
+    return User.objects.create_user(
+        phone_number=phone,
+        password="Test@1234",
+        school=school,
+        role=role,
+        first_name=first_name,
+        last_name="Test",
+    )
+
+
+@pytest.fixture
+def population(school, section, level, academic_year, classroom, parent_user, teacher_assignment):
+    """Two children of parent_user in ``classroom``, one other family in 1AM - B."""
+    from apps.academics.models import Classroom
+
+    other_class = Classroom.objects.create(
+        school=school,
+        section=section,
+        academic_year=academic_year,
+        level=level,
+        name="1AM - B",
+    )
+    children = [_user(school, f"05600000{n}", "STUDENT", f"Enfant{n}") for n in range(2)]
+    other_child = _user(school, "0560000010", "STUDENT", "Autre")
+    other_parent = _user(school, "0560000011", "PARENT", "AutreParent")
+    for child in children:
+        child.student_profile.current_class = classroom
+        child.student_profile.save()
+    other_child.student_profile.current_class = other_class
+    other_child.student_profile.save()
+    parent_user.parent_profile.children.set([c.student_profile for c in children])
+    other_parent.parent_profile.children.set([other_child.student_profile])
+    return {
+        "children": children,
+        "parent": parent_user,
+        "teacher": teacher_assignment.teacher,
+        "other_child": other_child,
+        "other_parent": other_parent,
+        "other_class": other_class,
+    }
+
+
+def _ids(recipients):
+    return sorted(str(r.user_id) for r in recipients)
+
+
+@pytest.mark.django_db
+class TestResolve:
+    def test_class_scope(self, school, classroom, population):
+        with CaptureQueriesContext(connection) as ctx:
+            recipients = resolve(Audience(school.pk, class_id=classroom.pk))
+        assert len(ctx.captured_queries) == 2
+        expected = population["children"] + [population["parent"], population["teacher"]]
+        assert _ids(recipients) == sorted(str(u.pk) for u in expected)
+
+    def test_roles_and_section_scope(self, school, section, classroom, population):
+        parents = resolve(Audience(school.pk, ("PARENT",), class_id=classroom.pk))
+        assert _ids(parents) == [str(population["parent"].pk)]
+        assert parents[0].phone == population["parent"].phone_number
+        assert parents[0].name == "Mohamed Benali"
+
+        parents = resolve(Audience(school.pk, ("PARENT",), section_id=section.pk))
+        assert _ids(parents) == sorted(
+            str(u.pk) for u in (population["parent"], population["other_parent"])
+        )
+
+    def test_tokens_and_preferences(self, school, population):
+        from apps.notifications.models import DeviceToken, NotificationPreference
+
+        parent = population["parent"]
+        DeviceToken.objects.create(user=parent, token="tok-a", platform="ANDROID")
+        DeviceToken.objects.create(user=parent, token="tok-b", platform="IOS")
+        NotificationPreference.objects.create(user=parent, push_system=False)
+
+        recipients = {
+            r.user_id: r
+            for r in resolve(Audience(school.pk, user_ids=(parent.pk, population["teacher"].pk)))
+        }
+        assert sorted(recipients[parent.pk].tokens) == ["tok-a", "tok-b"]
+        assert not recipients[parent.pk].preference.is_push_enabled("system")
+        teacher = recipients[population["teacher"].pk]
+        assert teacher.tokens == [] and teacher.preferences is None
+        assert teacher.preference.is_push_enabled("system")
+
+    def test_cached_for_owner(self, school, classroom, population, settings):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        audience = Audience(school.pk, ("PARENT",), class_id=classroom.pk)
+
+        first = resolve(audience, tokens=False, cache_for="sms_campaign:1")
+        with CaptureQueriesContext(connection) as ctx:
+            again = resolve(audience, tokens=False, cache_for="sms_campaign:1")
+        assert len(ctx.captured_queries) == 0
+        assert _ids(again) == _ids(first)
+
+        forget(audience, "sms_campaign:1")
+        with CaptureQueriesContext(connection) as ctx:
+            resolve(audience, tokens=False, cache_for="sms_campaign:1")
+        assert len(ctx.captured_queries) == 1
+
+
+@pytest.mark.django_db
+class TestConsumers:
+    def test_campaign_class_target(self, school, classroom, population):
+        from apps.sms.gateway import CustomGateway, SMSResult
+        from apps.sms.models import SMSCampaign, SMSConfig, SMSMessage
+        from apps.sms.tasks import execute_campaign_task
+
+        SMSConfig.objects.create(
+            school=school,
+            provider=SMSConfig.GatewayProvider.CUSTOM,
+            api_url="https://sms.example.test/send",
+            remaining_balance=10,
+        )
+        campaign = SMSCampaign.objects.create(
+            school=school,
+            title="Sortie",
+            message="Sortie scolaire vendredi",
+            target_type=SMSCampaign.TargetType.CLASS,
+            target_class=classroom,
+        )
+        with patch.object(CustomGateway, "send", return_value=SMSResult(True, message_id="x")):
+            assert execute_campaign_task(str(campaign.pk)) == {"sent": 1, "failed": 0}
+        assert list(
+            SMSMessage.objects.filter(campaign=campaign).values_list("recipient_phone", flat=True)
+        ) == [population["parent"].phone_number]
+
+    def test_campaign_without_individuals_targets_nobody(self, school, population):
+        from apps.sms.gateway import CustomGateway
+        from apps.sms.models import SMSCampaign, SMSConfig, SMSMessage
+        from apps.sms.tasks import execute_campaign_task
+
+        SMSConfig.objects.create(
+            school=school,
+            provider=SMSConfig.GatewayProvider.CUSTOM,
+            api_url="https://sms.example.test/send",
+            remaining_balance=10,
+        )
+        campaign = SMSCampaign.objects.create(
+            school=school,
+            title="Rappel",
+            message="Rappel",
+            target_type=SMSCampaign.TargetType.INDIVIDUAL,
+        )
+        assert resolve(campaign.audience(), tokens=False) == []
+        with patch.object(CustomGateway, "send") as send:
+            assert execute_campaign_task(str(campaign.pk)) == {"sent": 0, "failed": 0}
+        send.assert_not_called()
+        assert not SMSMessage.objects.filter(campaign=campaign).exists()
+
+    @patch("core.firebase.send_push_to_multiple", return_value={"unregistered_tokens": []})
+    def test_announcement_push_respects_preferences(
+        self, mock_push, school, admin_user, classroom, population
+    ):
+        from apps.announcements.models import Announcement
+        from apps.announcements.tasks import send_announcement_notifications
+        from apps.notifications.models import DeviceToken, NotificationPreference
+
+        first, second = population["children"]
+        DeviceToken.objects.create(user=first, token="tok-1", platform="ANDROID")
+        DeviceToken.objects.create(user=second, token="tok-2", platform="ANDROID")
+        DeviceToken.objects.create(user=population["other_child"], token="tok-3", platform="IOS")
+        NotificationPreference.objects.create(user=second, push_system=False)
+
+        announcement = Announcement.objects.create(
+            school=school,
+            author=admin_user,
+            title="Sortie",
+            body="Sortie scolaire vendredi",
+            target_audience=Announcement.TargetAudience.SPECIFIC_CLASS,
+            target_class=classroom,
+        )
+        result = send_announcement_notifications(str(announcement.pk))
+
+        assert result["count"] == 1
+        mock_push.assert_called_once()
+        assert mock_push.call_args.args[0] == ["tok-1"]
@@ -0,0 +1,152 @@
+"""
+Tests for the chat consumers' connection state:
+
+  - a message only costs its INSERT and the inbox counter updates
+    (participants, room, permission and members are cached at connect)
+  - a membership change reaches the connected consumers, which reload
+    their write permission or disconnect a removed member
+"""
+import pytest
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+def _application():
+    from apps.chat.routing import websocket_urlpatterns
+
+    return URLRouter(websocket_urlpatterns)
+
+
+async def _connect(path, user):
+    communicator = WebsocketCommunicator(_application(), path)
+    communicator.scope["user"] = user
+    connected, _ = await communicator.connect()
+    assert connected
+    return communicator
+
+
+class QueryLog:
+    """
+    Execute wrapper recording the SQL run while ``recording`` is set.
+    Consumers run their DB work in the test thread (thread-sensitive
+    database_sync_to_async), on the connection the wrapper is installed on.
+    """
+
+    def __init__(self):
+        self.recording = False
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.recording:
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def selects(self, table):
+        return [
+            sql for sql in self.queries
+            if sql.startswith("SELECT") and f'FROM "{table}"' in sql
+        ]
+
+    def run(self, scenario):
+        with connection.execute_wrapper(self):
+            return async_to_sync(scenario)()
+
+
+@pytest.fixture
+def broadcast_room(school, admin_user, teacher_user):
+    from apps.chat.models import ChatRoom, ChatRoomMembership
+
+    room = ChatRoom.objects.create(
+        school=school,
+        room_type=ChatRoom.RoomType.ADMIN_BROADCAST,
+        name="Annonces",
+        created_by=admin_user,
+    )
+    ChatRoomMembership.objects.create(
+        room=room, user=admin_user, role=ChatRoomMembership.Role.ADMIN
+    )
+    ChatRoomMembership.objects.create(room=room, user=teacher_user)
+    return room
+
+
+@pytest.fixture(autouse=True)
+def in_memory_channel_layer(settings):
+    settings.CHANNEL_LAYERS = IN_MEMORY_LAYER
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConsumerState:
+    def test_conversation_message_does_not_reload_state(self, school, admin_user, parent_user):
+        from apps.chat.models import Conversation, Message
+
+        conv = Conversation.objects.create(
+            school=school,
+            created_by=admin_user,
+            participant_admin=admin_user,
+            participant_other=parent_user,
+            participant_other_role="parent",
+        )
+
+        log = QueryLog()
+
+        async def scenario():
+            communicator = await _connect(f"/ws/chat/{conv.id}/", parent_user)
+            log.recording = True
+            await communicator.send_json_to({"content": "Bonjour"})
+            message = await communicator.receive_json_from()
+            log.recording = False
+            await communicator.disconnect()
+            return message
+
+        message = log.run(scenario)
+        assert message["recipient_id"] == str(admin_user.pk)
+        assert log.queries and log.selects("conversations") == []
+        assert Message.objects.filter(conversation=conv).count() == 1
+        conv.refresh_from_db()
+        assert conv.unread_count_admin == 1
+
+    def test_room_message_and_permission_reload(self, broadcast_room, teacher_user):
+        from apps.chat.models import ChatRoomMembership, ChatRoomMessage
+
+        path = f"/ws/room/{broadcast_room.id}/"
+        log = QueryLog()
+
+        async def scenario():
+            communicator = await _connect(path, teacher_user)
+
+            # Plain member of a broadcast room: refused without a query
+            log.recording = True
+            await communicator.send_json_to({"content": "Salut"})
+            refused = await communicator.receive_json_from()
+            log.recording = False
+            assert "error" in refused
+            assert log.queries == []
+
+            # Promoted to room admin: the consumer picks it up
+            membership = await database_sync_to_async(
+                ChatRoomMembership.objects.get
+            )(room=broadcast_room, user=teacher_user)
+            membership.role = ChatRoomMembership.Role.ADMIN
+            await database_sync_to_async(membership.save)()
+            assert await communicator.receive_nothing(timeout=0.2)
+
+            log.recording = True
+            await communicator.send_json_to({"content": "Réunion demain"})
+            message = await communicator.receive_json_from()
+            log.recording = False
+            assert message["room_name"] == "Annonces"
+            assert log.selects("chat_rooms") == []
+            assert log.selects("chat_room_memberships") == []
+
+            # Removed from the room: disconnected
+            await database_sync_to_async(membership.delete)()
+            closed = await communicator.receive_output(timeout=1)
+            assert closed == {"type": "websocket.close", "code": 4003}
+
+        log.run(scenario)
+        assert ChatRoomMessage.objects.filter(room=broadcast_room).count() == 1
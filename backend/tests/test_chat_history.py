@@ -0,0 +1,140 @@
+"""
+Tests for the cursor-paginated chat history (KeysetPagination):
+
+  - ?limit returns the latest page, ?before walks back through the history
+  - ?after / ?since only return the newer messages (delta sync)
+  - messages sharing a timestamp are neither skipped nor repeated
+  - without any paging parameter the full list is still returned
+"""
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.utils import timezone
+
+
+@pytest.fixture
+def conversation(school, admin_user, parent_user):
+    from apps.chat.models import Conversation
+
+    return Conversation.objects.create(
+        school=school,
+        room_type="ADMIN_PARENT",
+        created_by=admin_user,
+        participant_admin=admin_user,
+        participant_other=parent_user,
+        participant_other_role="parent",
+    )
+
+
+@pytest.fixture
+def history(conversation, admin_user, parent_user):
+    """25 messages, one minute apart; #10 and #11 share a timestamp."""
+    from apps.chat.models import Message
+
+    start = timezone.now() - timedelta(hours=1)
+    messages = []
+    for n in range(25):
+        msg = Message.objects.create(
+            conversation=conversation,
+            sender=admin_user if n % 2 else parent_user,
+            content=f"m{n}",
+        )
+        created_at = start + timedelta(minutes=min(n, 10) if n <= 11 else n)
+        Message.objects.filter(pk=msg.pk).update(created_at=created_at)
+        messages.append(msg)
+    return messages
+
+
+def _url(conversation):
+    return f"/api/v1/chat/conversations/{conversation.id}/messages/"
+
+
+def _contents(resp):
+    return [row["content"] for row in resp.data["results"]]
+
+
+@pytest.mark.django_db
+class TestConversationHistory:
+    def test_backward_pages_cover_history_once(self, admin_client, conversation, history):
+        resp = admin_client.get(_url(conversation), {"limit": 10})
+        assert resp.status_code == 200
+        assert _contents(resp) == [f"m{n}" for n in range(15, 25)]
+        assert resp.data["has_more"] is True
+
+        seen = _contents(resp)
+        while resp.data["previous_cursor"]:
+            resp = admin_client.get(
+                _url(conversation), {"limit": 10, "before": resp.data["previous_cursor"]}
+            )
+            seen = _contents(resp) + seen
+        assert resp.data["has_more"] is False
+        assert sorted(seen, key=lambda c: int(c[1:])) == [f"m{n}" for n in range(25)]
+        assert len(seen) == 25
+
+    def test_after_cursor_polls_new_messages(
+        self, admin_client, conversation, history, parent_user
+    ):
+        from apps.chat.models import Message
+
+        resp = admin_client.get(_url(conversation), {"limit": 5})
+        cursor = resp.data["next_cursor"]
+
+        resp = admin_client.get(_url(conversation), {"after": cursor})
+        assert resp.data["results"] == []
+        assert resp.data["next_cursor"] == cursor
+
+        Message.objects.create(conversation=conversation, sender=parent_user, content="new")
+        resp = admin_client.get(_url(conversation), {"after": cursor})
+        assert _contents(resp) == ["new"]
+        assert resp.data["has_more"] is False
+
+    def test_since_returns_new_and_deleted(self, admin_client, conversation, history):
+        since = timezone.now() - timedelta(minutes=40)
+        history[3].soft_delete()
+
+        resp = admin_client.get(_url(conversation), {"since": since.isoformat()})
+        assert resp.status_code == 200
+        assert _contents(resp) == [f"m{n}" for n in range(21, 25)]
+        assert resp.data["deleted"] == [str(history[3].pk)]
+
+    def test_invalid_parameters(self, admin_client, conversation, history):
+        assert admin_client.get(_url(conversation), {"before": "nope"}).status_code == 400
+        assert admin_client.get(_url(conversation), {"since": "hier"}).status_code == 400
+
+    def test_without_parameters_returns_full_list(
+        self, admin_client, conversation, history
+    ):
+        from core.pagination import KeysetPagination
+
+        # Legacy clients get the whole thread, whatever the page size
+        with patch.object(KeysetPagination, "page_size", 10):
+            resp = admin_client.get(_url(conversation))
+        contents = [row["content"] for row in resp.data]
+        assert sorted(contents) == sorted(f"m{n}" for n in range(25))
+        assert (contents[0], contents[-1]) == ("m0", "m24")
+
+
+@pytest.mark.django_db
+class TestRoomHistory:
+    def test_room_pages(self, admin_client, school, admin_user):
+        from apps.chat.models import ChatRoom, ChatRoomMembership, ChatRoomMessage
+
+        room = ChatRoom.objects.create(
+            school=school,
+            room_type=ChatRoom.RoomType.ADMIN_BROADCAST,
+            name="Annonces",
+            created_by=admin_user,
+        )
+        ChatRoomMembership.objects.create(
+            room=room, user=admin_user, role=ChatRoomMembership.Role.ADMIN
+        )
+        for n in range(7):
+            ChatRoomMessage.objects.create(room=room, sender=admin_user, content=f"r{n}")
+
+        url = f"/api/v1/chat/rooms/{room.id}/messages/"
+        resp = admin_client.get(url, {"limit": 4})
+        assert _contents(resp) == ["r3", "r4", "r5", "r6"]
+        resp = admin_client.get(url, {"limit": 4, "before": resp.data["previous_cursor"]})
+        assert _contents(resp) == ["r0", "r1", "r2"]
+        assert resp.data["previous_cursor"] is None
@@ -0,0 +1,211 @@
+"""
+Tests for the denormalised chat inbox (last-message snapshot + unread
+counters on Conversation / ChatRoom / ChatRoomMembership):
+
+  - creating, soft-deleting and reading messages keep the snapshot and
+    the per-participant counters exact
+  - the conversation and room lists run a fixed number of queries
+  - rebuild_chat_inbox recomputes the snapshots
+"""
+import io
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+
+@pytest.fixture
+def conversation(school, admin_user, parent_user):
+    from apps.chat.models import Conversation
+
+    return Conversation.objects.create(
+        school=school,
+        room_type="ADMIN_PARENT",
+        created_by=admin_user,
+        participant_admin=admin_user,
+        participant_other=parent_user,
+        participant_other_role="parent",
+    )
+
+
+@pytest.fixture
+def room(school, admin_user, teacher_user, parent_user):
+    from apps.chat.models import ChatRoom, ChatRoomMembership
+
+    room = ChatRoom.objects.create(
+        school=school,
+        room_type=ChatRoom.RoomType.TEACHER_PARENT_GROUP,
+        name="Parents 3AP",
+        created_by=teacher_user,
+    )
+    for user in (teacher_user, parent_user, admin_user):
+        ChatRoomMembership.objects.create(room=room, user=user)
+    return room
+
+
+def _client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.mark.django_db
+class TestConversationSnapshot:
+    def test_create_delete_and_read(self, conversation, admin_user, parent_user):
+        from apps.chat.models import Message
+
+        first = Message.objects.create(
+            conversation=conversation, sender=parent_user, content="Bonjour"
+        )
+        second = Message.objects.create(
+            conversation=conversation, sender=parent_user, content="Question"
+        )
+        Message.objects.create(conversation=conversation, sender=admin_user, content="Oui ?")
+        conversation.refresh_from_db()
+        assert conversation.last_message_preview == "Oui ?"
+        assert conversation.last_message_sender == admin_user
+        assert (conversation.unread_count_admin, conversation.unread_count_other) == (2, 1)
+
+        # Deleting the latest message brings the previous one back
+        conversation.last_message.soft_delete()
+        conversation.refresh_from_db()
+        assert conversation.last_message == second
+        assert (conversation.unread_count_admin, conversation.unread_count_other) == (2, 0)
+
+        second.delete()
+        conversation.refresh_from_db()
+        assert conversation.last_message == first
+        assert conversation.unread_count_admin == 1
+
+        resp = _client(admin_user).post(
+            f"/api/v1/chat/conversations/{conversation.id}/messages/read/"
+        )
+        assert resp.status_code == 200
+        conversation.refresh_from_db()
+        assert conversation.unread_count_admin == 0
+        assert conversation.is_read_by_admin is True
+
+    def test_list_runs_fixed_queries(self, school, admin_user, parent_user, conversation):
+        from apps.accounts.models import User
+        from apps.chat.models import Conversation, Message
+
+        client = _client(admin_user)
+        url = "/api/v1/chat/conversations/"
+
+        def _count():
+            with CaptureQueriesContext(connection) as ctx:
+                resp = client.get(url)
+            assert resp.status_code == 200
+            return resp, len(ctx.captured_queries)
+
+        Message.objects.create(conversation=conversation, sender=parent_user, content="a")
+        _, before = _count()
+
+        for n in range(4):
+            other = User.objects.create_user(
+                phone_number=f"0661{n:06d}",
+                password="pass1234",
+                first_name=f"P{n}",
+                last_name="Inbox",
+                role=User.Role.PARENT,
+                school=school,
+            )
+            conv = Conversation.objects.create(
+                school=school,
+                created_by=admin_user,
+                participant_admin=admin_user,
+                participant_other=other,
+                participant_other_role="parent",
+            )
+            for _ in range(3):
+                Message.objects.create(conversation=conv, sender=other, content=f"m{n}")
+        resp, after = _count()
+
+        assert after == before
+        assert len(resp.data) == 5
+        row = next(r for r in resp.data if r["id"] == str(conversation.id))
+        assert (row["last_message_preview"], row["unread_count"]) == ("a", 1)
+
+    def test_parent_counter_reset_on_open(self, conversation, admin_user, parent_user):
+        from apps.chat.models import Message
+
+        Message.objects.create(conversation=conversation, sender=admin_user, content="Hi")
+        resp = _client(parent_user).get("/api/v1/chat/conversations/")
+        assert resp.data[0]["unread_count"] == 1
+
+        _client(parent_user).get(f"/api/v1/chat/conversations/{conversation.id}/messages/")
+        conversation.refresh_from_db()
+        assert conversation.unread_count_other == 0
+
+    def test_delete_after_open(self, conversation, admin_user, parent_user):
+        from apps.chat.models import Message
+
+        first = Message.objects.create(
+            conversation=conversation, sender=admin_user, content="m1",
+            status=Message.Status.DELIVERED,
+        )
+        # The parent opens the thread: m1 is read, though still DELIVERED
+        _client(parent_user).get(f"/api/v1/chat/conversations/{conversation.id}/messages/")
+        Message.objects.create(conversation=conversation, sender=admin_user, content="m2")
+        conversation.refresh_from_db()
+        assert conversation.unread_count_other == 1
+
+        first.soft_delete()
+        conversation.refresh_from_db()
+        assert conversation.unread_count_other == 1
+
+        call_command("rebuild_chat_inbox", stdout=io.StringIO())
+        conversation.refresh_from_db()
+        assert conversation.unread_count_other == 1
+
+
+@pytest.mark.django_db
+class TestRoomSnapshot:
+    def test_counters_per_member(self, room, teacher_user, parent_user, admin_user):
+        from apps.chat.models import ChatRoomMembership, ChatRoomMessage
+
+        for n in range(3):
+            ChatRoomMessage.objects.create(room=room, sender=teacher_user, content=f"t{n}")
+        ChatRoomMessage.objects.create(room=room, sender=parent_user, content="merci")
+
+        def _unread():
+            return dict(
+                ChatRoomMembership.objects.filter(room=room).values_list(
+                    "user_id", "unread_count"
+                )
+            )
+
+        assert _unread() == {teacher_user.pk: 1, parent_user.pk: 3, admin_user.pk: 4}
+
+        # The parent opens the room, then the teacher retracts a message
+        resp = _client(parent_user).get(f"/api/v1/chat/rooms/{room.id}/messages/")
+        assert resp.status_code == 200
+        last = ChatRoomMessage.objects.create(room=room, sender=teacher_user, content="t3")
+        last.soft_delete()
+        assert _unread() == {teacher_user.pk: 1, parent_user.pk: 0, admin_user.pk: 4}
+
+        room.refresh_from_db()
+        assert room.last_message_preview == "merci"
+
+        resp = _client(admin_user).get("/api/v1/chat/rooms/")
+        [row] = resp.data
+        assert (row["member_count"], row["unread_count"]) == (3, 4)
+        assert row["last_message_sender"] == parent_user.pk
+
+
+@pytest.mark.django_db
+def test_rebuild_chat_inbox(conversation, room, admin_user, parent_user, teacher_user):
+    from apps.chat.models import ChatRoom, Conversation, Message, ChatRoomMessage
+
+    Message.objects.create(conversation=conversation, sender=admin_user, content="x")
+    ChatRoomMessage.objects.create(room=room, sender=teacher_user, content="y")
+    Conversation.objects.update(last_message=None, last_message_preview="", unread_count_other=0)
+    ChatRoom.objects.update(last_message=None, last_message_preview="")
+
+    call_command("rebuild_chat_inbox", stdout=io.StringIO())
+    conversation.refresh_from_db()
+    room.refresh_from_db()
+    assert (conversation.last_message_preview, conversation.unread_count_other) == ("x", 1)
+    assert room.last_message_preview == "y"
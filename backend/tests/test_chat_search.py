@@ -0,0 +1,148 @@
+"""
+Tests for the full-text chat search (apps.chat.search):
+
+  - French and Arabic words match their inflected forms
+  - only the user's conversations and rooms are searched, deleted
+    messages are not, edited messages are re-indexed
+  - results are ranked and paginated with limit / offset
+"""
+import pytest
+from django.db import connection
+from rest_framework.test import APIClient
+
+URL = "/api/v1/chat/messages/search/"
+
+
+@pytest.fixture
+def conversation(school, admin_user, parent_user):
+    from apps.chat.models import Conversation
+
+    return Conversation.objects.create(
+        school=school,
+        room_type="ADMIN_PARENT",
+        created_by=admin_user,
+        participant_admin=admin_user,
+        participant_other=parent_user,
+        participant_other_role="parent",
+    )
+
+
+@pytest.fixture
+def room(school, admin_user, teacher_user):
+    from apps.chat.models import ChatRoom, ChatRoomMembership
+
+    room = ChatRoom.objects.create(
+        school=school,
+        room_type=ChatRoom.RoomType.ADMIN_TEACHER_GROUP,
+        name="Salle des profs",
+        created_by=admin_user,
+    )
+    ChatRoomMembership.objects.create(
+        room=room, user=admin_user, role=ChatRoomMembership.Role.ADMIN
+    )
+    ChatRoomMembership.objects.create(room=room, user=teacher_user)
+    return room
+
+
+def _say(conversation, sender, content):
+    from apps.chat.models import Message
+
+    return Message.objects.create(conversation=conversation, sender=sender, content=content)
+
+
+def _post(room, sender, content):
+    from apps.chat.models import ChatRoomMessage
+
+    return ChatRoomMessage.objects.create(room=room, sender=sender, content=content)
+
+
+def _utf8_database():
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW server_encoding")
+        return cursor.fetchone()[0] == "UTF8"
+
+
+def _contents(resp):
+    return [row["content"] for row in resp.data["results"]]
+
+
+@pytest.mark.django_db
+class TestMatching:
+    def test_french_stemming(self, admin_client, conversation, admin_user):
+        _say(conversation, admin_user, "Les réunions de parents auront lieu jeudi")
+        _say(conversation, admin_user, "Bulletin du premier trimestre")
+
+        assert _contents(admin_client.get(URL, {"q": "réunion"})) == [
+            "Les réunions de parents auront lieu jeudi"
+        ]
+        assert _contents(admin_client.get(URL, {"q": "parent jeudi"})) == [
+            "Les réunions de parents auront lieu jeudi"
+        ]
+        assert _contents(admin_client.get(URL, {"q": "réunion -jeudi"})) == []
+
+    def test_arabic_stemming(self, admin_client, conversation, admin_user):
+        if not _utf8_database():
+            pytest.skip("Arabic words are only parsed by a UTF8 database")
+        _say(conversation, admin_user, "اجتماع أولياء التلاميذ يوم الخميس")
+
+        assert _contents(admin_client.get(URL, {"q": "التلاميذ"})) == [
+            "اجتماع أولياء التلاميذ يوم الخميس"
+        ]
+
+    def test_scope_deleted_and_edited(
+        self, admin_client, conversation, room, admin_user, teacher_user
+    ):
+        _say(conversation, admin_user, "Sortie scolaire au musée")
+        _post(room, teacher_user, "Qui accompagne la sortie ?")
+        deleted = _post(room, admin_user, "Sortie annulée")
+        deleted.soft_delete()
+
+        resp = admin_client.get(URL, {"q": "sortie"})
+        assert resp.status_code == 200
+        assert {(row["type"], row["content"]) for row in resp.data["results"]} == {
+            ("conversation", "Sortie scolaire au musée"),
+            ("room", "Qui accompagne la sortie ?"),
+        }
+        # The teacher is not in the conversation
+        teacher_client = APIClient()
+        teacher_client.force_authenticate(user=teacher_user)
+        assert _contents(teacher_client.get(URL, {"q": "sortie"})) == [
+            "Qui accompagne la sortie ?"
+        ]
+
+        msg = _say(conversation, admin_user, "Rendez-vous lundi")
+        msg.content = "Rendez-vous mardi"
+        msg.save()
+        assert _contents(admin_client.get(URL, {"q": "mardi"})) == ["Rendez-vous mardi"]
+        assert _contents(admin_client.get(URL, {"q": "lundi"})) == []
+
+    def test_short_query_rejected(self, admin_client):
+        assert admin_client.get(URL, {"q": "a"}).status_code == 400
+
+
+@pytest.mark.django_db
+class TestRankingAndPages:
+    def test_best_match_first(self, admin_client, conversation, room, admin_user):
+        _say(conversation, admin_user, "Absence signalée")
+        _post(room, admin_user, "Absence, absence et encore absence ce mois-ci")
+
+        resp = admin_client.get(URL, {"q": "absence"})
+        assert _contents(resp)[0] == "Absence, absence et encore absence ce mois-ci"
+        ranks = [row["rank"] for row in resp.data["results"]]
+        assert ranks == sorted(ranks, reverse=True)
+
+    def test_pages(self, admin_client, conversation, room, admin_user):
+        for n in range(3):
+            _say(conversation, admin_user, f"Devoir n°{n}")
+            _post(room, admin_user, f"Devoir de groupe n°{n}")
+
+        seen = []
+        params = {"q": "devoir", "limit": 4}
+        while True:
+            resp = admin_client.get(URL, params)
+            seen += _contents(resp)
+            if not resp.data["has_more"]:
+                break
+            params["offset"] = resp.data["next_offset"]
+        assert resp.data["next_offset"] is None
+        assert len(seen) == len(set(seen)) == 6
@@ -0,0 +1,171 @@
+"""
+Tests for the streaming report exports (core.exports):
+
+  - XLSX sheets are written in write-only mode (preamble, header, fills)
+  - the attendance CSV / Excel exports stream every row, with no cap
+  - the MEN grade sheets load a class in a fixed number of queries
+  - ``?async=true`` runs the export as a job that stores the file and
+    notifies the user with the download link
+"""
+
+import io
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from openpyxl import load_workbook
+
+from apps.attendance.models import AttendanceRecord
+from apps.grades.services import recalculate_classroom_trimester
+from apps.grades.views import men_export_sheets
+from apps.notifications.models import Notification
+from core.exports import Sheet, iter_csv, run_export_job, write_xlsx
+
+from tests.test_attendance_bulk import DAY, BulkAttendanceTestCase
+from tests.test_attendance_stats import AttendanceStatsTestCase
+from tests.test_grades_recalculation import ClassroomRecalculationTestCase
+
+
+class TestWriters(SimpleTestCase):
+    def test_xlsx_sheet_layout(self):
+        sheet = Sheet(
+            title="Rapport",
+            columns=[("Nom", 20), ("Statut", 10)],
+            rows=iter([["Amina", "Absent"], ["Karim", "Present"]]),
+            preamble=["École Test"],
+            fills={1: {"Absent": "FF6B6B"}},
+        )
+        buf = io.BytesIO()
+        self.assertEqual(write_xlsx(buf, [sheet]), 2)
+
+        ws = load_workbook(buf).active
+        self.assertEqual(ws.title, "Rapport")
+        self.assertEqual(
+            [[c.value for c in row] for row in ws.iter_rows()],
+            [
+                ["École Test", None],
+                [None, None],
+                ["Nom", "Statut"],
+                ["Amina", "Absent"],
+                ["Karim", "Present"],
+            ],
+        )
+        self.assertIn("A1:B1", ws.merged_cells)
+        self.assertEqual(ws["B4"].fill.start_color.rgb, "00FF6B6B")
+        self.assertEqual(ws.column_dimensions["A"].width, 20)
+
+    def test_csv_is_generated_lazily(self):
+        def rows():
+            yield ["a", 1]
+            raise AssertionError("second row must not be read yet")
+
+        lines = iter_csv(Sheet(title="t", columns=[("x", 1), ("y", 1)], rows=rows()))
+        self.assertEqual(next(lines), "\ufeff")
+        self.assertEqual(next(lines), "x,y\r\n")
+        self.assertEqual(next(lines), "a,1\r\n")
+
+
+class TestAttendanceExports(AttendanceStatsTestCase):
+    def setUp(self):
+        super().setUp()
+        for student in self.students:
+            for period in ("MORNING", "AFTERNOON"):
+                AttendanceRecord.objects.create(
+                    student=student,
+                    class_obj=self.klass,
+                    school=self.school,
+                    date=DAY,
+                    period=period,
+                    status="ABSENT" if period == "MORNING" else "PRESENT",
+                )
+        self.client.force_authenticate(user=self.admin)
+
+    def test_csv_streams_every_row(self):
+        resp = self.client.get("/api/v1/attendance/report/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        lines = b"".join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1 + 2 * len(self.students))
+
+    def test_excel_export(self):
+        resp = self.client.get(
+            "/api/v1/attendance/reports/excel/", {"class_id": str(self.klass.pk)}
+        )
+        self.assertEqual(resp.status_code, 200)
+        ws = load_workbook(io.BytesIO(b"".join(resp.streaming_content))).active
+        self.assertEqual(ws.max_row, 1 + 2 * len(self.students))
+        self.assertEqual(ws["A1"].value, "Élève")
+
+    def test_async_export_job(self):
+        with patch("core.exports.run_export_job.apply_async") as apply_async:
+            resp = self.client.get("/api/v1/attendance/reports/excel/", {"async": "true"})
+        self.assertEqual(resp.status_code, 202)
+        task_id = apply_async.call_args.kwargs["task_id"]
+        self.assertEqual(resp.data["status_url"], f"/api/v1/exports/{task_id}/")
+        self.assertEqual(self.client.get(resp.data["status_url"]).data["status"], "pending")
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            run_export_job.apply(kwargs=apply_async.call_args.kwargs["kwargs"], task_id=task_id)
+
+            status = self.client.get(resp.data["status_url"]).data
+            self.assertEqual(status["status"], "done")
+            self.assertTrue(status["url"].endswith(".xlsx"))
+            self.assertTrue(
+                Notification.objects.filter(user=self.admin, body__contains=status["url"]).exists()
+            )
+
+        # Jobs are only visible to the user who started them
+        self.client.force_authenticate(user=self.teacher)
+        self.assertEqual(self.client.get(resp.data["status_url"]).status_code, 404)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True, CELERY_TASK_EAGER_PROPAGATES=True)
+    def test_eager_export_job_stays_done(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            resp = self.client.get("/api/v1/attendance/reports/excel/", {"async": "true"})
+            self.assertEqual(resp.status_code, 202)
+            # The job ran inside the request: its status is not reset to pending
+            status = self.client.get(resp.data["status_url"]).data
+            self.assertEqual(status["status"], "done")
+            self.assertTrue(status["url"].endswith(".xlsx"))
+
+
+class TestMarkedByColumn(BulkAttendanceTestCase):
+    def test_csv_keeps_marker_name(self):
+        self._mark([(self.students[0], "LATE")])
+        self.teacher.role = "ADMIN"
+        self.teacher.save(update_fields=["role"])
+        resp = self.client.get("/api/v1/attendance/report/")
+        content = b"".join(resp.streaming_content).decode()
+        self.assertIn("Amina Teacher", content)
+
+
+class TestMENExport(ClassroomRecalculationTestCase):
+    def _export(self):
+        params = {"academic_year_id": str(self.academic_year.pk), "trimester": "1"}
+        buf = io.BytesIO()
+        with CaptureQueriesContext(connection) as ctx:
+            rows = write_xlsx(buf, men_export_sheets(self.school, params))
+        return rows, len(ctx.captured_queries), load_workbook(buf)[self.klass.name]
+
+    def test_class_sheet_in_constant_queries(self):
+        counts = []
+        for n in range(6):
+            student = self._student(n)
+            self._grade(student, self.math_exam, Decimal(10 + n))
+            if n in (1, 5):
+                with self.captureOnCommitCallbacks(execute=True):
+                    recalculate_classroom_trimester(self.klass, self.academic_year, 1)
+                rows, queries, ws = self._export()
+                self.assertEqual(rows, n + 1)
+                counts.append(queries)
+        self.assertEqual(counts[0], counts[1])
+
+        header = [c.value for c in ws[5]]
+        self.assertEqual(header[:3], ["الرقم", "الاسم واللقب", "Mathématiques\n(/4.00)"])
+        data = [[c.value for c in row] for row in ws.iter_rows(min_row=6)]
+        self.assertEqual(len(data), 6)
+        best = next(row for row in data if row[-2] == 1)
+        self.assertEqual(best[2], 15)
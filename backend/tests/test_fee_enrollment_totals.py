@@ -0,0 +1,143 @@
+"""
+Tests for the incremental fee-enrollment totals:
+
+  - StudentPayment create / edit / move / soft-delete / delete moves
+    StudentFeeEnrollment.total_paid and status with F() updates
+  - the daily task marks overdue enrollments LATE with one UPDATE
+"""
+import datetime
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+FUTURE = datetime.date.today() + datetime.timedelta(days=90)
+PAST = datetime.date.today() - datetime.timedelta(days=10)
+
+
+def _fee(school, academic_year, name):
+    from apps.finance.models import FeeStructure
+
+    return FeeStructure.objects.create(
+        school=school,
+        name=name,
+        academic_year=academic_year,
+        amount_annual=Decimal("60000.00"),
+        due_date=FUTURE,
+    )
+
+
+def _pay(school, student, fee, amount):
+    from apps.finance.models import StudentPayment
+
+    return StudentPayment.objects.create(
+        school=school,
+        student=student,
+        fee_structure=fee,
+        payment_type="mensuel",
+        amount_paid=Decimal(amount),
+        payment_date=datetime.date.today(),
+        period_start=datetime.date.today(),
+        period_end=FUTURE,
+        payment_method="especes",
+    )
+
+
+@pytest.fixture
+def fees(school, academic_year):
+    return _fee(school, academic_year, "Scolarité"), _fee(school, academic_year, "Transport")
+
+
+@pytest.fixture
+def enrollments(school, student_user, fees):
+    from apps.finance.models import StudentFeeEnrollment
+
+    return [
+        StudentFeeEnrollment.objects.create(
+            school=school,
+            student=student_user,
+            fee_structure=fee,
+            total_due=Decimal("60000.00"),
+            due_date=FUTURE,
+        )
+        for fee in fees
+    ]
+
+
+def _state(enrollment):
+    enrollment.refresh_from_db()
+    return enrollment.total_paid, enrollment.status
+
+
+@pytest.mark.django_db
+class TestIncrementalTotals:
+    def test_payment_lifecycle(self, school, student_user, fees, enrollments):
+        from apps.finance.models import StudentPayment
+
+        tuition, transport = enrollments
+        payment = _pay(school, student_user, fees[0], "8000.00")
+        assert _state(tuition) == (Decimal("8000.00"), "PARTIAL")
+
+        payment = StudentPayment.objects.get(pk=payment.pk)
+        payment.amount_paid = Decimal("60000.00")
+        payment.save()
+        assert _state(tuition) == (Decimal("60000.00"), "PAID")
+
+        payment.fee_structure = fees[1]
+        payment.save()
+        assert _state(tuition) == (Decimal("0.00"), "UNPAID")
+        assert _state(transport) == (Decimal("60000.00"), "PAID")
+
+        payment.soft_delete()
+        assert _state(transport) == (Decimal("0.00"), "UNPAID")
+
+        other = _pay(school, student_user, fees[1], "1000.00")
+        StudentPayment.objects.get(pk=other.pk).delete()
+        assert _state(transport) == (Decimal("0.00"), "UNPAID")
+
+    def test_no_aggregate_on_write(self, school, student_user, fees, enrollments):
+        with CaptureQueriesContext(connection) as ctx:
+            _pay(school, student_user, fees[0], "8000.00")
+        sql = [q["sql"] for q in ctx.captured_queries]
+        assert not any("SUM(" in q.upper() for q in sql)
+        assert sum(q.startswith("UPDATE") and "student_fee_enrollments" in q for q in sql) == 1
+
+    def test_enrollment_created_after_payments(self, school, student_user, fees):
+        from apps.finance.models import StudentFeeEnrollment
+
+        _pay(school, student_user, fees[0], "5000.00")
+        enrollment = StudentFeeEnrollment.objects.create(
+            school=school,
+            student=student_user,
+            fee_structure=fees[0],
+            total_due=Decimal("60000.00"),
+            due_date=FUTURE,
+        )
+        assert _state(enrollment) == (Decimal("5000.00"), "PARTIAL")
+
+    def test_overdue_payment_is_late(self, school, student_user, fees, enrollments):
+        tuition = enrollments[0]
+        tuition.due_date = PAST
+        tuition.save(update_fields=["due_date"])
+        _pay(school, student_user, fees[0], "100.00")
+        assert _state(tuition) == (Decimal("100.00"), "LATE")
+
+
+@pytest.mark.django_db
+class TestDailyTask:
+    def test_mark_late(self, school, student_user, fees, enrollments):
+        from apps.finance.models import StudentFeeEnrollment
+        from apps.finance.tasks import refresh_enrollment_statuses
+
+        tuition, transport = enrollments
+        _pay(school, student_user, fees[1], "60000.00")
+        StudentFeeEnrollment.objects.update(due_date=PAST)
+
+        with CaptureQueriesContext(connection) as ctx:
+            result = refresh_enrollment_statuses()
+        assert result["updated"] == 1
+        assert len(ctx.captured_queries) == 1
+        assert _state(tuition)[1] == "LATE"
+        assert _state(transport)[1] == "PAID"
+
@@ -667,7 +667,7 @@ class TestReportExport:
         resp = admin_client.get("/api/v1/finance/payments/report/?export_format=csv")
         assert resp.status_code == 200
         assert "text/csv" in resp["Content-Type"]
-        content = resp.content.decode("utf-8-sig")
+        content = b"".join(resp.streaming_content).decode("utf-8-sig")
         assert "Youssef" in content
 
     def test_pdf_export(self, admin_client, payment):
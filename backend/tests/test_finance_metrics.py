@@ -0,0 +1,193 @@
+"""
+Tests for the finance dashboard metrics (apps.finance.metrics):
+
+  - each dashboard is one aggregate query, none once cached
+  - payment / enrollment / payslip writes and payroll runs invalidate
+    the school's cached figures
+  - the monthly revenue series covers the 12 months in one query, and
+    is served by reports/revenue-monthly/
+"""
+import datetime
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.finance import metrics
+
+TODAY = datetime.date(2026, 3, 15)
+
+
+@pytest.fixture(autouse=True)
+def locmem(settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    from django.core.cache import cache
+
+    cache.clear()
+
+
+@pytest.fixture
+def fee_structure(school, academic_year):
+    from apps.finance.models import FeeStructure
+
+    return FeeStructure.objects.create(
+        school=school,
+        name="Frais de scolarité 2025-2026",
+        academic_year=academic_year,
+        amount_annual=Decimal("60000.00"),
+        due_date=datetime.date(2026, 6, 30),
+    )
+
+
+@pytest.fixture
+def enrollment(school, student_user, fee_structure):
+    from apps.finance.models import StudentFeeEnrollment
+
+    return StudentFeeEnrollment.objects.create(
+        school=school,
+        student=student_user,
+        fee_structure=fee_structure,
+        total_due=Decimal("60000.00"),
+        due_date=datetime.date(2026, 6, 30),
+    )
+
+
+def _pay(school, student, fee, amount, day, period_end=datetime.date(2026, 6, 30)):
+    from apps.finance.models import StudentPayment
+
+    return StudentPayment.objects.create(
+        school=school,
+        student=student,
+        fee_structure=fee,
+        payment_type="mensuel",
+        amount_paid=Decimal(amount),
+        payment_date=day,
+        period_start=day,
+        period_end=period_end,
+        payment_method="especes",
+    )
+
+
+def _queries(func, *args):
+    with CaptureQueriesContext(connection) as ctx:
+        result = func(*args)
+    return result, len(ctx.captured_queries)
+
+
+@pytest.mark.django_db
+class TestPaymentStats:
+    def test_one_query_then_cached(self, school, student_user, fee_structure):
+        _pay(school, student_user, fee_structure, "8000.00", datetime.date(2026, 3, 2))
+        _pay(school, student_user, fee_structure, "5000.00", datetime.date(2026, 1, 10))
+        _pay(
+            school, student_user, fee_structure, "3000.00", datetime.date(2025, 11, 5),
+            period_end=datetime.date(2025, 12, 31),
+        )
+
+        stats, count = _queries(metrics.payment_stats, school, TODAY)
+        assert count == 1
+        assert stats == {
+            "total_this_month": Decimal("8000.00"),
+            "total_this_year": Decimal("13000.00"),
+            "active_count": 2,
+            "expired_count": 1,
+            "payers": 1,
+        }
+        assert _queries(metrics.payment_stats, school, TODAY) == (stats, 0)
+
+    def test_payment_write_invalidates(self, school, student_user, fee_structure):
+        payment = _pay(school, student_user, fee_structure, "8000.00", datetime.date(2026, 3, 2))
+        assert metrics.payment_stats(school, TODAY)["total_this_month"] == Decimal("8000.00")
+
+        _pay(school, student_user, fee_structure, "2000.00", datetime.date(2026, 3, 3))
+        assert metrics.payment_stats(school, TODAY)["total_this_month"] == Decimal("10000.00")
+
+        payment.soft_delete()
+        assert metrics.payment_stats(school, TODAY)["total_this_month"] == Decimal("2000.00")
+
+
+@pytest.mark.django_db
+class TestEnrollmentStats:
+    def test_payment_moves_enrollment_figures(self, school, student_user, fee_structure, enrollment):
+        stats, count = _queries(metrics.enrollment_stats, school, TODAY)
+        assert count == 1
+        assert (stats["total"], stats["unpaid"], stats["total_collected"]) == (1, 1, 0)
+
+        _pay(school, student_user, fee_structure, "8000.00", datetime.date(2026, 3, 2))
+        stats = metrics.enrollment_stats(school, TODAY)
+        assert stats["total_collected"] == Decimal("8000.00")
+
+        enrollment.refresh_from_db()
+        enrollment.total_due = Decimal("8000.00")
+        enrollment.save()
+        assert metrics.enrollment_stats(school, TODAY)["total_due"] == Decimal("8000.00")
+
+
+@pytest.mark.django_db
+class TestPayrollStats:
+    def test_payslip_writes_invalidate(self, school, teacher_user):
+        from apps.finance.models import PaySlip, SalaryConfig
+        from apps.finance.payroll_run import run_payroll
+
+        stats, count = _queries(metrics.payroll_stats, school, 3, 2026)
+        assert count == 1
+        assert stats["total_payslips"] == 0
+
+        SalaryConfig.objects.create(
+            school=school, teacher=teacher_user, base_salary=Decimal("50000.00")
+        )
+        run_payroll(school, 3, 2026)
+        stats = metrics.payroll_stats(school, 3, 2026)
+        assert (stats["total_payslips"], stats["draft"], stats["total_gross"]) == (
+            1, 1, Decimal("50000.00"),
+        )
+
+        payslip = PaySlip.objects.get(school=school, month=3, year=2026)
+        payslip.status = "PAID"
+        payslip.save()
+        stats = metrics.payroll_stats(school, 3, 2026)
+        assert (stats["draft"], stats["paid"]) == (0, 1)
+
+
+@pytest.mark.django_db
+class TestMonthlyRevenue:
+    def test_series(self, school, student_user, fee_structure):
+        _pay(school, student_user, fee_structure, "8000.00", datetime.date(2026, 3, 2))
+        _pay(school, student_user, fee_structure, "2000.00", datetime.date(2026, 3, 20))
+        _pay(school, student_user, fee_structure, "5000.00", datetime.date(2026, 1, 10))
+        _pay(school, student_user, fee_structure, "9999.00", datetime.date(2025, 3, 1))
+
+        series, count = _queries(metrics.monthly_revenue, school, 2026)
+        assert count == 1
+        assert [row["month"] for row in series] == list(range(1, 13))
+        assert series[0] == {"month": 1, "revenue": Decimal("5000.00"), "count": 1}
+        assert series[2] == {"month": 3, "revenue": Decimal("10000.00"), "count": 2}
+        assert series[1] == {"month": 2, "revenue": 0, "count": 0}
+        assert _queries(metrics.monthly_revenue, school, 2026)[1] == 0
+
+    def test_schools_are_isolated(self, school, student_user, fee_structure):
+        from apps.schools.models import School
+
+        other = School.objects.create(name="Autre École", subdomain="autre")
+        metrics.monthly_revenue(other, 2026)
+        _pay(school, student_user, fee_structure, "8000.00", datetime.date(2026, 3, 2))
+
+        # Only the paying school was invalidated
+        assert _queries(metrics.monthly_revenue, other, 2026)[1] == 0
+        assert metrics.monthly_revenue(school, 2026)[2]["revenue"] == Decimal("8000.00")
+
+    def test_endpoint(self, admin_client, school, student_user, fee_structure):
+        from apps.schools.models import SchoolSubscription
+
+        SchoolSubscription.objects.create(
+            school=school, plan_name="Full", is_active=True, module_finance=True
+        )
+        _pay(school, student_user, fee_structure, "8000.00", datetime.date(2026, 3, 2))
+
+        url = "/api/v1/finance/reports/revenue-monthly/"
+        resp = admin_client.get(url, {"year": 2026})
+        assert resp.status_code == 200
+        assert resp.data["year"] == 2026
+        assert resp.data["results"][2] == {"month": 3, "revenue": Decimal("8000.00"), "count": 1}
+        assert admin_client.get(url, {"year": "abc"}).status_code == 400
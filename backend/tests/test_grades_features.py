@@ -49,6 +49,7 @@ from apps.grades.services import (
     confirm_csv_import,
     calculate_subject_average,
     calculate_trimester_average,
+    recalculate_classroom_trimester,
 )
 from apps.schools.models import School, Section, AcademicYear
 
@@ -638,6 +639,23 @@ class TestStudentAveragesAPI(APITestCase, GradeTestSetup):
         )
         self.assertEqual(math_avg["effective_average"], "14.80")
 
+    def test_18b_student_averages_etag(self):
+        """The averages response carries an ETag; a matching If-None-Match → 304."""
+        self.client.force_authenticate(user=self.admin_user)
+        url = f"/api/v1/grades/students/{self.student1.pk}/averages/"
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # The cascade recomputes the trimester average → new document and ETag
+        with self.captureOnCommitCallbacks(execute=True):
+            recalculate_classroom_trimester(self.classroom, self.academic_year, 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
     def test_19_student_averages_permission(self):
         """Student can only see their own averages."""
         self.client.force_authenticate(user=self.student_user)
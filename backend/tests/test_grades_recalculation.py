@@ -0,0 +1,652 @@
+"""
+Tests for the set-based classroom recalculation engine
+(grades.services.recalculate_classroom_trimester).
+
+Covers:
+  - parity with the per-student calculate_* functions
+  - locked SubjectAverage / TrimesterAverage rows are left untouched
+  - manual overrides are preserved and drive the appreciation
+  - annual averages once all 3 trimesters exist
+  - query count does not grow with the class size
+  - grade saves are coalesced into one flush per classroom/trimester
+  - window-function rankings match the legacy Python ranking
+  - coefficient / ExamType lookup caches and their invalidation
+  - bulk grade upsert: roster check, one upsert, one audit batch, one flush
+  - student averages snapshots: cached reads, rebuild and invalidation
+"""
+
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.accounts.models import User
+from apps.academics.models import Class, Level, LevelSubject, StudentProfile, Stream
+from apps.academics.models import Subject as AcademicSubject
+from apps.grades.caching import (
+    coefficient_map,
+    exam_type_map,
+    invalidate_coefficient_map,
+    invalidate_exam_type_map,
+)
+from apps.grades.models import (
+    AnnualAverage,
+    ExamType,
+    Grade,
+    GradeAuditLog,
+    SubjectAverage,
+    TrimesterAverage,
+)
+from apps.grades.services import (
+    admin_override_average,
+    bulk_upsert_grades,
+    calculate_annual_rankings,
+    calculate_rankings,
+    calculate_subject_average,
+    calculate_trimester_average,
+    lock_trimester,
+    recalculate_classroom_trimester,
+)
+from apps.grades.snapshots import student_averages_snapshot
+from apps.schools.models import AcademicYear, School, Section
+
+
+class ClassroomRecalculationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(name="Recalc School", subdomain="recalc")
+        cls.section = Section.objects.create(
+            school=cls.school,
+            section_type=Section.SectionType.MIDDLE,
+            name="Moyen",
+        )
+        cls.academic_year = AcademicYear.objects.create(
+            school=cls.school,
+            section=cls.section,
+            name="2025-2026",
+            start_date=date(2025, 9, 1),
+            end_date=date(2026, 6, 30),
+        )
+        cls.level = Level.objects.create(
+            school=cls.school,
+            section=cls.section,
+            name="2ème Année Moyenne",
+            code="2AM",
+            order=2,
+            max_grade=20,
+            passing_grade=10,
+        )
+        cls.klass = Class.objects.create(
+            school=cls.school,
+            section=cls.section,
+            academic_year=cls.academic_year,
+            level=cls.level,
+            name="2AM-A",
+        )
+        cls.teacher = User.objects.create_user(
+            phone_number="0551000000",
+            password="pass1234",
+            first_name="Nadia",
+            last_name="Teacher",
+            role=User.Role.TEACHER,
+            school=cls.school,
+        )
+
+        cls.math = AcademicSubject.objects.create(
+            school=cls.school, name="Mathématiques", code="MATH"
+        )
+        cls.french = AcademicSubject.objects.create(
+            school=cls.school, name="Français", code="FR"
+        )
+        LevelSubject.objects.create(
+            school=cls.school,
+            level=cls.level,
+            subject=cls.math,
+            coefficient=Decimal("4"),
+        )
+        # No LevelSubject for French → coefficient defaults to 1
+
+        cls.math_exam = cls._exam(cls.math, "Examen", Decimal("60"), Decimal("20"))
+        cls.math_cc = cls._exam(cls.math, "Contrôle", Decimal("40"), Decimal("10"))
+        cls.french_exam = cls._exam(cls.french, "Composition", Decimal("100"), Decimal("20"))
+
+    @classmethod
+    def _exam(cls, subject, name, percentage, max_score, trimester=1):
+        return ExamType.objects.create(
+            subject=subject,
+            classroom=cls.klass,
+            academic_year=cls.academic_year,
+            trimester=trimester,
+            name=name,
+            percentage=percentage,
+            max_score=max_score,
+            created_by=cls.teacher,
+        )
+
+    def _student(self, n):
+        user = User.objects.create_user(
+            phone_number=f"0552{n:06d}",
+            password="pass1234",
+            first_name=f"Eleve{n}",
+            last_name="Test",
+            role=User.Role.STUDENT,
+            school=self.school,
+        )
+        profile, _ = StudentProfile.objects.get_or_create(user=user)
+        profile.current_class = self.klass
+        profile.save()
+        return profile
+
+    def _grade(self, student, exam_type, score, is_absent=False):
+        return Grade.objects.create(
+            student=student,
+            exam_type=exam_type,
+            score=score,
+            is_absent=is_absent,
+            entered_by=self.teacher,
+        )
+
+
+class TestBulkRecalculation(ClassroomRecalculationTestCase):
+    def test_matches_per_student_functions(self):
+        s1, s2, s3 = self._student(1), self._student(2), self._student(3)
+        self._grade(s1, self.math_exam, Decimal("13.5"))
+        self._grade(s1, self.math_cc, Decimal("7"))
+        self._grade(s1, self.french_exam, Decimal("11"))
+        # s2: absent on the exam, no contrôle → percentage redistributed
+        self._grade(s2, self.math_exam, None, is_absent=True)
+        self._grade(s2, self.french_exam, Decimal("17.25"))
+        # s3: only the contrôle
+        self._grade(s3, self.math_cc, Decimal("9"))
+
+        expected = {}
+        for s in (s1, s2, s3):
+            for subj in (self.math, self.french):
+                expected[(s.pk, subj.pk)] = calculate_subject_average(
+                    s, subj, self.klass, self.academic_year, 1, save=False
+                )
+
+        summary = recalculate_classroom_trimester(
+            self.klass.pk, self.academic_year.pk, 1
+        )
+
+        self.assertEqual(summary["students"], 3)
+        self.assertEqual(summary["subject_averages"], 5)
+        self.assertEqual(summary["trimester_averages"], 3)
+        self.assertEqual(summary["locked_skipped"], 0)
+
+        for (student_id, subject_id), value in expected.items():
+            row = SubjectAverage.objects.filter(
+                student_id=student_id, subject_id=subject_id, trimester=1
+            ).first()
+            self.assertEqual(row.calculated_average if row else None, value)
+
+        for s in (s1, s2, s3):
+            ta = TrimesterAverage.objects.get(student=s, trimester=1)
+            self.assertEqual(
+                ta.calculated_average,
+                calculate_trimester_average(
+                    s, self.klass, self.academic_year, 1, save=False
+                ),
+            )
+            self.assertNotEqual(ta.appreciation, "")
+            self.assertIsNotNone(ta.rank_in_class)
+
+    def test_locked_rows_are_skipped(self):
+        s1 = self._student(1)
+        self._grade(s1, self.math_exam, Decimal("15"))
+        self._grade(s1, self.french_exam, Decimal("12"))
+        SubjectAverage.objects.create(
+            student=s1,
+            subject=self.math,
+            classroom=self.klass,
+            academic_year=self.academic_year,
+            trimester=1,
+            calculated_average=Decimal("5.00"),
+            is_locked=True,
+        )
+
+        summary = recalculate_classroom_trimester(self.klass, self.academic_year, 1)
+
+        self.assertEqual(summary["locked_skipped"], 1)
+        math_avg = SubjectAverage.objects.get(student=s1, subject=self.math)
+        self.assertEqual(math_avg.calculated_average, Decimal("5.00"))
+        # Trimester average still uses the locked subject average:
+        # (5×4 + 12×1) / 5 = 6.40
+        ta = TrimesterAverage.objects.get(student=s1, trimester=1)
+        self.assertEqual(ta.calculated_average, Decimal("6.40"))
+
+        TrimesterAverage.objects.filter(pk=ta.pk).update(is_locked=True)
+        self._grade(s1, self.math_cc, Decimal("10"))
+        summary = recalculate_classroom_trimester(self.klass, self.academic_year, 1)
+        self.assertEqual(summary["locked_skipped"], 2)
+        ta.refresh_from_db()
+        self.assertEqual(ta.calculated_average, Decimal("6.40"))
+
+    def test_manual_override_preserved(self):
+        s1 = self._student(1)
+        self._grade(s1, self.math_exam, Decimal("8"))
+        TrimesterAverage.objects.create(
+            student=s1,
+            classroom=self.klass,
+            academic_year=self.academic_year,
+            trimester=1,
+            manual_override=Decimal("17.00"),
+        )
+
+        recalculate_classroom_trimester(self.klass, self.academic_year, 1)
+
+        ta = TrimesterAverage.objects.get(student=s1, trimester=1)
+        self.assertEqual(ta.calculated_average, Decimal("8.00"))
+        self.assertEqual(ta.manual_override, Decimal("17.00"))
+        self.assertEqual(ta.appreciation, "Excellent")
+
+    def test_annual_average_when_three_trimesters(self):
+        s1 = self._student(1)
+        self._grade(s1, self.french_exam, Decimal("12"))
+        for trimester, avg in ((2, Decimal("14")), (3, Decimal("16"))):
+            TrimesterAverage.objects.create(
+                student=s1,
+                classroom=self.klass,
+                academic_year=self.academic_year,
+                trimester=trimester,
+                calculated_average=avg,
+            )
+
+        summary = recalculate_classroom_trimester(self.klass, self.academic_year, 1)
+
+        self.assertEqual(summary["annual_averages"], 1)
+        aa = AnnualAverage.objects.get(student=s1)
+        self.assertEqual(aa.calculated_average, Decimal("14.00"))
+        self.assertEqual(aa.rank_in_class, 1)
+
+    def test_query_count_independent_of_class_size(self):
+        def run():
+            with CaptureQueriesContext(connection) as ctx:
+                recalculate_classroom_trimester(self.klass, self.academic_year, 1)
+            return len(ctx.captured_queries)
+
+        for n in range(3):
+            s = self._student(n)
+            self._grade(s, self.math_exam, Decimal("10") + n)
+            self._grade(s, self.french_exam, Decimal("12"))
+        # Warm the lookup caches so both runs hit them
+        coefficient_map(self.klass)
+        exam_type_map(self.klass.pk, self.academic_year.pk, 1)
+        small = run()
+
+        for n in range(3, 15):
+            s = self._student(n)
+            self._grade(s, self.math_exam, Decimal("10") + n % 5)
+            self._grade(s, self.math_cc, Decimal("6"))
+            self._grade(s, self.french_exam, Decimal("9"))
+        large = run()
+
+        self.assertEqual(small, large)
+
+
+class TestCascadeCoalescing(ClassroomRecalculationTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        from apps.grades.tasks import _cascade_pending_key
+
+        self.pending_key = _cascade_pending_key(
+            self.klass.pk, self.academic_year.pk, 1
+        )
+        cache.delete(self.pending_key)
+        self.addCleanup(cache.delete, self.pending_key)
+
+    def test_many_grade_saves_enqueue_one_flush(self):
+        students = [self._student(n) for n in range(10)]
+
+        with patch(
+            "apps.grades.tasks.flush_classroom_cascade.apply_async"
+        ) as mock_flush:
+            with self.captureOnCommitCallbacks(execute=True):
+                for s in students:
+                    self._grade(s, self.math_exam, Decimal("12"))
+                    self._grade(s, self.french_exam, Decimal("14"))
+
+        self.assertEqual(mock_flush.call_count, 1)
+        self.assertEqual(
+            mock_flush.call_args.kwargs["args"],
+            [str(self.klass.pk), str(self.academic_year.pk), 1],
+        )
+
+    def test_dispatch_failure_releases_marker(self):
+        from apps.grades.tasks import schedule_classroom_cascade
+
+        args = (str(self.klass.pk), str(self.academic_year.pk), 1)
+        with patch(
+            "apps.grades.tasks.flush_classroom_cascade.apply_async",
+            side_effect=ConnectionError,
+        ):
+            with self.assertRaises(ConnectionError):
+                schedule_classroom_cascade(*args)
+
+        with patch(
+            "apps.grades.tasks.flush_classroom_cascade.apply_async"
+        ) as mock_flush:
+            self.assertTrue(schedule_classroom_cascade(*args))
+        self.assertEqual(mock_flush.call_count, 1)
+
+    def test_flush_clears_marker_and_recomputes(self):
+        from django.core.cache import cache
+
+        from apps.grades.tasks import flush_classroom_cascade
+
+        s1 = self._student(1)
+        self._grade(s1, self.french_exam, Decimal("15"))
+        cache.set(self.pending_key, True)
+
+        result = flush_classroom_cascade.run(
+            str(self.klass.pk), str(self.academic_year.pk), 1
+        )
+
+        self.assertIsNone(cache.get(self.pending_key))
+        self.assertEqual(result["trimester_averages"], 1)
+        ta = TrimesterAverage.objects.get(student=s1, trimester=1)
+        self.assertEqual(ta.calculated_average, Decimal("15.00"))
+        self.assertEqual(ta.rank_in_class, 1)
+
+
+class TestWindowRankings(ClassroomRecalculationTestCase):
+    RANK_FIELDS = ("rank_in_class", "rank_in_stream", "rank_in_level", "rank_in_section")
+
+    def setUp(self):
+        # Second class in the same level (with a filière) + another level
+        self.stream = Stream.objects.create(
+            school=self.school, level=self.level, name="Sciences", code="SCI"
+        )
+        self.klass_b = Class.objects.create(
+            school=self.school,
+            section=self.section,
+            academic_year=self.academic_year,
+            level=self.level,
+            stream=self.stream,
+            name="2AM-B",
+        )
+        level_3 = Level.objects.create(
+            school=self.school,
+            section=self.section,
+            name="3ème Année Moyenne",
+            code="3AM",
+            order=3,
+        )
+        self.klass_c = Class.objects.create(
+            school=self.school,
+            section=self.section,
+            academic_year=self.academic_year,
+            level=level_3,
+            name="3AM-A",
+        )
+        averages = [
+            (self.klass, "12.00", None),
+            (self.klass, "12.00", None),  # tie
+            (self.klass, "9.50", "15.00"),  # override wins
+            (self.klass, None, None),  # no average → no rank
+            (self.klass_b, "14.25", None),
+            (self.klass_b, "11.00", None),
+            (self.klass_c, "16.00", None),
+            (self.klass_c, "12.00", None),
+        ]
+        for n, (klass, calc, override) in enumerate(averages):
+            student = self._student(n)
+            for model, extra in (
+                (TrimesterAverage, {"trimester": 1}),
+                (AnnualAverage, {}),
+            ):
+                model.objects.create(
+                    student=student,
+                    classroom=klass,
+                    academic_year=self.academic_year,
+                    calculated_average=Decimal(calc) if calc else None,
+                    manual_override=Decimal(override) if override else None,
+                    **extra,
+                )
+
+    def _ranks(self, model, fields):
+        return {
+            row[0]: row[1:]
+            for row in model.objects.values_list("student_id", *fields)
+        }
+
+    def _reset(self):
+        TrimesterAverage.objects.update(**{f: None for f in self.RANK_FIELDS})
+        AnnualAverage.objects.update(rank_in_class=None, rank_in_level=None)
+
+    def test_window_matches_python(self):
+        for klass in (self.klass, self.klass_b, self.klass_c):
+            calculate_rankings(klass, self.academic_year, 1, method="python")
+        expected = self._ranks(TrimesterAverage, self.RANK_FIELDS)
+
+        # One window pass re-ranks every class/level of the section
+        self._reset()
+        calculate_rankings(self.klass, self.academic_year, 1)
+        self.assertEqual(self._ranks(TrimesterAverage, self.RANK_FIELDS), expected)
+
+        # 2AM-A: override 15 > 12 = 12 → 1, 2, 2; missing average → None
+        self.assertEqual(
+            sorted(
+                TrimesterAverage.objects.filter(classroom=self.klass).values_list(
+                    "rank_in_class", flat=True
+                ),
+                key=lambda r: (r is None, r),
+            ),
+            [1, 2, 2, None],
+        )
+        # Classes without a filière never get a rank_in_stream
+        self.assertFalse(
+            TrimesterAverage.objects.filter(
+                classroom=self.klass, rank_in_stream__isnull=False
+            ).exists()
+        )
+
+    def test_annual_window_matches_python(self):
+        fields = ("rank_in_class", "rank_in_level")
+        for klass in (self.klass, self.klass_b, self.klass_c):
+            calculate_annual_rankings(klass, self.academic_year, method="python")
+        expected = self._ranks(AnnualAverage, fields)
+
+        self._reset()
+        calculate_annual_rankings(self.klass, self.academic_year)
+        calculate_annual_rankings(self.klass_c, self.academic_year)
+        self.assertEqual(self._ranks(AnnualAverage, fields), expected)
+
+    def test_only_changed_rows_are_written(self):
+        calculate_rankings(self.klass, self.academic_year, 1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            calculate_rankings(self.klass, self.academic_year, 1)
+        self.assertFalse(
+            any(q["sql"].startswith("UPDATE") for q in ctx.captured_queries)
+        )
+
+        TrimesterAverage.objects.filter(
+            classroom=self.klass_c, calculated_average=Decimal("12.00")
+        ).update(calculated_average=Decimal("17.00"))
+        with CaptureQueriesContext(connection) as ctx:
+            calculate_rankings(self.klass, self.academic_year, 1)
+        updates = [q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+
+
+class TestLookupCaches(ClassroomRecalculationTestCase):
+    def setUp(self):
+        invalidate_coefficient_map(LevelSubject(school=self.school, level=self.level))
+        invalidate_exam_type_map(self.math_exam)
+
+    def test_coefficient_map_is_cached(self):
+        self.assertEqual(coefficient_map(self.klass), {self.math.pk: Decimal("4.00")})
+        with self.assertNumQueries(0):
+            coefficient_map(self.klass)
+
+    def test_level_subject_save_invalidates(self):
+        coefficient_map(self.klass)
+        LevelSubject.objects.create(
+            school=self.school,
+            level=self.level,
+            subject=self.french,
+            coefficient=Decimal("3"),
+        )
+        self.assertEqual(coefficient_map(self.klass)[self.french.pk], Decimal("3"))
+
+        LevelSubject.objects.filter(subject=self.math).get().delete()
+        self.assertNotIn(self.math.pk, coefficient_map(self.klass))
+
+    def test_stream_row_wins_over_fallback(self):
+        stream = Stream.objects.create(
+            school=self.school, level=self.level, name="Sciences", code="SCI"
+        )
+        klass_b = Class.objects.create(
+            school=self.school,
+            section=self.section,
+            academic_year=self.academic_year,
+            level=self.level,
+            stream=stream,
+            name="2AM-B",
+        )
+        self.assertEqual(coefficient_map(klass_b)[self.math.pk], Decimal("4.00"))
+
+        LevelSubject.objects.create(
+            school=self.school,
+            level=self.level,
+            stream=stream,
+            subject=self.math,
+            coefficient=Decimal("7"),
+        )
+        self.assertEqual(coefficient_map(klass_b)[self.math.pk], Decimal("7"))
+        self.assertEqual(coefficient_map(self.klass)[self.math.pk], Decimal("4.00"))
+
+    def test_exam_type_map_invalidated_on_change(self):
+        ids = {et["id"] for et in exam_type_map(self.klass.pk, self.academic_year.pk, 1)}
+        self.assertEqual(ids, {self.math_exam.pk, self.math_cc.pk, self.french_exam.pk})
+
+        self.math_cc.trimester = 2
+        self.math_cc.save()
+        ids = {et["id"] for et in exam_type_map(self.klass.pk, self.academic_year.pk, 1)}
+        self.assertNotIn(self.math_cc.pk, ids)
+        ids = {et["id"] for et in exam_type_map(self.klass.pk, self.academic_year.pk, 2)}
+        self.assertEqual(ids, {self.math_cc.pk})
+
+
+class TestBulkGradeUpsert(ClassroomRecalculationTestCase):
+    setUp = TestCascadeCoalescing.setUp
+
+    def test_roster_and_max_score_errors(self):
+        s1, s2 = self._student(1), self._student(2)
+        outsider = self._student(3)
+        outsider.current_class = None
+        outsider.save()
+
+        result = bulk_upsert_grades(
+            self.math_cc,
+            [
+                {"student_id": s1.pk, "score": Decimal("8")},
+                {"student_id": outsider.pk, "score": Decimal("5")},
+                {"student_id": s2.pk, "score": Decimal("11")},
+            ],
+            self.teacher,
+        )
+
+        self.assertEqual(result["saved"], 1)
+        self.assertEqual(
+            [(e["index"], e["student_id"]) for e in result["errors"]],
+            [(1, str(outsider.pk)), (2, str(s2.pk))],
+        )
+        self.assertEqual(Grade.objects.get().student, s1)
+
+    def test_upsert_updates_existing_and_audits_once(self):
+        students = [self._student(n) for n in range(6)]
+        existing = self._grade(students[0], self.math_exam, Decimal("9"))
+        items = [
+            {"student_id": s.pk, "score": Decimal("14"), "is_absent": False}
+            for s in students
+        ]
+
+        with patch(
+            "apps.grades.tasks.flush_classroom_cascade.apply_async"
+        ) as mock_flush:
+            with self.captureOnCommitCallbacks(execute=True):
+                with CaptureQueriesContext(connection) as ctx:
+                    result = bulk_upsert_grades(
+                        self.math_exam.pk,
+                        items,
+                        self.teacher,
+                        status=Grade.Status.DRAFT,
+                    )
+
+        self.assertEqual(result, {"saved": 6, "errors": []})
+        upserts = [
+            q for q in ctx.captured_queries
+            if q["sql"].startswith(f'INSERT INTO "{Grade._meta.db_table}"')
+        ]
+        self.assertEqual(len(upserts), 1)
+        self.assertEqual(mock_flush.call_count, 1)
+
+        existing.refresh_from_db()
+        self.assertEqual(existing.score, Decimal("14.00"))
+        self.assertEqual(Grade.objects.filter(score=Decimal("14")).count(), 6)
+
+        logs = GradeAuditLog.objects.filter(action="GRADE_ENTERED")
+        self.assertEqual(logs.count(), 6)
+        log = logs.get(student=students[0])
+        self.assertEqual(log.object_id, existing.pk)
+        self.assertEqual(log.old_value, Decimal("9.00"))
+
+
+class TestAveragesSnapshot(ClassroomRecalculationTestCase):
+    def setUp(self):
+        self.s1, self.s2 = self._student(1), self._student(2)
+        self._grade(self.s1, self.french_exam, Decimal("15"))
+        self._grade(self.s2, self.french_exam, Decimal("11"))
+        with self.captureOnCommitCallbacks(execute=True):
+            recalculate_classroom_trimester(self.klass, self.academic_year, 1)
+
+    def _trimester_average(self, student):
+        snapshot = student_averages_snapshot(student.pk)
+        return snapshot["data"]["trimester_averages"][0]
+
+    def test_cascade_rebuilds_snapshots(self):
+        with self.assertNumQueries(0):
+            first = student_averages_snapshot(self.s1.pk)
+        self.assertEqual(first["data"]["trimester_averages"][0]["rank_in_class"], 1)
+
+        self._grade(self.s2, self.math_exam, Decimal("20"))
+        with self.captureOnCommitCallbacks(execute=True):
+            recalculate_classroom_trimester(self.klass, self.academic_year, 1)
+
+        with self.assertNumQueries(0):
+            second = student_averages_snapshot(self.s1.pk)
+        self.assertNotEqual(second["etag"], first["etag"])
+        self.assertEqual(second["data"]["trimester_averages"][0]["rank_in_class"], 2)
+
+    def test_year_variant_cached_separately(self):
+        data = student_averages_snapshot(self.s1.pk, self.academic_year.pk)["data"]
+        self.assertEqual(data["subject_averages"][0]["effective_average"], "15.00")
+        with self.assertNumQueries(0):
+            student_averages_snapshot(self.s1.pk, self.academic_year.pk)
+
+    def test_override_and_lock_invalidate(self):
+        self.assertEqual(self._trimester_average(self.s2)["effective_average"], "11.00")
+
+        admin = User.objects.create_user(
+            phone_number="0551999999",
+            password="pass1234",
+            first_name="Samir",
+            last_name="Directeur",
+            role=User.Role.ADMIN,
+            school=self.school,
+        )
+        ta = TrimesterAverage.objects.get(student=self.s2, trimester=1)
+        admin_override_average("trimester_average", ta.pk, Decimal("18"), admin)
+        self.assertEqual(self._trimester_average(self.s2)["effective_average"], "18.00")
+        # The override changed the ranking of the other student as well
+        self.assertEqual(self._trimester_average(self.s1)["rank_in_class"], 2)
+
+        lock_trimester(self.klass, self.academic_year, 1, admin)
+        self.assertTrue(self._trimester_average(self.s1)["is_locked"])
@@ -0,0 +1,102 @@
+"""
+Tests for core.name_matching (roster name index of the grade CSV
+import):
+
+  - normalisation of accents, case, punctuation and Arabic letter variants
+  - transliteration variants and word order give the same key
+  - fuzzy lookups only score a trigram shortlist, not the whole roster
+"""
+
+import time
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from core.name_matching import NameIndex, name_key, normalize_name
+
+FIRST_NAMES = [
+    "Ahmed", "Yacine", "Amine", "Karim", "Sofiane", "Walid", "Nassim",
+    "Fatima", "Aïcha", "Meriem", "Sarah", "Imane", "Lina", "Ouahiba",
+]
+LAST_NAMES = [
+    "Benali", "Bouzid", "Haddad", "Mansouri", "Belkacem", "Djebbar",
+    "Zerrouki", "Khelifi", "Saadi", "Hamidi", "Boukhari", "Cherif",
+]
+
+
+def _roster(size):
+    for n in range(size):
+        last = f"{LAST_NAMES[n % len(LAST_NAMES)]}{n // 100}"
+        first = FIRST_NAMES[(n // len(LAST_NAMES)) % len(FIRST_NAMES)]
+        yield last, first, n
+
+
+class TestNormalisation(SimpleTestCase):
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("  BEN-ALI  Aïcha "), "ben ali aicha")
+        self.assertEqual(normalize_name("فاطِمة"), normalize_name("فاطمه"))
+
+    def test_name_key_folds_variants(self):
+        pairs = [
+            (("Benali", "Ahmed"), ("ahmed", "Ben Ali")),
+            (("Hamidi", "Ouahiba"), ("Hamidi", "Wahiba")),
+            (("Saadi", "Abdelkader"), ("Saâdi", "Abd El Kader")),
+            (("Djebbar", "Yacine"), ("Djebar", "Yassine")),
+        ]
+        for left, right in pairs:
+            self.assertEqual(name_key(*left), name_key(*right), (left, right))
+        self.assertNotEqual(name_key("Benali", "Ahmed"), name_key("Benali", "Amine"))
+
+
+class TestNameIndex(SimpleTestCase):
+    def setUp(self):
+        self.index = NameIndex(_roster(2000))
+
+    def test_exact_and_fuzzy_lookup(self):
+        self.assertEqual(self.index.best_match("BENALI0", "ahmed"), (0, 1.0))
+
+        obj, ratio = self.index.best_match("Benalli0", "Ahmd")
+        self.assertEqual(obj, 0)
+        self.assertGreaterEqual(ratio, 0.8)
+
+        _, ratio = self.index.best_match("Inconnu", "Personne")
+        self.assertLess(ratio, 0.8)
+
+    def test_homonyms_are_all_returned(self):
+        self.index.add("Benali0", "Ahmed", "homonym")
+        self.assertEqual(self.index.exact("benali0", "AHMED"), [0, "homonym"])
+        self.assertEqual(self.index.best_match("Benali0", "Ahmed"), (None, 1.0))
+
+    def test_folded_key_is_not_an_exact_match(self):
+        index = NameIndex([("Karim", "Amine", "A"), ("Karim", "Amin", "B")])
+        self.assertEqual(index.best_match("Karim", "Amin"), ("B", 1.0))
+        self.assertEqual(index.best_match("KARIM", "Amine"), ("A", 1.0))
+        # Another spelling folds to both students: ambiguous
+        objs, _ = index.matches("Karim", "Aminne")
+        self.assertEqual(objs, ["A", "B"])
+        self.assertEqual(index.best_match("Karim", "Aminne")[0], None)
+
+    def test_swapped_names_are_fuzzy(self):
+        index = NameIndex([("Said", "Mohamed", "A"), ("Mohamed", "Said", "B")])
+        self.assertEqual(index.best_match("Mohamed", "Said"), ("B", 1.0))
+
+        index = NameIndex([("Said", "Mohamed", "A")])
+        obj, ratio = index.best_match("Mohamed", "Said")
+        self.assertEqual(obj, "A")
+        self.assertTrue(0.8 <= ratio < 1.0)
+
+    def test_fuzzy_scores_only_the_shortlist(self):
+        with patch("core.name_matching.SequenceMatcher.ratio", return_value=0.5) as ratio:
+            self.index.best_match("Zerroukki3", "Sofian")
+        self.assertLessEqual(ratio.call_count, self.index.shortlist)
+
+    def test_preview_sized_file_is_fast(self):
+        rows = [(f"{last}x", first) for last, first, _ in list(_roster(2000))[::45]]
+
+        start = time.perf_counter()
+        index = NameIndex(_roster(2000))
+        for last, first in rows:
+            index.best_match(last, first)
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.5)
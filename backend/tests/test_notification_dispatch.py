@@ -0,0 +1,228 @@
+"""
+Tests for the notification dispatcher (apps.notifications.dispatch):
+
+  - a batch costs a fixed number of queries whatever its size
+  - preferences: INFO is in-app only, muted categories and silent mode
+    skip the push, URGENT also sends an SMS and ignores silent mode
+  - identical payloads share multicast calls of at most 500 tokens,
+    tokens reported unregistered by FCM are deleted
+  - every recipient gets a WebSocket event
+"""
+from datetime import time
+from unittest.mock import patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.notifications.dispatch import NotificationIntent, dispatch, send_pushes
+from apps.notifications.models import DeviceToken, Notification, NotificationPreference
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+@pytest.fixture(autouse=True)
+def in_memory_layer(settings):
+    settings.CHANNEL_LAYERS = IN_MEMORY_LAYER
+
+
+@pytest.fixture
+def tokens(admin_user, teacher_user, parent_user):
+    for user, token in ((admin_user, "a"), (teacher_user, "t"), (parent_user, "p")):
+        DeviceToken.objects.create(user=user, token=token, platform="ANDROID")
+
+
+def _intent(user, **kwargs):
+    kwargs.setdefault("title", "Note publiée")
+    kwargs.setdefault("body", "Mathématiques : 15/20")
+    return NotificationIntent(user_id=user.pk, school_id=user.school_id, **kwargs)
+
+
+def _push_response(tokens, unregistered=()):
+    return {
+        "success_count": len(tokens) - len(unregistered),
+        "failure_count": len(unregistered),
+        "unregistered_tokens": list(unregistered),
+    }
+
+
+@pytest.mark.django_db
+class TestBatch:
+    def test_fixed_query_count(self, school, admin_user, teacher_user, parent_user, tokens):
+        users = [admin_user, teacher_user, parent_user]
+
+        def run(intents):
+            with patch(
+                "core.firebase.send_push_to_multiple",
+                side_effect=lambda chunk, *a: _push_response(chunk),
+            ) as push, CaptureQueriesContext(connection) as ctx:
+                result = dispatch(intents)
+            return result, len(ctx.captured_queries), push.call_count
+
+        small, small_queries, _ = run([_intent(admin_user, notification_type="GRADE")])
+        large, large_queries, calls = run(
+            [_intent(user, notification_type="GRADE") for user in users * 4]
+        )
+        assert small_queries == large_queries
+        assert large["notifications"] == 12
+        assert large["websocket"] == 12
+        # One payload: one multicast call, each device notified once
+        assert calls == 1
+        assert large["push_tokens"] == 3
+        assert Notification.objects.filter(push_sent=True).count() == 13
+
+    def test_empty_batch(self):
+        assert dispatch([]) == {
+            "notifications": 0,
+            "push_tokens": 0,
+            "pruned_tokens": 0,
+            "sms": 0,
+            "websocket": 0,
+        }
+
+
+@pytest.mark.django_db
+class TestPreferences:
+    def _dispatch(self, intents):
+        with patch(
+            "core.firebase.send_push_to_multiple",
+            side_effect=lambda chunk, *a: _push_response(chunk),
+        ) as push, patch("apps.sms.tasks.send_sms_task.delay") as sms:
+            result = dispatch(intents)
+        pushed = sorted(token for c in push.call_args_list for token in c.args[0])
+        return result, pushed, sms
+
+    def test_info_is_in_app_only(self, parent_user, tokens):
+        result, pushed, _ = self._dispatch([_intent(parent_user, priority="INFO")])
+        assert result["notifications"] == 1
+        assert pushed == []
+
+    def test_muted_category(self, admin_user, parent_user, tokens):
+        NotificationPreference.objects.create(user=parent_user, push_academic=False)
+        result, pushed, _ = self._dispatch(
+            [
+                _intent(parent_user, notification_type="GRADE"),
+                _intent(admin_user, notification_type="GRADE"),
+                _intent(parent_user, notification_type="ATTENDANCE"),
+            ]
+        )
+        assert pushed == ["a", "p"]
+        assert not Notification.objects.get(
+            user=parent_user, notification_type="GRADE"
+        ).push_sent
+
+    def test_silent_mode_and_urgent(self, parent_user, tokens):
+        NotificationPreference.objects.create(
+            user=parent_user,
+            silent_mode_enabled=True,
+            silent_start_time=time(0, 0),
+            silent_end_time=time(23, 59, 59),
+        )
+        _, pushed, sms = self._dispatch([_intent(parent_user, notification_type="ATTENDANCE")])
+        assert pushed == []
+        sms.assert_not_called()
+
+        result, pushed, sms = self._dispatch(
+            [
+                _intent(
+                    parent_user,
+                    notification_type="ATTENDANCE",
+                    priority="URGENT",
+                    sms_text="Absence de votre enfant",
+                )
+            ]
+        )
+        assert pushed == ["p"]
+        assert result["sms"] == 1
+        sms.assert_called_once()
+
+        from apps.sms.models import SMSMessage
+
+        message = SMSMessage.objects.get()
+        assert message.recipient_phone == parent_user.phone_number
+        assert message.content == "Absence de votre enfant"
+        assert Notification.objects.filter(priority="URGENT", sms_sent=True).count() == 1
+
+    def test_sms_follows_category_preference(self, parent_user, tokens):
+        # sms_academic is off by default
+        result, pushed, sms = self._dispatch(
+            [_intent(parent_user, notification_type="GRADE", priority="URGENT")]
+        )
+        assert pushed == ["p"]
+        assert result["sms"] == 0
+        sms.assert_not_called()
+
+
+@pytest.mark.django_db
+class TestPush:
+    def test_chunks_and_shared_payloads(self, parent_user, teacher_user):
+        DeviceToken.objects.bulk_create(
+            [
+                DeviceToken(user=parent_user, token=f"p{n}", platform="ANDROID")
+                for n in range(600)
+            ]
+            + [DeviceToken(user=teacher_user, token="t", platform="IOS")]
+        )
+        with patch(
+            "core.firebase.send_push_to_multiple",
+            side_effect=lambda chunk, *a: _push_response(chunk),
+        ) as push:
+            result = send_pushes(
+                [
+                    (parent_user.pk, "Alerte", "Bus en retard", {}),
+                    (teacher_user.pk, "Alerte", "Bus en retard", {}),
+                    (teacher_user.pk, "Rappel", "Conseil de classe", {"id": "1"}),
+                ]
+            )
+        assert result["tokens"] == 602
+        assert result["users"] == {str(parent_user.pk), str(teacher_user.pk)}
+        assert sorted(len(c.args[0]) for c in push.call_args_list) == [1, 101, 500]
+
+    def test_unregistered_tokens_are_pruned(self, admin_user, parent_user, tokens):
+        DeviceToken.objects.create(user=parent_user, token="p-old", platform="ANDROID")
+        with patch(
+            "core.firebase.send_push_to_multiple",
+            side_effect=lambda chunk, *a: _push_response(
+                chunk, [t for t in chunk if t in ("p-old", "a")]
+            ),
+        ):
+            result = dispatch(
+                [_intent(admin_user), _intent(parent_user)], websocket=False
+            )
+        assert result["pruned_tokens"] == 2
+        assert sorted(DeviceToken.objects.values_list("token", flat=True)) == ["p", "t"]
+        # The admin's only device is gone: the push did not reach them
+        assert Notification.objects.filter(push_sent=True).get().user == parent_user
+
+
+@pytest.mark.django_db
+class TestWebSocket:
+    def test_events_reach_each_recipient(self, admin_user, parent_user):
+        layer = get_channel_layer()
+        channels = {}
+        for user in (admin_user, parent_user):
+            channels[user.pk] = async_to_sync(layer.new_channel)()
+            async_to_sync(layer.group_add)(f"notifications_{user.pk}", channels[user.pk])
+
+        result = dispatch(
+            [
+                _intent(admin_user, priority="INFO"),
+                _intent(
+                    parent_user,
+                    priority="INFO",
+                    ws_event={"type": "absence_notification", "message": "Absence"},
+                ),
+            ]
+        )
+        assert result["websocket"] == 2
+
+        event = async_to_sync(layer.receive)(channels[admin_user.pk])
+        assert event["type"] == "notification"
+        assert event["title"] == "Note publiée"
+        assert event["id"] == str(Notification.objects.get(user=admin_user).pk)
+        assert async_to_sync(layer.receive)(channels[parent_user.pk]) == {
+            "type": "absence_notification",
+            "message": "Absence",
+        }
@@ -0,0 +1,175 @@
+"""
+Tests for the cached notification inbox (apps.notifications.inbox):
+
+  - the unread counter follows creations (single and bulk), mark-read
+    and mark-all-read, and is served from the cache
+  - ?since= delta sync answers "nothing new" without a query and pages
+    through the newer notifications
+  - archive_read_notifications moves only old read notifications
+"""
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.notifications.dispatch import NotificationIntent, dispatch
+from apps.notifications.models import Notification, NotificationArchive
+from apps.notifications.tasks import archive_read_notifications
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+LIST_URL = "/api/v1/notifications/"
+UNREAD_URL = "/api/v1/notifications/unread-count/"
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    settings.CACHES = LOCMEM_CACHE
+    settings.CHANNEL_LAYERS = IN_MEMORY_LAYER
+    cache.clear()
+
+
+@pytest.fixture
+def notify(parent_user, django_capture_on_commit_callbacks):
+    def create(title="Nouvelle note", **kwargs):
+        with django_capture_on_commit_callbacks(execute=True):
+            return Notification.objects.create(
+                user=parent_user,
+                school=parent_user.school,
+                title=title,
+                body="…",
+                notification_type="GRADE",
+                **kwargs,
+            )
+
+    return create
+
+
+def _unread(client, django_assert_num_queries, queries=0):
+    with django_assert_num_queries(queries):
+        return client.get(UNREAD_URL).data["unread_count"]
+
+
+@pytest.mark.django_db
+class TestUnreadCounter:
+    def test_follows_writes(
+        self,
+        parent_client,
+        parent_user,
+        notify,
+        django_assert_num_queries,
+        django_capture_on_commit_callbacks,
+    ):
+        first = notify()
+        # Cache miss: one COUNT, then served from the cache
+        assert _unread(parent_client, django_assert_num_queries, queries=1) == 1
+        notify()
+        notify(is_read=True)
+        assert _unread(parent_client, django_assert_num_queries) == 2
+
+        with django_capture_on_commit_callbacks(execute=True):
+            dispatch(
+                [
+                    NotificationIntent(
+                        user_id=parent_user.pk,
+                        school_id=parent_user.school_id,
+                        title="Absence",
+                        body="…",
+                        priority="INFO",
+                    )
+                ]
+                * 3
+            )
+        assert _unread(parent_client, django_assert_num_queries) == 5
+
+        with django_capture_on_commit_callbacks(execute=True):
+            assert parent_client.post(f"{LIST_URL}{first.pk}/read/").status_code == 200
+            # Already read: no second decrement
+            parent_client.post(f"{LIST_URL}{first.pk}/read/")
+        assert _unread(parent_client, django_assert_num_queries) == 4
+
+        with django_capture_on_commit_callbacks(execute=True):
+            parent_client.post(f"{LIST_URL}read-all/")
+        assert _unread(parent_client, django_assert_num_queries) == 0
+        assert not Notification.objects.filter(is_read=False).exists()
+
+    def test_other_users_notification_is_not_found(self, admin_client, notify):
+        notification = notify()
+        assert admin_client.post(f"{LIST_URL}{notification.pk}/read/").status_code == 404
+        assert not Notification.objects.get(pk=notification.pk).is_read
+
+
+@pytest.mark.django_db
+class TestDeltaSync:
+    def test_nothing_new_is_answered_from_cache(
+        self, parent_client, notify, django_assert_num_queries
+    ):
+        latest = notify()
+        cursor = latest.created_at.isoformat()
+        parent_client.get(UNREAD_URL)  # warm the counter
+
+        with django_assert_num_queries(0):
+            resp = parent_client.get(LIST_URL, {"since": cursor})
+        assert resp.status_code == 200
+        assert resp.data["results"] == []
+        assert resp.data["has_more"] is False
+        assert resp.data["unread_count"] == 1
+        assert resp.data["cursor"] == cursor
+
+    def test_pages_through_new_notifications(self, parent_client, notify):
+        cursor = notify("Ancienne").created_at.isoformat()
+        for n in range(3):
+            notify(f"Nouvelle {n}")
+
+        titles = []
+        params = {"since": cursor, "page_size": 2}
+        while True:
+            resp = parent_client.get(LIST_URL, params)
+            titles += [row["title"] for row in resp.data["results"]]
+            params["since"] = resp.data["cursor"]
+            if not resp.data["has_more"]:
+                break
+        assert titles == ["Nouvelle 0", "Nouvelle 1", "Nouvelle 2"]
+        assert parent_client.get(LIST_URL, params).data["results"] == []
+
+    def test_filters_and_invalid_cursor(self, parent_client, notify):
+        cursor = (timezone.now() - timedelta(minutes=1)).isoformat()
+        notify("Note", priority="IMPORTANT")
+        notify("Info")
+
+        resp = parent_client.get(LIST_URL, {"since": cursor, "priority": "important"})
+        assert [row["title"] for row in resp.data["results"]] == ["Note"]
+        assert parent_client.get(LIST_URL, {"since": "hier"}).status_code == 400
+
+    def test_list_without_cursor_is_unchanged(self, parent_client, notify):
+        notify("A")
+        notify("B")
+        resp = parent_client.get(LIST_URL)
+        assert [row["title"] for row in resp.data] == ["B", "A"]
+
+
+@pytest.mark.django_db
+class TestArchive:
+    def test_moves_old_read_notifications(self, notify, settings):
+        settings.NOTIFICATION_RETENTION_DAYS = 90
+        old = timezone.now() - timedelta(days=120)
+        old_read = [notify(f"Lue {n}", is_read=True) for n in range(3)]
+        old_unread = notify("Non lue")
+        recent_read = notify("Récente", is_read=True)
+        Notification.objects.filter(
+            pk__in=[n.pk for n in old_read] + [old_unread.pk]
+        ).update(created_at=old)
+
+        assert archive_read_notifications(batch_size=2)["archived"] == 3
+        assert set(Notification.objects.values_list("pk", flat=True)) == {
+            old_unread.pk,
+            recent_read.pk,
+        }
+        archived = NotificationArchive.objects.get(pk=old_read[0].pk)
+        assert archived.title == "Lue 0"
+        assert archived.created_at == old
+        assert archived.archived_at is not None
+
+        assert archive_read_notifications()["archived"] == 0
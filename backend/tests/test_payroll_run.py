@@ -0,0 +1,246 @@
+"""
+Tests for the batched payroll run (apps.finance.payroll_run):
+
+  - payslip amounts (overtime, unpaid leave, deductions, advances)
+  - references continue the period sequence
+  - a run is idempotent per (school, month, year)
+  - the number of queries does not grow with the staff
+  - background job: progress / result status, one run per period
+  - bulk-generate endpoints: inline 201, background 202 + status URL
+"""
+import datetime
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.finance.payroll_run import run_payroll
+
+
+def _teacher_config(school, n, base="60000.00", rate="1500.00"):
+    from apps.accounts.models import User
+    from apps.finance.models import SalaryConfig
+
+    teacher = User.objects.create_user(
+        phone_number=f"05700000{n:02d}",
+        password="Test@1234",
+        school=school,
+        role="TEACHER",
+        first_name=f"Prof{n}",
+        last_name="Test",
+    )
+    return SalaryConfig.objects.create(
+        school=school,
+        teacher=teacher,
+        base_salary=Decimal(base),
+        hourly_rate=Decimal(rate),
+        qualification="MASTER",
+        weekly_hours=18,
+    )
+
+
+@pytest.fixture
+def configs(school):
+    return [_teacher_config(school, 1), _teacher_config(school, 2, "44000.00", "1000.00")]
+
+
+@pytest.fixture
+def deductions(school):
+    from apps.finance.models import Deduction
+
+    Deduction.objects.create(
+        school=school, name="CNAS", deduction_type="PERCENTAGE", value=Decimal("9.00")
+    )
+    Deduction.objects.create(
+        school=school, name="IRG", deduction_type="FIXED", value=Decimal("3000.00")
+    )
+
+
+@pytest.mark.django_db
+class TestRunPayroll:
+    def test_amounts(self, school, configs, deductions):
+        from apps.finance.models import LeaveRecord, OvertimeRecord, SalaryAdvance
+
+        first, second = configs
+        OvertimeRecord.objects.create(
+            school=school, teacher=first.teacher, date=datetime.date(2024, 3, 5),
+            hours=Decimal("4"), approved=True,
+        )
+        OvertimeRecord.objects.create(
+            school=school, teacher=first.teacher, date=datetime.date(2024, 3, 6),
+            hours=Decimal("9"), approved=False,
+        )
+        LeaveRecord.objects.create(
+            school=school, teacher=second.teacher, leave_type="UNPAID", status="APPROVED",
+            start_date=datetime.date(2024, 3, 30), end_date=datetime.date(2024, 4, 3),
+        )
+        advance = SalaryAdvance.objects.create(
+            school=school, teacher=first.teacher, amount=Decimal("5000.00"),
+            deduction_months=2, status="APPROVED",
+        )
+        SalaryAdvance.objects.filter(pk=advance.pk).update(remaining=Decimal("5000.00"))
+
+        result = run_payroll(school, 3, 2024)
+        slips = {ps.teacher_id: ps for ps in result["payslips"]}
+        assert result["skipped"] == []
+
+        ps = slips[first.teacher_id]
+        assert ps.overtime_amount == Decimal("6000.00")
+        assert ps.gross_salary == Decimal("66000.00")
+        # CNAS 9 % + IRG + half of the advance
+        assert ps.total_deductions == Decimal("5940.00") + Decimal("3000.00") + Decimal("2500.00")
+        assert ps.deductions_detail[-1] == {"name": "Avance sur salaire", "amount": "2500.00"}
+        assert ps.net_salary == ps.gross_salary - ps.total_deductions
+
+        ps = slips[second.teacher_id]
+        # 30 and 31 March only
+        assert ps.leave_days_unpaid == 2
+        assert ps.leave_deduction == Decimal("4000.00")
+        assert ps.gross_salary == Decimal("40000.00")
+
+        advance.refresh_from_db()
+        assert advance.remaining == Decimal("2500.00")
+        assert advance.status == "APPROVED"
+
+    def test_references_continue_sequence(self, school, configs):
+        from apps.finance.models import PaySlip
+
+        PaySlip.objects.create(
+            school=school, teacher=configs[0].teacher, month=5, year=2024,
+            base_salary=1, gross_salary=1, net_salary=1,
+        )
+        result = run_payroll(school, 5, 2024)
+        assert [ps.reference for ps in result["payslips"]] == ["FDP-2024-05-00002"]
+        assert result["skipped"] == [configs[0].teacher.full_name]
+
+    def test_idempotent(self, school, configs):
+        from apps.finance.models import PaySlip
+
+        assert len(run_payroll(school, 6, 2024)["payslips"]) == 2
+        again = run_payroll(school, 6, 2024)
+        assert again["payslips"] == [] and len(again["skipped"]) == 2
+        assert PaySlip.objects.filter(month=6, year=2024).count() == 2
+
+    def test_queries_do_not_grow_with_staff(self, school, configs, deductions):
+        with CaptureQueriesContext(connection) as ctx:
+            run_payroll(school, 7, 2024)
+        few = len(ctx.captured_queries)
+
+        for n in range(3, 23):
+            _teacher_config(school, n)
+        with CaptureQueriesContext(connection) as ctx:
+            run_payroll(school, 8, 2024)
+        assert len(ctx.captured_queries) == few
+
+
+@pytest.mark.django_db
+class TestPayrollJob:
+    @pytest.fixture(autouse=True)
+    def locmem(self, settings):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+    def test_job_status(self, school, configs, admin_user):
+        from apps.finance import payroll_run
+        from apps.finance.tasks import run_payroll_job
+
+        updates = []
+        real_set = payroll_run.set_job_status
+
+        def record(task_id, **values):
+            updates.append(values)
+            return real_set(task_id, **values)
+
+        with patch.object(payroll_run, "set_job_status", side_effect=record):
+            run_payroll_job.apply(
+                kwargs={"school_id": str(school.pk), "month": 9, "year": 2024},
+                task_id="job-1",
+            )
+        assert {"done": 2, "total": 2} in updates
+        job = payroll_run.job_status("job-1")
+        assert job["status"] == "done"
+        assert job["created_count"] == 2
+
+    def test_one_run_per_period(self, school, admin_user):
+        from apps.finance import payroll_run
+
+        apply_async = MagicMock()
+        with patch("apps.finance.tasks.run_payroll_job.apply_async", apply_async):
+            task_id, started = payroll_run.start_payroll_job(school, 10, 2024, admin_user)
+            assert started
+            assert apply_async.call_args.kwargs["task_id"] == task_id
+            assert payroll_run.job_status(task_id)["status"] == "pending"
+            assert payroll_run.start_payroll_job(school, 10, 2024, admin_user) == (task_id, False)
+            payroll_run.set_job_status(task_id, status="done")
+            again, started = payroll_run.start_payroll_job(school, 10, 2024, admin_user)
+            assert started and again != task_id
+        assert apply_async.call_count == 2
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True, CELERY_TASK_EAGER_PROPAGATES=True)
+    def test_eager_job_then_new_run(self, school, configs, admin_user):
+        from apps.finance import payroll_run
+
+        first, started = payroll_run.start_payroll_job(school, 11, 2024, admin_user)
+        assert started
+        # The job finished inside apply_async(): not reset to pending
+        assert payroll_run.job_status(first)["status"] == "done"
+        assert payroll_run.job_status(first)["created_count"] == 2
+
+        second, started = payroll_run.start_payroll_job(school, 11, 2024, admin_user)
+        assert started and second != first
+        assert payroll_run.job_status(second)["status"] == "done"
+        assert payroll_run.job_status(second)["skipped_count"] == 2
+
+    def test_dispatch_failure_releases_period(self, school, admin_user):
+        from apps.finance import payroll_run
+
+        with patch(
+            "apps.finance.tasks.run_payroll_job.apply_async", side_effect=ConnectionError
+        ):
+            with pytest.raises(ConnectionError):
+                payroll_run.start_payroll_job(school, 12, 2024, admin_user)
+        with patch("apps.finance.tasks.run_payroll_job.apply_async"):
+            assert payroll_run.start_payroll_job(school, 12, 2024, admin_user)[1]
+
+
+@pytest.fixture
+def finance_module(school):
+    from apps.schools.models import SchoolSubscription
+
+    return SchoolSubscription.objects.create(
+        school=school, plan_name="Full", is_active=True, module_finance=True
+    )
+
+
+@pytest.mark.django_db
+class TestBulkGenerateEndpoints:
+    url = "/api/v1/finance/payslips/bulk-generate/"
+
+    @pytest.fixture(autouse=True)
+    def locmem(self, settings):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+    def test_inline_run(self, admin_client, finance_module, configs):
+        resp = admin_client.post(self.url, {"month": 3, "year": 2024}, format="json")
+        assert resp.status_code == 201
+        assert resp.data["created_count"] == 2
+
+    def test_background_job_and_status(self, admin_client, finance_module, configs):
+        with patch("apps.finance.tasks.run_payroll_job.apply_async") as apply_async:
+            resp = admin_client.post(
+                self.url, {"month": 4, "year": 2024, "async": "true"}, format="json"
+            )
+        assert resp.status_code == 202
+        assert resp.data["status"] == "started"
+        task_id = resp.data["task_id"]
+        assert apply_async.call_args.kwargs["task_id"] == task_id
+        assert resp.data["status_url"] == f"{self.url}{task_id}/"
+
+        resp = admin_client.get(f"{self.url}{task_id}/")
+        assert resp.status_code == 200
+        assert resp.data["status"] == "pending"
+        assert "school_id" not in resp.data
+
+        assert admin_client.get(f"{self.url}unknown/").status_code == 404
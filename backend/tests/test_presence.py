@@ -0,0 +1,109 @@
+"""
+Tests for the WebSocket presence registry (core.presence):
+
+  - connections are counted per user and expire without heartbeat
+  - the consumers register their user while the socket is open
+  - chat pushes are only queued for the recipients who are offline
+"""
+import time
+from unittest.mock import patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+
+from core import presence
+
+from tests.test_chat_consumers import _connect, in_memory_channel_layer  # noqa: F401
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    settings.CACHES = LOCMEM_CACHE
+    cache.clear()
+
+
+class TestRegistry:
+    def test_counts_connections(self):
+        presence.connect("u1")
+        presence.connect("u1")
+        presence.connect("u2")
+        presence.disconnect("u1")
+        assert presence.online_user_ids(["u1", "u2", "u3"]) == {"u1", "u2"}
+
+        presence.disconnect("u1")
+        presence.disconnect("u1")  # extra disconnect is harmless
+        assert presence.offline_user_ids(["u1", "u2", "u3"]) == ["u1", "u3"]
+        assert presence.is_online("u2")
+
+    def test_expires_without_heartbeat(self):
+        with patch.object(presence, "PRESENCE_TTL", 0.2):
+            presence.connect("u1")
+            presence.connect("u2")
+            time.sleep(0.12)
+            presence.heartbeat("u1")
+            time.sleep(0.12)
+            assert presence.online_user_ids(["u1", "u2"]) == {"u1"}
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConsumersAndPushes:
+    def test_push_only_to_offline_recipient(self, school, admin_user, parent_user):
+        from apps.chat.models import Conversation
+        from apps.notifications.models import DeviceToken
+
+        conv = Conversation.objects.create(
+            school=school,
+            created_by=admin_user,
+            participant_admin=admin_user,
+            participant_other=parent_user,
+            participant_other_role="parent",
+        )
+        DeviceToken.objects.create(user=admin_user, token="admin-phone", platform="android")
+
+        async def scenario():
+            chat = await _connect(f"/ws/chat/{conv.id}/", parent_user)
+            notifications = await _connect("/ws/notifications/", admin_user)
+            assert presence.is_online(admin_user.pk)
+
+            await chat.send_json_to({"content": "Bonjour"})
+            await chat.receive_json_from()
+            await notifications.receive_json_from()
+
+            await notifications.disconnect()
+            assert not presence.is_online(admin_user.pk)
+            await chat.send_json_to({"content": "Vous êtes là ?"})
+            await chat.receive_json_from()
+            await chat.disconnect()
+
+        with patch("apps.notifications.tasks.drain_push_outbox.apply_async"):
+            async_to_sync(scenario)()
+
+        from apps.notifications.models import PushOutbox
+        from apps.notifications.tasks import drain_push_outbox
+
+        assert list(PushOutbox.objects.values_list("user_id", "body")) == [
+            (admin_user.pk, "Vous êtes là ?")
+        ]
+        assert not presence.is_online(parent_user.pk)
+
+        with patch("core.firebase.send_push_to_multiple") as push:
+            drain_push_outbox()
+        assert push.call_args.args[0] == ["admin-phone"]
+        assert push.call_args.args[2] == "Vous êtes là ?"
+
+    def test_batch_task_skips_online_users(self, admin_user, parent_user):
+        from apps.chat.tasks import send_offline_fcm_push_batch
+        from apps.notifications.models import DeviceToken
+
+        for user, token in ((admin_user, "a"), (parent_user, "p")):
+            DeviceToken.objects.create(user=user, token=token, platform="android")
+        presence.connect(admin_user.pk)
+
+        with patch("core.firebase.send_push_to_multiple") as push:
+            send_offline_fcm_push_batch(
+                [str(admin_user.pk), str(parent_user.pk)], "Salon", "Bonjour"
+            )
+        assert push.call_args.args[0] == ["p"]
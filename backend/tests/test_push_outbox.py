@@ -0,0 +1,121 @@
+"""
+Tests for the push outbox (apps.notifications.tasks):
+
+  - queue_push only writes rows for offline users and schedules one
+    drain per coalescing window
+  - the drain folds a burst of messages into one push per user and
+    conversation, shares multicast calls between identical payloads and
+    skips the users who came online in the meantime
+"""
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+
+from apps.notifications.models import DeviceToken, PushOutbox
+from apps.notifications.tasks import drain_push_outbox, queue_push
+from core import presence
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    settings.CACHES = LOCMEM_CACHE
+    cache.clear()
+
+
+@pytest.fixture
+def apply_async():
+    with patch("apps.notifications.tasks.drain_push_outbox.apply_async") as mock:
+        yield mock
+
+
+@pytest.fixture
+def tokens(admin_user, teacher_user, parent_user):
+    for user, token in ((admin_user, "a"), (teacher_user, "t"), (parent_user, "p")):
+        DeviceToken.objects.create(user=user, token=token, platform="ANDROID")
+
+
+def _drain():
+    with patch("core.firebase.send_push_to_multiple") as push:
+        result = drain_push_outbox()
+    calls = sorted((c.args[0], c.args[2], c.args[3]) for c in push.call_args_list)
+    return result, calls
+
+
+@pytest.mark.django_db
+class TestQueue:
+    def test_online_users_are_not_queued(self, admin_user, parent_user, apply_async):
+        presence.connect(admin_user.pk)
+        assert queue_push([admin_user.pk, parent_user.pk], "Salon", "Bonjour") == 1
+        assert list(PushOutbox.objects.values_list("user_id", flat=True)) == [parent_user.pk]
+
+        presence.connect(parent_user.pk)
+        assert queue_push([admin_user.pk, parent_user.pk], "Salon", "Bonjour") == 0
+
+    def test_one_drain_per_window(self, parent_user, apply_async, settings):
+        settings.PUSH_OUTBOX_COALESCE_SECONDS = 7
+        for n in range(5):
+            queue_push([parent_user.pk], "Message", f"n°{n}")
+        apply_async.assert_called_once_with(countdown=7)
+
+        # The drain clears the marker: the next push schedules a new one
+        _drain()
+        queue_push([parent_user.pk], "Message", "encore")
+        assert apply_async.call_count == 2
+
+
+@pytest.mark.django_db
+class TestDrain:
+    def test_burst_is_coalesced_per_conversation(self, parent_user, tokens, apply_async):
+        for n in range(3):
+            queue_push(
+                [parent_user.pk],
+                "Message de Admin",
+                f"n°{n}",
+                {"conversation_id": "c1"},
+                group_key="conversation:c1",
+            )
+        queue_push(
+            [parent_user.pk],
+            "Message de Karim",
+            "Bonjour",
+            {"conversation_id": "c2"},
+            group_key="conversation:c2",
+        )
+
+        result, calls = _drain()
+        assert result == {"rows": 4, "tokens": 2}
+        assert calls == [
+            (["p"], "3 nouveaux messages", {"conversation_id": "c1", "count": 3}),
+            (["p"], "Bonjour", {"conversation_id": "c2"}),
+        ]
+        assert not PushOutbox.objects.exists()
+
+    def test_room_message_is_one_multicast(
+        self, admin_user, teacher_user, parent_user, tokens, apply_async
+    ):
+        queue_push(
+            [admin_user.pk, teacher_user.pk, parent_user.pk],
+            "Annonces: Admin",
+            "Réunion demain",
+            {"room_id": "r1"},
+            group_key="room:r1",
+        )
+        # Came online before the drain: not pushed, row still consumed
+        presence.connect(teacher_user.pk)
+
+        result, calls = _drain()
+        assert result["rows"] == 3
+        assert [(sorted(t), body) for t, body, _ in calls] == [(["a", "p"], "Réunion demain")]
+        assert not PushOutbox.objects.exists()
+
+    def test_batches_until_empty(self, parent_user, tokens, apply_async):
+        for n in range(5):
+            queue_push([parent_user.pk], "Alerte", f"n°{n}")
+
+        with patch("core.firebase.send_push_to_multiple") as push:
+            result = drain_push_outbox(batch_size=2)
+        assert result == {"rows": 5, "tokens": 5}
+        assert push.call_count == 5
@@ -0,0 +1,291 @@
+"""
+Tests for the school-wide report card pipeline (grades.tasks):
+
+  - generate_school_report_cards fans out one chunk per class (chord)
+  - render_class_report_cards records progress and per-student errors
+  - concurrent progress updates are aggregated, errors capped at 10
+  - bundle_school_report_cards streams the ZIP to storage
+  - a chunk failing for good marks the job failed (chord errback)
+  - ReportCardBatch loads a class in a fixed number of queries and
+    render_report_cards upserts the ReportCard rows
+"""
+
+import shutil
+import tempfile
+import uuid
+import zipfile
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.academics.models import Class, Level, StudentProfile
+from apps.academics.models import Subject as AcademicSubject
+from apps.accounts.models import User
+from apps.grades.caching import coefficient_map
+from apps.grades.models import ReportCard, SubjectAverage, TrimesterAverage
+from apps.grades.report_cards import (
+    ReportCardBatch,
+    render_report_cards,
+    report_card_storage_path,
+)
+from apps.grades.tasks import (
+    _update_report_progress,
+    bundle_school_report_cards,
+    fail_school_report_cards,
+    generate_school_report_cards,
+    render_class_report_cards,
+)
+from apps.schools.models import AcademicYear, School, Section
+
+
+class FakeRenderer:
+    """Stands in for WeasyPrint; fails for the students listed in ``failing``."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.contexts = []
+
+    def render(self, context):
+        if str(context["student"].pk) in self.failing:
+            raise RuntimeError("WeasyPrint crashed")
+        self.contexts.append(context)
+        return b"%PDF-1.4 " + str(context["student"].pk).encode()
+
+
+class ReportCardPipelineTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(name="Bulletins School", subdomain="bulletins")
+        cls.section = Section.objects.create(
+            school=cls.school,
+            section_type=Section.SectionType.MIDDLE,
+            name="Moyen",
+        )
+        cls.academic_year = AcademicYear.objects.create(
+            school=cls.school,
+            section=cls.section,
+            name="2025-2026",
+            start_date=date(2025, 9, 1),
+            end_date=date(2026, 6, 30),
+        )
+        cls.level = Level.objects.create(
+            school=cls.school,
+            section=cls.section,
+            name="1ère Année Moyenne",
+            code="1AM",
+            order=1,
+        )
+        cls.classes = [
+            Class.objects.create(
+                school=cls.school,
+                section=cls.section,
+                academic_year=cls.academic_year,
+                level=cls.level,
+                name=name,
+            )
+            for name in ("1AM-A", "1AM-B")
+        ]
+        cls.students = []
+        for n, klass in enumerate(cls.classes * 2):
+            user = User.objects.create_user(
+                phone_number=f"0553{n:06d}",
+                password="pass1234",
+                first_name=f"Eleve{n}",
+                last_name="Bulletin",
+                role=User.Role.STUDENT,
+                school=cls.school,
+            )
+            profile, _ = StudentProfile.objects.get_or_create(user=user)
+            profile.current_class = klass
+            profile.save()
+            cls.students.append(profile)
+
+    def setUp(self):
+        self.progress_key = f"report_cards_progress_{uuid.uuid4()}"
+        cache.set(self.progress_key, {
+            "status": "running",
+            "total": len(self.students),
+            "completed": 0,
+            "current_class": "",
+            "errors": [],
+        })
+        self.addCleanup(cache.delete, self.progress_key)
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class TestSchoolReportCardPipeline(ReportCardPipelineTestCase):
+    def test_fans_out_one_chunk_per_class(self):
+        with patch("celery.chord") as mock_chord:
+            generate_school_report_cards.run(
+                str(self.school.pk), str(self.academic_year.pk), 1
+            )
+
+        header = mock_chord.call_args.args[0]
+        self.assertEqual(
+            sorted(sig.args[0] for sig in header),
+            sorted(str(k.pk) for k in self.classes),
+        )
+        callback = mock_chord.return_value.call_args.args[0]
+        self.assertEqual(callback.task, bundle_school_report_cards.name)
+        [errback] = callback.options["link_error"]
+        self.assertEqual(errback["task"], fail_school_report_cards.name)
+
+    def test_failed_chunk_marks_job_failed(self):
+        fail_school_report_cards.run(
+            None, RuntimeError("worker lost"), None, self.progress_key
+        )
+
+        progress = cache.get(self.progress_key)
+        self.assertEqual(progress["status"], "failed")
+        self.assertEqual(progress["error"], "worker lost")
+
+    def test_chunk_records_progress_and_errors(self):
+        klass = self.classes[0]
+        failing = str(self.students[0].pk)
+
+        with patch(
+            "apps.grades.report_cards.get_renderer",
+            return_value=FakeRenderer(failing=[failing]),
+        ):
+            result = render_class_report_cards.run(
+                str(klass.pk), 1, str(self.academic_year.pk), self.progress_key
+            )
+
+        self.assertEqual(result["errors"], 1)
+        self.assertEqual(len(result["entries"]), 1)
+        self.assertTrue(default_storage.exists(result["entries"][0][0]))
+        progress = cache.get(self.progress_key)
+        self.assertEqual(progress["completed"], 2)
+        self.assertEqual(progress["current_class"], "1AM-A")
+        self.assertEqual([e["student"] for e in progress["errors"]], [failing])
+
+    def test_progress_updates_accumulate(self):
+        for n in range(15):
+            _update_report_progress(
+                self.progress_key,
+                completed=1,
+                student_error={"student": str(n)},
+            )
+
+        progress = cache.get(self.progress_key)
+        self.assertEqual(progress["completed"], 15)
+        self.assertEqual(len(progress["errors"]), 10)
+        self.assertEqual(progress["errors"][-1], {"student": "14"})
+
+    def test_bundle_streams_zip(self):
+        entries = []
+        for student in self.students[:2]:
+            path = report_card_storage_path(
+                self.school.pk, self.academic_year.name, 1, student
+            )
+            default_storage.save(path, ContentFile(b"%PDF-1.4 " + str(student.pk).encode()))
+            entries.append([path, f"1AM-A/{student.user.first_name}.pdf"])
+        entries.append(["report_cards/missing.pdf", "1AM-A/missing.pdf"])
+
+        with patch("apps.notifications.tasks.send_notification.delay"):
+            zip_url = bundle_school_report_cards.run(
+                [{"entries": entries, "errors": 1}],
+                str(self.school.pk),
+                str(self.academic_year.pk),
+                1,
+                self.progress_key,
+            )
+
+        progress = cache.get(self.progress_key)
+        self.assertEqual(progress["status"], "completed")
+        self.assertEqual(progress["zip_url"], zip_url)
+
+        zip_path = (
+            f"report_cards/{self.school.pk}/{self.academic_year.name}/T1/"
+            "school_T1_all_classes.zip"
+        )
+        with default_storage.open(zip_path, "rb") as f:
+            names = zipfile.ZipFile(f).namelist()
+        self.assertEqual(sorted(names), sorted(arc for _, arc in entries[:2]))
+
+
+class TestReportCardBatch(ReportCardPipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        klass = self.classes[0]
+        math = AcademicSubject.objects.create(school=self.school, name="Maths", code="M")
+        for n, student in enumerate(s for s in self.students if s.current_class == klass):
+            SubjectAverage.objects.create(
+                student=student,
+                subject=math,
+                classroom=klass,
+                academic_year=self.academic_year,
+                trimester=1,
+                calculated_average=Decimal("12") + n,
+            )
+            TrimesterAverage.objects.create(
+                student=student,
+                classroom=klass,
+                academic_year=self.academic_year,
+                trimester=1,
+                calculated_average=Decimal("12") + n,
+                rank_in_class=2 - n,
+            )
+
+    def _load(self):
+        coefficient_map(self.classes[0])  # cached: not part of the batch cost
+        with CaptureQueriesContext(connection) as ctx:
+            batch = ReportCardBatch(self.classes[0], self.academic_year, 1)
+        return batch, len(ctx.captured_queries)
+
+    def test_query_count_independent_of_class_size(self):
+        _, small = self._load()
+        for n in range(10, 16):
+            user = User.objects.create_user(
+                phone_number=f"0554{n:06d}",
+                password="pass1234",
+                first_name=f"Extra{n}",
+                last_name="Bulletin",
+                role=User.Role.STUDENT,
+                school=self.school,
+            )
+            StudentProfile.objects.filter(user=user).update(current_class=self.classes[0])
+
+        batch, large = self._load()
+        self.assertEqual(len(batch.students), 8)
+        self.assertEqual(small, large)
+
+    def test_render_upserts_report_cards(self):
+        student = self.students[0]
+        ReportCard.objects.create(
+            student=student,
+            class_obj=self.classes[0],
+            academic_year=self.academic_year,
+            trimester=1,
+            admin_comment="Bon travail",
+        )
+        batch, _ = self._load()
+        renderer = FakeRenderer()
+
+        with patch("apps.grades.report_cards.get_renderer", return_value=renderer):
+            results = render_report_cards(batch)
+
+        self.assertEqual([r["error"] for r in results], [None, None])
+        self.assertEqual(ReportCard.objects.count(), 2)
+        rc = ReportCard.objects.get(student=student)
+        self.assertEqual(rc.admin_comment, "Bon travail")
+        self.assertEqual(rc.general_average, Decimal("12.00"))
+        self.assertEqual(rc.rank, 2)
+        self.assertEqual(rc.total_students, 2)
+        self.assertTrue(rc.pdf_url)
+
+        context = next(c for c in renderer.contexts if c["student"] == student)
+        self.assertEqual(context["admin_comment"], "Bon travail")
+        self.assertEqual(context["subject_rows"][0]["coefficient"], Decimal("1"))
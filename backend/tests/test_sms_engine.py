@@ -0,0 +1,216 @@
+"""
+Tests for the SMS sending engine (apps.sms.engine / apps.sms.gateway):
+
+  - balance is reserved per batch and failed sends are refunded
+  - campaigns create their messages in bulk, stop at the balance and
+    record every result
+  - the custom gateway uses its batch endpoint, 100 recipients per call
+  - the token bucket paces the senders
+"""
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apps.sms.engine import BALANCE_EXHAUSTED, NO_GATEWAY, reserve_balance
+from apps.sms.gateway import CustomGateway, SMSResult, TokenBucket
+from apps.sms.models import SMSCampaign, SMSConfig, SMSMessage
+from apps.sms.tasks import execute_campaign_task, send_sms_task
+
+
+@pytest.fixture
+def sms_config(school):
+    return SMSConfig.objects.create(
+        school=school,
+        provider=SMSConfig.GatewayProvider.CUSTOM,
+        sender_name="ILMI",
+        api_url="https://sms.example.test/send",
+        remaining_balance=100,
+        alert_threshold=0,
+    )
+
+
+@pytest.fixture
+def parents(school):
+    from apps.accounts.models import User
+
+    return [
+        User.objects.create_user(
+            phone_number=f"066000000{n}",
+            password="Test@1234",
+            school=school,
+            role="PARENT",
+            first_name=f"Parent{n}",
+            last_name="Test",
+        )
+        for n in range(3)
+    ]
+
+
+def _send(phone, message):
+    if phone.endswith("1"):
+        return SMSResult(False, error="Numéro invalide")
+    return SMSResult(True, message_id=f"id-{phone}")
+
+
+@pytest.mark.django_db
+class TestBalance:
+    def test_reserve_is_capped(self, sms_config):
+        assert reserve_balance(sms_config.pk, 60) == 60
+        assert reserve_balance(sms_config.pk, 60) == 40
+        assert reserve_balance(sms_config.pk, 1) == 0
+        sms_config.refresh_from_db()
+        assert sms_config.remaining_balance == 0
+
+    def test_single_sms(self, school, sms_config):
+        msg = SMSMessage.objects.create(
+            school=school, recipient_phone="0660000000", content="Bonjour"
+        )
+        with patch.object(CustomGateway, "send", side_effect=_send):
+            send_sms_task(str(msg.pk))
+        msg.refresh_from_db()
+        sms_config.refresh_from_db()
+        assert msg.status == SMSMessage.Status.SENT
+        assert msg.gateway_message_id == "id-0660000000"
+        assert msg.cost == sms_config.cost_per_sms
+        assert sms_config.remaining_balance == 99
+
+    def test_single_sms_without_gateway(self, school):
+        msg = SMSMessage.objects.create(
+            school=school, recipient_phone="0660000000", content="Bonjour"
+        )
+        send_sms_task(str(msg.pk))
+        msg.refresh_from_db()
+        assert msg.status == SMSMessage.Status.FAILED
+        assert msg.error_message == NO_GATEWAY
+
+
+@pytest.mark.django_db
+class TestCampaign:
+    def _campaign(self, school, parents):
+        campaign = SMSCampaign.objects.create(
+            school=school,
+            title="Réunion",
+            message="Réunion des parents jeudi",
+            target_type=SMSCampaign.TargetType.INDIVIDUAL,
+        )
+        campaign.target_individuals.set(parents)
+        return campaign
+
+    def test_results_and_refund(self, school, sms_config, parents):
+        sms_config.remaining_balance = 2
+        sms_config.save()
+        campaign = self._campaign(school, parents)
+
+        with patch.object(CustomGateway, "send", side_effect=_send):
+            result = execute_campaign_task(str(campaign.pk))
+        assert result == {"sent": 1, "failed": 2}
+
+        campaign.refresh_from_db()
+        assert campaign.status == SMSCampaign.Status.COMPLETED
+        assert (campaign.total_recipients, campaign.sent_count, campaign.failed_count) == (
+            3,
+            1,
+            2,
+        )
+        statuses = dict(
+            SMSMessage.objects.filter(campaign=campaign).values_list(
+                "recipient_phone", "error_message"
+            )
+        )
+        assert statuses == {
+            "0660000000": "",
+            "0660000001": "Numéro invalide",
+            "0660000002": BALANCE_EXHAUSTED,
+        }
+        # The invalid number's credit was given back
+        sms_config.refresh_from_db()
+        assert sms_config.remaining_balance == 1
+
+    def test_queries_do_not_grow_with_recipients(self, school, sms_config, parents):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        campaign = self._campaign(school, parents)
+        with patch.object(CustomGateway, "send", side_effect=_send), CaptureQueriesContext(
+            connection
+        ) as ctx:
+            execute_campaign_task(str(campaign.pk))
+        few = len(ctx.captured_queries)
+
+        from apps.accounts.models import User
+
+        more = [
+            User.objects.create_user(
+                phone_number=f"07700000{n:02d}",
+                password="x",
+                school=school,
+                role="PARENT",
+                first_name="P",
+                last_name=str(n),
+            )
+            for n in range(20)
+        ]
+        campaign = self._campaign(school, parents + more)
+        with patch.object(CustomGateway, "send", side_effect=_send), CaptureQueriesContext(
+            connection
+        ) as ctx:
+            execute_campaign_task(str(campaign.pk))
+        assert len(ctx.captured_queries) == few
+
+    def test_without_gateway(self, school, parents):
+        campaign = self._campaign(school, parents)
+        assert execute_campaign_task(str(campaign.pk)) == {"sent": 0, "failed": 3}
+        assert set(
+            SMSMessage.objects.filter(campaign=campaign).values_list("error_message", flat=True)
+        ) == {NO_GATEWAY}
+
+
+class TestGateway:
+    def test_batch_endpoint(self):
+        gateway = CustomGateway(
+            api_key="k",
+            api_secret="",
+            api_url="https://sms.example.test/send",
+            sender_name="ILMI",
+            bulk_api_url="https://sms.example.test/bulk-test",
+        )
+        gateway.rate_per_second = 0
+
+        def post(url, json, **kwargs):
+            response = MagicMock(status_code=200)
+            response.json.return_value = {
+                "results": [
+                    {"error": "invalide"} if m["to"] == "bad" else {"id": m["to"]}
+                    for m in json["messages"]
+                ]
+            }
+            return response
+
+        session = MagicMock()
+        session.post.side_effect = post
+        recipients = [{"phone": str(n), "message": "Bonjour"} for n in range(250)]
+        recipients[120]["phone"] = "bad"
+
+        with patch.object(CustomGateway, "session", session):
+            results = gateway.deliver(recipients)
+
+        assert sorted(len(c.kwargs["json"]["messages"]) for c in session.post.call_args_list) == [
+            50,
+            100,
+            100,
+        ]
+        assert {c.args[0] for c in session.post.call_args_list} == {
+            "https://sms.example.test/bulk-test"
+        }
+        assert [r.message_id for r in results[:3]] == ["0", "1", "2"]
+        assert not results[120].success and results[120].error == "invalide"
+        assert sum(r.success for r in results) == 249
+
+    def test_token_bucket_paces(self):
+        bucket = TokenBucket(rate=500, capacity=10)
+        start = time.monotonic()
+        for _ in range(30):
+            bucket.acquire()
+        # 10 from the burst, 20 more at 500/s
+        assert time.monotonic() - start >= 0.035